@@ -30,3 +30,14 @@ model.reset_states()
 output = model.get_output()
 
 from .my_new_model import model
+
+import json
+
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.models.m4_sf_2011 import model
+
+with open("m4_sf_2011.json", "w") as f:
+    json.dump(model.to_spec(), f)
+
+with open("m4_sf_2011.json", "r") as f:
+    new_model = Unit.from_spec(json.load(f))
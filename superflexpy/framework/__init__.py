@@ -23,6 +23,30 @@ CODED BY: Marco Dal Molin
 DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
 """
 
-from . import element, network, node, unit
-
-__all__ = ["element", "network", "node", "unit"]
+from . import (
+    assimilation,
+    catchment_batch,
+    chunked_evaluation,
+    element,
+    network,
+    network_partition,
+    node,
+    parareal,
+    profiler,
+    sensitivity,
+    unit,
+)
+
+__all__ = [
+    "assimilation",
+    "catchment_batch",
+    "chunked_evaluation",
+    "element",
+    "network",
+    "network_partition",
+    "node",
+    "parareal",
+    "profiler",
+    "sensitivity",
+    "unit",
+]
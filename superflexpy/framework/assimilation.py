@@ -0,0 +1,395 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+
+This file contains the implementation of an ensemble Kalman filter (EnKF) to
+assimilate observations in a unit. The ensemble members are solved together
+between the observation times and their states are stored in a single array,
+updated in place by the analysis.
+"""
+
+import numpy as np
+
+from .catchment_batch import CatchmentBatch
+
+
+class EnsembleKalmanFilter:
+    """
+    This class assimilates observations of the outputs of a Unit with the
+    ensemble Kalman filter. The states of the members are stored in a 2D
+    array (#members, #states), whose columns follow the order of the states
+    returned by the method get_states of the unit (lag states use one column
+    per position of the lag, flux after flux). The layout is returned by the
+    method get_layout.
+
+    Between two observation times the members are solved at once by a
+    CatchmentBatch (forecast); at the observation times the states are
+    corrected with a stochastic (perturbed observations) or square root
+    (ensemble transform) update (analysis).
+    """
+
+    def __init__(
+        self,
+        unit,
+        num_members,
+        parameters=None,
+        states=None,
+        method="stochastic",
+        inflation=1.0,
+        bounds=None,
+        batch_size=None,
+        seed=None,
+    ):
+        """
+        This is the initializer of the class EnsembleKalmanFilter.
+
+        Parameters
+        ----------
+        unit : superflexpy.framework.unit.Unit
+            Unit to solve. Its time step must be already set.
+        num_members : int
+            Number of members of the ensemble
+        parameters : dict(str : numpy.ndarray)
+            Parameters that change among the members, as arrays (#members,)
+            or floats. See CatchmentBatch.run.
+        states : dict(str : numpy.ndarray)
+            Initial states that change among the members (e.g. the initial
+            spread of the ensemble). See CatchmentBatch.run. Lag states that
+            are None are initialized by the first forecast; the ensemble array
+            is available from then on.
+        method : str
+            Analysis: 'stochastic' (perturbed observations) or 'sqrt'
+            (ensemble transform Kalman filter, deterministic).
+        inflation : float
+            Multiplicative inflation of the deviations of the members from
+            the mean of the ensemble, applied before each analysis.
+        bounds : dict(str : tuple(float, float))
+            Bounds of the states (e.g. storages must not be negative), applied
+            after each analysis. States not listed are not bounded. Use None
+            for a missing bound.
+        batch_size : int
+            Maximum number of members solved together. See CatchmentBatch.
+        seed : int
+            Seed of the random numbers used by the stochastic analysis.
+        """
+
+        self._error_message = "module : superflexPy, EnsembleKalmanFilter ,"
+        self._error_message += " Error message : "
+
+        if method not in ["stochastic", "sqrt"]:
+            message = "{}unknown method {}".format(self._error_message, method)
+            raise ValueError(message)
+
+        self._batch = CatchmentBatch(unit, batch_size=batch_size)
+        self._num_members = num_members
+        self._parameters = {} if parameters is None else parameters
+        self._states = {} if states is None else states
+        self._method = method
+        self._inflation = inflation
+        self._bounds = {} if bounds is None else bounds
+        self._rng = np.random.default_rng(seed)
+
+        self._layout = None
+        self._ensemble = None
+
+        if all(v is not None for v in self.get_states().values()):
+            self._set_layout(self.get_states())
+
+    def forecast(self, inputs):
+        """
+        This method solves all the members, starting from the states of the
+        ensemble, and stores their final states in the ensemble.
+
+        Parameters
+        ----------
+        inputs : list(numpy.ndarray)
+            Inputs of the unit, as 2D arrays (#members, #timesteps) (e.g.
+            perturbed forcing) or 1D arrays (#timesteps,) used for all the
+            members.
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            Outputs of the unit, as 2D arrays (#members, #timesteps).
+        """
+
+        outputs, states = self._batch.run(inputs=inputs, parameters=self._parameters, states=self.get_states())
+
+        if self._layout is None:
+            self._set_layout(states)
+        else:
+            self._to_ensemble(states)
+
+        return outputs
+
+    def analysis(self, observed, predicted, error):
+        """
+        This method corrects the states of the ensemble, in place, given the
+        observations and their values predicted by the members. Missing (NaN)
+        observations are skipped.
+
+        Parameters
+        ----------
+        observed : numpy.ndarray
+            Observed values, 1D array (#observations,)
+        predicted : numpy.ndarray
+            Values predicted by the members, 2D array (#members,
+            #observations)
+        error : float or numpy.ndarray
+            Variance of the observation errors: float (all observations),
+            1D array (#observations,), or covariance matrix (#observations,
+            #observations).
+        """
+
+        if self._ensemble is None:
+            message = "{}the ensemble is not initialized. Call forecast first".format(self._error_message)
+            raise RuntimeError(message)
+
+        observed = np.atleast_1d(np.asarray(observed, dtype=np.float64))
+        predicted = np.asarray(predicted, dtype=np.float64).reshape((self._num_members, len(observed)))
+        error = np.asarray(error, dtype=np.float64)
+
+        if error.ndim < 2:
+            error = np.diag(np.broadcast_to(error, observed.shape))
+
+        valid = ~np.isnan(observed)
+        if not valid.any():
+            return
+
+        observed = observed[valid]
+        predicted = predicted[:, valid]
+        error = error[np.ix_(valid, valid)]
+
+        self._inflate(predicted)
+
+        if self._method == "stochastic":
+            _stochastic_update(self._ensemble, predicted, observed, error, self._rng)
+        else:
+            _sqrt_update(self._ensemble, predicted, observed, error)
+
+        self._apply_bounds()
+
+    def assimilate(self, inputs, observed, error, output=0):
+        """
+        This method runs the forecast until the next observation time, at the
+        last time step of the inputs, and assimilates the observations of an
+        output of the unit.
+
+        Parameters
+        ----------
+        inputs : list(numpy.ndarray)
+            Inputs of the unit until the observation time. See forecast.
+        observed : float
+            Observed value of the output at the last time step. If NaN, the
+            analysis is skipped.
+        error : float
+            Variance of the observation error
+        output : int
+            Index of the observed output of the unit
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            Outputs of the forecast, before the analysis.
+        """
+
+        outputs = self.forecast(inputs)
+        self.analysis(observed, outputs[output][:, -1:], error)
+
+        return outputs
+
+    def get_ensemble(self):
+        """
+        This method returns the array of the states of the ensemble. It is
+        not a copy: changing it changes the ensemble.
+
+        Returns
+        -------
+        numpy.ndarray
+            2D array (#members, #states). None if the ensemble is not
+            initialized.
+        """
+
+        return self._ensemble
+
+    def set_ensemble(self, ensemble):
+        """
+        This method sets the states of the ensemble.
+
+        Parameters
+        ----------
+        ensemble : numpy.ndarray
+            2D array (#members, #states), with the layout returned by
+            get_layout.
+        """
+
+        if self._ensemble is None or np.shape(ensemble) != self._ensemble.shape:
+            message = "{}the ensemble must have shape {}".format(
+                self._error_message, None if self._ensemble is None else self._ensemble.shape
+            )
+            raise ValueError(message)
+
+        self._ensemble[:] = ensemble
+
+    def get_layout(self):
+        """
+        This method returns the position of the states in the columns of the
+        ensemble.
+
+        Returns
+        -------
+        list(tuple(str, int, int, int))
+            Name of the state, flux (lag states) or None, first column, and
+            last column (excluded).
+        """
+
+        return None if self._layout is None else list(self._layout)
+
+    def get_states(self):
+        """
+        This method returns the states of the members, in the format used by
+        CatchmentBatch (members along the first dimension).
+
+        Returns
+        -------
+        dict(str : numpy.ndarray)
+            States of the members
+        """
+
+        if self._layout is None:
+            # Initial states of the unit, unless given for the members
+            states = {}
+            for k, v in self._batch._states.items():
+                v = self._states.get(k, v)
+                states[k] = None if v is None else self._broadcast_state(v)
+
+            return states
+
+        states = {}
+        for name, flux, start, stop in self._layout:
+            if flux is None:
+                states[name] = self._ensemble[:, start]
+            else:
+                states.setdefault(name, []).append(self._ensemble[:, start:stop])
+
+        return states
+
+    # PROTECTED METHODS
+
+    def _broadcast_state(self, state):
+        if isinstance(state, list):
+            return [
+                np.broadcast_to(np.asarray(s, dtype=np.float64), (self._num_members, np.shape(s)[-1])) for s in state
+            ]
+
+        return np.broadcast_to(np.asarray(state, dtype=np.float64), (self._num_members,))
+
+    def _set_layout(self, states):
+        self._layout = []
+        column = 0
+
+        for name, state in states.items():
+            if isinstance(state, list):
+                for flux, s in enumerate(state):
+                    self._layout.append((name, flux, column, column + np.shape(s)[1]))
+                    column += np.shape(s)[1]
+            else:
+                self._layout.append((name, None, column, column + 1))
+                column += 1
+
+        self._ensemble = np.zeros((self._num_members, column))
+        self._to_ensemble(states)
+
+    def _to_ensemble(self, states):
+        for name, flux, start, stop in self._layout:
+            if flux is None:
+                self._ensemble[:, start] = states[name]
+            else:
+                self._ensemble[:, start:stop] = states[name][flux]
+
+    def _inflate(self, predicted):
+        if self._inflation == 1.0:
+            return
+
+        for array in [self._ensemble, predicted]:
+            mean = array.mean(axis=0)
+            array -= mean
+            array *= self._inflation
+            array += mean
+
+    def _apply_bounds(self):
+        for name, flux, start, stop in self._layout:
+            if name in self._bounds:
+                low, high = self._bounds[name]
+                np.clip(self._ensemble[:, start:stop], low, high, out=self._ensemble[:, start:stop])
+
+    def __repr__(self):
+        str = "Module: superflexPy\nEnsembleKalmanFilter class\n"
+        str += "Members: {}\n".format(self._num_members)
+        str += "Method: {}\n".format(self._method)
+        str += "Inflation: {}\n".format(self._inflation)
+
+        return str
+
+
+def _stochastic_update(ensemble, predicted, observed, error, rng):
+    """
+    This function updates the ensemble, in place, with the stochastic EnKF:
+    each member assimilates the observations perturbed with a random error.
+    """
+
+    num_members = len(ensemble)
+    anomalies = ensemble - ensemble.mean(axis=0)
+    pred_anomalies = predicted - predicted.mean(axis=0)
+
+    cov_xy = anomalies.T @ pred_anomalies / (num_members - 1)
+    cov_yy = pred_anomalies.T @ pred_anomalies / (num_members - 1) + error
+
+    perturbed = observed + rng.multivariate_normal(np.zeros(len(observed)), error, size=num_members)
+    ensemble += np.linalg.solve(cov_yy, (perturbed - predicted).T).T @ cov_xy.T
+
+
+def _sqrt_update(ensemble, predicted, observed, error):
+    """
+    This function updates the ensemble, in place, with the ensemble transform
+    Kalman filter: the mean is updated with the Kalman gain and the
+    deviations from the mean are transformed with the symmetric square root
+    of the analysis covariance in the space of the members.
+    """
+
+    num_members = len(ensemble)
+    mean = ensemble.mean(axis=0)
+    anomalies = ensemble - mean
+    pred_mean = predicted.mean(axis=0)
+    pred_anomalies = (predicted - pred_mean) / np.sqrt(num_members - 1)
+
+    cov_xy = anomalies.T @ pred_anomalies / np.sqrt(num_members - 1)
+    cov_yy = pred_anomalies.T @ pred_anomalies + error
+    mean += cov_xy @ np.linalg.solve(cov_yy, observed - pred_mean)
+
+    weights = np.eye(num_members) + pred_anomalies @ np.linalg.solve(error, pred_anomalies.T)
+    eig_val, eig_vec = np.linalg.eigh(weights)
+    transform = (eig_vec / np.sqrt(eig_val)) @ eig_vec.T
+
+    ensemble[:] = mean + transform @ anomalies
@@ -0,0 +1,282 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of a runner that solves the same unit
+for many independent catchments at once (large-sample mode). The catchments
+are stacked along an additional dimension of the fluxes and the differential
+equations are solved by compiled loops across the catchments.
+"""
+
+from copy import deepcopy
+
+import numpy as np
+
+from ..utils.metrics import StreamingMetrics
+from ..utils.numerical_approximator import NumericalApproximator
+from .element import ODEsElement
+from .unit import Unit
+
+
+class CatchmentBatch:
+    """
+    This class solves a Unit for many independent catchments that share its
+    structure but have different inputs, parameters, and states. Instead of
+    looping over the catchments in python, the unit is solved once with fluxes
+    of dimensions (#timesteps, #catchments): the elements governed by ODEs
+    solve all the catchments with a single compiled loop (parallel when the
+    numerical approximator uses numba) and the other elements operate on the
+    2D arrays.
+
+    The runner works on a private copy of the unit. Numerical approximators
+    that redefine the method solve (e.g. the ones of coupled ODEs) are not
+    supported.
+    """
+
+    def __init__(self, unit, batch_size=None):
+        """
+        This is the initializer of the class CatchmentBatch.
+
+        Parameters
+        ----------
+        unit : superflexpy.framework.unit.Unit
+            Unit to solve. Its time step must be already set. Its parameters
+            and states are the default values for all the catchments.
+        batch_size : int
+            Maximum number of catchments solved together. It bounds the memory
+            used by the fluxes. If None, all the catchments are solved
+            together.
+        """
+
+        self._error_message = "module : superflexPy, CatchmentBatch ,"
+        self._error_message += " Error message : "
+
+        if not isinstance(unit, Unit):
+            message = "{}the model must be a Unit. Given {}".format(self._error_message, type(unit))
+            raise TypeError(message)
+
+        for layer in unit._layers:
+            for el in layer:
+                if isinstance(el, ODEsElement) and type(el._num_app).solve is not NumericalApproximator.solve:
+                    message = "{}the numerical approximator of {} cannot solve batches of catchments".format(
+                        self._error_message, el.id
+                    )
+                    raise ValueError(message)
+
+        self._unit = deepcopy(unit)
+        self._unit.set_memoization(None)  # Entries of the batches would only fill the cache
+
+        self._batch_size = batch_size
+        self._parameters = self._unit.get_parameters()
+        self._states = self._unit.get_states()
+
+    def run(self, inputs, parameters=None, states=None):
+        """
+        This method solves the unit for all the catchments.
+
+        Parameters
+        ----------
+        inputs : list(numpy.ndarray)
+            Inputs of the unit. Each input is a 2D array (#catchments,
+            #timesteps) or a 1D array (#timesteps,) used for all the
+            catchments.
+        parameters : dict(str : numpy.ndarray)
+            Parameters that change among the catchments, as arrays
+            (#catchments,) or floats. The keys must be the ones returned by
+            the method get_parameters_name of the unit. The other parameters
+            keep the values of the unit.
+        states : dict(str : numpy.ndarray)
+            Initial states that change among the catchments. The keys must be
+            the ones returned by the method get_states_name of the unit. The
+            states of the ODEs are arrays (#catchments,) or floats, the states
+            of the lags are 2D arrays (#catchments, lag length) or lists of
+            them (one per flux). The other states, and the ones that are None,
+            keep the values of the unit: the final states returned by run can
+            be used to continue the simulation.
+
+        Returns
+        -------
+        list(numpy.ndarray), dict(str : numpy.ndarray)
+            Outputs of the unit, as 2D arrays (#catchments, #timesteps), and
+            final states, with the catchments along the first dimension.
+        """
+
+        parameters = {} if parameters is None else parameters
+        states = {} if states is None else states
+
+        num_catchments = self._get_num_catchments(inputs, parameters, states)
+        num_ts = np.shape(inputs[0])[-1]
+        batch_size = num_catchments if self._batch_size is None else self._batch_size
+
+        outputs = None
+        final_states = []
+
+        for start in range(0, num_catchments, batch_size):
+            stop = min(start + batch_size, num_catchments)
+            num_loc = stop - start
+
+            loc_par = {}
+            for k, v in self._parameters.items():
+                v = parameters.get(k, v)
+                if isinstance(v, (float, np.ndarray)):
+                    v = np.broadcast_to(np.asarray(v, dtype=np.float64), (num_catchments,))[start:stop]
+                    v = v.reshape((1, num_loc))
+                loc_par[k] = v
+
+            loc_states = {}
+            for k, v in self._states.items():
+                if states.get(k) is not None:
+                    loc_states[k] = self._get_batch_state(states[k], start, stop, num_catchments)
+                elif isinstance(v, float):
+                    loc_states[k] = np.full(num_loc, v)
+                else:
+                    loc_states[k] = deepcopy(v)
+
+            loc_in = []
+            for i in inputs:
+                i = np.asarray(i, dtype=np.float64)
+                if i.ndim == 2:
+                    i = i[start:stop]
+                loc_in.append(np.ascontiguousarray(np.broadcast_to(i, (num_loc, num_ts)).T))
+
+            self._unit.set_parameters(loc_par)
+            self._unit.set_states(loc_states)
+            self._unit.set_input(loc_in)
+
+            loc_out = self._unit.get_output()
+
+            if outputs is None:
+                outputs = [np.zeros((num_catchments, num_ts)) for _ in loc_out]
+
+            for o, lo in zip(outputs, loc_out):
+                o[start:stop] = np.broadcast_to(np.reshape(lo, (num_ts, -1)), (num_ts, num_loc)).T
+
+            final_states.append(self._unit.get_states())
+
+        return outputs, self._stack_states(final_states)
+
+    def evaluate(self, inputs, observed, parameters=None, states=None, chunk_size=None, warmup=0, output=0):
+        """
+        This method solves the unit for all the catchments and returns the
+        goodness of fit of one of its outputs (see StreamingMetrics). The
+        time steps are solved in chunks, restarting from the final states of
+        the previous chunk, and each chunk is added to the metrics as soon as
+        it is solved: the simulated series are never stored entirely.
+
+        Parameters
+        ----------
+        inputs : list(numpy.ndarray)
+            Inputs of the unit. See run.
+        observed : numpy.ndarray
+            Observed values, 2D array (#catchments, #timesteps) or 1D array
+            (#timesteps,) used for all the catchments. NaN values are skipped.
+        parameters : dict(str : numpy.ndarray)
+            Parameters that change among the catchments. See run.
+        states : dict(str : numpy.ndarray)
+            Initial states that change among the catchments. See run.
+        chunk_size : int
+            Number of time steps solved together. If None, all the time steps
+            are solved together.
+        warmup : int
+            Number of initial time steps excluded from the metrics.
+        output : int
+            Index of the output of the unit that is evaluated.
+
+        Returns
+        -------
+        dict(str : numpy.ndarray), dict(str : numpy.ndarray)
+            Metrics of the catchments and final states.
+        """
+
+        num_ts = np.shape(inputs[0])[-1]
+        chunk_size = num_ts if chunk_size is None else chunk_size
+        metrics = None
+
+        for start in range(0, num_ts, chunk_size):
+            stop = min(start + chunk_size, num_ts)
+            loc_in = [np.asarray(i)[..., start:stop] for i in inputs]
+
+            outputs, states = self.run(inputs=loc_in, parameters=parameters, states=states)
+
+            if metrics is None:
+                metrics = StreamingMetrics(num_members=len(outputs[output]))
+
+            first = max(start, warmup)
+            if first < stop:
+                metrics.update(outputs[output][:, first - start :], np.asarray(observed)[..., first:stop])
+
+        return metrics.get_scores(), states
+
+    # PROTECTED METHODS
+
+    def _get_num_catchments(self, inputs, parameters, states):
+        sizes = set()
+
+        for i in inputs:
+            if np.ndim(i) == 2:
+                sizes.add(np.shape(i)[0])
+
+        for v in list(parameters.values()) + list(states.values()):
+            if isinstance(v, list):
+                v = v[0]
+            if np.ndim(v) > 0:
+                sizes.add(np.shape(v)[0])
+
+        if len(sizes) > 1:
+            message = "{}inconsistent number of catchments: {}".format(self._error_message, sorted(sizes))
+            raise ValueError(message)
+
+        return sizes.pop() if sizes else 1
+
+    @staticmethod
+    def _get_batch_state(state, start, stop, num_catchments):
+        # From catchments along the first dimension to the layout used by the
+        # elements: 1D for the ODEs and (lag length, #catchments) for the lags
+        if isinstance(state, list):
+            return [np.asarray(s, dtype=np.float64)[start:stop].T.copy() for s in state]
+
+        state = np.asarray(state, dtype=np.float64)
+
+        if state.ndim == 2:
+            return state[start:stop].T.copy()
+
+        return np.broadcast_to(state, (num_catchments,))[start:stop].copy()
+
+    @staticmethod
+    def _stack_states(batch_states):
+        states = {}
+
+        for k, v in batch_states[0].items():
+            if v is None:
+                states[k] = None
+            elif isinstance(v, list):
+                # Lags: the batches may have different lengths
+                states[k] = []
+                for f in range(len(v)):
+                    loc_states = [s[k][f] for s in batch_states]
+                    length = max(len(s) for s in loc_states)
+                    states[k].append(np.concatenate([np.pad(s, ((0, length - len(s)), (0, 0))).T for s in loc_states]))
+            else:
+                states[k] = np.concatenate([np.broadcast_to(s[k], (np.size(s[k]),)) for s in batch_states])
+
+        return states
@@ -0,0 +1,217 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of a runner that solves a model in
+chunks of time steps, updating its goodness of fit after each chunk, and that
+stops the simulation as soon as the fit cannot become better than a threshold
+(e.g. the best one found so far by a calibration).
+"""
+
+import numpy as np
+
+from ..utils.metrics import StreamingMetrics
+from .network import Network
+from .node import Node
+from .unit import Unit
+
+
+def sse_bound(metrics):
+    """
+    This function returns the sum of squared errors accumulated so far. Since
+    it can only increase with the next time steps, it is a lower bound of the
+    sum of squared errors of the full simulation.
+
+    Parameters
+    ----------
+    metrics : superflexpy.utils.metrics.StreamingMetrics
+        Metrics of the time steps solved so far
+
+    Returns
+    -------
+    float
+        Bound of the objective function (lower is better)
+    """
+
+    return float(metrics.get_scores()["SSE"][0])
+
+
+class ChunkedEvaluation:
+    """
+    This class solves a model (Unit, Node, or Network) in chunks of time
+    steps, restarting from the states at the end of the previous chunk, and
+    accumulates the goodness of fit of one of its outputs (see
+    StreamingMetrics). After each chunk, a bound of the objective function
+    (lower is better) is calculated from the metrics; if it exceeds the
+    threshold, the simulation is stopped and the partial scores are returned,
+    marked as incomplete.
+
+    The bound must never be larger than the value of the objective function
+    at the end of the simulation (e.g. the sum of squared errors accumulated
+    so far); otherwise, parameter sets better than the threshold may be
+    discarded.
+
+    In a calibration, the model is evaluated for each parameter set with
+    the threshold equal to the best value of the objective function found so
+    far; this is done automatically if the threshold is not specified.
+    """
+
+    def __init__(self, model, observed, chunk_size, output=0, outlet=None, warmup=0, bound=sse_bound):
+        """
+        This is the initializer of the class ChunkedEvaluation.
+
+        Parameters
+        ----------
+        model : superflexpy.framework.network.Network, Node, or Unit
+            Model to solve. It is solved in place: its parameters and states
+            must be set (e.g. calling reset_states) before each run.
+        observed : numpy.ndarray
+            Observed values of the output. NaN values are skipped.
+        chunk_size : int
+            Number of time steps solved between two evaluations of the bound
+        output : int
+            Index of the output of the model that is evaluated
+        outlet : str
+            Id of the node whose output is evaluated. Used only if the model
+            is a Network.
+        warmup : int
+            Number of initial time steps excluded from the metrics
+        bound : callable
+            Function that receives the StreamingMetrics of the time steps
+            solved so far and returns a bound of the objective function. By
+            default, the sum of squared errors.
+        """
+
+        self._error_message = "module : superflexPy, ChunkedEvaluation ,"
+        self._error_message += " Error message : "
+
+        if not isinstance(model, (Unit, Node, Network)):
+            message = "{}the model must be a Unit, a Node, or a Network. Given {}".format(
+                self._error_message, type(model)
+            )
+            raise TypeError(message)
+
+        if isinstance(model, Network) and outlet is None:
+            message = "{}the outlet must be specified when the model is a Network".format(self._error_message)
+            raise ValueError(message)
+
+        self._model = model
+        self._observed = np.asarray(observed, dtype=np.float64)
+        self._chunk_size = chunk_size
+        self._output = output
+        self._outlet = outlet
+        self._warmup = warmup
+        self._bound = bound
+        self._best = None
+
+    def run(self, inputs, threshold=None):
+        """
+        This method solves the model, starting from its current states, and
+        returns its goodness of fit.
+
+        Parameters
+        ----------
+        inputs : list(numpy.ndarray) or dict(str : list(numpy.ndarray))
+            Inputs of the model. If the model is a Network, dictionary with
+            the inputs of each node.
+        threshold : float
+            Value of the bound above which the simulation is stopped. If None,
+            the best (lowest) value of the bound among the complete runs done
+            so far is used.
+
+        Returns
+        -------
+        dict(str : float), dict
+            Metrics of the time steps solved (see StreamingMetrics) and
+            report, with keys 'complete' (False if the simulation was
+            stopped), 'time_steps' (number of time steps solved), and 'bound'
+            (last value of the bound).
+        """
+
+        num_ts = len(self._observed)
+        threshold = self._best if threshold is None else threshold
+        metrics = StreamingMetrics(num_members=1)
+        bound = None
+
+        for start in range(0, num_ts, self._chunk_size):
+            stop = min(start + self._chunk_size, num_ts)
+            simulated = self._solve(inputs, start, stop)
+
+            first = max(start, self._warmup)
+            if first < stop:
+                metrics.update(simulated[first - start :], self._observed[first:stop])
+
+            bound = self._bound(metrics)
+
+            if stop < num_ts and threshold is not None and bound > threshold:
+                return self._get_scores(metrics), {"complete": False, "time_steps": stop, "bound": bound}
+
+        if bound is not None and (self._best is None or bound < self._best):
+            self._best = bound
+
+        return self._get_scores(metrics), {"complete": True, "time_steps": num_ts, "bound": bound}
+
+    def get_best(self):
+        """
+        This method returns the best (lowest) value of the bound among the
+        complete runs.
+
+        Returns
+        -------
+        float
+            Best value of the bound. None if no run has been completed.
+        """
+
+        return self._best
+
+    def reset(self):
+        """
+        This method forgets the best value of the bound.
+        """
+
+        self._best = None
+
+    # PROTECTED METHODS
+
+    def _solve(self, inputs, start, stop):
+        if isinstance(self._model, Network):
+            for cat, loc_in in inputs.items():
+                self._model.call_internal(cat, "set_input", input=[i[start:stop] for i in loc_in])
+
+            return self._model.get_output(outlets=[self._outlet])[self._outlet][self._output]
+
+        self._model.set_input([i[start:stop] for i in inputs])
+
+        return self._model.get_output()[self._output]
+
+    @staticmethod
+    def _get_scores(metrics):
+        return {k: float(v[0]) for k, v in metrics.get_scores().items()}
+
+    def __repr__(self):
+        str = "Module: superflexPy\nChunkedEvaluation class\n"
+        str += "Model: {}\n".format(self._model.id if hasattr(self._model, "id") else "network")
+        str += "Chunk size: {}\n".format(self._chunk_size)
+        str += "Best bound: {}\n".format(self._best)
+
+        return str
@@ -30,6 +30,11 @@ from copy import copy, deepcopy
 
 import numpy as np
 
+from ..utils.lazy_numba import is_numba_loaded, jit
+from ..utils.memoization import fingerprint
+from ..utils.memory import retained_bytes
+from ..utils.spec import class_path, object_to_spec
+
 
 class BaseElement:
     """
@@ -47,6 +52,41 @@ class BaseElement:
     Number of upstream elements
     """
 
+    _memory_attributes = {
+        "inputs": ["input"],
+        "parameters": ["_parameters"],
+        "state_array": ["state_array", "solver_status"],
+        "states": ["_states", "_init_states"],
+        "weights": ["_weight"],
+        "buffers": ["_output_buffers"],
+    }
+    """
+    Attributes that retain memory, divided by category. Used by memory_report
+    """
+
+    _pickle_exclude = [
+        "_memo",
+        "state_array",
+        "solver_status",
+        "_output_buffers",
+        "get_output",
+        "_solve_differential_equation",
+        "_solve_lag",
+    ]
+    """
+    Attributes that are not pickled: caches, results of the last run, and
+    wrappers added by the profiler. Since the time series of the states
+    (state_array) are not pickled, an unpickled element must be solved again
+    before calling get_output with solve=False.
+    """
+
+    _pickle_kernels = ["_fluxes", "_fluxes_python"]
+    """
+    Attributes that contain lists of fluxes functions. The functions that are
+    attributes of the class (e.g. compiled kernels) are pickled by name and
+    taken from the class when unpickling.
+    """
+
     input = {}
     """
     Dictionary of input fluxes
@@ -114,6 +154,104 @@ class BaseElement:
 
         return self._num_upstream
 
+    def _memory_report(self, prefix, seen, report):
+        """
+        This method adds to the report the memory retained by the element,
+        divided by category, returning its total. It is used by the method
+        memory_report of the components.
+        """
+
+        memory = {}
+        for category, attributes in self._memory_attributes.items():
+            memory[category] = retained_bytes([getattr(self, a, None) for a in attributes], seen)
+
+        memory["total"] = sum(memory.values())
+        memory["inclusive"] = memory["total"]
+        report[prefix + self.id] = memory
+
+        return memory["total"]
+
+    def _to_spec(self, writer):
+        """
+        This method returns the specification of the element. It is used by
+        the method to_spec of the components.
+
+        Parameters
+        ----------
+        writer : superflexpy.utils.spec.SpecWriter
+            Writer of the specification of the model.
+
+        Returns
+        -------
+        dict
+            Specification of the element, with keys 'class' and 'arguments'.
+        """
+
+        return {"class": class_path(self.__class__), "arguments": deepcopy(self._get_init_arguments())}
+
+    def _get_init_arguments(self):
+        """
+        This method returns the arguments of the initializer that create the
+        element as built by the user (i.e. without prefixes). The values are
+        not copied. It is used to write the specifications and to pickle the
+        element. Elements with custom initializers must extend it.
+        """
+
+        return {"id": self.id}
+
+    @classmethod
+    def _from_spec(cls, spec, reader):
+        """
+        This method creates the element from its specification. It is used by
+        the method from_spec of the components.
+
+        Parameters
+        ----------
+        spec : dict
+            Specification of the element.
+        reader : superflexpy.utils.spec.SpecReader
+            Reader of the specification of the model.
+
+        Returns
+        -------
+        superflexpy.framework.element.BaseElement
+            Element
+        """
+
+        return cls(**deepcopy(spec["arguments"]))
+
+    def _get_output_layout(self, input_layout, new_buffer):
+        """
+        This method is used by the Unit to plan the reuse of the buffers that
+        store the fluxes. Given the layout of the inputs, it returns the layout
+        of the outputs. Elements that write their outputs in buffers provided
+        by the Unit (method set_output_buffers) must call new_buffer for each
+        output flux, while elements that return their inputs must return the
+        corresponding part of the input layout. By default, the outputs are
+        allocated by the element and are represented by None.
+
+        Parameters
+        ----------
+        input_layout : list
+            Layout of the inputs. It has the same structure of the inputs of
+            the element, where each flux is represented by the index of the
+            buffer that stores it or by None (flux not stored in a buffer). A
+            list of fluxes of unknown length is represented by None.
+        new_buffer : function
+            Function that returns the index of a new buffer.
+
+        Returns
+        -------
+        list
+            Layout of the outputs. It has the same structure of the outputs of
+            the element.
+        """
+
+        if self.num_downstream == 1:
+            return None
+        else:
+            return [None] * self.num_downstream
+
     def __repr__(self):
         str = "Module: superflexPy\nElement: {}\n".format(self.id)
         return str
@@ -126,6 +264,31 @@ class BaseElement:
         ele = self.__class__(id=self.id)
         return ele
 
+    def __getstate__(self):
+        state = {k: v for k, v in self.__dict__.items() if k not in self._pickle_exclude}
+
+        for k in self._pickle_kernels:
+            if k in state:
+                state[k] = [self._get_kernel_name(f) for f in state[k]]
+
+        return state
+
+    def __setstate__(self, state):
+        for k in self._pickle_kernels:
+            if k in state:
+                state[k] = [getattr(self.__class__, f) if isinstance(f, str) else f for f in state[k]]
+
+        self.__dict__.update(state)
+
+    def _get_kernel_name(self, fun):
+        # Name of the class attribute that is the function, if any
+        name = getattr(fun, "__name__", None)
+
+        if name is not None and getattr(self.__class__, name, None) is fun:
+            return name
+
+        return fun
+
 
 class ParameterizedElement(BaseElement):
     """
@@ -236,6 +399,12 @@ class ParameterizedElement(BaseElement):
             # Save the prefix for furure uses
             self._prefix_parameters = "{}_{}".format(prefix, self._prefix_parameters)
 
+    def _get_init_arguments(self):
+        arguments = super()._get_init_arguments()
+        arguments["parameters"] = {k[len(self._prefix_parameters) :]: v for k, v in self._parameters.items()}
+
+        return arguments
+
     def __repr__(self):
         str = "Module: superflexPy\nElement: {}\n".format(self.id)
         str += "Parameters:\n"
@@ -376,6 +545,12 @@ class StateElement(BaseElement):
             # Save the prefix for furure uses
             self._prefix_states = "{}_{}".format(prefix, self._prefix_states)
 
+    def _get_init_arguments(self):
+        arguments = super()._get_init_arguments()
+        arguments["states"] = {k.split("_")[-1]: v for k, v in self._init_states.items()}
+
+        return arguments
+
     def __repr__(self):
         str = "Module: superflexPy\nElement: {}\n".format(self.id)
         str += "States:\n"
@@ -403,6 +578,12 @@ class StateParameterizedElement(StateElement, ParameterizedElement):
     A StateParameterizedElement has parameters and states.
     """
 
+    _memo = None
+    """
+    Cache used to memoize the solution of the element. If None, memoization is
+    not active.
+    """
+
     def __init__(self, parameters, states, id):
         """
         This is the initializer of the abstract class
@@ -425,6 +606,42 @@ class StateParameterizedElement(StateElement, ParameterizedElement):
         StateElement.__init__(self, states, id)
         ParameterizedElement.__init__(self, parameters, id)
 
+    def set_memoization(self, cache):
+        """
+        This method activates the memoization of the solution of the element.
+        When active, the solution is stored in the cache using as key a
+        fingerprint of parameters, initial states, and inputs; if the element
+        is solved again with the same values, the solution is taken from the
+        cache.
+
+        Parameters
+        ----------
+        cache : superflexpy.utils.memoization.MemoizationCache
+            Cache used to store the solutions. It can be shared among elements.
+            If None, memoization is deactivated.
+        """
+
+        self._memo = cache
+
+    def _memo_key(self, *values):
+        """
+        This method calculates the key used to store the solution of the
+        element in the cache.
+
+        Parameters
+        ----------
+        *values
+            Values (e.g., parameters, states, and inputs) that determine the
+            solution of the element.
+
+        Returns
+        -------
+        str
+            Key of the solution
+        """
+
+        return fingerprint(self.__class__, *values)
+
     def __repr__(self):
         str = "Module: superflexPy\nElement: {}\n".format(self.id)
         str += "Parameters:\n"
@@ -442,6 +659,7 @@ class StateParameterizedElement(StateElement, ParameterizedElement):
         ele = self.__class__(parameters=p, states=s, id=self.id)
         ele._prefix_states = self._prefix_states
         ele._prefix_parameters = self._prefix_parameters
+        ele._memo = self._memo
         return ele
 
     def __deepcopy__(self, memo):
@@ -450,6 +668,7 @@ class StateParameterizedElement(StateElement, ParameterizedElement):
         ele = self.__class__(parameters=p, states=s, id=self.id)
         ele._prefix_states = self._prefix_states
         ele._prefix_parameters = self._prefix_parameters
+        ele._memo = self._memo
         return ele
 
 
@@ -477,6 +696,13 @@ class ODEsElement(StateParameterizedElement):
     List of states used by the solver of the differential equation
     """
 
+    solver_status = None
+    """
+    Status codes of the root finder at each time step of the last run, with
+    the dimensions of state_array. Available only if the root finder returns
+    them (e.g. superflexpy.implementation.root_finders.fallback).
+    """
+
     _fluxes = []
     """
     This attribute contains a list of methods (one per differential equation)
@@ -568,21 +794,76 @@ class ODEsElement(StateParameterizedElement):
             message = "{}the attribute _solver_states must be filled".format(self._error_message)
             raise ValueError(message)
 
-        self.state_array = self._num_app.solve(
-            fun=self._fluxes,
-            S0=self._solver_states,
-            dt=self._dt,
-            **self.input,
-            **{k[len(self._prefix_parameters) :]: self._parameters[k] for k in self._parameters},
-            **kwargs
+        parameters = {k[len(self._prefix_parameters) :]: self._parameters[k] for k in self._parameters}
+
+        if self._memo is not None:
+            root_finder = self._num_app._root_finder
+            key = self._memo_key(
+                self._fluxes,
+                self._num_app.__class__,
+                self._num_app._clip_bounds,
+                root_finder.__class__,
+                None if root_finder is None else root_finder.get_settings(),
+                self._solver_states,
+                self._dt,
+                self.input,
+                parameters,
+                kwargs,
+            )
+
+            cached = self._memo.get(key)
+
+            if cached is not None:
+                self.state_array = cached[0].copy()
+                self.solver_status = None if cached[1] is None else cached[1].copy()
+                return
+
+        self.state_array, self.solver_status = self._num_app.solve_with_status(
+            fun=self._fluxes, S0=self._solver_states, dt=self._dt, **self.input, **parameters, **kwargs
         )
 
+        if self._memo is not None:
+            self._memo.put(
+                key, (self.state_array.copy(), None if self.solver_status is None else self.solver_status.copy())
+            )
+
+    def _get_init_arguments(self):
+        arguments = super()._get_init_arguments()
+        arguments["approximation"] = self._num_app
+
+        return arguments
+
+    def _to_spec(self, writer):
+        # The approximators are stored in the table of the shared objects
+        arguments = {k: deepcopy(v) for k, v in self._get_init_arguments().items() if k != "approximation"}
+        arguments["approximation"] = writer.share("approximators", object_to_spec(self._num_app))
+        spec = {"class": class_path(self.__class__), "arguments": arguments}
+
+        if hasattr(self, "_dt"):
+            spec["timestep"] = self._dt
+
+        return spec
+
+    @classmethod
+    def _from_spec(cls, spec, reader):
+        # The approximators are shared among the elements
+        arguments = {k: deepcopy(v) for k, v in spec["arguments"].items() if k != "approximation"}
+        ele = cls(approximation=reader.get_shared("approximators", spec["arguments"]["approximation"]), **arguments)
+
+        if "timestep" in spec:
+            ele.set_timestep(spec["timestep"])
+
+        return ele
+
     def __copy__(self):
         p = self._parameters  # Only the reference
         s = deepcopy(self._states)  # Create a new dictionary
         ele = self.__class__(parameters=p, states=s, id=self.id, approximation=self._num_app)
         ele._prefix_states = self._prefix_states
         ele._prefix_parameters = self._prefix_parameters
+        ele._memo = self._memo
+        if hasattr(self, "_dt"):
+            ele._dt = self._dt
         return ele
 
     def __deepcopy__(self, memo):
@@ -591,6 +872,9 @@ class ODEsElement(StateParameterizedElement):
         ele = self.__class__(parameters=p, states=s, id=self.id, approximation=self._num_app)
         ele._prefix_states = self._prefix_states
         ele._prefix_parameters = self._prefix_parameters
+        ele._memo = self._memo
+        if hasattr(self, "_dt"):
+            ele._dt = self._dt
         return ele
 
 
@@ -605,7 +889,8 @@ class LagElement(StateParameterizedElement):
     - 'lag-time': characteristic time of the lag. Its definition depends on the
       specific implementations of the element. It can be a scalar (it will be
       applied to all the fluxes) or a list (with length equal to the number of
-      fluxes).
+      fluxes). A numpy.ndarray with one value per series solves many
+      independent series at once (see _solve_lag_batch).
 
     States must be called:
 
@@ -624,6 +909,36 @@ class LagElement(StateParameterizedElement):
     Number of downstream elements
     """
 
+    _weight_cache = None
+    """
+    Cache (superflexpy.utils.memoization.MemoizationCache) of the weight
+    arrays, shared by all the instances of the class and keyed by class and
+    lag time. Child classes opt in by setting it. Cached arrays are read-only.
+    If None, the weights are built at every run.
+    """
+
+    _lag_buffers = None
+    """
+    Ring buffers (one per flux) that store the state of the lag between runs,
+    together with the positions of their heads (_lag_heads) and the lag times
+    they were built for (_lag_buffers_time). While they are in use, the lag
+    state in _states is out of date and it is written back, in the usual
+    order, only when the states are read or copied (see _sync_lag_state).
+    """
+
+    _memory_attributes = dict(
+        BaseElement._memory_attributes,
+        states=BaseElement._memory_attributes["states"] + ["_lag_buffers"],
+    )
+
+    _pickle_exclude = BaseElement._pickle_exclude + [
+        "_weight",
+        "_lag_buffers",
+        "_lag_heads",
+        "_lag_buffers_time",
+        "_advance_lag",
+    ]
+
     def _build_weight(self, lag_time):
         """
         This method must be implemented by any child class. It calculates the
@@ -671,7 +986,10 @@ class LagElement(StateParameterizedElement):
             List of output fluxes.
         """
 
-        if solve:
+        if solve and isinstance(self._parameters[self._prefix_parameters + "lag-time"], np.ndarray):
+            self._sync_lag_state()
+            self._solve_lag_batch()
+        elif solve:
             # Create lists if we are dealing with scalars
             if isinstance(self._parameters[self._prefix_parameters + "lag-time"], float):
                 lag_time = [self._parameters[self._prefix_parameters + "lag-time"]] * len(self.input)
@@ -682,32 +1000,33 @@ class LagElement(StateParameterizedElement):
                 message = "{}lag_time parameter of type {}".format(self._error_message, par_type)
                 raise TypeError(message)
 
-            if self._states[self._prefix_states + "lag"] is None:
-                lag_state = self._init_lag_state(lag_time)
+            if self._memo is None:
+                self._advance_lag(lag_time)
             else:
-                if isinstance(self._states[self._prefix_states + "lag"], np.ndarray):
-                    lag_state = [copy(self._states[self._prefix_states + "lag"])] * len(self.input)
-                elif isinstance(self._states[self._prefix_states + "lag"], list):
-                    lag_state = self._states[self._prefix_states + "lag"]
-                else:
-                    state_type = type(self._states[self._prefix_states + "lag"])
-                    message = "{}lag state of type {}".format(self._error_message, state_type)
-                    raise TypeError(message)
+                self._solve_lag_memoized(lag_time)
 
-            self._weight = self._build_weight(lag_time)
+        # Copies: state_array is reused by the following runs
+        return [self.state_array[:, i, 0].copy() for i in range(len(self.input))]
 
-            self.state_array = self._solve_lag(self._weight, lag_state, self.input)
+    def get_states(self, names=None):
+        """
+        This method returns the states of the element. See
+        StateElement.get_states.
+        """
 
-            # Get the new lag value to restart
-            final_states = self.state_array[-1, :, :]
-            final_states[:, :-1] = final_states[:, 1:]
-            final_states[:, -1] = 0
+        self._sync_lag_state()
+        return StateParameterizedElement.get_states(self, names)
 
-            self.set_states(
-                {self._prefix_states + "lag": [final_states[i, : len(w)] for i, w in enumerate(self._weight)]}
-            )
+    def set_states(self, states):
+        """
+        This method sets the values of the states. See
+        StateElement.set_states.
+        """
 
-        return [self.state_array[:, i, 0] for i in range(len(self.input))]
+        StateParameterizedElement.set_states(self, states)
+
+        if self._prefix_states + "lag" in states:
+            self._lag_buffers = None
 
     def reset_states(self):
         """
@@ -716,15 +1035,173 @@ class LagElement(StateParameterizedElement):
         set back to None.
         """
 
+        self._lag_buffers = None
+
         for k in self._init_states.keys():
             k_no_prefix = k.split("_")[-1]
             self._states[self._prefix_states + k_no_prefix] = deepcopy(self._init_states[k])  # I have to isolate
 
+    def _get_lag_state(self, lag_time):
+        """
+        This method returns the lag state (list of numpy.ndarray, one per
+        flux) stored in _states, initializing it if None.
+        """
+
+        if self._states[self._prefix_states + "lag"] is None:
+            return self._init_lag_state(lag_time)
+        elif isinstance(self._states[self._prefix_states + "lag"], np.ndarray):
+            return [copy(self._states[self._prefix_states + "lag"])] * len(self.input)
+        elif isinstance(self._states[self._prefix_states + "lag"], list):
+            return self._states[self._prefix_states + "lag"]
+        else:
+            state_type = type(self._states[self._prefix_states + "lag"])
+            message = "{}lag state of type {}".format(self._error_message, state_type)
+            raise TypeError(message)
+
+    def _advance_lag(self, lag_time):
+        """
+        This method applies the lag keeping its state in ring buffers that
+        persist between the runs: a run continues from the buffers and the
+        heads left by the previous one, without copying the state. The buffers
+        are built from the states only when they have been set, read, or the
+        lag time has changed. The array state_array is reused by the runs with
+        the same number of time steps.
+
+        Parameters
+        ----------
+        lag_time : list(float)
+            List of lag times
+        """
+
+        if self._lag_buffers is None or self._lag_buffers_time != lag_time:
+            self._sync_lag_state()
+            lag_state = self._get_lag_state(lag_time)
+            self._weight = [np.asarray(w, dtype=np.float64) for w in self._get_weight(lag_time)]
+            self._lag_buffers = [_fit_lag_state(ls, len(w)) for w, ls in zip(self._weight, lag_state)]
+            self._lag_heads = [0] * len(self._weight)
+            self._lag_buffers_time = list(lag_time)
+
+        shape = (len(self.input[0]), len(self._weight), max([len(w) for w in self._weight]))
+        state_array = getattr(self, "state_array", None)
+        if not isinstance(state_array, np.ndarray) or state_array.shape != shape or not state_array.flags.writeable:
+            self.state_array = np.zeros(shape)
+
+        # The compiled loop is used only if numba is already in use: units
+        # with the python architecture do not import it
+        solve = _solve_lag_ring if is_numba_loaded() else _solve_lag_vectorized
+
+        for flux_num, (w, i) in enumerate(zip(self._weight, self.input)):
+            self._lag_heads[flux_num] = solve(
+                w,
+                self._lag_buffers[flux_num],
+                self._lag_heads[flux_num],
+                np.asarray(i, dtype=np.float64),
+                self.state_array[:, flux_num, :],
+            )
+
+    def _sync_lag_state(self):
+        """
+        This method writes the state kept in the ring buffers (see
+        _advance_lag) to _states, in the usual order (first position = next
+        output), and releases the buffers.
+        """
+
+        if self._lag_buffers is None:
+            return
+
+        self._states[self._prefix_states + "lag"] = [np.roll(b, -h) for b, h in zip(self._lag_buffers, self._lag_heads)]
+        self._lag_buffers = None
+
+    def _solve_lag_memoized(self, lag_time):
+        """
+        This method applies the lag using the memoization cache: the solution
+        is taken from the cache if the lag was already solved with the same
+        lag times, states, and inputs.
+
+        Parameters
+        ----------
+        lag_time : list(float)
+            List of lag times
+        """
+
+        self._sync_lag_state()
+        lag_state = self._get_lag_state(lag_time)
+
+        key = self._memo_key(lag_time, lag_state, self.input)
+        cached = self._memo.get(key)
+
+        if cached is None:
+            self._weight = self._get_weight(lag_time)
+            self.state_array = self._solve_lag(self._weight, lag_state, self.input)
+            self._memo.put(key, (self._weight, self.state_array.copy()))
+        else:
+            self._weight = cached[0]
+            self.state_array = cached[1].copy()
+
+        # Get the new lag value to restart
+        final_states = self.state_array[-1, :, :].copy()  # The last output must not change
+        final_states[:, :-1] = final_states[:, 1:]
+        final_states[:, -1] = 0
+
+        self.set_states({self._prefix_states + "lag": [final_states[i, : len(w)] for i, w in enumerate(self._weight)]})
+
+    def __getstate__(self):
+        self._sync_lag_state()
+        return StateParameterizedElement.__getstate__(self)
+
+    def __copy__(self):
+        self._sync_lag_state()
+        return StateParameterizedElement.__copy__(self)
+
+    def __deepcopy__(self, memo):
+        self._sync_lag_state()
+        return StateParameterizedElement.__deepcopy__(self, memo)
+
+    def __repr__(self):
+        self._sync_lag_state()
+        return StateParameterizedElement.__repr__(self)
+
+    def _get_weight(self, lag_time):
+        """
+        This method returns the weight arrays, building them with the method
+        _build_weight. If the class has a _weight_cache, the weight array of
+        each lag time is built only the first time it is requested.
+
+        Parameters
+        ----------
+        lag_time : list(float)
+            List of lag times
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            List of weight array(s).
+        """
+
+        if self._weight_cache is None:
+            return self._build_weight(lag_time)
+
+        weight = []
+        for t in lag_time:
+            key = (self.__class__, float(t))
+            w = self._weight_cache.get(key)
+
+            if w is None:
+                w = self._build_weight([t])[0]
+                w.setflags(write=False)  # Shared among elements
+                self._weight_cache.put(key, w)
+
+            weight.append(w)
+
+        return weight
+
     @staticmethod
     def _solve_lag(weight, lag_state, input):
         """
         This method distributes the input fluxes according to the weight array
-        and the initial state.
+        and the initial state. An initial state with a length different from
+        the one of the weights (e.g. after changing the lag time without
+        resetting the states) is fitted to it (see _fit_lag_state).
 
         Parameters
         ----------
@@ -746,14 +1223,74 @@ class LagElement(StateParameterizedElement):
 
         output = np.zeros((len(input[0]), len(weight), max_length))  # num_ts, num_fluxes, len_lag
 
+        # The compiled loop is used only if numba is already in use: units
+        # with the python architecture do not import it
+        solve = _solve_lag_ring if is_numba_loaded() else _solve_lag_vectorized
+
         for flux_num, (w, ls, i) in enumerate(zip(weight, lag_state, input)):
-            for ts in range(len(input[0])):
-                updated_state = ls + i[ts] * w
-                output[ts, flux_num, : len(w)] = updated_state[:]
-                ls = np.append(updated_state[1:], 0)
+            solve(
+                np.asarray(w, dtype=np.float64),
+                _fit_lag_state(ls, len(w)),  # The kernels modify the state
+                0,
+                np.asarray(i, dtype=np.float64),
+                output[:, flux_num, :],
+            )
 
         return output
 
+    def _solve_lag_batch(self):
+        """
+        This method applies the lag to many independent series (e.g.
+        catchments) at once. The parameter 'lag-time' is an array with one
+        value per series and the input fluxes are 2D arrays (#timesteps,
+        #series). The state is a list (one per flux) of 2D arrays (lag length,
+        #series); a state with a single column is used for all the series. A
+        state with a length different from the one of the weights is fitted to
+        it (see _fit_lag_state). Only the output of the lag is stored in
+        state_array, which has dimensions (#timesteps, #fluxes, 1, #series).
+        """
+
+        lag_time = np.ravel(self._parameters[self._prefix_parameters + "lag-time"])
+        num_ts = len(self.input[0])
+        num_series = len(lag_time)
+        num_fluxes = len(self.input)
+
+        # Weights of the series, padded with zeros to the longest lag
+        series_weight = {}
+        for t in np.unique(lag_time):
+            series_weight[t] = self._get_weight([t] * num_fluxes)
+
+        self._weight = []
+        for f in range(num_fluxes):
+            weight = np.zeros((max(len(w[f]) for w in series_weight.values()), num_series))
+            for c, t in enumerate(lag_time):
+                weight[: len(series_weight[t][f]), c] = series_weight[t][f]
+            self._weight.append(weight)
+
+        lag_state = self._states[self._prefix_states + "lag"]
+        if lag_state is None or isinstance(lag_state, np.ndarray):
+            lag_state = [lag_state] * num_fluxes
+
+        output = np.zeros((num_ts, num_fluxes, 1, num_series))
+        final_states = []
+
+        for f, (w, ls, i) in enumerate(zip(self._weight, lag_state, self.input)):
+            i = np.broadcast_to(np.reshape(i, (num_ts, -1)), (num_ts, num_series))
+
+            # Row t contains all the water leaving the lag at time step t
+            contributions = np.zeros((num_ts + len(w), num_series))
+            if ls is not None:
+                contributions[: len(w)] = _fit_lag_state(np.reshape(ls, (len(ls), -1)), len(w))
+
+            for k in range(len(w)):
+                contributions[k : k + num_ts] += w[k] * i
+
+            output[:, f, 0, :] = contributions[:num_ts]
+            final_states.append(contributions[num_ts:])
+
+        self.state_array = output
+        self.set_states({self._prefix_states + "lag": final_states})
+
     def _init_lag_state(self, lag_time):
         """
         This method sets the initial state of the lag to arrays of proper
@@ -774,3 +1311,76 @@ class LagElement(StateParameterizedElement):
         for i in range(len(self.input)):
             ini_state.append(np.zeros(int(np.ceil(lag_time[i]))))
         return ini_state
+
+
+def _fit_lag_state(lag_state, length):
+    """
+    This function returns a copy of the state of a lag (first dimension:
+    positions of the lag) with the given length. Missing positions are filled
+    with zeros, while the water in the positions beyond the length is added
+    to the last one, so that it leaves the lag instead of being lost.
+    """
+
+    lag_state = np.asarray(lag_state, dtype=np.float64)
+
+    state = np.zeros((length,) + lag_state.shape[1:])
+    state[: min(length, len(lag_state))] = lag_state[:length]
+    state[length - 1] += lag_state[length:].sum(axis=0)
+
+    return state
+
+
+@jit(nopython=True, nogil=True)
+def _solve_lag_ring(weight, lag_state, head, input, output):
+    """
+    This function applies the lag to one flux. The state of the lag is kept in
+    a ring buffer, whose first position is at head: at each time step the
+    input is added to all the positions and the one at the head, which leaves
+    the lag, moves the head forward instead of shifting the whole state. The
+    states are written to output in the usual order (first position = current
+    output). The buffer is updated in place and the new head is returned.
+    """
+
+    length = len(weight)
+
+    for ts in range(len(input)):
+        for k in range(length):
+            pos = (head + k) % length
+            lag_state[pos] = lag_state[pos] + input[ts] * weight[k]
+            output[ts, k] = lag_state[pos]
+
+        lag_state[head] = 0.0
+        head = (head + 1) % length
+
+    return head
+
+
+def _solve_lag_vectorized(weight, lag_state, head, input, output):
+    """
+    This function applies the lag to one flux, like _solve_lag_ring, with
+    operations on whole arrays: the contribution of the input d time steps
+    before is added to all the time steps at once. The contributions are
+    added from the oldest to the newest, as in the loop over the time steps.
+    The buffer is updated in place and its head is moved back to the first
+    position.
+    """
+
+    length = len(weight)
+    num_ts = len(input)
+
+    if num_ts == 0:
+        return head
+
+    lag_state[:] = np.roll(lag_state, -head)
+    output[:] = 0.0
+
+    for ts in range(min(length, num_ts)):
+        output[ts, : length - ts] = lag_state[ts:]
+
+    for d in range(min(length, num_ts) - 1, -1, -1):
+        output[d:, : length - d] += input[: num_ts - d, None] * weight[None, d:]
+
+    lag_state[:-1] = output[-1, 1:length]
+    lag_state[-1] = 0.0
+
+    return 0
@@ -25,7 +25,11 @@ DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
 This file contains the implementation of the Network class.
 """
 
+from copy import deepcopy
+
 from ..utils.generic_component import GenericComponent
+from ..utils.memory import retained_bytes
+from ..utils.spec import class_path
 from .node import Node
 
 
@@ -36,7 +40,9 @@ class Network(GenericComponent):
     tree.
     """
 
-    def __init__(self, nodes, topology):
+    _pickle_exclude = GenericComponent._pickle_exclude + ["_cache"]
+
+    def __init__(self, nodes, topology, incremental=False):
         """
         This is the initializer of the class Network.
 
@@ -49,6 +55,17 @@ class Network(GenericComponent):
             Topology of the network. Keys are the id of the nodes and values
             are the id of the downstream node the key. Since the network must
             be a tree, each key has only one downstream element
+        incremental : bool
+            True if the network keeps the outputs of the nodes in memory and,
+            when solved again, re-solves only the nodes whose parameters,
+            states, or inputs changed since the last run (dirty nodes). The
+            other nodes reuse their cached outputs, which are routed again
+            only if something changed upstream, and get back the time series
+            of their elements (e.g. state_array) as if they were solved.
+            Changes are tracked through the methods set_parameters,
+            set_states, reset_states, and set_input of the network and of its
+            nodes; changes made in other ways (e.g. modifying in place the
+            input arrays) require calling clear_cache.
         """
 
         self._error_message = "module : superflexPy, Network ,"
@@ -61,12 +78,14 @@ class Network(GenericComponent):
 
         self._content = nodes
         self._downstream = topology
+        self._incremental = incremental
+        self._cache = {}
 
         self._build_network()
 
     # METHODS FOR THE USER
 
-    def get_output(self, solve=True):
+    def get_output(self, solve=True, outlets=None):
         """
         This method solves the network, solving each node and putting together
         their outputs according to the topology of the network.
@@ -75,64 +94,137 @@ class Network(GenericComponent):
         ----------
         solve : bool
             True if the elements have to be solved (i.e. calculate the states).
+        outlets : list(str)
+            Ids of the nodes whose outputs are requested. Only these nodes and
+            the ones upstream of them are solved; all the others are skipped
+            and keep their states. If None, all the nodes are solved.
 
         Returns
         -------
         :dict(str : list(numpy.ndarray))
-            Dictionary containig the output fluxes of all the nodes.
+            Dictionary containig the output fluxes of the nodes. If outlets
+            is specified, only the requested nodes are returned.
         """
 
-        # Keep track of the solved catchemts
-        solved = {k: False for k in self._upstream.keys()}
+        if outlets is None:
+            to_solve = self._order
+        else:
+            if isinstance(outlets, str):
+                outlets = [outlets]
+            upstream = self._find_upstream_nodes(outlets)
+            to_solve = [cat for cat in self._order if cat in upstream]
+
+        incremental = self._incremental and solve
         output = {}
+        changed = set()  # Nodes with an output different from the cached one
 
-        # Solve first the headwater
-        for cat in self._headwater:
-            output[cat] = self._content[self._content_pointer[cat]].get_output(solve)
-            solved[cat] = True
+        for cat in to_solve:
+            node = self._content[self._content_pointer[cat]]
 
-        if len(self._content) != len(self._headwater):
-            completed = False
-        else:
-            completed = True
+            if incremental and self._is_cached(cat):
+                # Restore the node as if it was solved
+                node.set_states(deepcopy(self._cache[cat]["states"]))
+                _set_results(self._cache[cat]["results"])
+                node._dirty = False
+                node._states_from_reset = False
 
-        while not completed:
-            for cat in self._upstream.keys():
-                if not solved[cat]:
-                    # Check if all the upstrams have been solves
-                    solvable = True
-                    for cat_up in self._upstream[cat]:
-                        if not solved[cat_up]:
-                            solvable = False
-                    if solvable:
-                        # Solve the current cathcment
-                        loc_out = self._content[self._content_pointer[cat]].get_output(solve)
-
-                        # Multiply for the area
-                        for i in range(len(loc_out)):
-                            loc_out[i] *= self._content[self._content_pointer[cat]].area
-
-                        for cat_up in self._upstream[cat]:
-                            routed_out = self._content[self._content_pointer[cat_up]].external_routing(output[cat_up])
-                            if len(loc_out) != len(routed_out):
-                                message = "{}Upstream and downstream catchment have ".format(self._error_message)
-                                message += "different number of fluxed. "
-                                message += "Upstream: {}, Local: {}".format(len(routed_out), len(loc_out))
-                                raise RuntimeError(message)
-                            for i in range(len(loc_out)):
-                                loc_out[i] += routed_out[i] * self._total_area[cat_up]
-
-                        for i in range(len(loc_out)):
-                            loc_out[i] /= self._total_area[cat]
-
-                        output[cat] = loc_out
-                        solved[cat] = True
-
-                        if self._downstream[cat] is None:
-                            completed = True
+                if self._upstream[cat] is None or not any(c in changed for c in self._upstream[cat]):
+                    output[cat] = [o.copy() for o in self._cache[cat]["output"]]
+                    continue
+
+                loc_out = [o.copy() for o in self._cache[cat]["local"]]
+            else:
+                # Solve the current cathcment
+                from_reset = node._states_from_reset
+                loc_out = node.get_output(solve)
+
+                if incremental:
+                    self._cache[cat] = {
+                        "local": [o.copy() for o in loc_out],
+                        "states": deepcopy(node.get_states()),
+                        "results": _get_results(node),
+                        "from_reset": from_reset,
+                    }
+                    node._dirty = False
+
+            changed.add(cat)
+
+            output[cat] = self._mix_upstream(cat, loc_out, output)
+
+            if incremental:
+                self._cache[cat]["output"] = [o.copy() for o in loc_out]
+
+        if outlets is not None:
+            output = {cat: output[cat] for cat in outlets}
 
         return output
 
+    def update(self, n_steps, forcing, outlets=None):
+        """
+        This method advances the network by n_steps time steps, starting from
+        the current states of the nodes, and returns the outputs of these
+        time steps. See GenericComponent.update.
+
+        Parameters
+        ----------
+        n_steps : int
+            Number of time steps to solve
+        forcing : dict(str : list(numpy.ndarray or float))
+            Inputs of the nodes. Arrays must have at least n_steps values, of
+            which the first n_steps are used; floats are used for all the
+            time steps.
+        outlets : list(str)
+            Ids of the nodes whose outputs are requested. See get_output.
+
+        Returns
+        -------
+        dict(str : list(numpy.ndarray))
+            Dictionary containig the output fluxes of the nodes.
+        """
+
+        for cat in self._order:
+            if cat not in forcing:
+                message = "{}missing forcing of the node {}".format(self._error_message, cat)
+                raise KeyError(message)
+
+            node = self._content[self._content_pointer[cat]]
+            node.set_input(node._get_forcing(n_steps, forcing[cat]))
+
+        return self.get_output(outlets=outlets)
+
+    def set_parameters(self, parameters):
+        """
+        This method sets the values of the parameters.
+
+        Parameters
+        ----------
+        parameters : dict
+            Contains the parameters of the element to be set. The keys must be
+            the ones returned by the method get_parameters_name. Only the
+            parameters that have to be changed should be passed.
+        """
+
+        GenericComponent.set_parameters(self, parameters)
+
+        # Parameters can be shared among nodes: all the nodes using them are
+        # marked as changed
+        for node in self._content:
+            if node._dirty:
+                continue
+            node_parameters = node.get_parameters()
+            for p in parameters:
+                if p in node_parameters:
+                    node._dirty = True
+                    break
+
+    def clear_cache(self):
+        """
+        This method empties the cache of the outputs of the nodes used when
+        the network is incremental. The next run solves all the nodes.
+        """
+
+        self._cache = {}
+
     def get_internal(self, id, attribute):
         """
         This method allows to inspect attributes of the objects that belong to
@@ -229,40 +321,134 @@ class Network(GenericComponent):
         # Build the map from id to index
         self._content_pointer = {cat.id: i for i, cat in enumerate(self._content)}
 
+        # Sort the nodes from upstream to downstream
+        self._order = []
+        solved = {k: False for k in self._upstream.keys()}
+
+        while len(self._order) < len(self._upstream):
+            progress = False
+            for cat in self._upstream.keys():
+                if solved[cat]:
+                    continue
+                # Check if all the upstrams have been solved
+                if self._upstream[cat] is None or all(solved[cat_up] for cat_up in self._upstream[cat]):
+                    self._order.append(cat)
+                    solved[cat] = True
+                    progress = True
+
+            if not progress:
+                message = "{}the topology is not a tree".format(self._error_message)
+                raise ValueError(message)
+
         # Calculate the total area
         self._total_area = {}
-        solved = {k: False for k in self._upstream.keys()}
 
-        # First the headwaters
-        for cat in self._headwater:
-            self._total_area[cat] = self._content[self._content_pointer[cat]].area
-            solved[cat] = True
+        for cat in self._order:
+            area = self._content[self._content_pointer[cat]].area
 
-        if len(self._content) != len(self._headwater):
-            completed = False
-        else:
-            completed = True
+            if self._upstream[cat] is not None:
+                for cat_up in self._upstream[cat]:
+                    area += self._total_area[cat_up]
 
-        while not completed:
-            for cat in self._upstream.keys():
-                if not solved[cat]:
-                    # Check if all the upstrams have been solves
-                    solvable = True
-                    for cat_up in self._upstream[cat]:
-                        if not solved[cat_up]:
-                            solvable = False
-                    if solvable:
-                        # Solve the current cathcment
-                        area = self._content[self._content_pointer[cat]].area
+            self._total_area[cat] = area
+
+    def _mix_upstream(self, cat, loc_out, output):
+        """
+        This method puts together the output of a node with the ones of the
+        nodes upstream, weighting them with the area and applying the external
+        routing.
+
+        Parameters
+        ----------
+        cat : str
+            Id of the node
+        loc_out : list(numpy.ndarray)
+            Output of the node. It is modified in place.
+        output : dict(str : list(numpy.ndarray))
+            Outputs of the nodes upstream
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            Output of the node, including the contribution of the upstream
+            nodes
+        """
+
+        if self._upstream[cat] is not None:
+            # Multiply for the area
+            for i in range(len(loc_out)):
+                loc_out[i] *= self._content[self._content_pointer[cat]].area
+
+            for cat_up in self._upstream[cat]:
+                routed_out = self._content[self._content_pointer[cat_up]].external_routing(output[cat_up])
+                if len(loc_out) != len(routed_out):
+                    message = "{}Upstream and downstream catchment have ".format(self._error_message)
+                    message += "different number of fluxed. "
+                    message += "Upstream: {}, Local: {}".format(len(routed_out), len(loc_out))
+                    raise RuntimeError(message)
+                for i in range(len(loc_out)):
+                    loc_out[i] += routed_out[i] * self._total_area[cat_up]
 
-                        for cat_up in self._upstream[cat]:
-                            area += self._total_area[cat_up]
+            for i in range(len(loc_out)):
+                loc_out[i] /= self._total_area[cat]
 
-                        self._total_area[cat] = area
-                        solved[cat] = True
+        return loc_out
 
-                        if self._downstream[cat] is None:
-                            completed = True
+    def _is_cached(self, cat):
+        """
+        This method checks if the cached output of a node can be used instead
+        of solving it.
+
+        Parameters
+        ----------
+        cat : str
+            Id of the node
+
+        Returns
+        -------
+        bool
+            True if the node did not change since its cached run
+        """
+
+        node = self._content[self._content_pointer[cat]]
+
+        return cat in self._cache and self._cache[cat]["from_reset"] and node._states_from_reset and not node._dirty
+
+    def _find_upstream_nodes(self, outlets):
+        """
+        This method finds the nodes that need to be solved to calculate the
+        output of the outlets.
+
+        Parameters
+        ----------
+        outlets : list(str)
+            Ids of the outlet nodes
+
+        Returns
+        -------
+        set(str)
+            Ids of the outlets and of all the nodes upstream of them
+        """
+
+        upstream = set()
+        to_visit = list(outlets)
+
+        while to_visit:
+            cat = to_visit.pop()
+
+            if cat not in self._upstream:
+                message = "{}the node {} does not exist".format(self._error_message, cat)
+                raise KeyError(message)
+
+            if cat in upstream:
+                continue
+
+            upstream.add(cat)
+
+            if self._upstream[cat] is not None:
+                to_visit.extend(self._upstream[cat])
+
+        return upstream
 
     def _find_attribute_from_name(self, id):
         """
@@ -290,6 +476,51 @@ class Network(GenericComponent):
         else:
             return (cat_num, False)
 
+    def _memory_report(self, prefix, seen, report):
+        """
+        This method adds to the report the memory of the network (outputs
+        cached by the incremental mode) and of its nodes.
+        """
+
+        memory = {"cache": retained_bytes(self._cache, seen)}
+        memory["total"] = memory["cache"]
+        report["network"] = memory
+
+        inclusive = memory["total"]
+        for node in self._content:
+            inclusive += node._memory_report("", seen, report)
+
+        memory["inclusive"] = inclusive
+
+        return inclusive
+
+    def _to_spec(self, writer):
+        """
+        This method returns the specification of the network and of its
+        nodes. It is used by the method to_spec.
+        """
+
+        arguments = {
+            "nodes": [n._to_spec(writer) for n in self._content],
+            "topology": deepcopy(self._downstream),
+            "incremental": self._incremental,
+        }
+
+        return {"class": class_path(self.__class__), "arguments": arguments}
+
+    @classmethod
+    def _from_spec(cls, spec, reader):
+        """
+        This method creates the network from its specification. It is used
+        by the method from_spec.
+        """
+
+        return cls(
+            nodes=[reader.build(n) for n in spec["arguments"]["nodes"]],
+            topology=deepcopy(spec["arguments"]["topology"]),
+            incremental=spec["arguments"]["incremental"],
+        )
+
     # MAGIC METHODS
 
     def __copy__(self):
@@ -300,6 +531,10 @@ class Network(GenericComponent):
         message = "{}A Network cannot be copied".format(self._error_message)
         raise AttributeError(message)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = {}  # The outputs cached by the incremental mode are not pickled
+
     def __repr__(self):
         str = "Module: superflexPy\nNetwork class\n"
         str += "Nodes:\n"
@@ -316,3 +551,28 @@ class Network(GenericComponent):
             str += "\n"
 
         return str
+
+
+def _get_results(component):
+    """
+    This function returns a copy of the time series calculated by the
+    elements of a component (the attributes in the category state_array of
+    their _memory_attributes), to be restored with _set_results.
+    """
+
+    if hasattr(component, "_content_pointer"):
+        return [r for p in component._content_pointer.values() for r in _get_results(component._content[p])]
+
+    attributes = component._memory_attributes.get("state_array", [])
+
+    return [(component, {a: deepcopy(getattr(component, a, None)) for a in attributes})]
+
+
+def _set_results(results):
+    """
+    This function restores the time series returned by _get_results.
+    """
+
+    for element, values in results:
+        for attribute, value in values.items():
+            setattr(element, attribute, deepcopy(value))
@@ -0,0 +1,466 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of the tools used to solve a Network on
+multiple processes: a partitioner that splits the network in subtrees,
+balancing their computational cost, and an executor that solves the subtrees
+in worker processes and puts together their outputs.
+"""
+
+import multiprocessing
+import traceback
+
+from .element import LagElement, ODEsElement
+from .network import Network
+
+_SOLVER_COST = {"python": 20.0, "numba": 1.0}
+"""
+Relative cost of solving one ODE for one time step, depending on the
+architecture of the numerical approximator
+"""
+
+
+def estimate_costs(network):
+    """
+    This function estimates the computational cost of solving each node of
+    the network. The cost is proportional to the length of the inputs and to
+    the number and type of elements: elements governed by ODEs weight more
+    than the others, and more when solved in python than with numba.
+
+    Parameters
+    ----------
+    network : superflexpy.framework.network.Network
+        Network to analyze
+
+    Returns
+    -------
+    dict(str : float)
+        Estimated cost of each node
+    """
+
+    costs = {}
+
+    for node in network._content:
+        try:
+            num_ts = len(node.input[0])
+        except AttributeError:
+            num_ts = 1  # Inputs not set yet
+
+        node_cost = 0.0
+        for unit in node._content:
+            for layer in unit._layers:
+                for el in layer:
+                    if isinstance(el, ODEsElement):
+                        architecture = getattr(el._num_app, "architecture", None)
+                        node_cost += len(el._fluxes) * _SOLVER_COST.get(architecture, 1.0)
+                    elif isinstance(el, LagElement):
+                        node_cost += 1.0
+                    else:
+                        node_cost += 0.1
+
+        costs[node.id] = node_cost * num_ts
+
+    return costs
+
+
+def partition_network(network, num_workers, costs=None):
+    """
+    This function splits the network in subtrees that can be solved
+    independently and assigns them to the workers. A subtree contains a node
+    (its outlet) and all the nodes upstream. Starting from the outlets of the
+    network, the most expensive subtree is split (its outlet is left to the
+    parent process, called trunk, and the subtrees upstream are considered
+    instead) until all the subtrees cost less than the total divided by the
+    number of workers. The subtrees are then assigned to the workers starting
+    from the most expensive, each time to the worker with the lowest load.
+
+    Parameters
+    ----------
+    network : superflexpy.framework.network.Network
+        Network to split
+    num_workers : int
+        Number of workers
+    costs : dict(str : float)
+        Cost of solving each node (e.g. measured timings). If None, it is
+        calculated with estimate_costs.
+
+    Returns
+    -------
+    list(list(str)), list(str)
+        Outlets of the subtrees assigned to each worker and nodes left to the
+        trunk, sorted from upstream to downstream.
+    """
+
+    if costs is None:
+        costs = estimate_costs(network)
+
+    subtree_cost = {}
+    for cat in network._order:
+        subtree_cost[cat] = costs[cat]
+        if network._upstream[cat] is not None:
+            subtree_cost[cat] += sum(subtree_cost[c] for c in network._upstream[cat])
+
+    target = sum(costs.values()) / num_workers
+    subtrees = [cat for cat in network._order if network._downstream[cat] is None]
+    trunk = []
+
+    while subtrees:
+        largest = max(subtrees, key=lambda c: subtree_cost[c])
+
+        if subtree_cost[largest] <= target or network._upstream[largest] is None:
+            break
+
+        subtrees.remove(largest)
+        subtrees.extend(network._upstream[largest])
+        trunk.append(largest)
+
+    # Longest processing time first
+    partitions = [[] for _ in range(num_workers)]
+    loads = [0.0] * num_workers
+
+    for cat in sorted(subtrees, key=lambda c: subtree_cost[c], reverse=True):
+        worker = loads.index(min(loads))
+        partitions[worker].append(cat)
+        loads[worker] += subtree_cost[cat]
+
+    trunk = [cat for cat in network._order if cat in trunk]
+
+    return [p for p in partitions if p], trunk
+
+
+class NetworkExecutor:
+    """
+    This class solves a Network using multiple processes. The network is split
+    in subtrees (see partition_network) and each worker process holds the
+    nodes of its subtrees, returning only the outputs of their outlets. The
+    nodes of the trunk are solved by the parent process, which puts together
+    the outputs as done by Network.get_output.
+
+    After the creation of the executor, the nodes assigned to the workers live
+    in the workers: changes to parameters, states, and inputs must be done
+    through the methods of the executor, and the nodes in the parent network
+    are not updated when solving.
+    """
+
+    def __init__(self, network, num_workers, costs=None, mp_context=None):
+        """
+        This is the initializer of the class NetworkExecutor.
+
+        Parameters
+        ----------
+        network : superflexpy.framework.network.Network
+            Network to solve. The inputs of the nodes must be already set.
+        num_workers : int
+            Number of worker processes
+        costs : dict(str : float)
+            Cost of solving each node. See partition_network.
+        mp_context : str
+            Start method of the worker processes (e.g. 'fork' or 'spawn'). If
+            None, the default of the platform is used.
+        """
+
+        self._error_message = "module : superflexPy, NetworkExecutor ,"
+        self._error_message += " Error message : "
+
+        self._network = network
+        self._partitions, self._trunk = partition_network(network, num_workers, costs)
+
+        context = multiprocessing.get_context(mp_context)
+
+        self._connections = []
+        self._processes = []
+        self._owner = {}  # Worker that holds each node
+
+        for worker, outlets in enumerate(self._partitions):
+            cats = set()
+            for outlet in outlets:
+                cats.update(network._find_upstream_nodes([outlet]))
+
+            for cat in cats:
+                self._owner[cat] = worker
+
+            nodes = [network._content[network._content_pointer[cat]] for cat in network._order if cat in cats]
+            topology = {cat: (None if cat in outlets else network._downstream[cat]) for cat in cats}
+
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(target=_worker, args=(child_connection, nodes, topology, outlets), daemon=True)
+            process.start()
+            child_connection.close()
+
+            self._connections.append(parent_connection)
+            self._processes.append(process)
+
+        self._parameters_name = self._request_all("get_parameters_name")
+        self._states_name = self._request_all("get_states_name")
+
+    # METHODS FOR THE USER
+
+    def get_output(self, solve=True):
+        """
+        This method solves the network. The workers solve their subtrees
+        while the parent solves the nodes of the trunk.
+
+        Differently from Network.get_output, the outputs of the nodes inside
+        the subtrees are not returned: only the outputs of the outlets are
+        sent back by the workers, to limit the data transferred between
+        processes.
+
+        Parameters
+        ----------
+        solve : bool
+            True if the elements have to be solved (i.e. calculate the states).
+
+        Returns
+        -------
+        dict(str : list(numpy.ndarray))
+            Dictionary containig the output fluxes of the outlets of the
+            subtrees and of the nodes of the trunk.
+        """
+
+        for connection in self._connections:
+            connection.send(("get_output", solve))
+
+        local_out = {}
+        try:
+            for cat in self._trunk:
+                local_out[cat] = self._network._content[self._network._content_pointer[cat]].get_output(solve)
+        finally:
+            # The replies are read also if the trunk fails, keeping the
+            # workers in sync with the following requests
+            worker_out = self._receive_all()
+
+        output = {}
+        for loc_out in worker_out:
+            output.update(loc_out)
+
+        for cat in self._trunk:
+            output[cat] = self._network._mix_upstream(cat, local_out[cat], output)
+
+        return output
+
+    def set_parameters(self, parameters):
+        """
+        This method sets the values of the parameters in the workers and in
+        the nodes of the trunk.
+
+        Parameters
+        ----------
+        parameters : dict
+            Contains the parameters to be set. The keys must be the ones
+            returned by the method get_parameters_name of the network.
+        """
+
+        self._network.set_parameters(parameters)
+
+        for worker, names in enumerate(self._parameters_name):
+            loc_parameters = {k: v for k, v in parameters.items() if k in names}
+            if loc_parameters:
+                self._request(worker, "set_parameters", loc_parameters)
+
+    def get_states(self):
+        """
+        This method returns the states of the nodes.
+
+        Returns
+        -------
+        dict
+            States of the nodes of the workers and of the trunk.
+        """
+
+        states = {}
+
+        for cat in self._trunk:
+            states.update(self._network._content[self._network._content_pointer[cat]].get_states())
+
+        for loc_states in self._request_all("get_states"):
+            states.update(loc_states)
+
+        return states
+
+    def set_states(self, states):
+        """
+        This method sets the values of the states in the workers and in the
+        nodes of the trunk.
+
+        Parameters
+        ----------
+        states : dict
+            Contains the states to be set. The keys must be the ones returned
+            by the method get_states.
+        """
+
+        for cat in self._trunk:
+            node = self._network._content[self._network._content_pointer[cat]]
+            names = node.get_states_name()
+            loc_states = {k: v for k, v in states.items() if k in names}
+            if loc_states:
+                node.set_states(loc_states)
+
+        for worker, names in enumerate(self._states_name):
+            loc_states = {k: v for k, v in states.items() if k in names}
+            if loc_states:
+                self._request(worker, "set_states", loc_states)
+
+    def reset_states(self):
+        """
+        This method sets the states of all the nodes to the values provided
+        at initialization.
+        """
+
+        for cat in self._trunk:
+            self._network._content[self._network._content_pointer[cat]].reset_states()
+
+        self._request_all("reset_states")
+
+    def set_input(self, inputs):
+        """
+        This method sets the inputs of the nodes.
+
+        Parameters
+        ----------
+        inputs : dict(str : list(numpy.ndarray))
+            Inputs of the nodes. Keys are the id of the nodes.
+        """
+
+        worker_inputs = [{} for _ in self._connections]
+
+        for cat, loc_in in inputs.items():
+            if cat in self._owner:
+                worker_inputs[self._owner[cat]][cat] = loc_in
+            else:
+                self._network._content[self._network._content_pointer[cat]].set_input(loc_in)
+
+        for worker, loc_inputs in enumerate(worker_inputs):
+            if loc_inputs:
+                self._request(worker, "set_input", loc_inputs)
+
+    def get_partitions(self):
+        """
+        This method returns the partition of the network.
+
+        Returns
+        -------
+        list(list(str)), list(str)
+            Outlets of the subtrees assigned to each worker and nodes solved
+            by the parent process.
+        """
+
+        return [list(p) for p in self._partitions], list(self._trunk)
+
+    def close(self):
+        """
+        This method stops the worker processes.
+        """
+
+        for connection, process in zip(self._connections, self._processes):
+            try:
+                connection.send(("close", None))
+                connection.close()
+            except (BrokenPipeError, OSError):
+                pass
+            process.join()
+
+        self._connections = []
+        self._processes = []
+
+    # PROTECTED METHODS
+
+    def _request(self, worker, command, argument=None):
+        self._connections[worker].send((command, argument))
+        return self._check_reply(worker, self._connections[worker].recv())
+
+    def _request_all(self, command, argument=None):
+        for connection in self._connections:
+            connection.send((command, argument))
+
+        return self._receive_all()
+
+    def _receive_all(self):
+        # All the replies are read before raising the error of a worker
+        replies = [connection.recv() for connection in self._connections]
+
+        return [self._check_reply(worker, reply) for worker, reply in enumerate(replies)]
+
+    def _check_reply(self, worker, reply):
+        status, result = reply
+
+        if status == "error":
+            message = "{}worker {} failed with the error:\n{}".format(self._error_message, worker, result)
+            raise RuntimeError(message)
+
+        return result
+
+    # MAGIC METHODS
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __repr__(self):
+        str = "Module: superflexPy\nNetworkExecutor class\n"
+        str += "Partitions:\n"
+        for worker, outlets in enumerate(self._partitions):
+            str += "\tWorker {}: {}\n".format(worker, outlets)
+        str += "Trunk:\n"
+        str += "\t{}\n".format(self._trunk)
+
+        return str
+
+
+def _worker(connection, nodes, topology, outlets):
+    """
+    This function is the main loop of the worker processes. It solves the
+    subtrees of the network and returns the outputs of their outlets.
+    """
+
+    network = Network(nodes=nodes, topology=topology)
+    content = {node.id: node for node in nodes}
+
+    while True:
+        command, argument = connection.recv()
+
+        if command == "close":
+            break
+
+        try:
+            if command == "get_output":
+                result = network.get_output(solve=argument, outlets=outlets)
+            elif command == "set_input":
+                for cat, loc_in in argument.items():
+                    content[cat].set_input(loc_in)
+                result = None
+            elif command in ["set_parameters", "set_states"]:
+                getattr(network, command)(argument)
+                result = None
+            else:
+                result = getattr(network, command)()
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+            continue
+
+        connection.send(("ok", result))
+
+    connection.close()
@@ -25,9 +25,11 @@ DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
 This file contains the implementation of the Node class.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy, deepcopy
 
 from ..utils.generic_component import GenericComponent
+from ..utils.spec import class_path
 from .unit import Unit
 
 
@@ -38,7 +40,20 @@ class Node(GenericComponent):
     applying, if present, a routing.
     """
 
-    def __init__(self, units, weights, area, id, parameters=None, states=None, shared_parameters=True):
+    _pickle_exclude = GenericComponent._pickle_exclude + ["_pool"]
+
+    def __init__(
+        self,
+        units,
+        weights,
+        area,
+        id,
+        parameters=None,
+        states=None,
+        shared_parameters=True,
+        parallel=False,
+        max_workers=None,
+    ):
         """
         This is the initializer of the class Node.
 
@@ -60,6 +75,16 @@ class Node(GenericComponent):
         shared_parameters : bool
             True if the parameters of the Units are shared among the different
             Nodes.
+        parallel : bool
+            True if the Units are solved concurrently on a pool of threads.
+            The pool is created at the first run and reused. The outputs are
+            then summed in the order of the units list, giving the same
+            results of the sequential solution. The speed up is achieved only
+            when the elements release the GIL (e.g. elements using the numba
+            numerical approximators).
+        max_workers : int
+            Number of threads of the pool. If None, it is the default of
+            concurrent.futures.ThreadPoolExecutor.
         """
 
         self.id = id
@@ -88,6 +113,10 @@ class Node(GenericComponent):
         self.area = area
         self._content_pointer = {hru.id: i for i, hru in enumerate(self._content)}
         self._weights = deepcopy(weights)
+        self._shared_parameters = shared_parameters
+        self._parallel = parallel
+        self._max_workers = max_workers
+        self._pool = None
         self.add_prefix_parameters(id, shared_parameters)
         self.add_prefix_states(id)
 
@@ -104,6 +133,7 @@ class Node(GenericComponent):
         """
 
         self.input = input
+        self._dirty = True
 
     def get_output(self, solve=True):
         """
@@ -125,19 +155,25 @@ class Node(GenericComponent):
         for h in self._content:
             h.set_input(deepcopy(self.input))
 
+        # Solve the units
+        if self._parallel and len(self._content) > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_workers)
+            futures = [self._pool.submit(h.get_output, solve) for h in self._content]
+            units_out = [f.result() for f in futures]
+        else:
+            units_out = [h.get_output(solve) for h in self._content]
+
         # Calculate output
         if isinstance(self._weights[0], float):
-            for i, (h, w) in enumerate(zip(self._content, self._weights)):
-                loc_out = h.get_output(solve)
-
+            for i, (loc_out, w) in enumerate(zip(units_out, self._weights)):
                 if i == 0:
                     output = [o * w for o in loc_out]
                 else:
                     for j in range(len(output)):
                         output[j] += loc_out[j] * w
         else:
-            for i, (h, w) in enumerate(zip(self._content, self._weights)):
-                loc_out = h.get_output(solve)
+            for i, (loc_out, w) in enumerate(zip(units_out, self._weights)):
                 out_count = 0
 
                 if i == 0:
@@ -156,8 +192,23 @@ class Node(GenericComponent):
                             output[j] += loc_out[out_count] * w[j]
                             out_count += 1
 
+        if solve:
+            # The states moved forward
+            self._dirty = True
+            self._states_from_reset = False
+
         return self._internal_routing(output)
 
+    def close(self):
+        """
+        This method shuts down the pool of threads used to solve the units in
+        parallel. A new pool is created if the node is solved again.
+        """
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
     def get_internal(self, id, attribute):
         """
         This method allows to inspect attributes of the objects that belong to
@@ -348,6 +399,41 @@ class Node(GenericComponent):
         # No routing
         return flux
 
+    def _to_spec(self, writer):
+        """
+        This method returns the specification of the node. The units are
+        stored in the table of the shared units and referenced by index. It is
+        used by the method to_spec.
+        """
+
+        arguments = self._get_spec_arguments()
+        arguments.update(
+            {
+                "units": [writer.share("units", h._to_spec(writer)) for h in self._content],
+                "weights": deepcopy(self._weights),
+                "area": self.area,
+                "shared_parameters": self._shared_parameters,
+                "parallel": self._parallel,
+                "max_workers": self._max_workers,
+            }
+        )
+
+        return {"class": class_path(self.__class__), "arguments": arguments}
+
+    @classmethod
+    def _from_spec(cls, spec, reader):
+        """
+        This method creates the node from its specification. Nodes that
+        referenced the same unit receive the same object, sharing the
+        parameters if shared_parameters is True. It is used by the method
+        from_spec.
+        """
+
+        arguments = {k: deepcopy(v) for k, v in spec["arguments"].items() if k != "units"}
+        units = [reader.get_shared("units", i) for i in spec["arguments"]["units"]]
+
+        return cls(units=units, **arguments)
+
     # MAGIC METHODS
 
     def __copy__(self):
@@ -358,6 +444,10 @@ class Node(GenericComponent):
         message = "{}A Node cannot be copied".format(self._error_message)
         raise AttributeError(message)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool = None  # The pool of threads is not pickled
+
     def __repr__(self):
         str = "Module: superflexPy\nNode: {}\n".format(self.id)
         str += "Units:\n"
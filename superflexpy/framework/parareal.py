@@ -0,0 +1,343 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains an experimental implementation of the Parareal algorithm,
+which solves a unit in parallel in time: the simulation period is divided in
+slices that are solved concurrently by worker processes, starting from states
+predicted by a cheap coarse model and corrected iteratively.
+"""
+
+import multiprocessing
+import time
+from copy import deepcopy
+
+import numpy as np
+
+from .element import LagElement, ODEsElement
+from .unit import Unit
+
+
+class Parareal:
+    """
+    This class solves a Unit with the Parareal algorithm. The simulation is
+    divided in time slices. The coarse propagator is a copy of the unit that
+    uses a cheap numerical approximator (e.g. explicit Euler without root
+    finder) with a time step coarse_factor times longer, applied to the
+    inputs averaged over coarse_factor time steps. The fine propagator is the
+    unit itself. At every iteration:
+
+    - the fine propagator solves all the slices in parallel, starting from the
+      current states at the boundaries of the slices;
+    - the coarse propagator sweeps the slices sequentially and the states at
+      the boundaries are corrected with the difference between the fine and
+      the coarse solutions of the previous iteration.
+
+    The iterations stop when the largest change of the states at the
+    boundaries is below the tolerance. After as many iterations as slices the
+    solution is equal to the serial one.
+
+    This implementation is experimental: it supports only units whose states
+    are scalars (i.e. without LagElement).
+    """
+
+    def __init__(self, unit, num_slices, coarse_approximation, coarse_factor=1, num_workers=1, mp_context=None):
+        """
+        This is the initializer of the class Parareal.
+
+        Parameters
+        ----------
+        unit : superflexpy.framework.unit.Unit
+            Unit to solve. Its time step must be already set.
+        num_slices : int
+            Number of time slices
+        coarse_approximation : superflexpy.utils.numerical_approximator.NumericalApproximator
+            Numerical approximator of the coarse propagator, usually a cheap
+            explicit one (e.g. explicit Euler without root finder, clipping
+            the states to their bounds). It must have the architecture of the
+            approximators of the unit.
+        coarse_factor : int
+            Ratio between the time steps of the coarse and of the fine
+            propagator.
+        num_workers : int
+            Number of worker processes solving the slices. If 1, the slices
+            are solved in the calling process.
+        mp_context : str
+            Start method of the worker processes (e.g. 'fork' or 'spawn'). If
+            None, the default of the platform is used.
+        """
+
+        self._error_message = "module : superflexPy, Parareal ,"
+        self._error_message += " Error message : "
+
+        if not isinstance(unit, Unit):
+            message = "{}the model must be a Unit. Given {}".format(self._error_message, type(unit))
+            raise TypeError(message)
+
+        architectures = set()
+        for layer in unit._layers:
+            for el in layer:
+                if isinstance(el, LagElement):
+                    message = "{}the states of {} are not scalars".format(self._error_message, el.id)
+                    raise ValueError(message)
+                elif isinstance(el, ODEsElement):
+                    architectures.add(el._num_app.architecture)
+
+        if architectures - {coarse_approximation.architecture}:
+            message = "{}the coarse approximation must have the architecture of the unit".format(self._error_message)
+            raise ValueError(message)
+
+        self._dt = unit.get_timestep()
+        self._unit = deepcopy(unit)
+        self._unit.set_memoization(None)
+
+        self._coarse = deepcopy(unit)
+        self._coarse.set_memoization(None)
+        for layer in self._coarse._layers:
+            for el in layer:
+                if isinstance(el, ODEsElement):
+                    el.define_numerical_approximation(coarse_approximation)
+
+        self._num_slices = num_slices
+        self._coarse_factor = coarse_factor
+        self._num_workers = num_workers
+        self._mp_context = mp_context
+        self._states_name = [k for k, v in unit.get_states().items() if v is not None]
+
+    def run(self, inputs, tol=1e-6, max_iterations=None, compare=False):
+        """
+        This method solves the unit with the Parareal algorithm, starting
+        from its current states.
+
+        Parameters
+        ----------
+        inputs : list(numpy.ndarray)
+            Inputs of the unit
+        tol : float
+            Tolerance on the largest change of the states at the boundaries of
+            the slices, relative to max(1, |state|).
+        max_iterations : int
+            Maximum number of iterations. If None, it is equal to the number
+            of slices.
+        compare : bool
+            If True, the unit is also solved serially to measure the speedup
+            and the error of the parallel solution.
+
+        Returns
+        -------
+        list(numpy.ndarray), dict
+            Outputs of the unit and report, with keys 'iterations',
+            'converged', 'defects' (largest change of the states at each
+            iteration), 'time', and, if compare is True, 'serial_time',
+            'speedup', and 'max_error' (largest absolute difference of the
+            outputs).
+        """
+
+        start_time = time.perf_counter()
+
+        num_ts = len(inputs[0])
+        max_iterations = self._num_slices if max_iterations is None else max_iterations
+        bounds = self._get_bounds(num_ts)
+        slices = [[i[start:stop] for i in inputs] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        states = np.zeros((len(slices) + 1, len(self._states_name)))
+        states[0] = self._get_states(self._unit)
+
+        # First prediction with the coarse propagator
+        coarse = np.zeros((len(slices), len(self._states_name)))
+        for k, loc_in in enumerate(slices):
+            coarse[k] = self._propagate_coarse(states[k], loc_in)
+            states[k + 1] = coarse[k]
+
+        report = {"iterations": 0, "converged": False, "defects": []}
+
+        with _FinePropagator(self._unit, self._states_name, self._num_workers, self._mp_context) as fine:
+            for iteration in range(max_iterations):
+                # Slices before the iteration number are already exact
+                solutions = fine.solve(states[:-1], slices, first=iteration)
+
+                new_states = states.copy()
+                for k in range(iteration, len(slices)):
+                    new_coarse = self._propagate_coarse(new_states[k], slices[k])
+                    new_states[k + 1] = new_coarse + solutions[k][1] - coarse[k]
+                    coarse[k] = new_coarse
+
+                defect = np.max(np.abs(new_states - states) / np.maximum(1.0, np.abs(states)), initial=0.0)
+                report["iterations"] = iteration + 1
+                report["defects"].append(defect)
+                states = new_states
+
+                if defect <= tol:
+                    report["converged"] = True
+                    break
+
+        outputs = [np.concatenate(o) for o in zip(*[s[0] for s in solutions])]
+
+        self._set_states(self._unit, states[-1])
+        report["time"] = time.perf_counter() - start_time
+
+        if compare:
+            serial = deepcopy(self._unit)
+            self._set_states(serial, states[0])
+            serial.set_input(inputs)
+
+            start_time = time.perf_counter()
+            reference = serial.get_output()
+            report["serial_time"] = time.perf_counter() - start_time
+            report["speedup"] = report["serial_time"] / report["time"]
+            report["max_error"] = max(np.max(np.abs(o - r)) for o, r in zip(outputs, reference))
+
+        return outputs, report
+
+    def get_states(self):
+        """
+        This method returns the states of the unit at the end of the last
+        run.
+
+        Returns
+        -------
+        dict
+            States of the unit
+        """
+
+        return self._unit.get_states()
+
+    # PROTECTED METHODS
+
+    def _get_bounds(self, num_ts):
+        # The boundaries of the slices are multiple of the coarse time step
+        num_coarse = int(np.ceil(num_ts / self._coarse_factor))
+        bounds = [int(round(b)) * self._coarse_factor for b in np.linspace(0, num_coarse, self._num_slices + 1)]
+        bounds[-1] = num_ts
+
+        return sorted(set(bounds))
+
+    def _propagate_coarse(self, states, inputs):
+        num_ts = len(inputs[0])
+        num_full = (num_ts // self._coarse_factor) * self._coarse_factor
+
+        self._set_states(self._coarse, states)
+
+        # Inputs averaged over the coarse time step; the remainder is solved
+        # with a shorter one
+        for start, stop in [(0, num_full), (num_full, num_ts)]:
+            if stop == start:
+                continue
+
+            length = min(self._coarse_factor, stop - start)
+            self._coarse.set_timestep(self._dt * length)
+            self._coarse.set_input([i[start:stop].reshape((-1, length)).mean(axis=1) for i in inputs])
+            self._coarse.get_output()
+
+        return self._get_states(self._coarse)
+
+    def _get_states(self, unit):
+        states = unit.get_states(self._states_name)
+        return np.array([states[k] for k in self._states_name], dtype=np.float64)
+
+    def _set_states(self, unit, states):
+        unit.set_states({k: float(v) for k, v in zip(self._states_name, states)})
+
+    def __repr__(self):
+        str = "Module: superflexPy\nParareal class\n"
+        str += "Unit: {}\n".format(self._unit.id)
+        str += "Slices: {}\n".format(self._num_slices)
+        str += "Coarse factor: {}\n".format(self._coarse_factor)
+        str += "Workers: {}\n".format(self._num_workers)
+
+        return str
+
+
+class _FinePropagator:
+    """
+    This class solves the slices with the fine propagator, in the calling
+    process or in a pool of worker processes.
+    """
+
+    def __init__(self, unit, states_name, num_workers, mp_context):
+        self._arguments = (unit, states_name)
+        self._pool = None
+
+        if num_workers > 1:
+            context = multiprocessing.get_context(mp_context)
+            self._pool = context.Pool(num_workers, initializer=_init_worker, initargs=self._arguments)
+        else:
+            _init_worker(*self._arguments)
+
+        self._solutions = {}
+
+    def solve(self, states, slices, first):
+        tasks = [(k, states[k], slices[k]) for k in range(first, len(slices))]
+
+        if self._pool is None:
+            results = [_solve_slice(t) for t in tasks]
+        else:
+            results = self._pool.map(_solve_slice, tasks)
+
+        for (k, _, _), result in zip(tasks, results):
+            self._solutions[k] = result
+
+        return [self._solutions[k] for k in range(len(slices))]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+        else:
+            _init_worker(None, None)
+
+
+_worker_unit = None
+"""
+Fine propagator and names of the states of the current process
+"""
+
+
+def _init_worker(unit, states_name):
+    """
+    This function prepares the fine propagator of the current process.
+    Called with None, it releases it.
+    """
+
+    global _worker_unit
+    _worker_unit = None if unit is None else (deepcopy(unit), states_name)
+
+
+def _solve_slice(task):
+    """
+    This function solves a slice with the fine propagator and returns the
+    outputs and the final states.
+    """
+
+    _, states, inputs = task
+    unit, states_name = _worker_unit
+
+    unit.set_states({k: float(v) for k, v in zip(states_name, states)})
+    unit.set_input(inputs)
+    outputs = unit.get_output()
+    final_states = unit.get_states(states_name)
+
+    return outputs, np.array([final_states[k] for k in states_name], dtype=np.float64)
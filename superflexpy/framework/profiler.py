@@ -0,0 +1,431 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of a profiler that measures where the
+time is spent when solving a component (Network, Node, Unit, or element).
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+from ..utils.lazy_numba import call_when_loaded, remove_load_callback
+from .element import LagElement, ODEsElement
+from .network import Network
+from .node import Node
+from .unit import Unit
+
+
+class Profiler:
+    """
+    This class implements an opt-in hierarchical profiler. When attached to a
+    component, it wraps the method get_output of all the components contained
+    (nodes, units, and elements) and the methods used to solve the elements,
+    recording the calls in a tree of timing frames. The wrappers are instance
+    attributes, removed by detach: components that are not profiled are not
+    affected.
+
+    The times are keyed by the prefixed id of the components (e.g.
+    Cat1_H2_UR), with the suffixes ':solve' (solution of the states),
+    ':get_fluxes' (calculation of the fluxes from the states), and ':compile'
+    (numba compilation) for the phases of the elements. The network is keyed
+    as 'network'.
+
+    When the units of a Node are solved in parallel, each thread has its own
+    tree of frames and the time of the node includes the time waiting for the
+    threads. In this case, the memory peaks are not reliable because the
+    allocations of all the threads are traced together.
+    """
+
+    def __init__(self, component=None, compile_events=True, memory=False):
+        """
+        This is the initializer of the class Profiler.
+
+        Parameters
+        ----------
+        component : superflexpy.framework.network.Network, Node, Unit, or element
+            Component to profile. If None, the profiler must be attached
+            later with the method attach.
+        compile_events : bool
+            True if the compilation of numba functions must be recorded as a
+            phase of the calling component.
+        memory : bool
+            True if the peak of the memory allocated during each call must be
+            recorded, using tracemalloc. Tracing the memory slows down the
+            execution.
+        """
+
+        self._error_message = "module : superflexPy, Profiler, Error message : "
+        self._compile_events = compile_events
+        self._memory = memory
+        self._started_tracemalloc = False
+        self._wrapped = []
+        self._listener = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+        if component is not None:
+            self.attach(component)
+
+    # METHODS FOR THE USER
+
+    def attach(self, component):
+        """
+        This method attaches the profiler to a component and to all the
+        components that it contains.
+
+        Parameters
+        ----------
+        component : superflexpy.framework.network.Network, Node, Unit, or element
+            Component to profile.
+        """
+
+        if self._wrapped:
+            message = "{}the profiler is already attached. Call detach first".format(self._error_message)
+            raise RuntimeError(message)
+
+        self._attach(component, prefix="")
+
+        if self._memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        if self._compile_events:
+            # The listener is registered when numba is imported: profiling
+            # models with the python architecture does not import it
+            call_when_loaded(self._register_compile_listener)
+
+    def detach(self):
+        """
+        This method removes the wrappers from the components, restoring their
+        original behavior. The statistics are kept.
+        """
+
+        for obj, name, previous in self._wrapped:
+            if previous is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, previous)
+
+        self._wrapped = []
+
+        remove_load_callback(self._register_compile_listener)
+
+        if self._listener is not None:
+            from numba.core import event
+
+            event.unregister("numba:compile", self._listener)
+            self._listener = None
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def reset(self):
+        """
+        This method deletes the statistics and the recorded events.
+        """
+
+        with self._lock:
+            self._statistics = {}
+            self._events = []
+            self._start = time.perf_counter()
+
+    def get_statistics(self):
+        """
+        This method returns the aggregated statistics.
+
+        Returns
+        -------
+        dict(str : dict)
+            Dictionary keyed by prefixed id. Each value is a dictionary with
+            keys 'kind' (network, node, unit, element, solve, get_fluxes, or
+            compile), 'class' (class of the component), 'calls', 'inclusive'
+            (total time, s), and 'exclusive' (time not spent in the profiled
+            components called, s). If the memory is traced, also 'peak'
+            (maximum, among the calls, of the memory allocated above the one
+            at the beginning of the call, bytes).
+        """
+
+        with self._lock:
+            return {k: dict(v) for k, v in self._statistics.items()}
+
+    def get_summary(self):
+        """
+        This method returns the exclusive time aggregated by kind of frame
+        (e.g. total time spent solving the elements, calculating the fluxes,
+        or compiling).
+
+        Returns
+        -------
+        dict(str : float)
+            Exclusive time (s) of each kind.
+        """
+
+        summary = {}
+        for v in self.get_statistics().values():
+            summary[v["kind"]] = summary.get(v["kind"], 0.0) + v["exclusive"]
+
+        return summary
+
+    def to_json(self, path=None):
+        """
+        This method exports the statistics in JSON format.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file to write. If None, no file is written.
+
+        Returns
+        -------
+        str
+            Statistics in JSON format.
+        """
+
+        text = json.dumps(self.get_statistics(), indent=2)
+
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+
+        return text
+
+    def to_chrome_trace(self, path=None):
+        """
+        This method exports the recorded calls in the trace event format of
+        Chrome (chrome://tracing, Perfetto).
+
+        Parameters
+        ----------
+        path : str
+            Path of the file to write. If None, no file is written.
+
+        Returns
+        -------
+        dict
+            Trace in the format of Chrome.
+        """
+
+        pid = os.getpid()
+
+        with self._lock:
+            trace_events = [
+                {
+                    "name": key,
+                    "cat": kind,
+                    "ph": "X",
+                    "ts": (start - self._start) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                }
+                for key, kind, start, duration, tid in self._events
+            ]
+
+        trace = {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(trace, f)
+
+        return trace
+
+    # PROTECTED METHODS
+
+    def _attach(self, component, prefix):
+        if isinstance(component, Network):
+            key = "network"
+            self._wrap(component, "get_output", key, "network")
+            for node in component._content:
+                self._attach(node, prefix="")
+            return
+
+        key = prefix + component.id
+
+        if isinstance(component, Node):
+            self._wrap(component, "get_output", key, "node")
+            for unit in component._content:
+                self._attach(unit, prefix=key + "_")
+        elif isinstance(component, Unit):
+            self._wrap(component, "get_output", key, "unit")
+            for layer in component._layers:
+                for element in layer:
+                    self._attach(element, prefix=key + "_")
+        else:
+            self._wrap(component, "get_output", key, "element")
+            if isinstance(component, ODEsElement):
+                self._wrap(component, "_solve_differential_equation", key + ":solve", "solve")
+                self._wrap_shared(component._num_app, "get_fluxes", ":get_fluxes", "get_fluxes")
+                self._add_key(key + ":get_fluxes", "get_fluxes", type(component._num_app).__name__)
+            elif isinstance(component, LagElement):
+                self._wrap(component, "_solve_lag", key + ":solve", "solve")
+                self._wrap(component, "_advance_lag", key + ":solve", "solve")
+
+    def _wrap(self, obj, name, key, kind):
+        self._wrapped.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, self._wrap_function(getattr(obj, name), key, kind))
+        self._add_key(key, kind, type(obj).__name__)
+
+    def _wrap_shared(self, obj, name, suffix, kind):
+        # Method of an object that may be shared among components (e.g. the
+        # numerical approximator). The key is the one of the calling
+        # component, with the suffix
+        if any(o is obj and n == name for o, n, _ in self._wrapped):
+            return
+
+        function = getattr(obj, name)
+
+        def wrapper(*args, **kwargs):
+            stack = self._get_stack()
+            key = (stack[-1][0] if stack else type(obj).__name__) + suffix
+            self._enter(key, kind)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._exit()
+
+        self._wrapped.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def _add_key(self, key, kind, class_name):
+        with self._lock:
+            self._statistics.setdefault(
+                key,
+                self._new_statistics(kind, class_name),
+            )
+
+    def _new_statistics(self, kind, class_name):
+        statistics = {"kind": kind, "class": class_name, "calls": 0, "inclusive": 0.0, "exclusive": 0.0}
+
+        if self._memory:
+            statistics["peak"] = 0
+
+        return statistics
+
+    def _wrap_function(self, function, key, kind):
+        def wrapper(*args, **kwargs):
+            self._enter(key, kind)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._exit()
+
+        return wrapper
+
+    def _get_stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            self._local.compile_depth = 0
+            return self._local.stack
+
+    def _enter(self, key, kind):
+        # Frame: key, kind, start time, time of the children, memory at the
+        # start, peak of memory
+        stack = self._get_stack()
+
+        if self._memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][5] = max(stack[-1][5], peak)
+            tracemalloc.reset_peak()
+        else:
+            current = 0
+
+        stack.append([key, kind, time.perf_counter(), 0.0, current, current])
+
+    def _exit(self):
+        end = time.perf_counter()
+        stack = self._get_stack()
+        key, kind, start, children, start_memory, peak = stack.pop()
+        duration = end - start
+
+        if self._memory and tracemalloc.is_tracing():
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+        if stack:
+            stack[-1][3] += duration
+            stack[-1][5] = max(stack[-1][5], peak)
+
+        with self._lock:
+            if key not in self._statistics:
+                self._statistics[key] = self._new_statistics(kind, None)
+
+            stats = self._statistics[key]
+            stats["calls"] += 1
+            stats["inclusive"] += duration
+            stats["exclusive"] += duration - children
+
+            if self._memory:
+                stats["peak"] = max(stats["peak"], peak - start_memory)
+
+            self._events.append((key, kind, start, duration, threading.get_ident()))
+
+    def _enter_compile(self):
+        # Nested compilations (e.g. of the functions called by the one
+        # compiled) are part of the outermost one
+        stack = self._get_stack()
+
+        if self._local.compile_depth == 0:
+            key = stack[-1][0].split(":")[0] + ":compile" if stack else "compile"
+            self._enter(key, "compile")
+
+        self._local.compile_depth += 1
+
+    def _register_compile_listener(self, numba):
+        self._listener = _compile_listener(self)
+
+    def _exit_compile(self):
+        self._get_stack()
+        self._local.compile_depth -= 1
+
+        if self._local.compile_depth == 0:
+            self._exit()
+
+
+def _compile_listener(profiler):
+    """
+    This function registers a numba listener that records the compilations in
+    the profiler.
+    """
+
+    from numba.core import event
+
+    class _CompileListener(event.Listener):
+        def on_start(self, event):
+            profiler._enter_compile()
+
+        def on_end(self, event):
+            profiler._exit_compile()
+
+    listener = _CompileListener()
+    event.register("numba:compile", listener)
+
+    return listener
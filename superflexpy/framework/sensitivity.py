@@ -0,0 +1,492 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of the global sensitivity analysis of
+the parameters of a unit (Sobol indices and Morris elementary effects). The
+designs are generated in blocks, each block is evaluated as a batch of
+catchments (see catchment_batch), possibly in worker processes, and the
+results are accumulated by streaming estimators: the memory depends on the
+size of the blocks and not on the total number of samples.
+"""
+
+import multiprocessing
+from collections import deque
+
+import numpy as np
+
+from .catchment_batch import CatchmentBatch
+
+
+def sobol_design(num_parameters, num_samples, block_size=1, seed=None):
+    """
+    This function generates the design used to estimate the Sobol indices,
+    according to the scheme of Saltelli et al. (2010). Each base sample
+    contributes num_parameters + 2 points, in the unit hypercube: the rows of
+    the matrices A and B, and the rows of A with one column taken from B.
+
+    Parameters
+    ----------
+    num_parameters : int
+        Number of parameters
+    num_samples : int
+        Number of base samples
+    block_size : int
+        Number of base samples in each block
+    seed : int
+        Seed of the random generator. The design does not depend on the
+        block size.
+
+    Yields
+    ------
+    numpy.ndarray
+        2D array (block_size * (num_parameters + 2), num_parameters). The
+        first rows are A, then B, then A with the column i from B, for each
+        parameter i.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, num_samples, block_size):
+        num_loc = min(block_size, num_samples - start)
+        samples = rng.random((num_loc, 2 * num_parameters))
+        A = samples[:, :num_parameters]
+        B = samples[:, num_parameters:]
+
+        design = [A, B]
+        for i in range(num_parameters):
+            AB = A.copy()
+            AB[:, i] = B[:, i]
+            design.append(AB)
+
+        yield np.concatenate(design)
+
+
+def morris_design(num_parameters, num_trajectories, num_levels=4, block_size=1, seed=None):
+    """
+    This function generates the trajectories used to calculate the Morris
+    elementary effects. Each trajectory starts from a random point of the
+    grid with num_levels levels in the unit hypercube and moves one
+    parameter at a time, in random order, by a step of num_levels / (2 *
+    (num_levels - 1)).
+
+    Parameters
+    ----------
+    num_parameters : int
+        Number of parameters
+    num_trajectories : int
+        Number of trajectories
+    num_levels : int
+        Number of levels of the grid. It must be even and at least 2.
+    block_size : int
+        Number of trajectories in each block
+    seed : int
+        Seed of the random generator. The design does not depend on the
+        block size.
+
+    Yields
+    ------
+    numpy.ndarray
+        2D array (block_size * (num_parameters + 1), num_parameters) of
+        trajectories, one after the other.
+    """
+
+    # Checked here, and not when the first block is generated
+    if num_levels < 2 or num_levels % 2 != 0:
+        message = "module : superflexPy, sensitivity , Error message : "
+        message += "num_levels must be even and at least 2. Given {}".format(num_levels)
+        raise ValueError(message)
+
+    return _morris_blocks(num_parameters, num_trajectories, num_levels, block_size, seed)
+
+
+def _morris_blocks(num_parameters, num_trajectories, num_levels, block_size, seed):
+    """
+    This function generates the blocks of trajectories of morris_design.
+    """
+
+    rng = np.random.default_rng(seed)
+    delta = num_levels / (2 * (num_levels - 1))
+    num_start = num_levels // 2  # Starting levels from which +delta is feasible
+
+    for start in range(0, num_trajectories, block_size):
+        num_loc = min(block_size, num_trajectories - start)
+        draws = rng.random((num_loc, 3 * num_parameters))
+
+        x = np.floor(draws[:, :num_parameters] * num_start) / (num_levels - 1)
+        order = np.argsort(draws[:, num_parameters : 2 * num_parameters], axis=1)
+        backward = draws[:, 2 * num_parameters :] < 0.5
+
+        # Going backward is possible only starting from the top half of the
+        # grid: the start is moved up
+        x[backward] += delta
+
+        design = np.zeros((num_loc, num_parameters + 1, num_parameters))
+        design[:, 0] = x
+
+        for step in range(num_parameters):
+            x = x.copy()
+            rows = np.arange(num_loc)
+            par = order[:, step]
+            x[rows, par] += np.where(backward[rows, par], -delta, delta)
+            design[:, step + 1] = x
+
+        yield design.reshape((-1, num_parameters))
+
+
+class SobolEstimator:
+    """
+    This class accumulates the evaluations of the design of sobol_design and
+    calculates the first order indices (Saltelli et al., 2010) and the total
+    order indices (Jansen, 1999). Only sums are stored.
+    """
+
+    def __init__(self, num_parameters):
+        """
+        This is the initializer of the class SobolEstimator.
+
+        Parameters
+        ----------
+        num_parameters : int
+            Number of parameters
+        """
+
+        self._num_parameters = num_parameters
+        self._num_samples = 0
+        self._shift = None  # Reduces the cancellation and the variance of the sums
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._sum_first = np.zeros(num_parameters)
+        self._sum_total = np.zeros(num_parameters)
+
+    def update(self, output):
+        """
+        This method adds the evaluations of a block of the design.
+
+        Parameters
+        ----------
+        output : numpy.ndarray
+            1D array of the evaluations of the block, in the order of
+            sobol_design.
+        """
+
+        output = np.asarray(output, dtype=np.float64).reshape((self._num_parameters + 2, -1))
+        f_A, f_B, f_AB = output[0], output[1], output[2:]
+
+        if self._shift is None:
+            self._shift = f_A[0]
+
+        self._num_samples += len(f_A)
+        self._sum += np.sum(f_A - self._shift) + np.sum(f_B - self._shift)
+        self._sum_squares += np.sum((f_A - self._shift) ** 2) + np.sum((f_B - self._shift) ** 2)
+        self._sum_first += np.sum((f_B - self._shift) * (f_AB - f_A), axis=1)  # Unbiased for any shift
+        self._sum_total += np.sum((f_A - f_AB) ** 2, axis=1)
+
+    def get_indices(self):
+        """
+        This method returns the estimates of the indices.
+
+        Returns
+        -------
+        dict(str : numpy.ndarray)
+            First order ('S1') and total order ('ST') indices of the
+            parameters, and variance of the output ('variance').
+        """
+
+        num_values = 2 * self._num_samples
+        variance = self._sum_squares / num_values - (self._sum / num_values) ** 2
+
+        return {
+            "S1": self._sum_first / self._num_samples / variance,
+            "ST": self._sum_total / (2 * self._num_samples) / variance,
+            "variance": variance,
+        }
+
+
+class MorrisEstimator:
+    """
+    This class accumulates the evaluations of the trajectories of
+    morris_design and calculates the statistics of the elementary effects:
+    mean ('mu'), mean of the absolute values ('mu_star'), and standard
+    deviation ('sigma'). Only sums are stored.
+    """
+
+    def __init__(self, num_parameters):
+        """
+        This is the initializer of the class MorrisEstimator.
+
+        Parameters
+        ----------
+        num_parameters : int
+            Number of parameters
+        """
+
+        self._num_parameters = num_parameters
+        self._num_trajectories = 0
+        self._sum = np.zeros(num_parameters)
+        self._sum_abs = np.zeros(num_parameters)
+        self._sum_squares = np.zeros(num_parameters)
+
+    def update(self, design, output):
+        """
+        This method adds the evaluations of a block of trajectories.
+
+        Parameters
+        ----------
+        design : numpy.ndarray
+            2D array of the trajectories, as returned by morris_design.
+        output : numpy.ndarray
+            1D array of the evaluations of the points of the trajectories.
+        """
+
+        num_points = self._num_parameters + 1
+        design = design.reshape((-1, num_points, self._num_parameters))
+        output = np.asarray(output, dtype=np.float64).reshape((-1, num_points))
+
+        step = np.diff(design, axis=1)  # One parameter changes at each step
+        par = np.argmax(np.abs(step), axis=2)
+        delta = np.take_along_axis(step, par[:, :, None], axis=2)[:, :, 0]
+
+        effects = np.zeros((len(design), self._num_parameters))
+        np.put_along_axis(effects, par, np.diff(output, axis=1) / delta, axis=1)
+
+        self._num_trajectories += len(design)
+        self._sum += effects.sum(axis=0)
+        self._sum_abs += np.abs(effects).sum(axis=0)
+        self._sum_squares += (effects**2).sum(axis=0)
+
+    def get_indices(self):
+        """
+        This method returns the statistics of the elementary effects. The
+        effects refer to the parameters scaled in the unit interval.
+
+        Returns
+        -------
+        dict(str : numpy.ndarray)
+            Statistics of the elementary effects ('mu', 'mu_star', 'sigma').
+        """
+
+        n = self._num_trajectories
+        mu = self._sum / n
+        variance = (self._sum_squares - n * mu**2) / max(n - 1, 1)
+
+        return {"mu": mu, "mu_star": self._sum_abs / n, "sigma": np.sqrt(np.maximum(variance, 0.0))}
+
+
+class SensitivityAnalysis:
+    """
+    This class runs the global sensitivity analysis of the parameters of a
+    Unit. The model is evaluated with CatchmentBatch: each block of the design
+    is solved as a batch of catchments sharing the inputs. The blocks are
+    evaluated in the calling process or, if num_workers > 1, in worker
+    processes, keeping at most two blocks per worker in flight. The
+    evaluations are passed to the estimators as soon as they are available.
+
+    The objective must be a function that accepts the list of outputs of the
+    unit, 2D arrays (#samples, #timesteps), and returns a 1D array (#samples,)
+    of scalar values. When using worker processes it must be defined at the
+    top level of a module, to be pickled.
+    """
+
+    def __init__(self, unit, inputs, objective, bounds, block_size=1000, num_workers=1, mp_context=None):
+        """
+        This is the initializer of the class SensitivityAnalysis.
+
+        Parameters
+        ----------
+        unit : superflexpy.framework.unit.Unit
+            Unit to analyze. Its time step must be already set.
+        inputs : list(numpy.ndarray)
+            Inputs of the unit, 1D arrays (#timesteps,).
+        objective : function
+            Function that calculates the value analyzed from the outputs.
+        bounds : dict(str : tuple(float, float))
+            Lower and upper bound of the parameters to analyze. The keys must
+            be the ones returned by the method get_parameters_name of the
+            unit.
+        block_size : int
+            Approximate number of model evaluations of each block. It bounds
+            the memory used.
+        num_workers : int
+            Number of worker processes. If 1, the blocks are evaluated in the
+            calling process.
+        mp_context : str
+            Start method of the worker processes (e.g. 'fork' or 'spawn'). If
+            None, the default of the platform is used.
+        """
+
+        self._error_message = "module : superflexPy, SensitivityAnalysis ,"
+        self._error_message += " Error message : "
+
+        names = unit.get_parameters_name()
+        for k in bounds:
+            if k not in names:
+                message = "{}the unit does not have the parameter {}".format(self._error_message, k)
+                raise KeyError(message)
+
+        self._names = list(bounds)
+        self._lower = np.array([bounds[k][0] for k in self._names], dtype=np.float64)
+        self._upper = np.array([bounds[k][1] for k in self._names], dtype=np.float64)
+        self._block_size = block_size
+        self._num_workers = num_workers
+        self._mp_context = mp_context
+        self._arguments = (unit, inputs, objective, self._names)
+
+    def sobol(self, num_samples, seed=None):
+        """
+        This method calculates the Sobol indices. The number of model
+        evaluations is num_samples * (#parameters + 2).
+
+        Parameters
+        ----------
+        num_samples : int
+            Number of base samples
+        seed : int
+            Seed of the random generator
+
+        Returns
+        -------
+        dict(str : dict(str : float))
+            First order ('S1') and total order ('ST') indices of each
+            parameter.
+        """
+
+        num_parameters = len(self._names)
+        estimator = SobolEstimator(num_parameters)
+        block_size = max(1, self._block_size // (num_parameters + 2))
+
+        for _, output in self._evaluate(sobol_design(num_parameters, num_samples, block_size, seed)):
+            estimator.update(output)
+
+        indices = estimator.get_indices()
+
+        return {k: dict(zip(self._names, indices[k])) for k in ["S1", "ST"]}
+
+    def morris(self, num_trajectories, num_levels=4, seed=None):
+        """
+        This method calculates the statistics of the Morris elementary
+        effects. The number of model evaluations is num_trajectories *
+        (#parameters + 1).
+
+        Parameters
+        ----------
+        num_trajectories : int
+            Number of trajectories
+        num_levels : int
+            Number of levels of the grid. It must be even and at least 2.
+        seed : int
+            Seed of the random generator
+
+        Returns
+        -------
+        dict(str : dict(str : float))
+            Mean ('mu'), mean of the absolute values ('mu_star'), and standard
+            deviation ('sigma') of the elementary effects of each parameter,
+            referred to the parameters scaled in the unit interval.
+        """
+
+        num_parameters = len(self._names)
+        estimator = MorrisEstimator(num_parameters)
+        block_size = max(1, self._block_size // (num_parameters + 1))
+        design = morris_design(num_parameters, num_trajectories, num_levels, block_size, seed)
+
+        for block, output in self._evaluate(design):
+            estimator.update(block, output)
+
+        indices = estimator.get_indices()
+
+        return {k: dict(zip(self._names, indices[k])) for k in ["mu", "mu_star", "sigma"]}
+
+    # PROTECTED METHODS
+
+    def _evaluate(self, design):
+        # Generator of (block, output) pairs, in the order of the design
+        scale = self._upper - self._lower
+
+        if self._num_workers == 1:
+            _init_worker(*self._arguments)
+            try:
+                for block in design:
+                    yield block, _evaluate_block(self._lower + block * scale)
+            finally:
+                _init_worker(None, None, None, None)
+            return
+
+        context = multiprocessing.get_context(self._mp_context)
+
+        with context.Pool(self._num_workers, initializer=_init_worker, initargs=self._arguments) as pool:
+            pending = deque()
+
+            for block in design:
+                pending.append((block, pool.apply_async(_evaluate_block, (self._lower + block * scale,))))
+
+                if len(pending) == 2 * self._num_workers:
+                    block, result = pending.popleft()
+                    yield block, result.get()
+
+            while pending:
+                block, result = pending.popleft()
+                yield block, result.get()
+
+    def __repr__(self):
+        str = "Module: superflexPy\nSensitivityAnalysis class\n"
+        str += "Parameters:\n"
+        for k, low, up in zip(self._names, self._lower, self._upper):
+            str += "\t{} : [{}, {}]\n".format(k, low, up)
+        str += "Block size: {}\n".format(self._block_size)
+        str += "Workers: {}\n".format(self._num_workers)
+
+        return str
+
+
+_worker_state = None
+"""
+Runner, inputs, objective, and names of the parameters of the current
+process
+"""
+
+
+def _init_worker(unit, inputs, objective, names):
+    """
+    This function prepares the evaluation of the blocks in the current
+    process. Called with None, it releases the runner.
+    """
+
+    global _worker_state
+
+    if unit is None:
+        _worker_state = None
+    else:
+        _worker_state = (CatchmentBatch(unit), inputs, objective, names)
+
+
+def _evaluate_block(samples):
+    """
+    This function evaluates a block of parameter sets as a batch of
+    catchments and returns the values of the objective.
+    """
+
+    runner, inputs, objective, names = _worker_state
+    outputs, _ = runner.run(inputs=inputs, parameters={k: samples[:, i] for i, k in enumerate(names)})
+
+    return np.asarray(objective(outputs), dtype=np.float64)
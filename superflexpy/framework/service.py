@@ -0,0 +1,625 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of a long running forecast service. The
+service builds the models once, keeps their compiled kernels and their
+(warm) states in memory, and solves the requests received through a Unix
+socket or a local TCP port. Inputs, outputs, and states travel as binary
+arrays. The file contains also the client and the command line entry point
+of the service:
+
+    python -m superflexpy.framework.service --model m4=m4.json --address /tmp/sfpy.sock
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+
+import numpy as np
+
+from ..utils.generic_component import GenericComponent
+from .network import Network
+
+_HEADER = struct.Struct("!I")
+"""
+Length of the JSON part of a message
+"""
+
+
+class ForecastServer:
+    """
+    This class implements the forecast service. Each model is replicated
+    num_workers times and the replicas are solved by a pool of threads (the
+    numba kernels release the GIL), so that the compilation is paid only by
+    the first request. For each model, the service keeps the warm states:
+    the initial states of the next request, updated at the end of each run.
+
+    Requests that update the warm states of a model are solved one at a time,
+    in the order they are received; the other requests (e.g. the members of
+    an ensemble forecast starting from the warm states) are solved
+    concurrently.
+
+    Since the specifications import classes by path and the requests are not
+    authenticated, the service must be exposed only to trusted local
+    clients: it listens on a Unix socket or on the loopback interface.
+    """
+
+    def __init__(self, models, address, num_workers=1, warmup_inputs=None):
+        """
+        This is the initializer of the class ForecastServer.
+
+        Parameters
+        ----------
+        models : dict(str : dict or superflexpy.utils.generic_component.GenericComponent)
+            Models served, as specifications (see GenericComponent.to_spec)
+            or components (Unit, Node, or Network). The service uses copies
+            of the models, built from the specifications; the warm states are
+            initialized with the current states of the components. The time
+            step of the models must be already set.
+        address : str or int
+            Path of the Unix socket or port of the TCP server, listening on
+            localhost (0 chooses a free port, see get_address).
+        num_workers : int
+            Number of requests solved concurrently
+        warmup_inputs : dict(str : list(numpy.ndarray))
+            Inputs used to solve each model once when the service starts,
+            compiling the numba kernels. The warm states are not changed.
+        """
+
+        self._error_message = "module : superflexPy, ForecastServer ,"
+        self._error_message += " Error message : "
+
+        self._replicas = {}
+        self._states = {}
+        self._locks = {}
+
+        for name, model in models.items():
+            if isinstance(model, GenericComponent):
+                states = deepcopy(model.get_states())
+                spec = model.to_spec()
+            elif isinstance(model, dict):
+                states = None
+                spec = model
+            else:
+                message = "{}the model {} must be a specification or a component. Given {}".format(
+                    self._error_message, name, type(model)
+                )
+                raise TypeError(message)
+
+            # The replicas are built from the specification since networks
+            # cannot be copied
+            self._replicas[name] = queue.Queue()
+            for _ in range(num_workers):
+                replica = GenericComponent.from_spec(spec)
+                self._replicas[name].put(replica)
+
+            self._states[name] = deepcopy(replica.get_states()) if states is None else states
+            self._locks[name] = threading.Lock()
+
+        self._executor = ThreadPoolExecutor(max_workers=num_workers)
+        self._num_workers = num_workers
+        self._thread = None
+
+        for name, inputs in (warmup_inputs or {}).items():
+            self.run(name, inputs, update_states=False)
+
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.remove(address)
+            self._server = socketserver.ThreadingUnixStreamServer(address, _RequestHandler)
+        else:
+            self._server = socketserver.ThreadingTCPServer(("127.0.0.1", address), _RequestHandler)
+
+        self._server.daemon_threads = True
+        self._server.service = self
+
+    def get_address(self):
+        """
+        This method returns the address of the service, to be used by the
+        clients.
+
+        Returns
+        -------
+        str or tuple(str, int)
+            Path of the Unix socket or host and port of the TCP server
+        """
+
+        return self._server.server_address
+
+    def serve_forever(self):
+        """
+        This method serves the requests until shutdown is called.
+        """
+
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        This method serves the requests in a background thread.
+        """
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        """
+        This method stops the service and releases the socket and the
+        workers.
+        """
+
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+
+        self._server.server_close()
+        self._executor.shutdown()
+
+        if isinstance(self._server.server_address, str) and os.path.exists(self._server.server_address):
+            os.remove(self._server.server_address)
+
+    def run(self, model, inputs, states=None, update_states=True):
+        """
+        This method solves a model. It is called for each request "run" but
+        can be called also directly.
+
+        Parameters
+        ----------
+        model : str
+            Name of the model
+        inputs : list(numpy.ndarray) or dict(str : list(numpy.ndarray))
+            Inputs of the model. If the model is a Network, dictionary with
+            the inputs of each node.
+        states : dict
+            Initial states. If None, the warm states of the model are used.
+            Only some states can be given: the others are the warm ones.
+        update_states : bool
+            If True, the final states become the warm states of the model.
+
+        Returns
+        -------
+        dict
+            Dictionary with keys 'outputs' (outputs of the model), 'states'
+            (final states), and 'time' (seconds spent solving the model).
+        """
+
+        self._check_model(model)
+        lock = self._locks[model] if update_states else _NoLock()
+
+        with lock:
+            return self._executor.submit(self._run, model, inputs, states, update_states).result()
+
+    def get_states(self, model):
+        """
+        This method returns the warm states of a model.
+
+        Parameters
+        ----------
+        model : str
+            Name of the model
+
+        Returns
+        -------
+        dict
+            Warm states
+        """
+
+        self._check_model(model)
+        with self._locks[model]:
+            return deepcopy(self._states[model])
+
+    def set_states(self, model, states):
+        """
+        This method changes (some of) the warm states of a model.
+
+        Parameters
+        ----------
+        model : str
+            Name of the model
+        states : dict
+            States to change
+        """
+
+        self._check_model(model)
+        with self._locks[model]:
+            self._states[model].update(deepcopy(states))
+
+    def reset_states(self, model):
+        """
+        This method sets the warm states of a model to its initial states.
+
+        Parameters
+        ----------
+        model : str
+            Name of the model
+        """
+
+        self._check_model(model)
+        with self._locks[model]:
+            replica = self._replicas[model].get()
+            try:
+                replica.reset_states()
+                self._states[model] = deepcopy(replica.get_states())
+            finally:
+                self._replicas[model].put(replica)
+
+    def list_models(self):
+        """
+        This method returns the names of the models served.
+
+        Returns
+        -------
+        list(str)
+            Names of the models
+        """
+
+        return sorted(self._replicas)
+
+    # PROTECTED METHODS
+
+    def _run(self, model, inputs, states, update_states):
+        replica = self._replicas[model].get()
+
+        try:
+            start = deepcopy(self._states[model])
+            start.update(states or {})
+            replica.set_states(start)
+
+            if isinstance(replica, Network):
+                for cat, loc_in in inputs.items():
+                    replica.call_internal(cat, "set_input", input=loc_in)
+            else:
+                replica.set_input(inputs)
+
+            start_time = time.perf_counter()
+            outputs = replica.get_output()
+            elapsed = time.perf_counter() - start_time
+
+            final_states = deepcopy(replica.get_states())
+        finally:
+            self._replicas[model].put(replica)
+
+        if update_states:
+            self._states[model] = deepcopy(final_states)
+
+        return {"outputs": outputs, "states": final_states, "time": elapsed}
+
+    def _dispatch(self, request):
+        method = request.get("method")
+
+        if method == "run":
+            return self.run(
+                request["model"],
+                request["inputs"],
+                states=request.get("states"),
+                update_states=request.get("update_states", True),
+            )
+        elif method == "get_states":
+            return {"states": self.get_states(request["model"])}
+        elif method == "set_states":
+            self.set_states(request["model"], request["states"])
+            return {}
+        elif method == "reset_states":
+            self.reset_states(request["model"])
+            return {}
+        elif method == "list_models":
+            return {"models": self.list_models()}
+        elif method == "ping":
+            return {}
+
+        message = "{}unknown method {}".format(self._error_message, method)
+        raise ValueError(message)
+
+    def _check_model(self, model):
+        if model not in self._replicas:
+            message = "{}unknown model {}. Available: {}".format(self._error_message, model, self.list_models())
+            raise KeyError(message)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
+
+    def __repr__(self):
+        str = "Module: superflexPy\nForecastServer class\n"
+        str += "Address: {}\n".format(self.get_address())
+        str += "Models: {}\n".format(self.list_models())
+        str += "Workers: {}\n".format(self._num_workers)
+
+        return str
+
+
+class ForecastClient:
+    """
+    This class implements the client of the forecast service. A client keeps
+    its connection open and sends one request at a time; concurrent requests
+    need different clients.
+    """
+
+    def __init__(self, address, timeout=None):
+        """
+        This is the initializer of the class ForecastClient.
+
+        Parameters
+        ----------
+        address : str or tuple(str, int)
+            Path of the Unix socket or host and port of the service (see
+            ForecastServer.get_address).
+        timeout : float
+            Timeout of the socket operations, in seconds. If None, the client
+            waits indefinitely.
+        """
+
+        if isinstance(address, str):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self._socket.settimeout(timeout)
+        self._socket.connect(tuple(address) if isinstance(address, list) else address)
+
+    def run(self, model, inputs, states=None, update_states=True):
+        """
+        This method solves a model on the service. See ForecastServer.run.
+
+        Returns
+        -------
+        list(numpy.ndarray) or dict(str : list(numpy.ndarray)), dict
+            Outputs and final states of the model
+        """
+
+        response = self._request("run", model=model, inputs=inputs, states=states, update_states=update_states)
+
+        return response["outputs"], response["states"]
+
+    def get_states(self, model):
+        """
+        This method returns the warm states of a model.
+        """
+
+        return self._request("get_states", model=model)["states"]
+
+    def set_states(self, model, states):
+        """
+        This method changes (some of) the warm states of a model.
+        """
+
+        self._request("set_states", model=model, states=states)
+
+    def reset_states(self, model):
+        """
+        This method sets the warm states of a model to its initial states.
+        """
+
+        self._request("reset_states", model=model)
+
+    def list_models(self):
+        """
+        This method returns the names of the models served.
+        """
+
+        return self._request("list_models")["models"]
+
+    def close(self):
+        """
+        This method closes the connection.
+        """
+
+        self._socket.close()
+
+    # PROTECTED METHODS
+
+    def _request(self, method, **kwargs):
+        _send_message(self._socket, dict(kwargs, method=method))
+        response = _receive_message(self._socket)
+
+        if response is None:
+            raise ConnectionError("module : superflexPy, ForecastClient , Error message : connection closed")
+
+        if response["status"] != "ok":
+            raise RuntimeError(response["message"])
+
+        return response
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """
+    This class serves the requests of a connection, until it is closed.
+    """
+
+    def handle(self):
+        while True:
+            try:
+                request = _receive_message(self.request)
+            except ConnectionError:
+                return
+
+            if request is None:
+                return
+
+            try:
+                response = self.server.service._dispatch(request)
+                response["status"] = "ok"
+            except Exception as e:
+                response = {"status": "error", "message": "{}: {}".format(type(e).__name__, e)}
+
+            _send_message(self.request, response)
+
+
+class _NoLock:
+    """
+    Context manager that does nothing, used instead of a lock
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+
+def _encode(obj, buffers):
+    """
+    This function replaces the arrays contained in obj (also in lists and
+    dictionaries) with their descriptions, appending the arrays to buffers.
+    """
+
+    if isinstance(obj, np.ndarray):
+        buffers.append(np.ascontiguousarray(obj))
+        return {"__array__": len(buffers) - 1, "dtype": obj.dtype.str, "shape": list(obj.shape)}
+    elif isinstance(obj, dict):
+        return {k: _encode(v, buffers) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_encode(v, buffers) for v in obj]
+    elif isinstance(obj, np.generic):
+        return obj.item()
+
+    return obj
+
+
+def _decode(obj, buffers):
+    """
+    This function restores the arrays described in obj.
+    """
+
+    if isinstance(obj, dict):
+        if "__array__" in obj:
+            array = np.frombuffer(buffers[obj["__array__"]], dtype=np.dtype(obj["dtype"]))
+            return array.reshape(obj["shape"])
+        return {k: _decode(v, buffers) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_decode(v, buffers) for v in obj]
+
+    return obj
+
+
+def _send_message(sock, message):
+    """
+    This function sends a message: the length of the JSON part, the JSON
+    part (message without arrays and sizes of the arrays), and the bytes of
+    the arrays.
+    """
+
+    buffers = []
+    header = json.dumps({"message": _encode(message, buffers), "buffers": [b.nbytes for b in buffers]}).encode()
+
+    sock.sendall(_HEADER.pack(len(header)) + header)
+    for b in buffers:
+        if b.nbytes:
+            sock.sendall(b.reshape(-1).view(np.uint8))
+
+
+def _receive_message(sock):
+    """
+    This function receives a message sent by _send_message. It returns None
+    if the connection is closed before the message starts.
+    """
+
+    size = _receive_bytes(sock, _HEADER.size, allow_eof=True)
+
+    if size is None:
+        return None
+
+    header = json.loads(bytes(_receive_bytes(sock, _HEADER.unpack(size)[0])))
+    buffers = [_receive_bytes(sock, n) for n in header["buffers"]]
+
+    return _decode(header["message"], buffers)
+
+
+def _receive_bytes(sock, size, allow_eof=False):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+
+    while received < size:
+        n = sock.recv_into(view[received:])
+
+        if n == 0:
+            if allow_eof and received == 0:
+                return None
+            raise ConnectionError("module : superflexPy, service , Error message : connection closed")
+
+        received += n
+
+    return data
+
+
+def main(argv=None):
+    """
+    This function starts the service from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="SuperflexPy forecast service")
+    parser.add_argument(
+        "--model",
+        action="append",
+        required=True,
+        metavar="NAME=SPEC",
+        help="name of a model and path of its specification (JSON). Can be repeated.",
+    )
+    parser.add_argument("--address", default=None, help="path of the Unix socket")
+    parser.add_argument("--port", type=int, default=None, help="port on localhost (instead of a Unix socket)")
+    parser.add_argument("--workers", type=int, default=1, help="number of requests solved concurrently")
+    args = parser.parse_args(argv)
+
+    models = {}
+    for m in args.model:
+        name, path = m.split("=", 1)
+        with open(path, "r") as f:
+            models[name] = json.load(f)
+
+    address = args.port if args.port is not None else args.address
+    if address is None:
+        parser.error("either --address or --port is required")
+
+    server = ForecastServer(models, address, num_workers=args.workers)
+    print("Serving {} on {}".format(server.list_models(), server.get_address()), flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,10 @@ This file contains the implementation of the Unit class.
 
 from copy import copy, deepcopy
 
+from ..utils.buffer_arena import BufferArena
 from ..utils.generic_component import GenericComponent
+from ..utils.memory import retained_bytes
+from ..utils.spec import class_path
 
 
 class Unit(GenericComponent):
@@ -78,6 +81,8 @@ class Unit(GenericComponent):
             self._layers = layers
 
         self.id = id
+        self._arena = None
+        self._buffer_plan = {}
 
         self._check_layers()
         self.add_prefix_parameters(id)
@@ -114,6 +119,9 @@ class Unit(GenericComponent):
             List containing the output fluxes of the unit.
         """
 
+        if self._arena is not None:
+            self._prepare_buffers(len(self.input[0]))
+
         # Set the first layer (it must have 1 element)
         self._layers[0][0].set_input(self.input)
 
@@ -176,6 +184,43 @@ class Unit(GenericComponent):
         self._construct_dictionary()
         self._check_layers()
 
+        if self._arena is not None:
+            self.enable_buffer_arena(self._recycle_buffers)
+
+    def enable_buffer_arena(self, recycle=True):
+        """
+        This method makes the elements that route the fluxes (e.g., Splitter
+        and Junction) write their outputs in preallocated buffers, which are
+        reused in the following runs instead of allocating new arrays. The
+        buffers are reallocated only when the length of the inputs changes.
+        The outputs of the last layer, returned by get_output, are never
+        stored in the buffers.
+
+        Parameters
+        ----------
+        recycle : bool
+            True if a buffer is reused, within the same run, as soon as the
+            flux it contains has been used by all the downstream elements. This
+            reduces the memory needed but the inputs stored in the elements
+            for post-run inspection (e.g., get_output with solve=False) may be
+            overwritten. If False, each flux has its own buffer.
+        """
+
+        self._recycle_buffers = recycle
+        self._plan_buffers()
+
+    def disable_buffer_arena(self):
+        """
+        This method makes the elements allocate new arrays for their outputs
+        at every run.
+        """
+
+        for layer_num, el_num in self._buffer_plan:
+            self._layers[layer_num][el_num].set_output_buffers(None)
+
+        self._arena = None
+        self._buffer_plan = {}
+
     # def parse_structure(self, structure):
     #     raise NotImplementedError('Functionality in the TODO list')
 
@@ -318,6 +363,126 @@ class Unit(GenericComponent):
             l, el = self._content_pointer[k]
             self._content[(l, el)] = self._layers[l][el]
 
+    def _plan_buffers(self):
+        """
+        This method decides which buffer stores each flux written by the
+        elements. It follows the fluxes through the layers to find when each
+        of them is used for the last time (passing through elements like
+        Transparent and Linker extends its lifetime). If the buffers are
+        recycled, fluxes whose lifetimes do not overlap share the same buffer.
+        """
+
+        lifetime = []  # For each flux: [layer where it is written, last layer where it is read]
+        layout = {}  # Layout of the outputs of the elements that write in buffers
+
+        def new_buffer():
+            lifetime.append([layer_num, layer_num])
+            return len(lifetime) - 1
+
+        def fluxes(loc_layout):
+            if loc_layout is None:
+                return []
+            elif isinstance(loc_layout, list):
+                return [f for lay in loc_layout for f in fluxes(lay)]
+            else:
+                return [loc_layout]
+
+        outputs = [None]  # The input of the unit is not stored in the buffers
+
+        for layer_num, layer in enumerate(self._layers):
+            ind = 0
+            next_outputs = []
+
+            for el_num, el in enumerate(layer):
+                if el.num_upstream == 1:
+                    loc_in = outputs[ind]
+                else:
+                    loc_in = outputs[ind : ind + el.num_upstream]
+                ind += el.num_upstream
+
+                # The inputs are alive until the element is solved
+                for f in fluxes(loc_in):
+                    lifetime[f][1] = max(lifetime[f][1], layer_num)
+
+                num_buffers = len(lifetime)
+                loc_out = el._get_output_layout(loc_in, new_buffer)
+
+                if len(lifetime) > num_buffers:
+                    layout[(layer_num, el_num)] = loc_out
+
+                if el.num_downstream == 1:
+                    next_outputs.append(loc_out)
+                else:
+                    next_outputs.extend(loc_out)
+
+            outputs = next_outputs
+
+        # The outputs of the unit must not be overwritten
+        escaping = set(fluxes(outputs))
+
+        # Assign the buffers
+        flux_to_buffer = {}
+        buffer_free_from = []  # Layer from which each buffer can be reused
+
+        for f, (first, last) in enumerate(lifetime):
+            if f in escaping:
+                continue
+
+            for b, free_from in enumerate(buffer_free_from):
+                if self._recycle_buffers and free_from <= first:
+                    break
+            else:
+                b = len(buffer_free_from)
+                buffer_free_from.append(None)
+
+            flux_to_buffer[f] = b
+            buffer_free_from[b] = last + 1
+
+        def to_buffers(loc_layout):
+            if isinstance(loc_layout, list):
+                return [to_buffers(lay) for lay in loc_layout]
+            else:
+                return flux_to_buffer.get(loc_layout, None)
+
+        self._buffer_plan = {k: to_buffers(v) for k, v in layout.items()}
+        self._arena = BufferArena(num_buffers=len(buffer_free_from))
+
+    def _prepare_buffers(self, length):
+        """
+        This method allocates the buffers, if needed, and passes them to the
+        elements.
+
+        Parameters
+        ----------
+        length : int
+            Number of time steps of the fluxes
+        """
+
+        if not self._arena.allocate(length):
+            return
+
+        def to_arrays(loc_plan):
+            if isinstance(loc_plan, list):
+                return [to_arrays(p) for p in loc_plan]
+            elif loc_plan is None:
+                return None
+            else:
+                return self._arena.get(loc_plan)
+
+        for (layer_num, el_num), loc_plan in self._buffer_plan.items():
+            self._layers[layer_num][el_num].set_output_buffers(to_arrays(loc_plan))
+
+    def _get_memory(self, seen):
+        """
+        This method returns the memory (bytes) retained directly by the unit,
+        including the buffers of the arena.
+        """
+
+        memory = super()._get_memory(seen)
+        memory["buffers"] = 0 if self._arena is None else retained_bytes(self._arena._buffers, seen)
+
+        return memory
+
     def _find_attribute_from_name(self, id, function):
         """
         This method is used to find the attributes or methods of the components
@@ -390,6 +555,29 @@ class Unit(GenericComponent):
             )
             raise ValueError(message)
 
+    def _to_spec(self, writer):
+        """
+        This method returns the specification of the unit and of its
+        elements. It is used by the method to_spec.
+        """
+
+        arguments = self._get_spec_arguments()
+        arguments["layers"] = [[el._to_spec(writer) for el in layer] for layer in self._layers]
+
+        return {"class": class_path(self.__class__), "arguments": arguments}
+
+    @classmethod
+    def _from_spec(cls, spec, reader):
+        """
+        This method creates the unit from its specification. It is used by
+        the method from_spec.
+        """
+
+        arguments = {k: deepcopy(v) for k, v in spec["arguments"].items() if k != "layers"}
+        layers = [[reader.build(el) for el in layer] for layer in spec["arguments"]["layers"]]
+
+        return cls(layers=layers, copy_pars=False, **arguments)  # The elements are new
+
     # MAGIC METHODS
 
     def __copy__(self):
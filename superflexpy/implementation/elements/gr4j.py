@@ -38,10 +38,11 @@ model for streamflow simulation, Journal of Hydrology, Volume 279, Issues 1–4,
 https://doi.org/10.1016/S0022-1694(03)00225-7, 2003.
 """
 
-import numba as nb
 import numpy as np
 
 from ...framework.element import BaseElement, LagElement, ODEsElement
+from ...utils.lazy_numba import jit
+from ...utils.memoization import MemoizationCache
 
 
 class InterceptionFilter(BaseElement):
@@ -248,8 +249,7 @@ class ProductionStore(ODEsElement):
                 ],
             )
 
-    @staticmethod
-    @nb.jit(
+    @jit(
         "Tuple((UniTuple(f8, 3), f8, f8, UniTuple(f8, 3)))"
         "(optional(f8), f8, i4, f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:])",
         nopython=True,
@@ -391,8 +391,7 @@ class RoutingStore(ODEsElement):
                 ],
             )
 
-    @staticmethod
-    @nb.jit(
+    @jit(
         "Tuple((UniTuple(f8, 3), f8, f8, UniTuple(f8, 3)))"
         "(optional(f8), f8, i4, f8[:], f8[:], f8[:], f8[:], f8[:], f8[:])",
         nopython=True,
@@ -462,6 +461,8 @@ class UnitHydrograph1(LagElement):
     This class implements the UnitHydrograph1 of GR4J.
     """
 
+    _weight_cache = MemoizationCache(max_memory=10e6)
+
     def __init__(self, parameters, states, id):
         """
         This is the initializer of the UnitHydrograph1.
@@ -486,23 +487,15 @@ class UnitHydrograph1(LagElement):
         weight = []
 
         for t in lag_time:
-            array_length = np.ceil(t)
-            w_i = []
-            for i in range(int(array_length)):
-                w_i.append(self._calculate_lag_area(i + 1, t) - self._calculate_lag_area(i, t))
-            weight.append(np.array(w_i))
+            area = self._calculate_lag_area(np.arange(int(np.ceil(t)) + 1), t)
+            weight.append(area[1:] - area[:-1])
 
         return weight
 
     @staticmethod
     def _calculate_lag_area(bin, len):
-        if bin <= 0:
-            value = 0
-        elif bin < len:
-            value = (bin / len) ** 2.5
-        else:
-            value = 1
-        return value
+        # bin is an array of non-negative values. The area is 1 after len
+        return np.minimum(bin / len, 1.0) ** 2.5
 
 
 class UnitHydrograph2(LagElement):
@@ -510,6 +503,8 @@ class UnitHydrograph2(LagElement):
     This class implements the UnitHydrograph2 of GR4J.
     """
 
+    _weight_cache = MemoizationCache(max_memory=10e6)
+
     def __init__(self, parameters, states, id):
         """
         This is the initializer of the UnitHydrograph2.
@@ -534,23 +529,14 @@ class UnitHydrograph2(LagElement):
         weight = []
 
         for t in lag_time:
-            array_length = np.ceil(t)
-            w_i = []
-            for i in range(int(array_length)):
-                w_i.append(self._calculate_lag_area(i + 1, t) - self._calculate_lag_area(i, t))
-            weight.append(np.array(w_i))
+            area = self._calculate_lag_area(np.arange(int(np.ceil(t)) + 1), t)
+            weight.append(area[1:] - area[:-1])
 
         return weight
 
     @staticmethod
     def _calculate_lag_area(bin, len):
+        # bin is an array of non-negative values. The area is 1 after len
         half_len = len / 2
-        if bin <= 0:
-            value = 0
-        elif bin < half_len:
-            value = 0.5 * (bin / half_len) ** 2.5
-        elif bin < len:
-            value = 1 - 0.5 * (2 - bin / half_len) ** 2.5
-        else:
-            value = 1
-        return value
+        x = np.minimum(bin / half_len, 2.0)
+        return np.where(bin < half_len, 0.5 * x**2.5, 1 - 0.5 * (2 - x) ** 2.5)
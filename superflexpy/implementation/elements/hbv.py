@@ -27,9 +27,8 @@ found, for example, in the HBV model.
 """
 
 
-import numba as nb
-
 from ...framework.element import ODEsElement
+from ...utils.lazy_numba import jit
 
 
 class PowerReservoir(ODEsElement):
@@ -136,8 +135,7 @@ class PowerReservoir(ODEsElement):
                 [0.0, -k[ind] * alpha[ind] * S ** (alpha[ind] - 1)],
             )
 
-    @staticmethod
-    @nb.jit(
+    @jit(
         "Tuple((UniTuple(f8, 2), f8, f8, UniTuple(f8, 2)))(optional(f8), f8, i4, f8[:], f8[:], f8[:], f8[:])",
         nopython=True,
     )
@@ -299,8 +297,7 @@ class UnsaturatedReservoir(ODEsElement):
                 ],
             )
 
-    @staticmethod
-    @nb.jit(
+    @jit(
         "Tuple((UniTuple(f8, 3), f8, f8,UniTuple(f8, 3)))"
         "(optional(f8), f8, i4, f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:])",
         nopython=True,
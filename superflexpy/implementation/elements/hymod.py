@@ -41,9 +41,10 @@ https://doi.org/10.5194/hess-5-13-2001, 2001.
 """
 
 
-import numba as nb
+import numpy as np
 
 from ...framework.element import ODEsElement
+from ...utils.lazy_numba import jit
 
 
 class UpperZone(ODEsElement):
@@ -188,8 +189,7 @@ class UpperZone(ODEsElement):
                 ],
             )
 
-    @staticmethod
-    @nb.jit(
+    @jit(
         "Tuple((UniTuple(f8, 3), f8, f8, UniTuple(f8, 3)))"
         "(optional(f8), f8, i4, f8[:], f8[:], f8[:], f8[:], f8[:], f8[:])",
         nopython=True,
@@ -317,10 +317,7 @@ class LinearReservoir(ODEsElement):
                 [0.0, -k[ind]],
             )
 
-    @staticmethod
-    @nb.jit(
-        "Tuple((UniTuple(f8, 2), f8, f8, UniTuple(f8, 2)))(optional(f8), f8, i4, f8[:], f8[:], f8[:])", nopython=True
-    )
+    @jit("Tuple((UniTuple(f8, 2), f8, f8, UniTuple(f8, 2)))(optional(f8), f8, i4, f8[:], f8[:], f8[:])", nopython=True)
     def _fluxes_function_numba(S, S0, ind, P, k, dt):
         # This method is used only when solving the equation
 
@@ -333,3 +330,134 @@ class LinearReservoir(ODEsElement):
             S0 + P[ind] * dt[ind],
             (0.0, -k[ind]),
         )
+
+
+class LinearReservoirCascade(ODEsElement):
+    """
+    This class implements the cascade of three linear reservoirs used for the
+    channel routing of Hymod as a single element. The three states are solved
+    together, as a coupled system, therefore the element requires a numerical
+    approximator for coupled ODEs (e.g. ImplicitEulerCoupledPython).
+    """
+
+    def __init__(self, parameters, states, approximation, id):
+        """
+        This is the initializer of the class LinearReservoirCascade.
+
+        Parameters
+        ----------
+        parameters : dict
+            Parameters of the element. The keys must be:
+            - 'k' : multiplier of the state (same for all the reservoirs)
+        states : dict
+            Initial state of the element. The keys must be:
+            - 'S1' : initial storage of the first reservoir.
+            - 'S2' : initial storage of the second reservoir.
+            - 'S3' : initial storage of the third reservoir.
+        approximation : superflexpy.utils.numerical_approximation.NumericalApproximator
+            Numerial method used to approximate the differential equation
+        id : str
+            Itentifier of the element. All the elements of the framework must
+            have an id.
+        """
+
+        ODEsElement.__init__(self, parameters=parameters, states=states, approximation=approximation, id=id)
+
+        self._fluxes_python = [self._fluxes_function_python]  # Used by get fluxes, regardless of the architecture
+
+        if approximation.architecture == "numba":
+            self._fluxes = [self._fluxes_function_numba]
+        elif approximation.architecture == "python":
+            self._fluxes = [self._fluxes_function_python]
+
+    # METHODS FOR THE USER
+
+    def set_input(self, input):
+        """
+        Set the input of the element.
+
+        Parameters
+        ----------
+        input : list(numpy.ndarray)
+            List containing the input fluxes of the element. It contains 1
+            flux:
+            1. Rainfall
+        """
+
+        self.input = {"P": input[0]}
+
+    def get_output(self, solve=True):
+        """
+        This method solves the differential equations governing the cascade.
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            Output fluxes in the following order:
+            1. Streamflow (Q) of the last reservoir
+        """
+
+        if solve:
+            self._solver_states = [self._states[self._prefix_states + s] for s in ["S1", "S2", "S3"]]
+            self._solve_differential_equation()
+
+            # Update the state
+            self.set_states(
+                {self._prefix_states + s: self.state_array[-1, i] for i, s in enumerate(["S1", "S2", "S3"])}
+            )
+
+        fluxes = self._num_app.get_fluxes(
+            fluxes=self._fluxes_python,
+            S=self.state_array,
+            S0=self._solver_states,
+            dt=self._dt,
+            **self.input,
+            **{k[len(self._prefix_parameters) :]: self._parameters[k] for k in self._parameters},
+        )
+
+        return [-fluxes[0][3]]
+
+    # PROTECTED METHODS
+
+    @staticmethod
+    def _fluxes_function_python(S, S0, ind, P, k, dt):
+        if ind is None:
+            return (
+                [
+                    P,
+                    -k * S[:, 0],
+                    -k * S[:, 1],
+                    -k * S[:, 2],
+                ],
+                np.zeros(3),
+                np.cumsum(S0) + np.reshape(P * dt, (-1, 1)),
+            )
+        else:
+            return (
+                np.array([P[ind] - k[ind] * S[0], k[ind] * (S[0] - S[1]), k[ind] * (S[1] - S[2])]),
+                np.zeros(3),
+                np.cumsum(S0) + P[ind] * dt[ind],
+                np.array([[-k[ind], 0.0, 0.0], [k[ind], -k[ind], 0.0], [0.0, k[ind], -k[ind]]]),
+            )
+
+    @jit(
+        "Tuple((f8[:], f8[:], f8[:], f8[:, :]))(f8[:], f8[:], i4, f8[:], f8[:], f8[:])",
+        nopython=True,
+    )
+    def _fluxes_function_numba(S, S0, ind, P, k, dt):
+        # This method is used only when solving the equation
+
+        rates = np.array([P[ind] - k[ind] * S[0], k[ind] * (S[0] - S[1]), k[ind] * (S[1] - S[2])])
+
+        jacobian = np.zeros((3, 3))
+        for i in range(3):
+            jacobian[i, i] = -k[ind]
+            if i > 0:
+                jacobian[i, i - 1] = k[ind]
+
+        return (
+            rates,
+            np.zeros(3),
+            np.cumsum(S0) + P[ind] * dt[ind],
+            jacobian,
+        )
@@ -28,7 +28,11 @@ complete the structure of the model.
 
 from copy import deepcopy
 
+import numpy as np
+
 from ...framework.element import BaseElement
+from ...utils.buffer_arena import locate_rows
+from ...utils.lazy_numba import jit
 
 
 class Splitter(BaseElement):
@@ -39,6 +43,12 @@ class Splitter(BaseElement):
 
     _num_upstream = 1
 
+    _output_buffers = None
+    """
+    Buffers where the outputs are written (see set_output_buffers). If None,
+    new arrays are created.
+    """
+
     def __init__(self, weight, direction, id):
         """
         This is the initializer of the class Splitter.
@@ -71,6 +81,7 @@ class Splitter(BaseElement):
         self._direction = direction
         self._weight = weight
         self._num_downstream = len(weight)
+        self._output_buffers = None
 
     # METHODS FOR THE USER
 
@@ -153,10 +164,44 @@ class Splitter(BaseElement):
             for j in range(len(self._weight[i])):
                 if self._direction[i][j] is None:
                     continue
-                output[-1].append(self.input[self._direction[i][j]] * self._weight[i][self._direction[i][j]])
+
+                flux = self.input[self._direction[i][j]]
+                weight = self._weight[i][self._direction[i][j]]
+
+                if self._output_buffers is None or self._output_buffers[i][len(output[-1])] is None:
+                    output[-1].append(flux * weight)
+                else:
+                    output[-1].append(np.multiply(flux, weight, out=self._output_buffers[i][len(output[-1])]))
 
         return output
 
+    def set_output_buffers(self, buffers):
+        """
+        This method sets the arrays where the outputs are written, avoiding
+        to allocate new arrays at every run. It is used by the Unit.
+
+        Parameters
+        ----------
+        buffers : list(list(numpy.ndarray))
+            Arrays with the same structure of the output. If an array is None,
+            the corresponding output is allocated when solving the element. If
+            None, all the outputs are allocated.
+        """
+
+        self._output_buffers = buffers
+
+    # PROTECTED METHODS
+
+    def _get_output_layout(self, input_layout, new_buffer):
+        return [[new_buffer() for d in direction if d is not None] for direction in self._direction]
+
+    def _get_init_arguments(self):
+        arguments = BaseElement._get_init_arguments(self)
+        arguments["weight"] = self._weight
+        arguments["direction"] = self._direction
+
+        return arguments
+
     # MAGIC METHODS
 
     def __copy__(self):
@@ -185,6 +230,12 @@ class Junction(BaseElement):
 
     _num_downstream = 1
 
+    _output_buffers = None
+    """
+    Buffers where the outputs are written (see set_output_buffers). If None,
+    new arrays are created.
+    """
+
     def __init__(self, direction, id):
         """
         This is the initializer of the class Junction.
@@ -207,6 +258,7 @@ class Junction(BaseElement):
         BaseElement.__init__(self, id)
         self._direction = direction
         self._num_upstream = len(direction[0])
+        self._output_buffers = None
 
     # METHODS FOR THE USER
 
@@ -260,14 +312,51 @@ class Junction(BaseElement):
         output = [0] * len(self._direction)
 
         for i in range(len(self._direction)):
+            buffer = None if self._output_buffers is None else self._output_buffers[i]
+            empty = True
+
             for j in range(len(self._direction[i])):
                 if self._direction[i][j] is None:
                     continue
 
-                output[i] += self.input[j][self._direction[i][j]]
+                if buffer is None:
+                    output[i] += self.input[j][self._direction[i][j]]
+                elif empty:
+                    np.copyto(buffer, self.input[j][self._direction[i][j]])
+                    output[i] = buffer
+                else:
+                    np.add(buffer, self.input[j][self._direction[i][j]], out=buffer)
+
+                empty = False
 
         return output
 
+    def set_output_buffers(self, buffers):
+        """
+        This method sets the arrays where the outputs are written, avoiding
+        to allocate new arrays at every run. It is used by the Unit.
+
+        Parameters
+        ----------
+        buffers : list(numpy.ndarray)
+            Arrays with the same structure of the output. If an array is None,
+            the corresponding output is allocated when solving the element. If
+            None, all the outputs are allocated.
+        """
+
+        self._output_buffers = buffers
+
+    # PROTECTED METHODS
+
+    def _get_output_layout(self, input_layout, new_buffer):
+        return [new_buffer() for _ in self._direction]
+
+    def _get_init_arguments(self):
+        arguments = BaseElement._get_init_arguments(self)
+        arguments["direction"] = self._direction
+
+        return arguments
+
     # MAGIC METHODS
 
     def __copy__(self):
@@ -370,6 +459,17 @@ class Linker(BaseElement):
 
         return output
 
+    # PROTECTED METHODS
+
+    def _get_output_layout(self, input_layout, new_buffer):
+        return [input_layout[d] for d in self._direction]
+
+    def _get_init_arguments(self):
+        arguments = BaseElement._get_init_arguments(self)
+        arguments["direction"] = self._direction
+
+        return arguments
+
     # MAGIC METHODS
 
     def __copy__(self):
@@ -421,3 +521,515 @@ class Transparent(BaseElement):
             List of outputs of the element.
         """
         return self.input
+
+    # PROTECTED METHODS
+
+    def _get_output_layout(self, input_layout, new_buffer):
+        return input_layout
+
+
+class SplitterNumba(Splitter):
+    """
+    This class implements a Splitter that routes the fluxes using a compiled
+    kernel. The direction and weight lists are transformed, when set, in
+    arrays of indices and coefficients (see get_routing) that can be used with
+    the function route_fluxes also inside other numba kernels.
+
+    The input fluxes are copied in an array that is kept among runs. If the
+    Unit provides the output buffers (see Unit.enable_buffer_arena), the
+    outputs are written directly in them.
+
+    Only the routing is compiled: a Unit containing these elements still
+    calls them one at a time from python. Solving a whole Unit in nopython
+    mode requires a kernel, written by the user, that composes route_fluxes
+    with the numba functions of the other elements.
+    """
+
+    _input_block = None
+    """
+    2D array where the input fluxes are copied before routing them.
+    """
+
+    _output_block = None
+    """
+    2D array containing the output buffers (see set_output_buffers). If None,
+    the outputs are allocated by route_fluxes.
+    """
+
+    _block_rows = None
+    """
+    Row of _output_block corresponding to each output flux.
+    """
+
+    _memory_attributes = dict(
+        Splitter._memory_attributes,
+        buffers=Splitter._memory_attributes["buffers"] + ["_input_block"],
+    )
+
+    _pickle_exclude = Splitter._pickle_exclude + ["_input_block", "_output_block", "_block_rows"]
+
+    def __init__(self, weight, direction, id):
+        """
+        This is the initializer of the class SplitterNumba. See the
+        documentation of Splitter for details.
+        """
+
+        Splitter.__init__(self, weight=weight, direction=direction, id=id)
+        self._build_routing()
+
+    # METHODS FOR THE USER
+
+    def set_weight(self, weight):
+        """
+        This method sets the weight of the element and updates the routing
+        arrays. See the documentation of Splitter for details.
+        """
+        Splitter.set_weight(self, weight)
+        self._build_routing()
+
+    def set_direction(self, direction):
+        """
+        This method sets the direction of the element and updates the routing
+        arrays. See the documentation of Splitter for details.
+        """
+        Splitter.set_direction(self, direction)
+        self._build_routing()
+
+    def get_routing(self):
+        """
+        This method returns the routing arrays of the element.
+
+        Returns
+        -------
+        numpy.ndarray, numpy.ndarray, numpy.ndarray, int
+            Index of the input flux, index of the output flux, coefficient,
+            and number of output fluxes. The outputs of all the downstream
+            elements are numbered consecutively.
+        """
+
+        return self._in_row, self._out_row, self._coeff, self._num_out
+
+    def get_output(self, solve=True):
+        """
+        This method returns the output of the splitter to the downstream
+        elements.
+
+        Returns
+        -------
+        list(list(numpy.ndarray))
+            List of output fluxes. Each element of the external list goes to
+            an element downstream
+        """
+
+        self._input_block = _fill_input_block(self._input_block, [self.input])  # Batch mode: 2D fluxes
+        fluxes = self._input_block
+
+        if _can_write_block(self._output_block, self._block_rows, fluxes, self._num_out):
+            route_fluxes_into(fluxes, self._in_row, self._out_row, self._coeff, self._output_block, self._block_rows)
+            return [list(buffers) for buffers in self._output_buffers]
+
+        routed = route_fluxes(fluxes, *self.get_routing())
+        routed = routed.reshape((-1,) + np.shape(self.input[0]))
+
+        return [list(routed[start:end]) for start, end in zip(self._offsets[:-1], self._offsets[1:])]
+
+    def set_output_buffers(self, buffers):
+        """
+        This method sets the arrays where the outputs are written. See the
+        documentation of Splitter for details. The outputs are written by the
+        kernel only if all the buffers are rows of the same 2D array, as the
+        ones provided by the Unit; otherwise they are allocated.
+        """
+
+        Splitter.set_output_buffers(self, buffers)
+        flat = [] if buffers is None else [b for loc_buffers in buffers for b in loc_buffers]
+        self._output_block, self._block_rows = locate_rows(flat)
+
+    # PROTECTED METHODS
+
+    def _build_routing(self):
+        in_row = []
+        coeff = []
+        self._offsets = [0]
+
+        for i in range(len(self._weight)):
+            for j in range(len(self._weight[i])):
+                if self._direction[i][j] is None:
+                    continue
+
+                in_row.append(self._direction[i][j])
+                coeff.append(self._weight[i][self._direction[i][j]])
+
+            self._offsets.append(len(in_row))
+
+        self._in_row = np.array(in_row, dtype=np.int64)
+        self._out_row = np.arange(len(in_row), dtype=np.int64)
+        self._coeff = np.array(coeff, dtype=np.float64)
+        self._num_out = len(in_row)
+
+
+class JunctionNumba(Junction):
+    """
+    This class implements a Junction that routes the fluxes using a compiled
+    kernel. The direction list is transformed, when set, in arrays of indices
+    (see get_routing) that can be used with the function route_fluxes also
+    inside other numba kernels. Differently from Junction, outputs without
+    contributions are arrays of zeros.
+
+    As in SplitterNumba, the input fluxes are copied in an array that is kept
+    among runs and the outputs are written in the buffers of the Unit, when
+    provided.
+    """
+
+    _input_block = None
+    """
+    2D array where the input fluxes are copied before routing them.
+    """
+
+    _output_block = None
+    """
+    2D array containing the output buffers (see set_output_buffers). If None,
+    the outputs are allocated by route_fluxes.
+    """
+
+    _block_rows = None
+    """
+    Row of _output_block corresponding to each output flux.
+    """
+
+    _memory_attributes = dict(
+        Junction._memory_attributes,
+        buffers=Junction._memory_attributes["buffers"] + ["_input_block"],
+    )
+
+    _pickle_exclude = Junction._pickle_exclude + ["_input_block", "_output_block", "_block_rows"]
+
+    def __init__(self, direction, id):
+        """
+        This is the initializer of the class JunctionNumba. See the
+        documentation of Junction for details.
+        """
+
+        Junction.__init__(self, direction=direction, id=id)
+        self._build_routing()
+
+    # METHODS FOR THE USER
+
+    def set_direction(self, direction):
+        """
+        This method sets the direction of the element and updates the routing
+        arrays. See the documentation of Junction for details.
+        """
+        Junction.set_direction(self, direction)
+        self._build_routing()
+
+    def get_routing(self, num_fluxes):
+        """
+        This method returns the routing arrays of the element.
+
+        Parameters
+        ----------
+        num_fluxes : list(int)
+            Number of fluxes coming from each upstream element. The inputs are
+            numbered consecutively, starting from the first upstream element.
+
+        Returns
+        -------
+        numpy.ndarray, numpy.ndarray, numpy.ndarray, int
+            Index of the input flux, index of the output flux, coefficient,
+            and number of output fluxes.
+        """
+
+        num_fluxes = tuple(num_fluxes)
+
+        if num_fluxes not in self._routing:
+            offsets = np.concatenate(([0], np.cumsum(num_fluxes))).astype(np.int64)
+            in_row = offsets[self._upstream] + self._flux_index
+            self._routing[num_fluxes] = (in_row, self._out_row, self._coeff, len(self._direction))
+
+        return self._routing[num_fluxes]
+
+    def get_output(self, solve=True):
+        """
+        This method returns the output of the junction to the downstream
+        element.
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            List of output fluxes.
+        """
+
+        self._input_block = _fill_input_block(self._input_block, self.input)  # Batch mode: 2D fluxes
+        fluxes = self._input_block
+        in_row, out_row, coeff, num_out = self.get_routing([len(loc_in) for loc_in in self.input])
+
+        if _can_write_block(self._output_block, self._block_rows, fluxes, num_out):
+            route_fluxes_into(fluxes, in_row, out_row, coeff, self._output_block, self._block_rows)
+            return list(self._output_buffers)
+
+        routed = route_fluxes(fluxes, in_row, out_row, coeff, num_out)
+
+        return list(routed.reshape((-1,) + np.shape(next(f for loc_in in self.input for f in loc_in))))
+
+    def set_output_buffers(self, buffers):
+        """
+        This method sets the arrays where the outputs are written. See the
+        documentation of Junction for details. The outputs are written by the
+        kernel only if all the buffers are rows of the same 2D array, as the
+        ones provided by the Unit; otherwise they are allocated.
+        """
+
+        Junction.set_output_buffers(self, buffers)
+        self._output_block, self._block_rows = locate_rows([] if buffers is None else buffers)
+
+    # PROTECTED METHODS
+
+    def _build_routing(self):
+        upstream = []
+        flux_index = []
+        out_row = []
+
+        for i in range(len(self._direction)):
+            for j in range(len(self._direction[i])):
+                if self._direction[i][j] is None:
+                    continue
+
+                upstream.append(j)
+                flux_index.append(self._direction[i][j])
+                out_row.append(i)
+
+        self._routing = {}  # Routing arrays for different numbers of input fluxes
+        self._upstream = np.array(upstream, dtype=np.int64)
+        self._flux_index = np.array(flux_index, dtype=np.int64)
+        self._out_row = np.array(out_row, dtype=np.int64)
+        self._coeff = np.ones(len(out_row))
+
+
+def _fill_input_block(block, inputs):
+    """
+    This function copies the input fluxes in the rows of a 2D array. The
+    array is allocated again only if its shape changes. Multidimensional
+    fluxes (batch mode) are flattened.
+
+    Parameters
+    ----------
+    block : numpy.ndarray
+        2D array used in the previous run. If None, it is allocated.
+    inputs : list(list(numpy.ndarray))
+        Input fluxes of each upstream element
+
+    Returns
+    -------
+    numpy.ndarray
+        2D array (number of input fluxes, number of values per flux)
+    """
+
+    num_fluxes = sum(len(loc_in) for loc_in in inputs)
+    shape = (num_fluxes, np.size(next(f for loc_in in inputs for f in loc_in)) if num_fluxes else 0)
+
+    if block is None or block.shape != shape:
+        block = np.empty(shape)
+
+    row = 0
+    for loc_in in inputs:
+        for flux in loc_in:
+            block[row] = np.ravel(flux)
+            row += 1
+
+    return block
+
+
+def _can_write_block(output_block, block_rows, fluxes, num_out):
+    # The buffers must exist and match the fluxes. num_out is checked since
+    # route_fluxes_into does not check the bounds of block_rows.
+    return output_block is not None and output_block.shape[1] == fluxes.shape[1] and len(block_rows) == num_out
+
+
+class LinkerNumba(Linker):
+    """
+    This class implements a Linker whose direction is stored as an array of
+    indices. Since the Linker does not modify the fluxes, get_output only
+    reorders them, while get_routing provides the arrays needed to perform the
+    same operation with the function route_fluxes inside other numba kernels.
+    """
+
+    def __init__(self, direction, id):
+        """
+        This is the initializer of the class LinkerNumba. See the
+        documentation of Linker for details.
+        """
+
+        Linker.__init__(self, direction=direction, id=id)
+        self._build_routing()
+
+    # METHODS FOR THE USER
+
+    def set_direction(self, direction):
+        """
+        This method sets the direction of the element and updates the routing
+        arrays. See the documentation of Linker for details.
+        """
+        Linker.set_direction(self, direction)
+        self._build_routing()
+
+    def get_routing(self, num_fluxes):
+        """
+        This method returns the routing arrays of the element.
+
+        Parameters
+        ----------
+        num_fluxes : list(int)
+            Number of fluxes coming from each upstream element. The inputs are
+            numbered consecutively, starting from the first upstream element.
+
+        Returns
+        -------
+        numpy.ndarray, numpy.ndarray, numpy.ndarray, int
+            Index of the input flux, index of the output flux, coefficient,
+            and number of output fluxes. The outputs of all the downstream
+            elements are numbered consecutively.
+        """
+
+        num_fluxes = np.array(num_fluxes, dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(num_fluxes)))
+
+        in_row = np.concatenate(
+            [np.arange(offsets[d], offsets[d + 1], dtype=np.int64) for d in self._index] + [np.zeros(0, dtype=np.int64)]
+        )
+
+        return in_row, np.arange(len(in_row), dtype=np.int64), np.ones(len(in_row)), len(in_row)
+
+    def get_output(self, solve=True):
+        """
+        This method returns the output of the linker to the downstream
+        elements.
+
+        Returns
+        -------
+        list(list(numpy.ndarray))
+            List of output fluxes. Each element of the external list goes to
+            an element downstream
+        """
+
+        return [self.input[d] for d in self._index]
+
+    # PROTECTED METHODS
+
+    def _build_routing(self):
+        self._index = np.array(self._direction, dtype=np.int64)
+
+
+class TransparentNumba(Transparent):
+    """
+    This class implements a Transparent element that provides, through
+    get_routing, the arrays needed to use it with the function route_fluxes
+    inside other numba kernels.
+    """
+
+    # METHODS FOR THE USER
+
+    def get_routing(self, num_fluxes):
+        """
+        This method returns the routing arrays of the element.
+
+        Parameters
+        ----------
+        num_fluxes : int
+            Number of incoming fluxes.
+
+        Returns
+        -------
+        numpy.ndarray, numpy.ndarray, numpy.ndarray, int
+            Index of the input flux, index of the output flux, coefficient,
+            and number of output fluxes.
+        """
+
+        rows = np.arange(num_fluxes, dtype=np.int64)
+
+        return rows, rows, np.ones(num_fluxes), num_fluxes
+
+
+@jit(nopython=True, nogil=True)  # Units can be solved in parallel threads
+def route_fluxes(fluxes, in_row, out_row, coeff, num_out):
+    """
+    This function routes the fluxes according to the arrays returned by the
+    method get_routing of the compiled structure elements:
+
+    output[out_row[p], :] += coeff[p] * fluxes[in_row[p], :]
+
+    It is compiled with numba, releases the GIL, and can be called by other
+    numba kernels. It is the building block for such kernels: the framework
+    does not compose it into a compiled solution of a whole Unit.
+
+    Parameters
+    ----------
+    fluxes : numpy.ndarray
+        2D array (number of input fluxes, number of time steps) of fluxes
+    in_row : numpy.ndarray
+        Index of the input flux
+    out_row : numpy.ndarray
+        Index of the output flux
+    coeff : numpy.ndarray
+        Coefficient applied to the input flux
+    num_out : int
+        Number of output fluxes
+
+    Returns
+    -------
+    numpy.ndarray
+        2D array (number of output fluxes, number of time steps) of fluxes
+    """
+
+    output = np.empty((num_out, fluxes.shape[1]))
+    route_fluxes_into(fluxes, in_row, out_row, coeff, output, np.arange(num_out))
+
+    return output
+
+
+@jit(nopython=True, nogil=True)
+def route_fluxes_into(fluxes, in_row, out_row, coeff, output, rows):
+    """
+    This function works as route_fluxes but writes the output fluxes in an
+    existing array:
+
+    output[rows[out_row[p]], :] += coeff[p] * fluxes[in_row[p], :]
+
+    Only the rows listed in rows are modified: the output fluxes without
+    contributions are set to zero.
+
+    Parameters
+    ----------
+    fluxes : numpy.ndarray
+        2D array (number of input fluxes, number of time steps) of fluxes
+    in_row : numpy.ndarray
+        Index of the input flux
+    out_row : numpy.ndarray
+        Index of the output flux
+    coeff : numpy.ndarray
+        Coefficient applied to the input flux
+    output : numpy.ndarray
+        2D array where the output fluxes are written
+    rows : numpy.ndarray
+        Row of output corresponding to each output flux
+    """
+
+    written = np.zeros(len(rows), dtype=np.bool_)
+
+    for p in range(len(in_row)):
+        out = output[rows[out_row[p]]]
+        flux = fluxes[in_row[p]]
+        c = coeff[p]
+
+        # Avoid initializing the output with zeros
+        if written[out_row[p]]:
+            for t in range(len(flux)):
+                out[t] += c * flux[t]
+        else:
+            for t in range(len(flux)):
+                out[t] = c * flux[t]
+            written[out_row[p]] = True
+
+    for r in range(len(rows)):
+        if not written[r]:
+            output[rows[r], :] = 0.0
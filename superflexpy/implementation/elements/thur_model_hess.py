@@ -35,10 +35,11 @@ Sci., 24, 1319–1345, https://doi.org/10.5194/hess-24-1319-2020, 2020.
 """
 
 
-import numba as nb
 import numpy as np
 
 from ...framework.element import LagElement, ODEsElement
+from ...utils.lazy_numba import jit
+from ...utils.memoization import MemoizationCache
 
 
 class SnowReservoir(ODEsElement):
@@ -160,8 +161,7 @@ class SnowReservoir(ODEsElement):
                 [0.0, -melt_potential * np.exp(-(S / m[ind])) / m[ind]],
             )
 
-    @staticmethod
-    @nb.jit(
+    @jit(
         "Tuple((UniTuple(f8, 2), f8, f8, UniTuple(f8, 2)))"
         "(optional(f8), f8, i4, f8[:], f8[:], f8[:], f8[:], f8[:], f8[:])",
         nopython=True,
@@ -185,6 +185,8 @@ class SnowReservoir(ODEsElement):
 
 
 class HalfTriangularLag(LagElement):
+    _weight_cache = MemoizationCache(max_memory=10e6)
+
     def __init__(self, parameters, states, id):
         """
         This is the initializer of the half triangular lag function.
@@ -208,21 +210,12 @@ class HalfTriangularLag(LagElement):
         weight = []
 
         for t in lag_time:
-            array_length = np.ceil(t)
-            w_i = []
-            for i in range(int(array_length)):
-                w_i.append(self._calculate_lag_area(i + 1, t) - self._calculate_lag_area(i, t))
-            weight.append(np.array(w_i))
+            area = self._calculate_lag_area(np.arange(int(np.ceil(t)) + 1), t)
+            weight.append(area[1:] - area[:-1])
 
         return weight
 
     @staticmethod
     def _calculate_lag_area(bin, len):
-        if bin <= 0:
-            value = 0
-        elif bin < len:
-            value = (bin / len) ** 2
-        else:
-            value = 1
-
-        return value
+        # bin is an array of non-negative values. The area is 1 after len
+        return np.minimum(bin / len, 1.0) ** 2
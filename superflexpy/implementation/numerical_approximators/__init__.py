@@ -23,6 +23,6 @@ CODED BY: Marco Dal Molin
 DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
 """
 
-from . import explicit_euler, implicit_euler, runge_kutta_4
+from . import explicit_euler, implicit_euler, implicit_euler_coupled, runge_kutta_4
 
-__all__ = ["explicit_euler", "implicit_euler", "runge_kutta_4"]
+__all__ = ["explicit_euler", "implicit_euler", "implicit_euler_coupled", "runge_kutta_4"]
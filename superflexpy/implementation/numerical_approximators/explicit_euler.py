@@ -27,14 +27,16 @@ explicit Euler numerical approximation.
 """
 
 
-import numba as nb
 import numpy as np
 
+from ...utils.lazy_numba import jit
 from ...utils.numerical_approximator import NumericalApproximator
 
 
 class ExplicitEulerPython(NumericalApproximator):
-    def __init__(self, root_finder):
+    _spec_attributes = {"root_finder": "_root_finder", "clip_bounds": "_clip_bounds"}
+
+    def __init__(self, root_finder=None, clip_bounds=False):
         """
         This class creates an approximation of an ODE using explicit Euler and
         solves it (finds the value of the state that sets to zero the
@@ -45,16 +47,23 @@ class ExplicitEulerPython(NumericalApproximator):
         Parameters
         ----------
         root_finder : superflexpy.utils.RootFinder
-            Solver used to find the root of the differential equation.
+            Solver used to find the root of the differential equation. If None,
+            the state at the end of the time step is calculated directly,
+            without the indirection of the root finder.
+        clip_bounds : bool
+            Used only if root_finder is None. If True, the state at the end of
+            the time step is clipped to the minimum and maximum values returned
+            by the fluxes functions.
         """
 
         super().__init__(root_finder=root_finder)
+        self._clip_bounds = clip_bounds
 
         self.architecture = "python"
         self._error_message = "module : superflexPy, solver : explicit Euler"
         self._error_message += " Error message : "
 
-        if root_finder.architecture != "python":
+        if root_finder is not None and root_finder.architecture != "python":
             message = "{}: architecture of the root_finder must be python. Given {}".format(
                 self._error_message, root_finder.architecture
             )
@@ -64,7 +73,7 @@ class ExplicitEulerPython(NumericalApproximator):
     def _get_fluxes(fluxes, S, S0, args, dt):
         # Calculate the state used to calculate the fluxes
         S = S[:-1]
-        S = np.insert(S, 0, S0)
+        S = np.insert(S, 0, S0, axis=0)
 
         flux = fluxes(
             S, S0, None, *args
@@ -72,6 +81,12 @@ class ExplicitEulerPython(NumericalApproximator):
 
         return np.array(flux[0])  # It is a list of vectors
 
+    @staticmethod
+    def _step(fluxes, S0, dt, ind, args):
+        flux_S0, min_S, max_S = fluxes(S0, S0, ind, *args)[:3]  # [flux, min, max, df]
+
+        return (S0 + dt[ind] * sum(flux_S0), min_S, max_S)
+
     @staticmethod
     def _differential_equation(fluxes, S, S0, dt, args, ind):
         # Specify a state in case None
@@ -83,8 +98,10 @@ class ExplicitEulerPython(NumericalApproximator):
 
         fl = fluxes_out[0]
 
-        # Calculate the numerical approximation of the differential equation
-        diff_eq = (S - S0) / dt[ind] - sum(fl)
+        # Calculate the numerical approximation of the differential equation.
+        # Written as S - S_new, like Runge Kutta, since ExplicitPython and
+        # ExplicitNumba return -diff_eq(S=0)
+        diff_eq = S - (S0 + dt[ind] * sum(fl))
 
         return (
             diff_eq,  # Fun to set to zero
@@ -95,7 +112,9 @@ class ExplicitEulerPython(NumericalApproximator):
 
 
 class ExplicitEulerNumba(NumericalApproximator):
-    def __init__(self, root_finder):
+    _spec_attributes = {"root_finder": "_root_finder", "clip_bounds": "_clip_bounds"}
+
+    def __init__(self, root_finder=None, clip_bounds=False):
         """
         This class creates an approximation of an ODE using explicit Euler and
         solves it (finds the value of the state that sets to zero the
@@ -106,16 +125,23 @@ class ExplicitEulerNumba(NumericalApproximator):
         Parameters
         ----------
         root_finder : superflexpy.utils.RootFinder
-            Solver used to find the root of the differential equation.
+            Solver used to find the root of the differential equation. If None,
+            the state at the end of the time step is calculated directly,
+            without the indirection of the root finder.
+        clip_bounds : bool
+            Used only if root_finder is None. If True, the state at the end of
+            the time step is clipped to the minimum and maximum values returned
+            by the fluxes functions.
         """
 
         super().__init__(root_finder=root_finder)
+        self._clip_bounds = clip_bounds
 
         self.architecture = "numba"
         self._error_message = "module : superflexPy, solver : explicit Euler"
         self._error_message += " Error message : "
 
-        if root_finder.architecture != "numba":
+        if root_finder is not None and root_finder.architecture != "numba":
             message = "{}: architecture of the root_finder must be numba. Given {}".format(
                 self._error_message, root_finder.architecture
             )
@@ -125,7 +151,7 @@ class ExplicitEulerNumba(NumericalApproximator):
     def _get_fluxes(fluxes, S, S0, args, dt):
         # Calculate the state used to calculate the fluxes. In this way S becomes S0
         S = S[:-1]
-        S = np.insert(S, 0, S0)
+        S = np.insert(S, 0, S0, axis=0)
 
         flux = fluxes(
             S, S0, None, *args
@@ -133,8 +159,13 @@ class ExplicitEulerNumba(NumericalApproximator):
 
         return np.array(flux[0])  # It is a list of vectors
 
-    @staticmethod
-    @nb.jit(nopython=True)
+    @jit(nopython=True)
+    def _step(fluxes, S0, dt, ind, args):
+        flux_S0, min_S, max_S = fluxes(S0, S0, ind, *args)[:3]  # [flux, min, max, df]
+
+        return (S0 + dt[ind] * sum(flux_S0), min_S, max_S)
+
+    @jit(nopython=True)
     def _differential_equation(fluxes, S, S0, dt, ind, args):
         # Specify a state in case None
         if S is None:
@@ -145,8 +176,10 @@ class ExplicitEulerNumba(NumericalApproximator):
 
         fl = fluxes_out[0]
 
-        # Calculate the numerical approximation of the differential equation
-        diff_eq = (S - S0) / dt[ind] - sum(fl)
+        # Calculate the numerical approximation of the differential equation.
+        # Written as S - S_new, like Runge Kutta, since ExplicitPython and
+        # ExplicitNumba return -diff_eq(S=0)
+        diff_eq = S - (S0 + dt[ind] * sum(fl))
 
         return (
             diff_eq,  # Fun to set to zero
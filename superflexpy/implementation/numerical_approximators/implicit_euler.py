@@ -27,9 +27,9 @@ implicit Euler numerical approximation.
 """
 
 
-import numba as nb
 import numpy as np
 
+from ...utils.lazy_numba import jit
 from ...utils.numerical_approximator import NumericalApproximator
 
 
@@ -132,8 +132,7 @@ class ImplicitEulerNumba(NumericalApproximator):
 
         return np.array(flux[0])  # It is a list of vectors
 
-    @staticmethod
-    @nb.jit(nopython=True)
+    @jit(nopython=True)
     def _differential_equation(fluxes, S, S0, dt, ind, args):
         # Specify a state in case None
         if S is None:
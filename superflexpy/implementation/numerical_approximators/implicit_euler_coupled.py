@@ -0,0 +1,285 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of a class that solves systems of coupled
+ODEs using the implicit Euler numerical approximation.
+"""
+
+import inspect
+
+import numpy as np
+
+from ...utils.lazy_numba import jit
+from ...utils.numerical_approximator import NumericalApproximator
+
+
+class ImplicitEulerCoupledPython(NumericalApproximator):
+    def __init__(self, root_finder):
+        """
+        This class creates an approximation of a system of coupled ODEs using
+        implicit Euler and solves it (finds the values of the states that set
+        to zero the approximation) for all the time steps.
+
+        Differently from ImplicitEulerPython, the element must define a single
+        fluxes function for all its states. When the index of the time step is
+        given, the function must return:
+
+        - numpy.ndarray with the derivatives of the states (one per state)
+
+        - numpy.ndarray with the minimum possible values of the states
+
+        - numpy.ndarray with the maximum possible values of the states
+
+        - 2D numpy.ndarray with the Jacobian of the derivatives w.r.t. the
+          states
+
+        When the index is None (post-run evaluation of the fluxes), S is a 2D
+        array (#timesteps, #states) and the function must return the list of
+        fluxes as time series.
+
+        Parameters
+        ----------
+        root_finder : superflexpy.utils.RootFinder
+            Solver used to find the root of the system (e.g.
+            NewtonSystemPython).
+        """
+
+        NumericalApproximator.__init__(self, root_finder=root_finder)
+
+        self.architecture = "python"
+        self._error_message = "module : superflexPy, solver : implicit Euler coupled"
+        self._error_message += " Error message : "
+
+        if root_finder.architecture != "python":
+            message = "{}: architecture of the root_finder must be python. Given {}".format(
+                self._error_message, root_finder.architecture
+            )
+            raise ValueError(message)
+
+    def solve(self, fun, S0, **kwargs):
+        """
+        This method solves the approximation of the system of ODEs.
+
+        Parameters
+        ----------
+        fun : list(function)
+            List containing the fluxes function of the system. It must have
+            length 1.
+        S0 : list(float)
+            Initial states of the system.
+        **kwargs
+            Additional arguments needed by fun. It must also contain dt.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of solutions of the system. It is a 2D array with dimensions
+            (#timesteps, #states)
+        """
+
+        if len(fun) != 1:
+            message = "{}coupled systems need one fluxes function. Given {}".format(self._error_message, len(fun))
+            raise ValueError(message)
+
+        scalars, vectors, num_ts = self._split_parameters(kwargs)
+        args = self._build_arguments(fun[0], kwargs, scalars, vectors, num_ts)
+
+        return self._solve(
+            root_finder=self._root_finder.solve,
+            diff_eq=self._differential_equation,
+            fun=fun[0],
+            S0=np.array(S0, dtype=np.float64),
+            dt=kwargs["dt"],
+            num_ts=num_ts,
+            args=args,
+            root_settings=self._root_finder.get_settings(),
+        )
+
+    def get_fluxes(self, fluxes, S, S0, **kwargs):
+        """
+        This method calculates the fluxes of the system, given the states.
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            List containing the fluxes returned by the fluxes function.
+        """
+
+        # The function is only python. No need of numba in get_fluxes
+        fun_pars = list(inspect.signature(fluxes[0]).parameters)
+        args = tuple(kwargs[arg] for arg in fun_pars if arg not in ["S", "S0", "ind"])
+
+        return [self._get_fluxes(fluxes=fluxes[0], S=S, S0=np.array(S0), args=args, dt=kwargs["dt"])]
+
+    @staticmethod
+    def _solve(root_finder, diff_eq, fun, S0, dt, num_ts, args, root_settings):
+        output = np.zeros((num_ts, len(S0)))
+
+        for i in range(num_ts):
+            root = root_finder(diff_eq=diff_eq, fluxes=fun, S0=S0, dt=dt, ind=i, args=args)
+
+            output[i, :] = root
+            S0 = root
+
+        return output
+
+    @staticmethod
+    def _get_fluxes(fluxes, S, S0, args, dt):
+        flux = fluxes(S, S0, None, *args)
+
+        return np.array(flux[0])  # It is a list of vectors
+
+    @staticmethod
+    def _differential_equation(fluxes, S, S0, dt, args, ind):
+        rates, lower, upper, d_rates = fluxes(S, S0, ind, *args)
+
+        diff_eq = (S - S0) / dt[ind] - rates
+        d_diff_eq = np.eye(len(S)) / dt[ind] - d_rates
+
+        return diff_eq, lower, upper, d_diff_eq
+
+
+class ImplicitEulerCoupledNumba(NumericalApproximator):
+    def __init__(self, root_finder):
+        """
+        This class creates an approximation of a system of coupled ODEs using
+        implicit Euler and solves it (finds the values of the states that set
+        to zero the approximation) for all the time steps. The whole time loop
+        is compiled with numba.
+
+        The fluxes function must follow the specification given in
+        ImplicitEulerCoupledPython. The function used to solve the system must
+        be compiled with numba, while the one used by get_fluxes is python.
+
+        Parameters
+        ----------
+        root_finder : superflexpy.utils.RootFinder
+            Solver used to find the root of the system (e.g.
+            NewtonSystemNumba).
+        """
+
+        NumericalApproximator.__init__(self, root_finder=root_finder)
+
+        self.architecture = "numba"
+        self._error_message = "module : superflexPy, solver : implicit Euler coupled"
+        self._error_message += " Error message : "
+
+        if root_finder.architecture != "numba":
+            message = "{}: architecture of the root_finder must be numba. Given {}".format(
+                self._error_message, root_finder.architecture
+            )
+            raise ValueError(message)
+
+    def solve(self, fun, S0, **kwargs):
+        """
+        This method solves the approximation of the system of ODEs.
+
+        Parameters
+        ----------
+        fun : list(function)
+            List containing the fluxes function of the system. It must have
+            length 1.
+        S0 : list(float)
+            Initial states of the system.
+        **kwargs
+            Additional arguments needed by fun. It must also contain dt.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of solutions of the system. It is a 2D array with dimensions
+            (#timesteps, #states)
+        """
+
+        if len(fun) != 1:
+            message = "{}coupled systems need one fluxes function. Given {}".format(self._error_message, len(fun))
+            raise ValueError(message)
+
+        scalars, vectors, num_ts = self._split_parameters(kwargs)
+        args = self._build_arguments(fun[0], kwargs, scalars, vectors, num_ts)
+
+        return self._solve(
+            root_finder=self._root_finder.solve,
+            diff_eq=self._differential_equation,
+            fun=fun[0],
+            S0=np.array(S0, dtype=np.float64),
+            dt=kwargs["dt"],
+            num_ts=num_ts,
+            args=args,
+            root_settings=self._root_finder.get_settings(),
+        )
+
+    def get_fluxes(self, fluxes, S, S0, **kwargs):
+        """
+        This method calculates the fluxes of the system, given the states.
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            List containing the fluxes returned by the fluxes function.
+        """
+
+        # The function is only python. No need of numba in get_fluxes
+        fun_pars = list(inspect.signature(fluxes[0]).parameters)
+        args = tuple(kwargs[arg] for arg in fun_pars if arg not in ["S", "S0", "ind"])
+
+        return [self._get_fluxes(fluxes=fluxes[0], S=S, S0=np.array(S0), args=args, dt=kwargs["dt"])]
+
+    @jit(nopython=True, nogil=True)  # Units can be solved in parallel threads
+    def _solve(root_finder, diff_eq, fun, S0, dt, num_ts, args, root_settings):
+        output = np.zeros((num_ts, len(S0)))
+
+        for i in range(num_ts):
+            root = root_finder(
+                diff_eq=diff_eq,
+                fluxes=fun,
+                S0=S0,
+                dt=dt,
+                ind=i,
+                args=args,
+                tol_F=root_settings[0],
+                tol_x=root_settings[1],
+                iter_max=root_settings[2],
+                max_damping=root_settings[3],
+            )
+
+            output[i, :] = root
+            S0 = root
+
+        return output
+
+    @staticmethod  # I do not use numba. Do not need it
+    def _get_fluxes(fluxes, S, S0, args, dt):
+        flux = fluxes(S, S0, None, *args)
+
+        return np.array(flux[0])  # It is a list of vectors
+
+    @jit(nopython=True)
+    def _differential_equation(fluxes, S, S0, dt, ind, args):
+        rates, lower, upper, d_rates = fluxes(S, S0, ind, *args)
+
+        diff_eq = (S - S0) / dt[ind] - rates
+        d_diff_eq = np.eye(len(S)) / dt[ind] - d_rates
+
+        return diff_eq, lower, upper, d_diff_eq
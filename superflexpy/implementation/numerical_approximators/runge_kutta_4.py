@@ -26,14 +26,16 @@ This file contains the implementation a class that solved the ODEs using the
 implicit Runge Kutta of 4th order numerical approximation.
 """
 
-import numba as nb
 import numpy as np
 
+from ...utils.lazy_numba import jit
 from ...utils.numerical_approximator import NumericalApproximator
 
 
 class RungeKutta4Python(NumericalApproximator):
-    def __init__(self, root_finder):
+    _spec_attributes = {"root_finder": "_root_finder", "clip_bounds": "_clip_bounds"}
+
+    def __init__(self, root_finder=None, clip_bounds=False):
         """
         This class creates an approximation of an ODE using Runge Kutta of 4th
         order and solves it (finds the value of the state that sets to zero the
@@ -47,16 +49,23 @@ class RungeKutta4Python(NumericalApproximator):
         Parameters
         ----------
         root_finder : superflexpy.utils.RootFinder
-            Solver used to find the root of the differential equation.
+            Solver used to find the root of the differential equation. If None,
+            the state at the end of the time step is calculated directly,
+            without the indirection of the root finder.
+        clip_bounds : bool
+            Used only if root_finder is None. If True, the state at the end of
+            the time step is clipped to the minimum and maximum values returned
+            by the fluxes functions.
         """
 
         super().__init__(root_finder=root_finder)
+        self._clip_bounds = clip_bounds
 
         self.architecture = "python"
         self._error_message = "module : superflexPy, solver : Runge Kutta 4"
         self._error_message += " Error message : "
 
-        if root_finder.architecture != "python":
+        if root_finder is not None and root_finder.architecture != "python":
             message = "{}: architecture of the root_finder must be python. Given {}".format(
                 self._error_message, root_finder.architecture
             )
@@ -66,7 +75,7 @@ class RungeKutta4Python(NumericalApproximator):
     def _get_fluxes(fluxes, S, S0, args, dt):
         # Calculate the state used to calculate the fluxes
         S = S[:-1]
-        S = np.insert(S, 0, S0)  # In the following, S is actually S0
+        S = np.insert(S, 0, S0, axis=0)  # In the following, S is actually S0
 
         k1_fluxes = fluxes(S, S0, None, *args)[0]
         k2_state = S + (np.sum(k1_fluxes, axis=0) * dt) / 2
@@ -80,6 +89,18 @@ class RungeKutta4Python(NumericalApproximator):
 
         return fluxes
 
+    @staticmethod
+    def _step(fluxes, S0, dt, ind, args):
+        flux_S0, min_S, max_S = fluxes(S0, S0, ind, *args)[:3]  # [flux, min, max, df]
+
+        # Call the ks of RK
+        k1 = dt[ind] * sum(flux_S0)
+        k2 = dt[ind] * sum(fluxes(S0 + k1 / 2, S0, ind, *args)[0])
+        k3 = dt[ind] * sum(fluxes(S0 + k2 / 2, S0, ind, *args)[0])
+        k4 = dt[ind] * sum(fluxes(S0 + k3, S0, ind, *args)[0])
+
+        return (S0 + k1 / 6 + k2 / 3 + k3 / 3 + k4 / 6, min_S, max_S)
+
     @staticmethod
     def _differential_equation(fluxes, S, S0, dt, args, ind):
         # Specify a state in case None
@@ -108,7 +129,9 @@ class RungeKutta4Python(NumericalApproximator):
 
 
 class RungeKutta4Numba(NumericalApproximator):
-    def __init__(self, root_finder):
+    _spec_attributes = {"root_finder": "_root_finder", "clip_bounds": "_clip_bounds"}
+
+    def __init__(self, root_finder=None, clip_bounds=False):
         """
         This class creates an approximation of an ODE using Runge Kutta of 4th
         order and solves it (finds the value of the state that sets to zero the
@@ -122,16 +145,23 @@ class RungeKutta4Numba(NumericalApproximator):
         Parameters
         ----------
         root_finder : superflexpy.utils.RootFinder
-            Solver used to find the root of the differential equation.
+            Solver used to find the root of the differential equation. If None,
+            the state at the end of the time step is calculated directly,
+            without the indirection of the root finder.
+        clip_bounds : bool
+            Used only if root_finder is None. If True, the state at the end of
+            the time step is clipped to the minimum and maximum values returned
+            by the fluxes functions.
         """
 
         super().__init__(root_finder=root_finder)
+        self._clip_bounds = clip_bounds
 
         self.architecture = "numba"
         self._error_message = "module : superflexPy, solver : Runge Kutta 4"
         self._error_message += " Error message : "
 
-        if root_finder.architecture != "numba":
+        if root_finder is not None and root_finder.architecture != "numba":
             message = "{}: architecture of the root_finder must be numba. Given {}".format(
                 self._error_message, root_finder.architecture
             )
@@ -141,7 +171,7 @@ class RungeKutta4Numba(NumericalApproximator):
     def _get_fluxes(fluxes, S, S0, args, dt):
         # Calculate the state used to calculate the fluxes
         S = S[:-1]
-        S = np.insert(S, 0, S0)  # In the following, S is actually S0
+        S = np.insert(S, 0, S0, axis=0)  # In the following, S is actually S0
 
         k1_fluxes = fluxes(S, S0, None, *args)[0]
         k2_state = S + (np.sum(k1_fluxes, axis=0) * dt) / 2
@@ -155,8 +185,19 @@ class RungeKutta4Numba(NumericalApproximator):
 
         return fluxes
 
-    @staticmethod
-    @nb.jit(nopython=True)
+    @jit(nopython=True)
+    def _step(fluxes, S0, dt, ind, args):
+        flux_S0, min_S, max_S = fluxes(S0, S0, ind, *args)[:3]  # [flux, min, max, df]
+
+        # Call the ks of RK
+        k1 = dt[ind] * sum(flux_S0)
+        k2 = dt[ind] * sum(fluxes(S0 + k1 / 2, S0, ind, *args)[0])
+        k3 = dt[ind] * sum(fluxes(S0 + k2 / 2, S0, ind, *args)[0])
+        k4 = dt[ind] * sum(fluxes(S0 + k3, S0, ind, *args)[0])
+
+        return (S0 + k1 / 6 + k2 / 3 + k3 / 3 + k4 / 6, min_S, max_S)
+
+    @jit(nopython=True)
     def _differential_equation(fluxes, S, S0, dt, args, ind):
         # Specify a state in case None
         if S is None:
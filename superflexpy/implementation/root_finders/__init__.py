@@ -23,6 +23,6 @@ CODED BY: Marco Dal Molin
 DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
 """
 
-from . import explicit, newton, pegasus
+from . import explicit, newton, newton_system, pegasus
 
-__all__ = ["explicit", "newton", "pegasus"]
+__all__ = ["explicit", "newton", "newton_system", "pegasus"]
@@ -28,8 +28,7 @@ iteration (e.g., with Explicit Euler or Runge Kutta).
 """
 
 
-import numba as nb
-
+from ...utils.lazy_numba import jit
 from ...utils.root_finder import RootFinder
 
 
@@ -39,6 +38,8 @@ class ExplicitPython(RootFinder):
     explicit.
     """
 
+    _spec_attributes = {}
+
     def __init__(self):
         """
         This is the initializer of the ExplicitRootFinderPython class. As the
@@ -96,6 +97,8 @@ class ExplicitNumba(RootFinder):
     explicit.
     """
 
+    _spec_attributes = {}
+
     def __init__(self):
         """
         This is the initializer of the ExplicitRootFinderNumba class. As the
@@ -105,12 +108,11 @@ class ExplicitNumba(RootFinder):
 
         super().__init__(tol_F=None, tol_x=None, iter_max=None)
 
-        self._name = "ExplicitRootFinderPython"
-        self.architecture = "python"
+        self._name = "ExplicitRootFinderNumba"
+        self.architecture = "numba"
         self._error_message = "module : superflexPy, solver : {},".format(self._name)
         self._error_message += " Error message : "
 
-    @staticmethod
-    @nb.jit(nopython=True)
+    @jit(nopython=True)
     def solve(diff_eq, fluxes, S0, dt, ind, args, tol_F, tol_x, iter_max):
         return -diff_eq(fluxes=fluxes, S=0, S0=S0, dt=dt, args=args, ind=ind)[0]
@@ -0,0 +1,398 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of a root finder that never raises:
+when a method does not converge within its maximum number of iterations, the
+search continues with the next method of a chain (Newton, Pegasus,
+bisection), starting from the best bracket found so far. If all the methods
+fail, the midpoint of the bracket is accepted. The method that produced each
+root is returned as a status code.
+
+References
+----------
+Dowell, M. & Jarratt, P. BIT (1972) 12: 503. https://doi.org/10.1007/BF01932959
+"""
+
+import numpy as np
+
+from ...utils.lazy_numba import jit
+from ...utils.root_finder import RootFinder
+
+SOLVER_STATUS = ("newton", "pegasus", "bisection", "midpoint", "failed", "bound")
+"""
+Names of the status codes returned by the fallback root finders. The code is
+the position in the tuple: 0-2 are the methods that converged, 3 means that
+the midpoint of the best bracket was accepted, 4 means that the initial
+interval does not bracket a root (the bound with the smallest residual is
+returned, or NaN if accept_midpoint is False), and 5 means that one of the
+bounds of the initial interval is a root (no method is used).
+"""
+
+_METHODS = {"newton": 0, "pegasus": 1, "bisection": 2}
+
+
+def count_status(status):
+    """
+    This function counts the time steps solved with each status.
+
+    Parameters
+    ----------
+    status : numpy.ndarray
+        Status codes (e.g. the attribute solver_status of an element)
+
+    Returns
+    -------
+    dict(str : int)
+        Number of time steps for each status in SOLVER_STATUS
+    """
+
+    counts = np.bincount(np.asarray(status, dtype=np.int64).reshape(-1), minlength=len(SOLVER_STATUS))
+
+    return {name: int(c) for name, c in zip(SOLVER_STATUS, counts)}
+
+
+class FallbackPython(RootFinder):
+    """
+    This class defines a root finder that tries a chain of methods (by
+    default Newton, Pegasus, and bisection) and never raises: each method
+    continues from the best bracket of the previous one and, if none
+    converges, the midpoint of the bracket is accepted. The method solve
+    returns the root and a status code (see SOLVER_STATUS), collected by the
+    numerical approximators in the attribute solver_status of the elements.
+    """
+
+    returns_status = True
+
+    _spec_attributes = dict(
+        RootFinder._spec_attributes,
+        chain="_chain",
+        bisection_iter_max="_bisection_iter_max",
+        accept_midpoint="_accept_midpoint",
+    )
+
+    def __init__(
+        self,
+        chain=("newton", "pegasus", "bisection"),
+        tol_F=1e-8,
+        tol_x=1e-8,
+        iter_max=10,
+        bisection_iter_max=100,
+        accept_midpoint=True,
+    ):
+        """
+        This is the initializer of the class FallbackPython.
+
+        Parameters
+        ----------
+        chain : tuple(str)
+            Methods tried, in order. Allowed values are 'newton' (requires
+            the derivatives of the fluxes), 'pegasus', and 'bisection'.
+        tol_F : float
+            Tolerance on the y axis (distance from 0) that stops the solver
+        tol_x : float
+            Tolerance on the x axis (distance between two roots) that stops
+            the solver
+        iter_max : int
+            Maximum number of iterations of Newton and Pegasus
+        bisection_iter_max : int
+            Maximum number of iterations of the bisection
+        accept_midpoint : bool
+            If True, when no method converges the midpoint of the best bracket
+            is returned; otherwise, NaN.
+        """
+
+        super().__init__(tol_F=tol_F, tol_x=tol_x, iter_max=iter_max)
+        self._name = "FallbackPython"
+        self.architecture = "python"
+        self._error_message = "module : superflexPy, solver : {},".format(self._name)
+        self._error_message += " Error message : "
+
+        if len(chain) == 0 or len(set(chain)) != len(chain) or any(m not in _METHODS for m in chain):
+            message = "{}the chain must contain distinct methods among {}. Given {}".format(
+                self._error_message, list(_METHODS), chain
+            )
+            raise ValueError(message)
+
+        self._chain = tuple(chain)
+        self._bisection_iter_max = bisection_iter_max
+        self._accept_midpoint = accept_midpoint
+
+    def get_settings(self):
+        """
+        This method returns the settings of the root finder.
+
+        Returns
+        -------
+        float
+            Function tollerance (tol_F)
+        float
+            X tollerance (tol_x)
+        int
+            Maximum number of iterations of Newton and Pegasus (iter_max)
+        int
+            Maximum number of iterations of the bisection
+        bool
+            True if the midpoint of the bracket is accepted
+        int, int, int
+            Codes of the methods of the chain, -1 if not used. They are
+            scalars because the compiled parallel loops do not accept nested
+            tuples.
+        """
+
+        chain = [_METHODS[m] for m in self._chain] + [-1] * (len(_METHODS) - len(self._chain))
+
+        return (self._tol_F, self._tol_x, self._iter_max, self._bisection_iter_max, self._accept_midpoint, *chain)
+
+    def solve(self, diff_eq, fluxes, S0, dt, ind, args):
+        """
+        This method calculates the root of the input function.
+
+        Parameters
+        ----------
+        diff_eq : function
+            Function be solved. See superflexpy.implementation.root_finders.
+            newton.NewtonPython.solve.
+        fluxes : function
+            Function to be passed to diff_eq. See specification in
+            superflexpy.utils.numerical_approximator
+        S0 : float
+            state at the beginning of the time step
+        dt : float
+            time step
+        kwargs : dict(str: float)
+            parameters needed by diff_eq
+
+        Returns
+        -------
+        float, int
+            Root of the function and status code
+        """
+
+        return _solve_chain(_newton, _pegasus, _bisection, diff_eq, fluxes, S0, dt, ind, args, self.get_settings())
+
+    def __repr__(self):
+        str = super().__repr__()
+        str += "\n\tchain = {}\n".format(self._chain)
+        str += "\tbisection_iter_max = {}\n".format(self._bisection_iter_max)
+        str += "\taccept_midpoint = {}".format(self._accept_midpoint)
+
+        return str
+
+
+class FallbackNumba(FallbackPython):
+    """
+    This class defines a root finder that tries a chain of methods (by
+    default Newton, Pegasus, and bisection) and never raises. See
+    FallbackPython.
+    """
+
+    def __init__(
+        self,
+        chain=("newton", "pegasus", "bisection"),
+        tol_F=1e-8,
+        tol_x=1e-8,
+        iter_max=10,
+        bisection_iter_max=100,
+        accept_midpoint=True,
+    ):
+        """
+        This is the initializer of the class FallbackNumba. See
+        FallbackPython.
+        """
+
+        super().__init__(
+            chain=chain,
+            tol_F=tol_F,
+            tol_x=tol_x,
+            iter_max=iter_max,
+            bisection_iter_max=bisection_iter_max,
+            accept_midpoint=accept_midpoint,
+        )
+        self._name = "FallbackNumba"
+        self.architecture = "numba"
+        self._error_message = "module : superflexPy, solver : {},".format(self._name)
+        self._error_message += " Error message : "
+
+    @jit(nopython=True)
+    def solve(diff_eq, fluxes, S0, dt, ind, args, settings):
+        return _solve_chain_numba(
+            _newton_numba, _pegasus_numba, _bisection_numba, diff_eq, fluxes, S0, dt, ind, args, settings
+        )
+
+
+def _solve_chain(newton, pegasus, bisection, diff_eq, fluxes, S0, dt, ind, args, settings):
+    """
+    This function tries the methods of the chain until one converges. The
+    methods receive a bracket (a, b) of the root, with the residuals (fa, fb),
+    and return whether they converged, the root, and the narrowest bracket
+    found.
+    """
+
+    tol_F, tol_x, iter_max, bisection_iter_max, accept_midpoint, first, second, third = settings
+
+    a, b = diff_eq(fluxes=fluxes, S=None, S0=S0, dt=dt, ind=ind, args=args)[1:3]
+    if a > b:
+        a, b = b, a
+
+    fa = diff_eq(fluxes=fluxes, S=a, S0=S0, dt=dt, ind=ind, args=args)[0]
+    fb = diff_eq(fluxes=fluxes, S=b, S0=S0, dt=dt, ind=ind, args=args)[0]
+
+    if np.abs(fa) < tol_F:
+        return a, 5
+    if np.abs(fb) < tol_F:
+        return b, 5
+
+    if not fa * fb < 0:
+        # No bracket (or NaN residuals): nothing better than the best bound
+        if not accept_midpoint:
+            return np.nan, 4
+        return (a if np.abs(fa) <= np.abs(fb) else b), 4
+
+    for method in (first, second, third):
+        if method < 0:
+            break
+        elif method == 0:
+            converged, root, a, b, fa, fb = newton(
+                diff_eq, fluxes, S0, dt, ind, args, a, b, fa, fb, tol_F, tol_x, iter_max
+            )
+        elif method == 1:
+            converged, root, a, b, fa, fb = pegasus(
+                diff_eq, fluxes, S0, dt, ind, args, a, b, fa, fb, tol_F, tol_x, iter_max
+            )
+        else:
+            converged, root, a, b, fa, fb = bisection(
+                diff_eq, fluxes, S0, dt, ind, args, a, b, fa, fb, tol_F, tol_x, bisection_iter_max
+            )
+
+        if converged:
+            return root, method
+
+    if not accept_midpoint:
+        return np.nan, 3
+
+    return (a + b) / 2, 3
+
+
+def _newton(diff_eq, fluxes, S0, dt, ind, args, a, b, fa, fb, tol_F, tol_x, iter_max):
+    """
+    Newton method, kept inside the bracket: the steps that leave it are
+    replaced by the midpoint of the bracket.
+    """
+
+    root = (a + b) / 2
+
+    for _ in range(iter_max):
+        f, _, _, df = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, ind=ind, args=args)
+
+        if np.abs(f) < tol_F:
+            return True, root, a, b, fa, fb
+
+        if fa * f < 0:
+            b = root
+            fb = f
+        else:
+            a = root
+            fa = f
+
+        if df == 0 or not np.isfinite(df):
+            new_root = (a + b) / 2
+        else:
+            new_root = root - f / df
+
+        if not (a < new_root < b):
+            new_root = (a + b) / 2
+
+        if np.abs(new_root - root) < tol_x:
+            return True, new_root, a, b, fa, fb
+
+        root = new_root
+
+    return False, root, a, b, fa, fb
+
+
+def _pegasus(diff_eq, fluxes, S0, dt, ind, args, a, b, fa, fb, tol_F, tol_x, iter_max):
+    """
+    Pegasus method, as in superflexpy.implementation.root_finders.pegasus.
+    """
+
+    x0, x1, f0, f1 = a, b, fa, fb
+    root = a
+
+    for _ in range(iter_max):
+        root = x0 - f0 * (x1 - x0) / (f1 - f0)
+        root = min(max(root, min(x0, x1)), max(x0, x1))
+
+        f_root = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, ind=ind, args=args)[0]
+
+        # True bracket, for the next methods
+        if fa * f_root < 0:
+            b = root
+            fb = f_root
+        else:
+            a = root
+            fa = f_root
+
+        if f_root * f0 < 0:
+            x1 = x0
+            f1 = f0
+        else:
+            f1 = f1 * f0 / (f0 + f_root)
+
+        x0 = root
+        f0 = f_root
+
+        if np.abs(f_root) < tol_F or np.abs(x0 - x1) < tol_x:
+            return True, root, a, b, fa, fb
+
+    return False, root, a, b, fa, fb
+
+
+def _bisection(diff_eq, fluxes, S0, dt, ind, args, a, b, fa, fb, tol_F, tol_x, iter_max):
+    """
+    Bisection method
+    """
+
+    root = (a + b) / 2
+
+    for _ in range(iter_max):
+        root = (a + b) / 2
+        f_root = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, ind=ind, args=args)[0]
+
+        if np.abs(f_root) < tol_F or (b - a) / 2 < tol_x:
+            return True, root, a, b, fa, fb
+
+        if fa * f_root < 0:
+            b = root
+            fb = f_root
+        else:
+            a = root
+            fa = f_root
+
+    return False, root, a, b, fa, fb
+
+
+_solve_chain_numba = jit(nopython=True)(_solve_chain)
+_newton_numba = jit(nopython=True)(_newton)
+_pegasus_numba = jit(nopython=True)(_pegasus)
+_bisection_numba = jit(nopython=True)(_bisection)
@@ -26,9 +26,9 @@ This file contains the implementation of the Newton method for root finding. The
 solution is forced to be bounded by the limits of acceptability.
 """
 
-import numba as nb
 import numpy as np
 
+from ...utils.lazy_numba import jit
 from ...utils.root_finder import RootFinder
 
 
@@ -194,8 +194,7 @@ class NewtonNumba(RootFinder):
         self._error_message = "module : superflexPy, solver : {},".format(self._name)
         self._error_message += " Error message : "
 
-    @staticmethod
-    @nb.jit(nopython=True)
+    @jit(nopython=True)
     def solve(diff_eq, fluxes, S0, dt, ind, args, tol_F, tol_x, iter_max):
         a_orig, b_orig = diff_eq(fluxes=fluxes, S=None, S0=S0, dt=dt, args=args, ind=ind)[1:3]
 
@@ -226,7 +225,7 @@ class NewtonNumba(RootFinder):
             root = (a_orig + b_orig) / 2
 
             for j in range(iter_max):
-                f, *_, df = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, args=args, ind=ind)
+                f, _, _, df = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, args=args, ind=ind)
 
                 if np.abs(f) < tol_F:
                     # Success
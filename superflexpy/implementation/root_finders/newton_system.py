@@ -0,0 +1,332 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of the damped Newton method for finding
+the root of systems of equations. The solution is forced to be bounded by the
+limits of acceptability. It is meant to be used with numerical approximators
+that solve coupled ODEs.
+"""
+
+import numpy as np
+
+from ...utils.lazy_numba import jit
+from ...utils.root_finder import RootFinder
+
+
+class NewtonSystemPython(RootFinder):
+    """
+    This class defines the root finder for systems of equations, using the
+    Newton method. At each iteration the step is halved until the residual
+    decreases (damping) and the solution is projected on the limits of
+    acceptability.
+    """
+
+    _spec_attributes = {
+        "tol_F": "_tol_F",
+        "tol_x": "_tol_x",
+        "iter_max": "_iter_max",
+        "max_damping": "_max_damping",
+    }
+
+    def __init__(self, tol_F=1e-8, tol_x=1e-8, iter_max=20, max_damping=10):
+        """
+        This is the initializer of the class NewtonSystemPython.
+
+        Parameters
+        ----------
+        tol_F : float
+            Tollerance on the y axis (maximum distance from 0 of the equations)
+            that stops the solver
+        tol_x : float
+            Tollerance on the x axis (maximum distance between two roots) that
+            stops the solver
+        iter_max : int
+            Maximum number of iteration of the solver. After this value it
+            raises a runtime error
+        max_damping : int
+            Maximum number of times the Newton step is halved in one iteration
+        """
+        super().__init__(tol_F=tol_F, tol_x=tol_x, iter_max=iter_max)
+        self._max_damping = max_damping
+        self._name = "NewtonSystemPython"
+        self.architecture = "python"
+        self._error_message = "module : superflexPy, solver : {},".format(self._name)
+        self._error_message += " Error message : "
+
+    def get_settings(self):
+        """
+        This method returns the settings of the root finder.
+
+        Returns
+        -------
+        float
+            Function tollerance (tol_F)
+        float
+            X tollerance (tol_x)
+        int
+            Maximum number of iterations (iter_max)
+        int
+            Maximum number of halvings of the step (max_damping)
+        """
+
+        return (
+            self._tol_F,
+            self._tol_x,
+            self._iter_max,
+            self._max_damping,
+        )
+
+    def solve(self, diff_eq, fluxes, S0, dt, ind, args):
+        """
+        This method calculated the root of the input system of equations.
+
+        Parameters
+        ----------
+        diff_eq : function
+            Function be solved. The function must accept the following inputs:
+            - fluxes : function used to calculate the fluxes given parameters
+                       and states
+            - S : proposed root (numpy.ndarray)
+            - S0 : states at the beginning of the time step
+            - dt : time step
+            - args : other parameters needed by diff_eq
+            It must return:
+            - Values of the equations given the root (numpy.ndarray)
+            - Lower boundaries of the states (numpy.ndarray)
+            - Upper boundaries of the states (numpy.ndarray)
+            - Jacobian of the equations wrt the root (2D numpy.ndarray)
+        fluxes : function
+            Function to be passed to diff_eq. See specification in
+            superflexpy.implementation.numerical_approximators.implicit_euler_coupled
+        S0 : numpy.ndarray
+            states at the beginning of the time step
+        dt : float
+            time step
+        args : tuple
+            parameters needed by diff_eq
+
+        Returns
+        -------
+        numpy.ndarray
+            Root of the system
+        """
+
+        root = S0.copy()
+        f, lower, upper, jac = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, args=args, ind=ind)
+        projected = np.minimum(np.maximum(root, lower), upper)
+
+        if np.any(projected != root):
+            root = projected
+            f, _, _, jac = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, args=args, ind=ind)
+
+        norm = np.max(np.abs(f))
+
+        for j in range(self._iter_max):
+            if norm < self._tol_F:
+                # Success
+                return root
+
+            try:
+                dx = np.linalg.solve(jac, -f)
+            except np.linalg.LinAlgError:
+                message = "{}singular Jacobian at time step {}".format(self._error_message, ind)
+                raise RuntimeError(message)
+
+            # Halve the step until the residual decreases
+            step = 1.0
+            for _ in range(self._max_damping + 1):
+                new_root = np.minimum(np.maximum(root + step * dx, lower), upper)
+                new_f, _, _, new_jac = diff_eq(fluxes=fluxes, S=new_root, S0=S0, dt=dt, args=args, ind=ind)
+                new_norm = np.max(np.abs(new_f))
+
+                if new_norm < norm:
+                    break
+
+                step /= 2
+
+            else:
+                # The projected step does not decrease the residual
+                message = "{}stalled at time step {}".format(self._error_message, ind)
+                raise RuntimeError(message)
+
+            diff_x = np.max(np.abs(new_root - root))
+            root, f, jac, norm = new_root, new_f, new_jac, new_norm
+
+            if norm < self._tol_F or diff_x < self._tol_x:
+                # Success
+                return root
+
+        message = "{}not converged. iter_max : {}".format(self._error_message, self._iter_max)
+        raise RuntimeError(message)
+
+
+class NewtonSystemNumba(RootFinder):
+    """
+    This class defines the root finder for systems of equations, using the
+    Newton method. At each iteration the step is halved until the residual
+    decreases (damping) and the solution is projected on the limits of
+    acceptability.
+    """
+
+    _spec_attributes = {
+        "tol_F": "_tol_F",
+        "tol_x": "_tol_x",
+        "iter_max": "_iter_max",
+        "max_damping": "_max_damping",
+    }
+
+    def __init__(self, tol_F=1e-8, tol_x=1e-8, iter_max=20, max_damping=10):
+        """
+        This is the initializer of the class NewtonSystemNumba.
+
+        Parameters
+        ----------
+        tol_F : float
+            Tollerance on the y axis (maximum distance from 0 of the equations)
+            that stops the solver
+        tol_x : float
+            Tollerance on the x axis (maximum distance between two roots) that
+            stops the solver
+        iter_max : int
+            Maximum number of iteration of the solver. After this value the
+            solution is set to nan
+        max_damping : int
+            Maximum number of times the Newton step is halved in one iteration
+        """
+        super().__init__(tol_F=tol_F, tol_x=tol_x, iter_max=iter_max)
+        self._max_damping = max_damping
+        self._name = "NewtonSystemNumba"
+        self.architecture = "numba"
+        self._error_message = "module : superflexPy, solver : {},".format(self._name)
+        self._error_message += " Error message : "
+
+    def get_settings(self):
+        """
+        This method returns the settings of the root finder.
+
+        Returns
+        -------
+        float
+            Function tollerance (tol_F)
+        float
+            X tollerance (tol_x)
+        int
+            Maximum number of iterations (iter_max)
+        int
+            Maximum number of halvings of the step (max_damping)
+        """
+
+        return (
+            self._tol_F,
+            self._tol_x,
+            self._iter_max,
+            self._max_damping,
+        )
+
+    @jit(nopython=True)
+    def solve(diff_eq, fluxes, S0, dt, ind, args, tol_F, tol_x, iter_max, max_damping):
+        root = S0.copy()
+        f, lower, upper, jac = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, ind=ind, args=args)
+        projected = np.minimum(np.maximum(root, lower), upper)
+
+        if np.any(projected != root):
+            root = projected
+            f, _, _, jac = diff_eq(fluxes=fluxes, S=root, S0=S0, dt=dt, ind=ind, args=args)
+
+        norm = np.max(np.abs(f))
+
+        for j in range(iter_max):
+            if norm < tol_F:
+                # Success
+                return root
+
+            dx = _linear_solve(jac, -f)
+
+            if np.isnan(dx[0]):
+                # Singular Jacobian. I cannot raise exceptions with Numba
+                break
+
+            # Halve the step until the residual decreases
+            step = 1.0
+            for _ in range(max_damping + 1):
+                new_root = np.minimum(np.maximum(root + step * dx, lower), upper)
+                new_f, _, _, new_jac = diff_eq(fluxes=fluxes, S=new_root, S0=S0, dt=dt, ind=ind, args=args)
+                new_norm = np.max(np.abs(new_f))
+
+                if new_norm < norm:
+                    break
+
+                step /= 2
+            else:
+                # The projected step does not decrease the residual
+                break
+
+            diff_x = np.max(np.abs(new_root - root))
+            root, f, jac, norm = new_root, new_f, new_jac, new_norm
+
+            if norm < tol_F or diff_x < tol_x:
+                # Success
+                return root
+
+        # I cannot raise exceptions with Numba
+        return np.full(len(S0), np.nan)
+
+
+@jit(nopython=True)
+def _linear_solve(A, b):
+    """
+    This function solves the linear system A x = b using Gaussian elimination
+    with partial pivoting. It returns an array of nan if A is singular.
+    """
+
+    n = len(b)
+    M = A.copy()
+    x = b.copy()
+
+    for k in range(n):
+        # Pivoting
+        p = k + np.argmax(np.abs(M[k:, k]))
+
+        if M[p, k] == 0.0:
+            return np.full(n, np.nan)
+
+        if p != k:
+            for c in range(n):
+                M[k, c], M[p, c] = M[p, c], M[k, c]
+            x[k], x[p] = x[p], x[k]
+
+        # Elimination
+        for r in range(k + 1, n):
+            factor = M[r, k] / M[k, k]
+            for c in range(k, n):
+                M[r, c] -= factor * M[k, c]
+            x[r] -= factor * x[k]
+
+    # Back substitution
+    for k in range(n - 1, -1, -1):
+        for c in range(k + 1, n):
+            x[k] -= M[k, c] * x[c]
+        x[k] /= M[k, k]
+
+    return x
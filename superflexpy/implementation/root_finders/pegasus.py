@@ -30,9 +30,9 @@ References
 Dowell, M. & Jarratt, P. BIT (1972) 12: 503. https://doi.org/10.1007/BF01932959
 """
 
-import numba as nb
 import numpy as np
 
+from ...utils.lazy_numba import jit
 from ...utils.root_finder import RootFinder
 
 
@@ -185,8 +185,7 @@ class PegasusNumba(RootFinder):
         self._error_message = "module : superflexPy, solver : {},".format(self._name)
         self._error_message += " Error message : "
 
-    @staticmethod
-    @nb.jit(nopython=True)
+    @jit(nopython=True)
     def solve(diff_eq, fluxes, S0, dt, ind, args, tol_F, tol_x, iter_max):
         a, b = diff_eq(fluxes=fluxes, S=None, S0=S0, dt=dt, ind=ind, args=args)[1:3]
         fa = diff_eq(fluxes=fluxes, S=a, S0=S0, dt=dt, ind=ind, args=args)[0]
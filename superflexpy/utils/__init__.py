@@ -23,6 +23,26 @@ CODED BY: Marco Dal Molin
 DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
 """
 
-from . import generic_component, numerical_approximator, root_finder
-
-__all__ = ["generic_component", "numerical_approximator", "root_finder"]
+from . import (
+    buffer_arena,
+    generic_component,
+    lazy_numba,
+    memoization,
+    memory,
+    metrics,
+    numerical_approximator,
+    root_finder,
+    spec,
+)
+
+__all__ = [
+    "buffer_arena",
+    "generic_component",
+    "lazy_numba",
+    "memoization",
+    "memory",
+    "metrics",
+    "numerical_approximator",
+    "root_finder",
+    "spec",
+]
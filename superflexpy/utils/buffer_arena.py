@@ -0,0 +1,147 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of a pool of preallocated arrays used
+by the Unit to store the outputs of the elements that route the fluxes.
+"""
+
+import numpy as np
+
+
+class BufferArena:
+    """
+    This class implements a pool of preallocated 1D arrays of the same length.
+    The arrays are kept among runs and reallocated only when the length
+    changes. They are the rows of a single 2D array, so that compiled elements
+    can write several of them with one kernel call (see locate_rows).
+    """
+
+    def __init__(self, num_buffers):
+        """
+        This is the initializer of the class BufferArena.
+
+        Parameters
+        ----------
+        num_buffers : int
+            Number of buffers in the pool.
+        """
+
+        self._num_buffers = num_buffers
+        self._block = None
+        self._buffers = []
+        self._length = None
+
+    def allocate(self, length):
+        """
+        This method allocates the buffers. If the buffers already have the
+        requested length, nothing is done.
+
+        Parameters
+        ----------
+        length : int
+            Length of the buffers.
+
+        Returns
+        -------
+        bool
+            True if new buffers have been allocated.
+        """
+
+        if length == self._length:
+            return False
+
+        self._block = np.empty((self._num_buffers, length))
+        self._buffers = list(self._block)
+        self._length = length
+
+        return True
+
+    def get(self, index):
+        """
+        This method returns a buffer.
+
+        Parameters
+        ----------
+        index : int
+            Index of the buffer.
+
+        Returns
+        -------
+        numpy.ndarray
+            Buffer
+        """
+
+        return self._buffers[index]
+
+    @property
+    def num_buffers(self):
+        """
+        Number of buffers in the pool.
+        """
+
+        return self._num_buffers
+
+    @property
+    def nbytes(self):
+        """
+        Memory (bytes) occupied by the buffers.
+        """
+
+        return sum(b.nbytes for b in self._buffers)
+
+    def __getstate__(self):
+        # The buffers are allocated again at the first run
+        return {"_num_buffers": self._num_buffers, "_block": None, "_buffers": [], "_length": None}
+
+
+def locate_rows(buffers):
+    """
+    This function finds the position of the buffers in the 2D array of the
+    BufferArena they belong to.
+
+    Parameters
+    ----------
+    buffers : list(numpy.ndarray)
+        Buffers to locate
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        2D array that contains the buffers and index of the row corresponding
+        to each buffer. If the buffers are not all rows of the same 2D array,
+        None, None.
+    """
+
+    if len(buffers) == 0 or any(b is None for b in buffers):
+        return None, None
+
+    block = buffers[0].base
+
+    if not isinstance(block, np.ndarray) or block.ndim != 2 or any(b.base is not block for b in buffers):
+        return None, None
+
+    start = block.__array_interface__["data"][0]
+    rows = [(b.__array_interface__["data"][0] - start) // block.strides[0] for b in buffers]
+
+    return block, np.array(rows, dtype=np.int64)
@@ -26,6 +26,13 @@ This file contains the implementation of a class that implements methods that
 are useful for Unit, Node, and Network.
 """
 
+from copy import deepcopy
+
+import numpy as np
+
+from .memory import retained_bytes
+from .spec import SpecReader, SpecWriter
+
 
 class GenericComponent(object):
     """
@@ -70,6 +77,25 @@ class GenericComponent(object):
     Prefix applied to local states
     """
 
+    _dirty = True
+    """
+    True if parameters, states, inputs, or timestep of the component changed
+    since its last run. Used by the Network to re-solve only the nodes that
+    changed.
+    """
+
+    _states_from_reset = True
+    """
+    True if the states of the component are the ones provided at
+    initialization (i.e. the component has not been run since the last
+    reset).
+    """
+
+    _pickle_exclude = ["get_output"]
+    """
+    Attributes that are not pickled (e.g. wrappers added by the profiler)
+    """
+
     def get_parameters(self, names=None):
         """
         This method returns the parameters of the component and of the ones
@@ -214,6 +240,8 @@ class GenericComponent(object):
             else:
                 self._content[position].set_parameters({p: parameters[p]})
 
+        self._dirty = True
+
     def get_states(self, names=None):
         """
         This method returns the states of the component and of the ones
@@ -313,6 +341,9 @@ class GenericComponent(object):
             else:
                 self._content[position].set_states({s: states[s]})
 
+        self._dirty = True
+        self._states_from_reset = False
+
     def reset_states(self, id=None):
         """
         This method sets the states to the values provided to the __init__
@@ -329,6 +360,8 @@ class GenericComponent(object):
         except AttributeError:
             local_id = None
 
+        dirty = self._dirty
+
         if id is None:
             for c in self._content_pointer.keys():
                 position = self._content_pointer[c]
@@ -351,6 +384,14 @@ class GenericComponent(object):
 
                     self._content[position].reset_states()
 
+        if id is None:
+            # Back to the initial states: a run from here reproduces the first
+            # run after initialization.
+            self._dirty = dirty
+            self._states_from_reset = True
+        else:
+            self._dirty = True
+
     def get_timestep(self):
         """
         This method returns the timestep used by the element.
@@ -373,6 +414,7 @@ class GenericComponent(object):
         """
 
         self._dt = dt
+        self._dirty = True
 
         for c in self._content_pointer.keys():
             position = self._content_pointer[c]
@@ -401,3 +443,212 @@ class GenericComponent(object):
                 self._content[position].define_solver(solver)
             except AttributeError:
                 continue
+
+    def set_memoization(self, cache):
+        """
+        This method activates the memoization of the solution for all the
+        elements contained in the component.
+
+        Parameters
+        ----------
+        cache : superflexpy.utils.memoization.MemoizationCache
+            Cache used to store the solutions of the elements. It is shared by
+            all the elements. If None, memoization is deactivated.
+        """
+
+        for c in self._content_pointer.keys():
+            position = self._content_pointer[c]
+
+            try:
+                self._content[position].set_memoization(cache)
+            except AttributeError:
+                continue
+
+    def update(self, n_steps, forcing):
+        """
+        This method advances the component by n_steps time steps, starting
+        from its current states, and returns the outputs of these time steps.
+        The states at the end of the call are the starting point of the next
+        one, so that the component can be run step by step (e.g. coupled to
+        another model or in real time) with the same results of a single run
+        over the whole period.
+
+        Each call has a fixed cost of python code in the framework and in
+        the elements, of the order of 100 microseconds for a unit with a few
+        elements (see test/performance/measure_update.py). Solving one time
+        step per call is therefore tens of times slower than a single run;
+        solving several time steps per call reduces the difference.
+
+        Parameters
+        ----------
+        n_steps : int
+            Number of time steps to solve
+        forcing : list(numpy.ndarray or float)
+            Inputs of the component. Arrays must have at least n_steps
+            values, of which the first n_steps are used; floats are used for
+            all the time steps.
+
+        Returns
+        -------
+        list(numpy.ndarray)
+            Outputs of the component over the n_steps time steps.
+        """
+
+        self.set_input(self._get_forcing(n_steps, forcing))
+
+        return self.get_output()
+
+    def _get_forcing(self, n_steps, forcing):
+        loc_forcing = []
+
+        for f in forcing:
+            if np.ndim(f) == 0:
+                loc_forcing.append(np.full(n_steps, f, dtype=np.float64))
+            elif len(f) < n_steps:
+                message = "{}forcing of length {} for {} time steps".format(self._error_message, len(f), n_steps)
+                raise ValueError(message)
+            else:
+                loc_forcing.append(np.asarray(f[:n_steps], dtype=np.float64))
+
+        return loc_forcing
+
+    def to_spec(self):
+        """
+        This method returns a compact specification of the component: classes,
+        ids, parameters, initial states, and settings of all the components
+        and elements that it contains, together with structure (layers,
+        weights, areas, topology). Numerical approximators and units shared
+        by different components are stored once. The specification is made
+        of plain Python containers and, if parameters and states are numbers
+        or lists, it can be saved as JSON.
+
+        Returns
+        -------
+        dict
+            Specification of the component.
+        """
+
+        writer = SpecWriter()
+
+        return writer.get_spec(self._to_spec(writer))
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        This method creates a component from the specification returned by
+        to_spec. The numerical approximators and units that were shared in
+        the original model are shared also in the new one; the compiled
+        kernels (e.g. numba functions of the fluxes) are attributes of the
+        classes and are, therefore, reused within the same process. Since the
+        classes are imported using their path, only trusted specifications
+        should be used.
+
+        Parameters
+        ----------
+        spec : dict
+            Specification of the component.
+
+        Returns
+        -------
+        superflexpy.utils.generic_component.GenericComponent
+            Component
+        """
+
+        component = SpecReader(spec).build(spec["model"])
+
+        if not isinstance(component, cls):
+            message = "module : superflexPy, {}, Error message : ".format(cls.__name__)
+            message += "the specification describes a {}".format(component.__class__.__name__)
+            raise TypeError(message)
+
+        return component
+
+    def _get_spec_arguments(self):
+        """
+        This method returns the local parameters and states of the component,
+        without prefixes, as arguments of the initializer.
+        """
+
+        return {
+            "id": self.id,
+            "parameters": (
+                {k[len(self._prefix_local_parameters) :]: deepcopy(v) for k, v in self._local_parameters.items()}
+                if self._local_parameters
+                else None
+            ),
+            "states": (
+                {k.split("_")[-1]: deepcopy(v) for k, v in self._init_local_states.items()}
+                if self._init_local_states
+                else None
+            ),
+        }
+
+    def memory_report(self, profiler=None):
+        """
+        This method calculates the memory retained by the component and by
+        all the components that it contains (e.g. states, inputs, time series
+        of the states, histories of the lag functions, cached outputs). Each
+        array is counted once, for the first component that retains it.
+
+        Parameters
+        ----------
+        profiler : superflexpy.framework.profiler.Profiler
+            Profiler, tracing the memory, that has been attached to the
+            component during a run. If provided, the peak of the memory
+            allocated during the run of each component is added to the report.
+
+        Returns
+        -------
+        dict(str : dict)
+            Dictionary keyed by prefixed id (e.g. Cat1_H2_UR, the network is
+            keyed as 'network'). Each value is a dictionary with the memory
+            (bytes) of each category retained by the component, its 'total',
+            the 'inclusive' memory (including the components contained) and,
+            if a profiler is provided, the 'peak' of the transient allocations.
+        """
+
+        report = {}
+        self._memory_report(prefix="", seen=set(), report=report)
+
+        if profiler is not None:
+            statistics = profiler.get_statistics()
+
+            for k in report:
+                if k in statistics and "peak" in statistics[k]:
+                    report[k]["peak"] = statistics[k]["peak"]
+
+        return report
+
+    def _memory_report(self, prefix, seen, report):
+        """
+        This method adds to the report the memory of the component and of the
+        components that it contains, returning the inclusive memory.
+        """
+
+        key = prefix + self.id
+        memory = self._get_memory(seen)
+        memory["total"] = sum(memory.values())
+        report[key] = memory
+
+        inclusive = memory["total"]
+        for c in self._content_pointer.keys():
+            inclusive += self._content[self._content_pointer[c]]._memory_report(key + "_", seen, report)
+
+        memory["inclusive"] = inclusive
+
+        return inclusive
+
+    def _get_memory(self, seen):
+        """
+        This method returns the memory (bytes) retained directly by the
+        component, divided by category.
+        """
+
+        return {
+            "inputs": retained_bytes(getattr(self, "input", None), seen),
+            "parameters": retained_bytes(self._local_parameters, seen),
+            "states": retained_bytes([self._local_states, self._init_local_states], seen),
+        }
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k not in self._pickle_exclude}
@@ -0,0 +1,217 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+
+This file contains the tools to use numba lazily: numba is imported, and the
+functions are compiled, only when a numba function is used for the first
+time (e.g. when an element is created with a numba numerical approximator).
+Importing SuperflexPy and running models with the python architecture does
+not require numba.
+"""
+
+import functools
+import importlib
+import sys
+import types
+
+_numba = None
+"""
+numba module, once imported
+"""
+
+_load_callbacks = []
+"""
+Functions called when numba is imported (see call_when_loaded)
+"""
+
+
+def load_numba():
+    """
+    This function imports numba, the first time that it is called, and
+    returns it.
+
+    Returns
+    -------
+    module
+        numba
+    """
+
+    global _numba
+
+    if _numba is None:
+        module = importlib.import_module("numba")
+
+        # Lazy functions used as globals of numba functions are typed as the
+        # functions they compile to
+        @module.extending.typeof_impl.register(LazyDispatcher)
+        def _typeof_lazy_dispatcher(val, c):
+            return module.extending.typeof_impl(val.get_dispatcher(), c)
+
+        _numba = module
+
+        for callback in list(_load_callbacks):
+            callback(module)
+        del _load_callbacks[:]
+
+    return _numba
+
+
+def call_when_loaded(callback):
+    """
+    This function calls a function, with numba as argument, when numba is
+    imported by load_numba. If numba is already imported (by load_numba or
+    by other code), the function is called immediately. It is used, for
+    example, to register numba event listeners without importing numba.
+
+    Parameters
+    ----------
+    callback : function
+        Function to call
+    """
+
+    if _numba is None and "numba" in sys.modules:
+        load_numba()  # Already imported: loading it is cheap
+
+    if _numba is None:
+        _load_callbacks.append(callback)
+    else:
+        callback(_numba)
+
+
+def remove_load_callback(callback):
+    """
+    This function removes a function registered with call_when_loaded that
+    has not been called yet.
+
+    Parameters
+    ----------
+    callback : function
+        Function to remove
+    """
+
+    if callback in _load_callbacks:
+        _load_callbacks.remove(callback)
+
+
+def is_numba_loaded():
+    """
+    This function tells if numba has already been imported by load_numba.
+
+    Returns
+    -------
+    bool
+        True if numba is loaded
+    """
+
+    return _numba is not None
+
+
+class _LazyNumba(types.ModuleType):
+    """
+    This class is a placeholder of the numba module that imports numba when
+    one of its attributes is used (e.g. nb.prange while compiling a parallel
+    function).
+    """
+
+    def __getattr__(self, name):
+        return getattr(load_numba(), name)
+
+
+nb = _LazyNumba("numba")
+"""
+Placeholder of the numba module, to use in place of 'import numba as nb'
+"""
+
+
+class LazyDispatcher:
+    """
+    This class wraps a python function that is compiled with numba.jit only
+    when it is used for the first time. Used as class attribute, it behaves
+    like a static method that returns the compiled function; called, it calls
+    the compiled function.
+    """
+
+    def __init__(self, py_func, args, kwargs):
+        """
+        This is the initializer of the class LazyDispatcher.
+
+        Parameters
+        ----------
+        py_func : function
+            Python function to compile
+        args : tuple
+            Positional arguments of numba.jit (e.g. the signature)
+        kwargs : dict
+            Keyword arguments of numba.jit (e.g. nopython)
+        """
+
+        self.py_func = py_func
+        self._args = args
+        self._kwargs = kwargs
+        self._dispatcher = None
+        functools.update_wrapper(self, py_func)
+
+    def get_dispatcher(self):
+        """
+        This method returns the compiled function, creating it the first time.
+        Functions with an explicit signature are compiled immediately, the
+        others when they are called (see numba.jit).
+
+        Returns
+        -------
+        numba.core.registry.CPUDispatcher
+            Compiled function
+        """
+
+        if self._dispatcher is None:
+            self._dispatcher = load_numba().jit(*self._args, **self._kwargs)(self.py_func)
+
+        return self._dispatcher
+
+    def __get__(self, obj, objtype=None):
+        return self.get_dispatcher()
+
+    def __call__(self, *args, **kwargs):
+        return self.get_dispatcher()(*args, **kwargs)
+
+    def __repr__(self):
+        return "LazyDispatcher({})".format(self.__qualname__)
+
+
+def jit(*args, **kwargs):
+    """
+    This function is a drop-in replacement of the decorator numba.jit that
+    compiles the function only when it is used for the first time (see
+    LazyDispatcher).
+
+    Returns
+    -------
+    function
+        Decorator that returns a LazyDispatcher
+    """
+
+    def decorator(py_func):
+        return LazyDispatcher(py_func, args, kwargs)
+
+    return decorator
@@ -0,0 +1,215 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of a cache that can be used by the
+elements to memoize the solution of their states, avoiding to solve them again
+when parameters, initial states, and inputs did not change.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class MemoizationCache:
+    """
+    This class implements a least recently used (LRU) cache with a memory
+    budget. The same cache can be shared by many elements: the keys identify
+    the class of the element, its numerical approximation, and all the values
+    that determine its solution.
+    """
+
+    def __init__(self, max_memory=100e6):
+        """
+        This is the initializer of the class MemoizationCache.
+
+        Parameters
+        ----------
+        max_memory : float
+            Maximum memory (bytes) occupied by the cached arrays. When the
+            budget is exceeded, the least recently used entries are evicted.
+        """
+
+        self._max_memory = max_memory
+        self._entries = OrderedDict()
+        self._memory = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()  # Elements can be solved in parallel threads
+
+    def get(self, key):
+        """
+        This method returns the value associated to the key.
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry, usually calculated using fingerprint.
+
+        Returns
+        -------
+        Unknown
+            Value of the entry. None if the key is not in the cache.
+        """
+
+        with self._lock:
+            try:
+                value, size = self._entries.pop(key)
+            except KeyError:
+                self._misses += 1
+                return None
+
+            self._entries[key] = (value, size)  # Most recently used
+            self._hits += 1
+
+        return value
+
+    def put(self, key, value):
+        """
+        This method stores a value in the cache, evicting the least recently
+        used entries if the memory budget is exceeded. Values larger than the
+        whole budget are not stored.
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry, usually calculated using fingerprint.
+        value : Unknown
+            Value to store. Its memory is calculated summing the size of all
+            the numpy.ndarray that it contains.
+        """
+
+        size = _nbytes(value)
+
+        if size > self._max_memory:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._memory -= self._entries.pop(key)[1]
+
+            self._entries[key] = (value, size)
+            self._memory += size
+
+            while self._memory > self._max_memory:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._memory -= old_size
+                self._evictions += 1
+
+    def clear(self):
+        """
+        This method removes all the entries from the cache. Statistics are not
+        reset.
+        """
+
+        with self._lock:
+            self._entries = OrderedDict()
+            self._memory = 0
+
+    def get_statistics(self):
+        """
+        This method returns the statistics of the cache.
+
+        Returns
+        -------
+        dict
+            Dictionary with keys 'hits', 'misses', 'evictions', 'entries', and
+            'memory' (bytes currently used).
+        """
+
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "entries": len(self._entries),
+            "memory": self._memory,
+        }
+
+    def __repr__(self):
+        str = "Module: superflexPy\nClass: MemoizationCache\n"
+        str += "Parameters:\n"
+        str += "\tmax_memory = {}\n".format(self._max_memory)
+        str += "Statistics:\n"
+        for k, v in self.get_statistics().items():
+            str += "\t{} = {}\n".format(k, v)
+
+        return str
+
+
+def fingerprint(*objects):
+    """
+    This function calculates a hash of the objects passed. It handles nested
+    lists, tuples, and dictionaries of numpy.ndarray, numbers, strings, None,
+    and functions (identified by module and name).
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the objects.
+    """
+
+    hasher = hashlib.blake2b(digest_size=20)
+
+    for o in objects:
+        _update(hasher, o)
+
+    return hasher.hexdigest()
+
+
+def _update(hasher, obj):
+    if isinstance(obj, np.ndarray):
+        hasher.update("a{}{}".format(obj.dtype.str, obj.shape).encode())
+        hasher.update(np.ascontiguousarray(obj))
+    elif isinstance(obj, (list, tuple)):
+        hasher.update("l{}".format(len(obj)).encode())
+        for o in obj:
+            _update(hasher, o)
+    elif isinstance(obj, dict):
+        hasher.update("d{}".format(len(obj)).encode())
+        for k in obj:
+            _update(hasher, k)
+            _update(hasher, obj[k])
+    elif obj is None or isinstance(obj, (str, bool, int, float, np.number)):
+        hasher.update("{}{!r}".format(type(obj).__name__, obj).encode())
+    elif callable(obj):
+        func = getattr(obj, "py_func", obj)  # numba dispatchers
+        hasher.update("f{}.{}".format(func.__module__, func.__qualname__).encode())
+    else:
+        message = "module : superflexPy, fingerprint, Error message : "
+        message += "cannot calculate the fingerprint of an object of type {}".format(type(obj))
+        raise TypeError(message)
+
+
+def _nbytes(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, (list, tuple)):
+        return sum(_nbytes(o) for o in obj)
+    elif isinstance(obj, dict):
+        return sum(_nbytes(o) for o in obj.values())
+    else:
+        return 0
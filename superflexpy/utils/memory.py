@@ -0,0 +1,66 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the utilities used to calculate the memory retained by the
+components of the models.
+"""
+
+import numpy as np
+
+
+def retained_bytes(obj, seen):
+    """
+    This function calculates the memory occupied by the numpy.ndarray
+    contained in an object, exploring nested lists, tuples, and dictionaries.
+    Each array is counted only once: views are counted as the array that owns
+    the memory and the arrays already in seen are not counted.
+
+    Parameters
+    ----------
+    obj : Unknown
+        Object to analyze
+    seen : set(int)
+        Identifiers (id) of the arrays already counted. It is updated in place.
+
+    Returns
+    -------
+    int
+        Memory (bytes)
+    """
+
+    if isinstance(obj, np.ndarray):
+        while isinstance(obj.base, np.ndarray):
+            obj = obj.base
+
+        if id(obj) in seen:
+            return 0
+
+        seen.add(id(obj))
+        return obj.nbytes
+    elif isinstance(obj, (list, tuple)):
+        return sum(retained_bytes(o, seen) for o in obj)
+    elif isinstance(obj, dict):
+        return sum(retained_bytes(o, seen) for o in obj.values())
+    else:
+        return 0
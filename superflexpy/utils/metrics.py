@@ -0,0 +1,197 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the implementation of goodness of fit metrics (NSE, KGE,
+RMSE) calculated in a single pass over the simulated and observed series.
+The series can be passed in chunks, as they are produced by the model, so
+that the full simulated series is never stored.
+"""
+
+import numpy as np
+
+from .lazy_numba import is_numba_loaded, jit
+
+_MOMENTS = ["count", "mean_sim", "mean_obs", "m2_sim", "m2_obs", "co_moment", "sse"]
+"""
+Running moments stored for each member
+"""
+
+
+class StreamingMetrics:
+    """
+    This class accumulates the moments needed to calculate the Nash-Sutcliffe
+    efficiency (NSE), the Kling-Gupta efficiency (KGE), and the root mean
+    square error (RMSE) of many members (e.g. catchments or parameter sets)
+    at once. If numba is in use, the moments are updated with the algorithm
+    of Welford, compiled with numba; otherwise, the moments of each chunk are
+    calculated with numpy and merged with the previous ones. Time steps with
+    missing (NaN) observations are skipped.
+    """
+
+    def __init__(self, num_members=1):
+        """
+        This is the initializer of the class StreamingMetrics.
+
+        Parameters
+        ----------
+        num_members : int
+            Number of members evaluated together
+        """
+
+        self._moments = np.zeros((num_members, len(_MOMENTS)))
+
+    def update(self, simulated, observed):
+        """
+        This method adds a chunk of time steps.
+
+        Parameters
+        ----------
+        simulated : numpy.ndarray
+            Simulated values, 2D array (#members, #timesteps) or, with one
+            member, 1D array (#timesteps,).
+        observed : numpy.ndarray
+            Observed values, 2D array (#members, #timesteps) or 1D array
+            (#timesteps,) used for all the members.
+        """
+
+        simulated = np.asarray(simulated, dtype=np.float64).reshape((len(self._moments), -1))
+        observed = np.asarray(observed, dtype=np.float64)
+        observed = observed.reshape((-1, simulated.shape[1]))
+
+        # The compiled loop is used only if numba is already in use: models
+        # with the python architecture do not import it
+        if is_numba_loaded():
+            _update_moments(self._moments, simulated, observed)
+        else:
+            _update_moments_vectorized(self._moments, simulated, observed)
+
+    def get_scores(self):
+        """
+        This method returns the metrics of the time steps added so far.
+
+        Returns
+        -------
+        dict(str : numpy.ndarray)
+            Values of 'NSE', 'KGE', 'RMSE', and 'SSE' (sum of squared
+            errors), one per member.
+        """
+
+        count, mean_sim, mean_obs, m2_sim, m2_obs, co_moment, sse = self._moments.T
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = co_moment / np.sqrt(m2_sim * m2_obs)
+            alpha = np.sqrt(m2_sim / m2_obs)
+            beta = mean_sim / mean_obs
+
+            return {
+                "NSE": 1 - sse / m2_obs,
+                "KGE": 1 - np.sqrt((r - 1) ** 2 + (alpha - 1) ** 2 + (beta - 1) ** 2),
+                "RMSE": np.sqrt(sse / count),
+                "SSE": sse.copy(),
+            }
+
+    def reset(self):
+        """
+        This method removes all the time steps added.
+        """
+
+        self._moments[:] = 0.0
+
+    def __repr__(self):
+        str = "Module: superflexPy\nStreamingMetrics class\n"
+        str += "Members: {}\n".format(len(self._moments))
+        str += "Time steps: {}\n".format(self._moments[:, 0].max() if len(self._moments) else 0)
+
+        return str
+
+
+@jit(nopython=True, nogil=True)
+def _update_moments(moments, simulated, observed):
+    """
+    This function updates the running moments of each member with a chunk of
+    simulated and observed values. The observations can have one row, used
+    for all the members.
+    """
+
+    for m in range(simulated.shape[0]):
+        row = m if observed.shape[0] > 1 else 0
+        count, mean_sim, mean_obs, m2_sim, m2_obs, co_moment, sse = moments[m]
+
+        for t in range(simulated.shape[1]):
+            sim = simulated[m, t]
+            obs = observed[row, t]
+
+            if np.isnan(obs):
+                continue
+
+            count += 1
+            d_sim = sim - mean_sim
+            d_obs = obs - mean_obs
+            mean_sim += d_sim / count
+            mean_obs += d_obs / count
+            m2_sim += d_sim * (sim - mean_sim)
+            m2_obs += d_obs * (obs - mean_obs)
+            co_moment += d_sim * (obs - mean_obs)
+            sse += (sim - obs) ** 2
+
+        moments[m, 0] = count
+        moments[m, 1] = mean_sim
+        moments[m, 2] = mean_obs
+        moments[m, 3] = m2_sim
+        moments[m, 4] = m2_obs
+        moments[m, 5] = co_moment
+        moments[m, 6] = sse
+
+
+def _update_moments_vectorized(moments, simulated, observed):
+    """
+    This function works as _update_moments using numpy: the moments of the
+    chunk are calculated for all the members at once and merged with the
+    running ones (parallel algorithm of Chan et al.).
+    """
+
+    valid = np.broadcast_to(~np.isnan(observed), simulated.shape)
+    observed = np.where(valid, observed, 0.0)
+    simulated = np.where(valid, simulated, 0.0)
+
+    count = valid.sum(axis=1)
+    safe_count = np.maximum(count, 1)
+    mean_sim = simulated.sum(axis=1) / safe_count
+    mean_obs = observed.sum(axis=1) / safe_count
+    d_sim = np.where(valid, simulated - mean_sim[:, None], 0.0)
+    d_obs = np.where(valid, observed - mean_obs[:, None], 0.0)
+
+    old_count = moments[:, 0]
+    new_count = old_count + count
+    weight = count / np.maximum(new_count, 1)
+    delta_sim = mean_sim - moments[:, 1]
+    delta_obs = mean_obs - moments[:, 2]
+
+    moments[:, 3] += (d_sim**2).sum(axis=1) + delta_sim**2 * old_count * weight
+    moments[:, 4] += (d_obs**2).sum(axis=1) + delta_obs**2 * old_count * weight
+    moments[:, 5] += (d_sim * d_obs).sum(axis=1) + delta_sim * delta_obs * old_count * weight
+    moments[:, 6] += ((simulated - observed) ** 2).sum(axis=1)
+    moments[:, 1] += delta_sim * weight
+    moments[:, 2] += delta_obs * weight
+    moments[:, 0] = new_count
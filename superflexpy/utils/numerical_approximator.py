@@ -26,10 +26,14 @@ This file contains the implementation of the base class for the numerical
 approximator to be used to solve the elements governed by ODEs.
 """
 import inspect
+import threading
+import weakref
+from collections import OrderedDict
 
-import numba as nb
 import numpy as np
 
+from .lazy_numba import jit, nb
+
 
 class NumericalApproximator:
     """
@@ -50,6 +54,23 @@ class NumericalApproximator:
     about the class
     """
 
+    _clip_bounds = False
+    """
+    Used only by the explicit approximators solved without root finder. If
+    True, the state is clipped to the bounds returned by the fluxes function
+    """
+
+    _spec_attributes = {"root_finder": "_root_finder"}
+    """
+    Arguments of the initializer and attributes that store their values. Used
+    to describe the approximator in the specifications of the models.
+    """
+
+    _pickle_exclude = ["get_fluxes"]
+    """
+    Attributes that are not pickled: the wrappers added by the profiler
+    """
+
     def __init__(self, root_finder):
         """
         The constructor of the subclass must accept the parameters of the
@@ -59,6 +80,8 @@ class NumericalApproximator:
         ----------
         root_finder : superflexpy.utils.root_finder.RootFinder
             Solver used to find the root(s) of the differential equation(s).
+            Explicit approximators may accept None, computing the state at the
+            end of the time step directly with the method _step.
         """
 
         self._root_finder = root_finder
@@ -89,7 +112,9 @@ class NumericalApproximator:
 
             - maximum possible value of the state
         S0 : list(float)
-            Initial states used for the ODEs. One value per fun
+            Initial states used for the ODEs. One value per fun. If the values
+            are 1D numpy.ndarray, the ODEs are solved in batch mode (see
+            _solve_batch) for many independent series at once.
         **kwargs
             Additional arguments needed by fun. It must also contain dt.
 
@@ -97,7 +122,179 @@ class NumericalApproximator:
         -------
         numpy.ndarray
             Array of solutions of the ODEs. It is a 2D array with dimensions
-            (#timesteps, #functions)
+            (#timesteps, #functions) or, in batch mode, a 3D array with
+            dimensions (#timesteps, #functions, #series)
+        """
+
+        if getattr(self._root_finder, "returns_status", False):
+            return self.solve_with_status(fun, S0, **kwargs)[0]
+
+        if any(isinstance(s, np.ndarray) for s in S0):
+            return self._solve_batch(fun, S0, kwargs)
+
+        scalars, vectors, num_ts = self._split_parameters(kwargs)
+
+        # Construct the output array
+        output = []
+
+        # With numba, the loops over the time steps are specialized on the
+        # functions they call (see _get_numba_kernel)
+        for f, s_zero in zip(fun, S0):
+            args = self._build_arguments(f, kwargs, scalars, vectors, num_ts)
+
+            if self._root_finder is None and self.architecture == "numba":
+                kernel = _get_numba_kernel(_make_solve_direct_kernel, self._step, f)
+                output.append(kernel(s_zero, kwargs["dt"], num_ts, args, self._clip_bounds))
+                continue
+            elif self._root_finder is None:
+                output.append(
+                    self._solve_direct_python(
+                        step=self._step,
+                        fun=f,
+                        S0=s_zero,
+                        dt=kwargs["dt"],
+                        num_ts=num_ts,
+                        args=args,
+                        clip_bounds=self._clip_bounds,
+                    )
+                )
+                continue
+
+            root_settings = self._root_finder.get_settings()
+
+            if self.architecture == "numba":
+                kernel = _get_numba_kernel(_make_solve_kernel, self._root_finder.solve, self._differential_equation, f)
+                output.append(kernel(s_zero, kwargs["dt"], num_ts, args, root_settings))
+                continue
+
+            output.append(
+                self._solve_python(
+                    root_finder=self._root_finder.solve,  # Passing just the method
+                    diff_eq=self._differential_equation,
+                    fun=f,
+                    S0=s_zero,
+                    dt=kwargs["dt"],
+                    num_ts=num_ts,
+                    args=args,
+                    root_settings=root_settings,
+                )
+            )
+
+        return np.array(output).reshape((-1, len(fun)))
+
+    def solve_with_status(self, fun, S0, **kwargs):
+        """
+        This method solves an approximation of the ODE, like solve, and
+        returns also the status of the root finder at each time step. The
+        status is available only with root finders that return it (i.e. that
+        have the attribute returns_status, like the fallback root finders):
+        their solve method returns the root and a status code.
+
+        Parameters
+        ----------
+        fun : list(function)
+            List of functions to calculate the fluxes of the ODEs. See solve.
+        S0 : list(float)
+            Initial states used for the ODEs. See solve.
+        **kwargs
+            Additional arguments needed by fun. It must also contain dt.
+
+        Returns
+        -------
+        numpy.ndarray, numpy.ndarray
+            Array of solutions of the ODEs (see solve) and array of status
+            codes (numpy.int8) with the same dimensions. The status is None if
+            the root finder does not return it.
+        """
+
+        if not getattr(self._root_finder, "returns_status", False):
+            return self.solve(fun, S0, **kwargs), None
+
+        batch = any(isinstance(s, np.ndarray) for s in S0)
+        num_series = len(np.atleast_1d(S0[0]))
+        series_kwargs, num_ts = self._get_series_arguments(kwargs, num_series)
+
+        if self.architecture == "python":
+            solve = self._solve_status_python
+        elif self.architecture == "numba":
+            # Outside batch mode, the kernel must not be parallel since units
+            # can be solved in parallel threads
+            solve = self._solve_status_batch_numba if batch else self._solve_status_numba
+
+        vectors = list(series_kwargs)
+        output = []
+        status = []
+
+        for f, s_zero in zip(fun, S0):
+            args = self._build_arguments(f, series_kwargs, [], vectors, num_ts)
+
+            solution, loc_status = solve(
+                root_finder=self._root_finder.solve,
+                diff_eq=self._differential_equation,
+                fun=f,
+                S0=np.array(np.broadcast_to(s_zero, (num_series,)), dtype=np.float64),
+                dt=series_kwargs["dt"],
+                num_ts=num_ts,
+                args=args,
+                root_settings=self._root_finder.get_settings(),
+            )
+
+            output.append(solution.reshape((num_series, num_ts)).T)
+            status.append(loc_status.reshape((num_series, num_ts)).T)
+
+        output = np.stack(output, axis=1)
+        status = np.stack(status, axis=1)
+
+        if not batch:
+            return output[:, :, 0], status[:, :, 0]
+
+        return output, status
+
+    def get_fluxes(self, fluxes, S, S0, **kwargs):
+        output = []
+        for i, (f, s_zero) in enumerate(zip(fluxes, S0)):
+            # The function is only python. No need of numba in get_fluxes
+            args = tuple(kwargs[arg] for arg in _get_arguments_name(f))
+
+            if isinstance(s_zero, np.ndarray):
+                # Batch mode: the fluxes of all the series are calculated at
+                # once on 2D arrays (#timesteps, #series)
+                output.append(
+                    self._get_fluxes(
+                        fluxes=f,
+                        S=S[:, i, :],
+                        S0=s_zero,
+                        args=tuple(self._get_batch_argument(a, S.shape[0], S.shape[2]) for a in args),
+                        dt=self._get_batch_argument(kwargs["dt"], S.shape[0], S.shape[2]),
+                    )
+                )
+                continue
+
+            output.append(
+                self._get_fluxes(fluxes=f, S=S[:, i], S0=s_zero, args=args, dt=kwargs["dt"])  # S is a 2d np array
+            )
+
+        return output
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k not in self._pickle_exclude}
+
+    def _split_parameters(self, kwargs):
+        """
+        This method divides the arguments of the fluxes functions between
+        scalars and vectors (time series) and transforms dt in a vector.
+
+        Parameters
+        ----------
+        kwargs : dict
+            Arguments of the fluxes functions. It must contain dt. It is
+            modified in place.
+
+        Returns
+        -------
+        list(str), list(str), int
+            Names of the scalar arguments, names of the vector arguments, and
+            number of time steps.
         """
 
         # Divide between scalar and vector parameters
@@ -126,74 +323,128 @@ class NumericalApproximator:
         if "dt" not in vectors:
             kwargs["dt"] = np.array([kwargs["dt"]] * num_ts)
 
-        # Construct the output array
-        output = []
+        return scalars, vectors, num_ts
+
+    def _solve_batch(self, fun, S0, kwargs):
+        """
+        This method solves the ODEs for many independent series (e.g.
+        catchments) sharing the same structure. The initial states are 1D
+        arrays (#series,), the arguments can be floats (same value for all the
+        series and time steps), 1D arrays (#timesteps,) (same time series for
+        all the series), or 2D arrays (#timesteps, #series) or (1, #series)
+        (values of each series, constant in time). The series are solved by a
+        compiled loop, in parallel when the architecture is numba.
+
+        Returns
+        -------
+        numpy.ndarray
+            3D array of solutions with dimensions (#timesteps, #functions,
+            #series)
+        """
+
+        num_series = len(np.atleast_1d(S0[0]))
+        series_kwargs, num_ts = self._get_series_arguments(kwargs, num_series)
 
-        # Set architecture
         if self.architecture == "python":
-            self._solve = self._solve_python
+            solve = self._solve_batch_python
+            solve_direct = self._solve_direct_batch_python
         elif self.architecture == "numba":
-            self._solve = self._solve_numba
+            solve = self._solve_batch_numba
+            solve_direct = self._solve_direct_batch_numba
 
-        for f, s_zero in zip(fun, S0):
-            # Find which parameters the function needs
-            if self.architecture == "python":
-                fun_pars = list(inspect.signature(f).parameters)
-            elif self.architecture == "numba":
-                # fun_pars = list(inspect.signature(f).parameters)
-                fun_pars = list(inspect.signature(f.py_func).parameters)
-
-            args = []
-            for arg in fun_pars:
-                if arg in ["S", "S0", "ind"]:
-                    continue
-                elif arg == "dt":
-                    args.append(kwargs[arg])  # We want to treat it differently
-                elif arg in vectors:
-                    args.append(kwargs[arg])
-                elif arg in scalars:
-                    args.append(np.array([kwargs[arg]] * num_ts))
-
-            args = tuple(args)
+        vectors = list(series_kwargs)
+        output = []
 
-            root_settings = self._root_finder.get_settings()
+        for f, s_zero in zip(fun, S0):
+            args = self._build_arguments(f, series_kwargs, [], vectors, num_ts)
+            s_zero = np.array(np.broadcast_to(s_zero, (num_series,)), dtype=np.float64)
 
-            output.append(
-                self._solve(
-                    root_finder=self._root_finder.solve,  # Passing just the method
+            if self._root_finder is None:
+                solution = solve_direct(
+                    step=self._step,
+                    fun=f,
+                    S0=s_zero,
+                    dt=series_kwargs["dt"],
+                    num_ts=num_ts,
+                    args=args,
+                    clip_bounds=self._clip_bounds,
+                )
+            else:
+                solution = solve(
+                    root_finder=self._root_finder.solve,
                     diff_eq=self._differential_equation,
                     fun=f,
                     S0=s_zero,
-                    dt=kwargs["dt"],
+                    dt=series_kwargs["dt"],
                     num_ts=num_ts,
                     args=args,
-                    root_settings=root_settings,
+                    root_settings=self._root_finder.get_settings(),
                 )
-            )
 
-        return np.array(output).reshape((-1, len(fun)))
+            output.append(solution.reshape((num_series, num_ts)).T)
 
-    def get_fluxes(self, fluxes, S, S0, **kwargs):
-        output = []
-        for i, (f, s_zero) in enumerate(zip(fluxes, S0)):
-            # The function is only python. No need of numba in get_fluxes
-            fun_pars = list(inspect.signature(f).parameters)
+        return np.stack(output, axis=1)
 
-            args = []
+    def _get_series_arguments(self, kwargs, num_series):
+        """
+        This method transforms the arguments of the fluxes functions in
+        vectors with the time steps of the series one after the other (see
+        _solve_batch).
 
-            for arg in fun_pars:
-                if arg in ["S", "S0", "ind"]:
-                    continue
-                else:
-                    args.append(kwargs[arg])
+        Returns
+        -------
+        dict(str : numpy.ndarray), int
+            Arguments and number of time steps
+        """
 
-            args = tuple(args)
+        num_ts = max([np.shape(v)[0] for v in kwargs.values() if np.ndim(v) > 0 and np.shape(v)[0] > 1] + [1])
 
-            output.append(
-                self._get_fluxes(fluxes=f, S=S[:, i], S0=s_zero, args=args, dt=kwargs["dt"])  # S is a 2d np array
-            )
+        series_kwargs = {}
+        for k, v in kwargs.items():
+            if not isinstance(v, (np.ndarray, float)):
+                message = "{}the parameter {} is of type {}".format(self._error_message, k, type(v))
+                raise TypeError(message)
 
-        return output
+            v = np.asarray(v, dtype=np.float64)
+            if v.ndim == 1:
+                v = v[:, None]
+            series_kwargs[k] = np.array(np.broadcast_to(v, (num_ts, num_series)).T).reshape(-1)
+
+        return series_kwargs, num_ts
+
+    @staticmethod
+    def _get_batch_argument(arg, num_ts, num_series):
+        # Argument of the fluxes functions for all the series of the batch.
+        # Vectors are time series shared by all the series
+        if np.ndim(arg) == 0:
+            return arg
+        elif np.ndim(arg) == 1:
+            arg = np.reshape(arg, (-1, 1))
+
+        return np.broadcast_to(arg, (num_ts, num_series))
+
+    def _build_arguments(self, fun, kwargs, scalars, vectors, num_ts):
+        """
+        This method constructs the tuple of arguments needed by a fluxes
+        function, in the order of its signature. Scalars are transformed in
+        vectors.
+
+        Returns
+        -------
+        tuple(numpy.ndarray)
+            Arguments of the function (states and time step index excluded)
+        """
+
+        args = []
+        for arg in _get_arguments_name(fun):
+            if arg == "dt":
+                args.append(kwargs[arg])  # We want to treat it differently
+            elif arg in vectors:
+                args.append(kwargs[arg])
+            elif arg in scalars:
+                args.append(np.array([kwargs[arg]] * num_ts))
+
+        return tuple(args)
 
     @staticmethod
     def _solve_python(
@@ -212,14 +463,256 @@ class NumericalApproximator:
         return output
 
     @staticmethod
-    @nb.jit(nopython=True)
-    def _solve_numba(
-        root_finder, diff_eq, fun, S0, dt, num_ts, args, root_settings
-    ):  # here args are all vectors of the same lenght
+    def _solve_direct_python(step, fun, S0, dt, num_ts, args, clip_bounds):
+        output = np.zeros(num_ts)
+
+        for i in range(num_ts):
+            S, min_S, max_S = step(fluxes=fun, S0=S0, dt=dt, ind=i, args=args)
+
+            if clip_bounds:
+                S = min(max(S, min_S), max_S)
+
+            output[i] = S
+            S0 = S
+
+        return output
+
+    @staticmethod
+    def _solve_batch_python(root_finder, diff_eq, fun, S0, dt, num_ts, args, root_settings):
+        # The time steps of the series are contiguous in dt and args
+        output = np.zeros(len(S0) * num_ts)
+
+        for c in range(len(S0)):
+            S = S0[c]
+            for t in range(num_ts):
+                i = c * num_ts + t
+                root = root_finder(diff_eq=diff_eq, fluxes=fun, S0=S, dt=dt, ind=i, args=args)
+
+                output[i] = root
+                S = root
+
+        return output
+
+    @jit(nopython=True, nogil=True, parallel=True)
+    def _solve_batch_numba(root_finder, diff_eq, fun, S0, dt, num_ts, args, root_settings):
+        output = np.zeros(len(S0) * num_ts)
+
+        for c in nb.prange(len(S0)):
+            S = S0[c]
+            for t in range(num_ts):
+                i = c * num_ts + t
+                root = root_finder(
+                    diff_eq=diff_eq,
+                    fluxes=fun,
+                    S0=S,
+                    dt=dt,
+                    ind=i,
+                    args=args,
+                    tol_F=root_settings[0],
+                    tol_x=root_settings[1],
+                    iter_max=root_settings[2],
+                )
+
+                output[i] = root
+                S = root
+
+        return output
+
+    @staticmethod
+    def _solve_status_python(root_finder, diff_eq, fun, S0, dt, num_ts, args, root_settings):
+        # Root finders returning the root and a status code. The time steps
+        # of the series are contiguous in dt and args
+        output = np.zeros(len(S0) * num_ts)
+        status = np.zeros(len(S0) * num_ts, dtype=np.int8)
+
+        for c in range(len(S0)):
+            S = S0[c]
+            for t in range(num_ts):
+                i = c * num_ts + t
+                root, code = root_finder(diff_eq=diff_eq, fluxes=fun, S0=S, dt=dt, ind=i, args=args)
+
+                output[i] = root
+                status[i] = code
+                S = root
+
+        return output, status
+
+    @jit(nopython=True, nogil=True)
+    def _solve_status_numba(root_finder, diff_eq, fun, S0, dt, num_ts, args, root_settings):
+        output = np.zeros(len(S0) * num_ts)
+        status = np.zeros(len(S0) * num_ts, dtype=np.int8)
+
+        for c in range(len(S0)):
+            S = S0[c]
+            for t in range(num_ts):
+                i = c * num_ts + t
+                root, code = root_finder(
+                    diff_eq=diff_eq, fluxes=fun, S0=S, dt=dt, ind=i, args=args, settings=root_settings
+                )
+
+                output[i] = root
+                status[i] = code
+                S = root
+
+        return output, status
+
+    @jit(nopython=True, nogil=True, parallel=True)
+    def _solve_status_batch_numba(root_finder, diff_eq, fun, S0, dt, num_ts, args, root_settings):
+        output = np.zeros(len(S0) * num_ts)
+        status = np.zeros(len(S0) * num_ts, dtype=np.int8)
+
+        for c in nb.prange(len(S0)):
+            S = S0[c]
+            for t in range(num_ts):
+                i = c * num_ts + t
+                root, code = root_finder(
+                    diff_eq=diff_eq, fluxes=fun, S0=S, dt=dt, ind=i, args=args, settings=root_settings
+                )
+
+                output[i] = root
+                status[i] = code
+                S = root
+
+        return output, status
+
+    @staticmethod
+    def _solve_direct_batch_python(step, fun, S0, dt, num_ts, args, clip_bounds):
+        output = np.zeros(len(S0) * num_ts)
+
+        for c in range(len(S0)):
+            S0_c = S0[c]
+            for t in range(num_ts):
+                i = c * num_ts + t
+                S, min_S, max_S = step(fluxes=fun, S0=S0_c, dt=dt, ind=i, args=args)
+
+                if clip_bounds:
+                    S = min(max(S, min_S), max_S)
+
+                output[i] = S
+                S0_c = S
+
+        return output
+
+    @jit(nopython=True, nogil=True, parallel=True)
+    def _solve_direct_batch_numba(step, fun, S0, dt, num_ts, args, clip_bounds):
+        output = np.zeros(len(S0) * num_ts)
+
+        for c in nb.prange(len(S0)):
+            S0_c = S0[c]
+            for t in range(num_ts):
+                i = c * num_ts + t
+                S, min_S, max_S = step(fluxes=fun, S0=S0_c, dt=dt, ind=i, args=args)
+
+                if clip_bounds:
+                    if S < min_S:
+                        S = min_S
+                    elif S > max_S:
+                        S = max_S
+
+                output[i] = S
+                S0_c = S
+
+        return output
+
+    @staticmethod
+    def _step(fluxes, S0, dt, ind, args):
+        raise NotImplementedError("The method _step must be implemented to solve without root finder")
+
+    @staticmethod
+    def _differential_equation(fluxes, S, S0, dt, args):
+        raise NotImplementedError("The method _differential_equation must be implemented")
+
+    @staticmethod
+    def _get_fluxes(fluxes, S, S0, args, dt):
+        raise NotImplementedError("The method _get_fluxes must be implemented")
+
+
+_ARGUMENTS_NAME = weakref.WeakKeyDictionary()
+"""
+Names of the arguments of the fluxes functions, keyed by function. The keys
+are weak references: the names of a function are forgotten when the function
+is garbage collected.
+"""
+
+
+def _get_arguments_name(fun):
+    """
+    This function returns the names of the arguments of a fluxes function
+    (numba or python), excluding the states and the index of the time step.
+    Reading the signature is slow compared to a step of the model, therefore
+    the names are cached.
+    """
+
+    try:
+        return _ARGUMENTS_NAME[fun]
+    except (KeyError, TypeError):
+        pars = inspect.signature(getattr(fun, "py_func", fun)).parameters
+        names = tuple(p for p in pars if p not in ["S", "S0", "ind"])
+        try:
+            _ARGUMENTS_NAME[fun] = names
+        except TypeError:
+            pass  # Callables that do not support weak references are not cached
+        return names
+
+
+_MAX_KERNELS = 256
+"""
+Maximum number of specialized loops kept in _KERNELS
+"""
+
+_KERNELS = OrderedDict()
+"""
+Compiled loops specialized on the functions they call, keyed by functions.
+A loop keeps alive the functions it calls, therefore weak keys would never be
+released: the cache is bounded instead, evicting the least recently used loop
+when it holds more than _MAX_KERNELS of them. An evicted loop is compiled
+again the next time it is needed.
+"""
+
+_KERNELS_LOCK = threading.Lock()  # Elements can be solved in parallel threads
+
+
+def _get_numba_kernel(make_kernel, *functions):
+    """
+    This function returns the loop over the time steps built by make_kernel
+    for the given (numba) functions. Functions passed as arguments to a numba
+    function are typed at every call, which dominates the cost of solving few
+    time steps: the specialized loop calls them directly and is built only
+    once per combination of functions.
+    """
+
+    key = (make_kernel,) + functions
+
+    with _KERNELS_LOCK:
+        kernel = _KERNELS.pop(key, None)
+        if kernel is not None:
+            _KERNELS[key] = kernel  # Most recently used
+            return kernel
+
+    kernel = make_kernel(*functions)
+
+    with _KERNELS_LOCK:
+        _KERNELS[key] = kernel
+        while len(_KERNELS) > _MAX_KERNELS:
+            _KERNELS.popitem(last=False)
+
+    return kernel
+
+
+def _make_solve_kernel(root_finder, diff_eq, fun):
+    """
+    This function builds the loop over the time steps of an element solved
+    with a root finder, calling directly the solve method of the root finder,
+    the differential equation of the numerical approximator, and the fluxes
+    function of the element. The loop has the interface of _solve_python,
+    without the functions among the arguments.
+    """
+
+    @nb.jit(nopython=True, nogil=True)
+    def kernel(S0, dt, num_ts, args, root_settings):
         output = np.zeros(num_ts)
 
         for i in range(num_ts):
-            # Call the root finder
             root = root_finder(
                 diff_eq=diff_eq,
                 fluxes=fun,
@@ -237,10 +730,34 @@ class NumericalApproximator:
 
         return output
 
-    @staticmethod
-    def _differential_equation(fluxes, S, S0, dt, args):
-        raise NotImplementedError("The method _differential_equation must be implemented")
+    return kernel
 
-    @staticmethod
-    def _get_fluxes(fluxes, S, S0, args, dt):
-        raise NotImplementedError("The method _get_fluxes must be implemented")
+
+def _make_solve_direct_kernel(step, fun):
+    """
+    This function builds the loop over the time steps of an element solved
+    without root finder, calling directly the step of the numerical
+    approximator and the fluxes function of the element. The loop has the
+    interface of _solve_direct_python, without the functions among the
+    arguments.
+    """
+
+    @nb.jit(nopython=True, nogil=True)
+    def kernel(S0, dt, num_ts, args, clip_bounds):
+        output = np.zeros(num_ts)
+
+        for i in range(num_ts):
+            S, min_S, max_S = step(fluxes=fun, S0=S0, dt=dt, ind=i, args=args)
+
+            if clip_bounds:
+                if S < min_S:
+                    S = min_S
+                elif S > max_S:
+                    S = max_S
+
+            output[i] = S
+            S0 = S
+
+        return output
+
+    return kernel
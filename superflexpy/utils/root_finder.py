@@ -38,6 +38,19 @@ class RootFinder:
     Implementation required to increase the performance (e.g. numba)
     """
 
+    returns_status = False
+    """
+    True if the method solve returns the root and a status code, instead of
+    the root only. The status is collected by the numerical approximators
+    (see NumericalApproximator.solve_with_status).
+    """
+
+    _spec_attributes = {"tol_F": "_tol_F", "tol_x": "_tol_x", "iter_max": "_iter_max"}
+    """
+    Arguments of the initializer and attributes that store their values. Used
+    to describe the root finder in the specifications of the models.
+    """
+
     def __init__(self, tol_F=1e-8, tol_x=1e-8, iter_max=10):
         """
         The constructor of the subclass must accept the parameters of the
@@ -0,0 +1,274 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This file contains the utilities used to describe the models with compact
+specifications (see the methods to_spec and from_spec of the components).
+A specification is made of plain Python containers that describe classes,
+ids, parameters, states, and structure of the model, and can be used to
+rebuild it without re-running the code that originally created it.
+"""
+
+import importlib
+from copy import deepcopy
+
+from .memoization import fingerprint
+
+SPEC_VERSION = 1
+"""
+Version of the format of the specifications
+"""
+
+
+def class_path(cls):
+    """
+    This function returns the path (module and name) used to identify a class
+    in the specifications.
+
+    Parameters
+    ----------
+    cls : type
+        Class
+
+    Returns
+    -------
+    str
+        Path of the class (e.g. superflexpy.framework.unit.Unit)
+    """
+
+    return "{}.{}".format(cls.__module__, cls.__qualname__)
+
+
+def load_class(path):
+    """
+    This function imports the class identified by its path. Since the module
+    of the class is imported, specifications must come from trusted sources.
+
+    Parameters
+    ----------
+    path : str
+        Path of the class, as returned by class_path.
+
+    Returns
+    -------
+    type
+        Class
+    """
+
+    module, _, name = path.rpartition(".")
+
+    return getattr(importlib.import_module(module), name)
+
+
+def object_to_spec(obj):
+    """
+    This function returns the specification of an object that declares the
+    arguments of its initializer with the class attribute _spec_attributes
+    (e.g. numerical approximators and root finders).
+
+    Parameters
+    ----------
+    obj : Unknown
+        Object to describe.
+
+    Returns
+    -------
+    dict
+        Specification, with keys 'class' and 'arguments'.
+    """
+
+    arguments = {}
+
+    for argument, attribute in obj._spec_attributes.items():
+        value = getattr(obj, attribute)
+
+        if hasattr(value, "_spec_attributes"):
+            arguments[argument] = object_to_spec(value)
+        else:
+            arguments[argument] = deepcopy(value)
+
+    return {"class": class_path(obj.__class__), "arguments": arguments}
+
+
+def object_from_spec(spec):
+    """
+    This function creates an object from the specification returned by
+    object_to_spec.
+
+    Parameters
+    ----------
+    spec : dict
+        Specification of the object.
+
+    Returns
+    -------
+    Unknown
+        Object
+    """
+
+    arguments = {}
+
+    for argument, value in spec["arguments"].items():
+        if isinstance(value, dict) and "class" in value:
+            arguments[argument] = object_from_spec(value)
+        else:
+            arguments[argument] = deepcopy(value)
+
+    return load_class(spec["class"])(**arguments)
+
+
+class SpecWriter:
+    """
+    This class is used by the components to write their specification. It
+    keeps the tables of the objects that can be shared by many components
+    (numerical approximators and units), storing each distinct object once.
+    """
+
+    def __init__(self):
+        """
+        This is the initializer of the class SpecWriter.
+        """
+
+        self._tables = {"approximators": [], "units": []}
+        self._index = {}
+
+    def share(self, table, spec):
+        """
+        This method adds a specification to a table, if an identical one is
+        not already present, and returns its index.
+
+        Parameters
+        ----------
+        table : str
+            Name of the table ('approximators' or 'units').
+        spec : dict
+            Specification of the object.
+
+        Returns
+        -------
+        int
+            Index of the specification in the table.
+        """
+
+        key = (table, fingerprint(spec))
+
+        if key not in self._index:
+            self._index[key] = len(self._tables[table])
+            self._tables[table].append(spec)
+
+        return self._index[key]
+
+    def get_spec(self, model):
+        """
+        This method returns the complete specification of a model.
+
+        Parameters
+        ----------
+        model : dict
+            Specification of the component that contains all the others.
+
+        Returns
+        -------
+        dict
+            Specification of the model, including the tables of the shared
+            objects.
+        """
+
+        spec = {"version": SPEC_VERSION, "model": model}
+        spec.update(self._tables)
+
+        return spec
+
+
+class SpecReader:
+    """
+    This class is used by the components to build themselves from a
+    specification. Each object of the tables is built only once and then
+    shared, as it was in the original model.
+    """
+
+    def __init__(self, spec):
+        """
+        This is the initializer of the class SpecReader.
+
+        Parameters
+        ----------
+        spec : dict
+            Specification of the model, as returned by SpecWriter.get_spec.
+        """
+
+        if spec.get("version") != SPEC_VERSION:
+            message = "module : superflexPy, SpecReader, Error message : "
+            message += "version {} of the specification is not supported".format(spec.get("version"))
+            raise ValueError(message)
+
+        self._spec = spec
+        self._built = {}
+
+    def build(self, spec):
+        """
+        This method builds a component (or element) from its specification.
+
+        Parameters
+        ----------
+        spec : dict
+            Specification of the component, with keys 'class' and
+            'arguments'.
+
+        Returns
+        -------
+        Unknown
+            Component
+        """
+
+        return load_class(spec["class"])._from_spec(spec, self)
+
+    def get_shared(self, table, index):
+        """
+        This method returns an object of a table, building it the first time
+        it is requested.
+
+        Parameters
+        ----------
+        table : str
+            Name of the table ('approximators' or 'units').
+        index : int
+            Index of the object in the table.
+
+        Returns
+        -------
+        Unknown
+            Object
+        """
+
+        key = (table, index)
+
+        if key not in self._built:
+            spec = self._spec[table][index]
+
+            if table == "approximators":
+                self._built[key] = object_from_spec(spec)
+            else:
+                self._built[key] = self.build(spec)
+
+        return self._built[key]
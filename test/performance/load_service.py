@@ -0,0 +1,216 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This script measures the latency of the forecast service. It starts the
+service in a separate process (command line entry point), serving the model
+M4 solved with numba, and sends requests from concurrent clients, reporting
+the statistics of the latency per request. For comparison, it measures also
+the latency of the same request solved by a new Python process, which pays
+the imports and the compilation every time.
+
+Usage:
+
+    python load_service.py [--clients 4] [--requests 50] [--length 365]
+                           [--workers 2] [--cold 3]
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.service import ForecastClient
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba
+
+COLD_RUN = """
+import json, sys
+import numpy as np
+sys.path.insert(0, {package_path!r})
+from superflexpy.framework.unit import Unit
+with open({spec!r}) as f:
+    model = Unit.from_spec(json.load(f))
+rng = np.random.default_rng(0)
+model.set_input([rng.uniform(0, 10, {length}), rng.uniform(0, 3, {length})])
+model.get_output()
+"""
+
+
+def build_spec():
+    """
+    This function returns the specification of the model M4 solved with
+    numba.
+    """
+
+    num_app = ImplicitEulerNumba(root_finder=PegasusNumba())
+    ur = UnsaturatedReservoir(
+        parameters={"Smax": 50.0, "Ce": 1.0, "m": 0.01, "beta": 2.0},
+        states={"S0": 25.0},
+        approximation=num_app,
+        id="UR",
+    )
+    fr = PowerReservoir(parameters={"k": 0.1, "alpha": 1.0}, states={"S0": 10.0}, approximation=num_app, id="FR")
+
+    model = Unit(layers=[[ur], [fr]], id="M4")
+    model.set_timestep(1.0)
+
+    return model.to_spec()
+
+
+def wait_service(address, timeout=60.0):
+    """
+    This function waits until the service accepts connections.
+    """
+
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < timeout:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(address)
+            return
+        except OSError:
+            time.sleep(0.05)
+
+    raise RuntimeError("The service did not start within {} s".format(timeout))
+
+
+def statistics(latencies):
+    """
+    This function returns the statistics of the latencies, in milliseconds.
+    """
+
+    latencies = np.array(latencies) * 1e3
+
+    return {
+        "mean": latencies.mean(),
+        "p50": np.percentile(latencies, 50),
+        "p90": np.percentile(latencies, 90),
+        "p99": np.percentile(latencies, 99),
+        "max": latencies.max(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=4, help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=50, help="number of requests of each client")
+    parser.add_argument("--length", type=int, default=365, help="number of time steps of each request")
+    parser.add_argument("--workers", type=int, default=2, help="number of workers of the service")
+    parser.add_argument("--cold", type=int, default=3, help="number of runs in a new process")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    inputs = [rng.uniform(0, 10, args.length), rng.uniform(0, 3, args.length)]
+
+    with tempfile.TemporaryDirectory() as folder:
+        spec_path = join(folder, "m4.json")
+        address = join(folder, "service.sock")
+
+        with open(spec_path, "w") as f:
+            json.dump(build_spec(), f)
+
+        # New process for each request
+        cold = []
+        script = COLD_RUN.format(package_path=package_path, spec=spec_path, length=args.length)
+        for _ in range(args.cold):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", script], check=True)
+            cold.append(time.perf_counter() - start)
+
+        service = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "superflexpy.framework.service",
+                "--model",
+                "m4={}".format(spec_path),
+                "--address",
+                address,
+                "--workers",
+                str(args.workers),
+            ],
+            cwd=package_path,
+            stdout=subprocess.DEVNULL,
+        )
+
+        try:
+            wait_service(address)
+
+            # The first request compiles the kernels in the service
+            with ForecastClient(address) as client:
+                start = time.perf_counter()
+                client.run("m4", inputs, update_states=False)
+                first = time.perf_counter() - start
+
+            latencies = []
+            lock = threading.Lock()
+
+            def send_requests():
+                with ForecastClient(address) as client:
+                    for _ in range(args.requests):
+                        start = time.perf_counter()
+                        client.run("m4", inputs, update_states=False)
+                        elapsed = time.perf_counter() - start
+                        with lock:
+                            latencies.append(elapsed)
+
+            threads = [threading.Thread(target=send_requests) for _ in range(args.clients)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            total = time.perf_counter() - start
+        finally:
+            service.terminate()
+            service.wait()
+            if os.path.exists(address):
+                os.remove(address)
+
+    print("{:<30}{:>12}".format("new process [ms]", "{:.1f}".format(np.mean(cold) * 1e3)))
+    print("{:<30}{:>12}".format("service, first request [ms]", "{:.1f}".format(first * 1e3)))
+    for k, v in statistics(latencies).items():
+        print("{:<30}{:>12}".format("service, {} [ms]".format(k), "{:.2f}".format(v)))
+    print("{:<30}{:>12}".format("throughput [requests/s]", "{:.1f}".format(len(latencies) / total)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This script compares the solution of the explicit numerical approximators
+(explicit Euler and Runge Kutta 4) computed directly (root_finder=None) with
+the one computed through the explicit root finder. For each approximator and
+architecture it reports the time per time step of the two paths (fastest of
+the repeated runs, compilation excluded) and the maximum absolute difference
+between their outputs.
+
+Usage:
+
+    python measure_explicit.py [--steps 100000] [--repeat 5] [--dt 0.5]
+"""
+
+import argparse
+import sys
+import time
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.implementation.numerical_approximators.explicit_euler import (
+    ExplicitEulerNumba,
+    ExplicitEulerPython,
+)
+from superflexpy.implementation.numerical_approximators.runge_kutta_4 import (
+    RungeKutta4Numba,
+    RungeKutta4Python,
+)
+from superflexpy.implementation.root_finders.explicit import (
+    ExplicitNumba,
+    ExplicitPython,
+)
+
+APPROXIMATORS = {
+    ("euler", "python"): (ExplicitEulerPython, ExplicitPython),
+    ("euler", "numba"): (ExplicitEulerNumba, ExplicitNumba),
+    ("rk4", "python"): (RungeKutta4Python, ExplicitPython),
+    ("rk4", "numba"): (RungeKutta4Numba, ExplicitNumba),
+}
+
+
+def measure(approximation, forcing, dt, repeat):
+    """
+    This function returns the fastest time of the solution of a reservoir and
+    its output.
+    """
+
+    reservoir = PowerReservoir(
+        parameters={"k": 0.1, "alpha": 1.5}, states={"S0": 10.0}, approximation=approximation, id="FR"
+    )
+    reservoir.set_timestep(dt)
+    reservoir.set_input(forcing)
+    output = reservoir.get_output()[0]  # Compilation
+
+    times = []
+    for _ in range(repeat):
+        reservoir.reset_states()
+        start = time.perf_counter()
+        reservoir.get_output()
+        times.append(time.perf_counter() - start)
+
+    return min(times), output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=100000, help="number of time steps")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed runs")
+    parser.add_argument("--dt", type=float, default=0.5, help="length of the time step")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    forcing = [rng.gamma(0.5, 10.0, args.steps)]
+
+    print(
+        "{:<8}{:<10}{:>14}{:>18}{:>10}{:>12}".format(
+            "method", "arch", "direct [us]", "root finder [us]", "speedup", "max diff"
+        )
+    )
+
+    for (method, architecture), (approximator, root_finder) in APPROXIMATORS.items():
+        direct, out_direct = measure(approximator(), forcing, args.dt, args.repeat)
+        indirect, out_indirect = measure(approximator(root_finder=root_finder()), forcing, args.dt, args.repeat)
+
+        print(
+            "{:<8}{:<10}{:>14.3f}{:>18.3f}{:>10.2f}{:>12.1e}".format(
+                method,
+                architecture,
+                direct / args.steps * 1e6,
+                indirect / args.steps * 1e6,
+                indirect / direct,
+                float(np.max(np.abs(out_direct - out_indirect))),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This script measures the time needed to import SuperflexPy and its modules in
+a new Python process, and to run a first time step of a model with the python
+and with the numba architecture. numba must be imported only when a numba
+numerical approximator is used: the script checks it and fails (exit code 1)
+if an import that should not need numba imports it, or if an import takes
+longer than the target.
+
+Usage:
+
+    python measure_import.py [--repeat 5] [--target 1.0]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from os.path import abspath, dirname, join
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+
+MODULES = [
+    "superflexpy",
+    "superflexpy.framework.unit",
+    "superflexpy.implementation.elements.hbv",
+    "superflexpy.implementation.elements.gr4j",
+    "superflexpy.implementation.elements.hymod",
+    "superflexpy.implementation.elements.thur_model_hess",
+    "superflexpy.implementation.elements.structure_elements",
+    "superflexpy.implementation.models.gr4j",
+]
+"""
+Modules whose import must not need numba
+"""
+
+RUN = """
+import numpy as np
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import ImplicitEuler{arch}
+from superflexpy.implementation.root_finders.pegasus import Pegasus{arch}
+
+app = ImplicitEuler{arch}(root_finder=Pegasus{arch}())
+fr = PowerReservoir(parameters={{"k": 0.1, "alpha": 1.5}}, states={{"S0": 10.0}}, approximation=app, id="FR")
+unit = Unit(layers=[[fr]], id="U")
+unit.set_timestep(1.0)
+unit.set_input([np.ones(1)])
+unit.get_output()
+"""
+"""
+First time step of a unit, formatted with the architecture (Python, Numba)
+"""
+
+MEASURE = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+exec({code!r})
+elapsed = time.perf_counter() - start
+
+print(json.dumps({{"time": elapsed, "numba": "numba" in sys.modules}}))
+"""
+
+
+def measure(code, repeat):
+    """
+    This function runs the code in new Python processes and returns the
+    shortest time and whether numba was imported.
+    """
+
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(code=code)],
+            cwd=package_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        times.append(result["time"])
+
+    return min(times), result["numba"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of SuperflexPy")
+    parser.add_argument("--repeat", type=int, default=5, help="number of processes per measure")
+    parser.add_argument("--target", type=float, default=1.0, help="maximum import time [s]")
+    parser.add_argument("--report", help="file where the results are saved (json)")
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+
+    print("{:<62} {:>10} {:>7}".format("case", "time [s]", "numba"))
+
+    cases = [("import " + m, "import " + m, False) for m in MODULES]
+    cases += [("first step (python)", RUN.format(arch="Python"), False)]
+    cases += [("first step (numba)", RUN.format(arch="Numba"), True)]
+
+    for name, code, numba_expected in cases:
+        elapsed, numba_imported = measure(code, args.repeat)
+        results[name] = {"time": elapsed, "numba": numba_imported}
+
+        flag = ""
+        if numba_imported and not numba_expected:
+            flag = "  <- numba imported"
+            failed = True
+        elif name.startswith("import") and elapsed > args.target:
+            flag = "  <- slower than {} s".format(args.target)
+            failed = True
+
+        print("{:<62} {:>10.3f} {:>7}{}".format(name, elapsed, str(numba_imported), flag))
+
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This script measures, for the models shipped in
+superflexpy/implementation/models, the size of the pickled model and the
+time needed to pickle and unpickle it. The measures are repeated after a run
+of the models, when they also contain inputs and states.
+
+Usage:
+
+    python measure_pickle.py [--repeat 50]
+"""
+
+import argparse
+import pickle
+import sys
+import timeit
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.implementation.models import gr4j, hymod, m4_sf_2011, thur_M2
+
+MODELS = {
+    "m4_sf_2011": m4_sf_2011.model,
+    "gr4j": gr4j.model,
+    "hymod": hymod.model,
+    "thur_M2": thur_M2.model,
+}
+
+
+def set_input(model, num_ts=1000):
+    """
+    This function sets random inputs to the model: precipitation and
+    potential evapotranspiration for the units, precipitation, temperature,
+    and potential evapotranspiration for the nodes of the network.
+    """
+
+    rng = np.random.default_rng(0)
+    precipitation = rng.uniform(0, 10, num_ts)
+    temperature = rng.uniform(-5, 20, num_ts)
+    pet = rng.uniform(0, 3, num_ts)
+
+    if isinstance(model, Network):
+        for node in model._content:
+            node.set_input([precipitation, temperature, pet])
+    else:
+        model.set_input([precipitation, pet])
+
+
+def measure(model, repeat):
+    """
+    This function returns the size of the pickled model and the time (best of
+    the repetitions) needed to pickle and unpickle it.
+    """
+
+    data = pickle.dumps(model)
+    dump = min(timeit.repeat(lambda: pickle.dumps(model), number=1, repeat=repeat))
+    load = min(timeit.repeat(lambda: pickle.loads(data), number=1, repeat=repeat))
+
+    return len(data), dump, load
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="number of repetitions of the measures")
+    args = parser.parse_args(argv)
+
+    print("{:<25}{:>12}{:>12}{:>12}".format("model", "size [B]", "dump [ms]", "load [ms]"))
+
+    for name, model in MODELS.items():
+        model.set_timestep(1.0)
+        model.reset_states()
+
+        for label in ["", " (after run)"]:
+            if label:
+                set_input(model)
+                model.get_output()
+
+            size, dump, load = measure(model, args.repeat)
+            print("{:<25}{:>12d}{:>12.3f}{:>12.3f}".format(name + label, size, dump * 1e3, load * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This script measures the overhead of the step-wise solution of a unit
+(method update). It solves a year of hourly time steps one step at a time
+and in a single run, with the python and with the numba architecture,
+reporting the time per step and the breakdown of the time among the elements
+(using the Profiler).
+
+Usage:
+
+    python measure_update.py [--steps 8760] [--steps-per-call 1]
+"""
+
+import argparse
+import sys
+import time
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.profiler import Profiler
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba, PegasusPython
+
+APPROXIMATORS = {
+    "python": lambda: ImplicitEulerPython(root_finder=PegasusPython()),
+    "numba": lambda: ImplicitEulerNumba(root_finder=PegasusNumba()),
+}
+
+
+def build_unit(architecture):
+    """
+    This function returns a unit made of an unsaturated reservoir, a fast
+    reservoir, and a lag.
+    """
+
+    num_app = APPROXIMATORS[architecture]()
+    ur = UnsaturatedReservoir(
+        parameters={"Smax": 50.0, "Ce": 1.0, "m": 0.01, "beta": 2.0},
+        states={"S0": 25.0},
+        approximation=num_app,
+        id="UR",
+    )
+    fr = PowerReservoir(parameters={"k": 0.1, "alpha": 1.5}, states={"S0": 10.0}, approximation=num_app, id="FR")
+    lag = UnitHydrograph1(parameters={"lag-time": 3.4}, states={"lag": None}, id="L")
+
+    unit = Unit(layers=[[ur], [fr], [lag]], id="U")
+    unit.set_timestep(1.0)
+
+    return unit
+
+
+def measure(unit, forcing, steps_per_call):
+    """
+    This function returns the time of a single run over the whole period, the
+    time of the step-wise solution, and the maximum absolute difference
+    between their outputs.
+    """
+
+    num_ts = len(forcing[0])
+
+    unit.set_input(forcing)
+    unit.get_output()  # Compilation
+    unit.reset_states()
+    start = time.perf_counter()
+    reference = unit.get_output()[0]
+    batch = time.perf_counter() - start
+
+    unit.reset_states()
+    outputs = []
+    start = time.perf_counter()
+    for t in range(0, num_ts, steps_per_call):
+        outputs.append(unit.update(min(steps_per_call, num_ts - t), [f[t:] for f in forcing])[0])
+    stepped = time.perf_counter() - start
+
+    return batch, stepped, float(np.max(np.abs(np.concatenate(outputs) - reference)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=8760, help="number of time steps")
+    parser.add_argument("--steps-per-call", type=int, default=1, help="time steps solved by each call of update")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    forcing = [rng.gamma(0.5, 10.0, args.steps), rng.uniform(0.0, 3.0, args.steps)]
+    num_calls = int(np.ceil(args.steps / args.steps_per_call))
+
+    print("{:<10}{:>12}{:>16}{:>10}{:>12}".format("arch", "run [ms]", "update [us]", "ratio", "max diff"))
+
+    for architecture in APPROXIMATORS:
+        unit = build_unit(architecture)
+        batch, stepped, difference = measure(unit, forcing, args.steps_per_call)
+        print(
+            "{:<10}{:>12.3f}{:>16.1f}{:>10.0f}{:>12.1e}".format(
+                architecture, batch * 1e3, stepped / num_calls * 1e6, stepped / batch, difference
+            )
+        )
+
+        # Where the time of a call goes
+        unit.reset_states()
+        profiler = Profiler(unit)
+        for t in range(0, min(args.steps, 1000), args.steps_per_call):
+            unit.update(args.steps_per_call, [f[t:] for f in forcing])
+        profiler.detach()
+
+        for key, stat in profiler.get_statistics().items():
+            print("\t{:<20}{:>12.1f} us/call".format(key, stat["exclusive"] / max(stat["calls"], 1) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+
+This script runs the cases in test/reference_results with all the
+combinations of architecture and numerical solver, recording the wall time of
+a run, the compilation time (overhead of the first run), and the maximum
+deviation from the results of Superflex (Results.csv). The results are written
+in a report and compared with a stored baseline, flagging the regressions in
+accuracy or speed.
+
+Usage:
+
+    python run_regression.py [--repeat 10] [--tile 50] [--report report.json]
+                             [--baseline baseline.json] [--update-baseline]
+
+The script exits with code 1 if a regression is found.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+from os.path import abspath, dirname, join
+
+import numpy as np
+import pandas as pd
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.framework.node import Node
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.elements.structure_elements import Junction, Splitter
+from superflexpy.implementation.numerical_approximators.explicit_euler import (
+    ExplicitEulerNumba,
+    ExplicitEulerPython,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.numerical_approximators.runge_kutta_4 import (
+    RungeKutta4Numba,
+    RungeKutta4Python,
+)
+from superflexpy.implementation.root_finders.newton import NewtonNumba, NewtonPython
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba, PegasusPython
+
+REFERENCE_PATH = join(package_path, "test", "reference_results")
+BASELINE_PATH = join(abspath(dirname(__file__)), "baseline.json")
+
+# Name of the configuration: (architecture, function returning the numerical approximator)
+SOLVERS = {
+    "python-implicit_euler-pegasus": ("python", lambda: ImplicitEulerPython(root_finder=PegasusPython())),
+    "numba-implicit_euler-pegasus": ("numba", lambda: ImplicitEulerNumba(root_finder=PegasusNumba())),
+    "python-implicit_euler-newton": ("python", lambda: ImplicitEulerPython(root_finder=NewtonPython())),
+    "numba-implicit_euler-newton": ("numba", lambda: ImplicitEulerNumba(root_finder=NewtonNumba())),
+    "python-explicit_euler": ("python", lambda: ExplicitEulerPython(clip_bounds=True)),
+    "numba-explicit_euler": ("numba", lambda: ExplicitEulerNumba(clip_bounds=True)),
+    "python-runge_kutta_4": ("python", lambda: RungeKutta4Python(clip_bounds=True)),
+    "numba-runge_kutta_4": ("numba", lambda: RungeKutta4Numba(clip_bounds=True)),
+}
+
+
+# MODELS OF THE CASES. Each function returns the model, a function to set the
+# inputs (from the columns of input.dat), and a function that returns the
+# simulated values in the order of the columns of Results.csv.
+
+
+def _fr(num_app):
+    return PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+
+
+def _sr(num_app):
+    return PowerReservoir(parameters={"k": 1e-4, "alpha": 1.0}, states={"S0": 0.0}, approximation=num_app, id="SR")
+
+
+def _ur(num_app):
+    return UnsaturatedReservoir(
+        parameters={"Smax": 50.0, "Ce": 1.5, "m": 0.01, "beta": 1.5},
+        states={"S0": 0.2 * 50.0, "PET": None},
+        approximation=num_app,
+        id="UR",
+    )
+
+
+def _hru_2(num_app):
+    s = Splitter(weight=[[0.3], [0.7]], direction=[[0], [0]], id="S")
+    j = Junction(direction=[[0, 0]], id="J")
+    return Unit(layers=[[_ur(num_app)], [s], [_fr(num_app), _sr(num_app)], [j]], id="H2")
+
+
+def _case_fr(num_app, dt):
+    model = _fr(num_app)
+    model.set_timestep(dt)
+
+    def set_input(data):
+        model.set_input([data[:, 6]])
+
+    def collect(out):
+        return [out[0], model.state_array[:, 0]]
+
+    return model, set_input, collect
+
+
+def _case_ur(num_app, dt):
+    model = _ur(num_app)
+    model.set_timestep(dt)
+
+    def set_input(data):
+        model.set_input([data[:, 6], data[:, 7]])
+
+    def collect(out):
+        return [out[0], model.get_AET()[0], model.state_array[:, 0]]
+
+    return model, set_input, collect
+
+
+def _case_ur_fr(num_app):
+    model = Unit(layers=[[_ur(num_app)], [_fr(num_app)]], id="H1")
+    model.set_timestep(1.0)
+
+    def set_input(data):
+        model.set_input([data[:, 6], data[:, 7]])
+
+    def collect(out):
+        return [
+            out[0],
+            model.call_internal(id="UR", method="get_AET")[0],
+            model.get_internal(id="UR", attribute="state_array")[:, 0],
+            model.get_internal(id="FR", attribute="state_array")[:, 0],
+        ]
+
+    return model, set_input, collect
+
+
+def _case_ur_fr_sr(num_app):
+    model = _hru_2(num_app)
+    model.set_timestep(1.0)
+
+    def set_input(data):
+        model.set_input([data[:, 6], data[:, 7]])
+
+    def collect(out):
+        return [
+            out[0],
+            model.call_internal(id="UR", method="get_AET")[0],
+            model.get_internal(id="UR", attribute="state_array")[:, 0],
+            model.get_internal(id="FR", attribute="state_array")[:, 0],
+            model.get_internal(id="SR", attribute="state_array")[:, 0],
+        ]
+
+    return model, set_input, collect
+
+
+def _collect_node(model, prefix):
+    # Columns Q_H1, S_FR_H1 and Q_H2, E_UR_H2, S_UR_H2, S_FR_H2, S_SR_H2
+    h1 = [
+        model.call_internal(id=prefix + "H1", method="get_output", solve=False)[0],
+        model.get_internal(id=prefix + "H1_FR", attribute="state_array")[:, 0],
+    ]
+    h2 = [
+        model.call_internal(id=prefix + "H2", method="get_output", solve=False)[0],
+        model.call_internal(id=prefix + "H2_UR", method="get_AET")[0],
+        model.get_internal(id=prefix + "H2_UR", attribute="state_array")[:, 0],
+        model.get_internal(id=prefix + "H2_FR", attribute="state_array")[:, 0],
+        model.get_internal(id=prefix + "H2_SR", attribute="state_array")[:, 0],
+    ]
+    return h1, h2
+
+
+def _case_2hrus(num_app):
+    h1 = Unit(layers=[[_fr(num_app)]], id="H1")
+    model = Node(units=[h1, _hru_2(num_app)], weights=[0.4, 0.6], area=1.0, id="Cat")
+    model.set_timestep(1.0)
+
+    def set_input(data):
+        model.set_input([data[:, 6], data[:, 7]])
+
+    def collect(out):
+        h1, h2 = _collect_node(model, "")
+        # The FR of H1 has no evapotranspiration (column E_FR_H1 is zero)
+        return [out[0]] + h1[:1] + [np.zeros_like(out[0])] + h1[1:] + h2
+
+    return model, set_input, collect
+
+
+def _case_3cats_2hrus(num_app):
+    h1 = Unit(layers=[[_fr(num_app)]], id="H1")
+    h2 = _hru_2(num_app)
+    nodes = [
+        Node(units=[h1, h2], weights=[0.25, 0.75], area=10.0, id="Cat1"),
+        Node(units=[h1, h2], weights=[0.4, 0.6], area=20.0, id="Cat2"),
+        Node(units=[h1, h2], weights=[0.8, 0.2], area=30.0, id="Cat3"),
+    ]
+    model = Network(nodes=nodes, topology={"Cat1": "Cat3", "Cat2": "Cat3", "Cat3": None})
+    model.set_timestep(1.0)
+
+    def set_input(data):
+        for i, n in enumerate(nodes):
+            n.set_input([data[:, 5 + i], data[:, 8 + i]])
+
+    def collect(out):
+        values = [out["Cat1"][0], out["Cat2"][0], out["Cat3"][0]]
+        nodes_values = [_collect_node(model, "{}_".format(n.id)) for n in nodes]
+        for h1, _ in nodes_values:
+            values += h1
+        for _, h2 in nodes_values:
+            values += h2
+        return values
+
+    return model, set_input, collect
+
+
+CASES = {
+    "01_FR": lambda num_app: _case_fr(num_app, dt=1.0),
+    "02_UR": lambda num_app: _case_ur(num_app, dt=1.0),
+    "03_UR_FR": _case_ur_fr,
+    "04_UR_FR_SR": _case_ur_fr_sr,
+    "05_2HRUs": _case_2hrus,
+    "06_3Cats_2HRUs": _case_3cats_2hrus,
+    "07_FR_2dt": lambda num_app: _case_fr(num_app, dt=2.0),
+    "08_UR_2dt": lambda num_app: _case_ur(num_app, dt=2.0),
+}
+
+
+# HARNESS
+
+
+def read_case(case):
+    """
+    This function reads the inputs and the results of Superflex of a case.
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        Columns of input.dat and of Results.csv
+    """
+
+    data = pd.read_csv(
+        join(REFERENCE_PATH, case, "input.dat"),
+        header=6,
+        sep=r"\s+|,\s+|,",
+        engine="python",
+    )
+    results = pd.read_csv(join(REFERENCE_PATH, case, "Results.csv"))
+
+    return data.values.astype(float), results.values
+
+
+def run_case(case, solver, repeat, tile):
+    """
+    This function runs a case with a solver configuration. The first run
+    includes the compilation of the numba functions that have not been
+    compiled yet in the process, its overhead over the following runs is
+    reported as compilation time. The accuracy is calculated on the inputs of
+    the case, the speed on the inputs repeated tile times, to obtain run times
+    that can be measured reliably.
+
+    Parameters
+    ----------
+    case : str
+        Name of the case (folder in test/reference_results).
+    solver : str
+        Name of the solver configuration (key of SOLVERS).
+    repeat : int
+        Number of timed runs after the first one.
+    tile : int
+        Number of times the inputs are repeated in the timed runs.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys 'wall_time' (fastest of the runs, s),
+        'compile_time' (s), and 'max_deviation' (maximum absolute difference
+        from Results.csv). If the simulated values are not finite, the
+        deviation is None and the case is recorded as failed with the key
+        'error'.
+    """
+
+    data, reference = read_case(case)
+    model, set_input, collect = CASES[case](SOLVERS[solver][1]())
+    set_input(data)
+
+    start = time.perf_counter()
+    out = model.get_output()
+    first_run = time.perf_counter() - start
+
+    simulated = np.array(collect(out)).T
+    max_deviation = float(np.max(np.abs(simulated - reference)))
+
+    set_input(np.tile(data, (tile, 1)))
+    model.reset_states()
+    start = time.perf_counter()
+    model.get_output()
+    first_run += time.perf_counter() - start  # Compiled again if array types change
+    wall_times = []
+    gc.disable()  # As in timeit
+    try:
+        for _ in range(repeat):
+            model.reset_states()
+            start = time.perf_counter()
+            model.get_output()
+            wall_times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    wall_time = float(np.min(wall_times))  # Least affected by the load of the machine
+
+    res = {
+        "wall_time": wall_time,
+        "compile_time": max(first_run - wall_time * (1 + 1 / tile), 0.0),
+        "max_deviation": max_deviation,
+    }
+
+    if not np.isfinite(max_deviation):
+        # NaN is not valid JSON and cannot be compared with the baseline
+        res["max_deviation"] = None
+        res["error"] = "NonFiniteResults: the simulated values are not finite"
+
+    return res
+
+
+def run_all(repeat, tile):
+    """
+    This function runs all the cases with all the solver configurations. The
+    order is fixed, so the compilation time is always attributed to the same
+    case. Failures (e.g. root finders not converging or non-finite results)
+    are recorded, not raised.
+
+    Returns
+    -------
+    dict
+        Dictionary of results keyed by 'case/solver'
+    """
+
+    results = {}
+    for solver in SOLVERS:
+        for case in CASES:
+            try:
+                res = run_case(case, solver, repeat, tile)
+            except Exception as e:
+                res = {"error": "{}: {}".format(type(e).__name__, e)}
+
+            results["{}/{}".format(case, solver)] = res
+
+    return results
+
+
+def compare(results, baseline, speed_tolerance, min_time, accuracy_tolerance):
+    """
+    This function compares the results with the baseline. A case that fails
+    (e.g. raising an error or simulating non-finite values) is a regression
+    if it did not fail in the baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Output of run_all.
+    baseline : dict
+        Output of run_all stored as baseline.
+    speed_tolerance : float
+        Maximum accepted ratio between wall time and baseline wall time.
+    min_time : float
+        Absolute increase of wall time (s) below which slow downs are ignored.
+    accuracy_tolerance : float
+        Maximum accepted increase of the deviation from Superflex.
+
+    Returns
+    -------
+    list(str)
+        Description of the regressions.
+    """
+
+    regressions = []
+
+    for key, res in results.items():
+        if key not in baseline:
+            continue
+
+        base = baseline[key]
+
+        if "error" in res or "error" in base:
+            if "error" in res and "error" not in base:
+                regressions.append("{} failure: {}".format(key, res["error"]))
+            continue
+
+        if res["max_deviation"] > base["max_deviation"] + accuracy_tolerance:
+            regressions.append(
+                "{} accuracy: max deviation {:.3e} (baseline {:.3e})".format(
+                    key, res["max_deviation"], base["max_deviation"]
+                )
+            )
+
+        increase = res["wall_time"] - base["wall_time"]
+        if res["wall_time"] > speed_tolerance * base["wall_time"] and increase > min_time:
+            regressions.append(
+                "{} speed: wall time {:.3e} s (baseline {:.3e} s)".format(key, res["wall_time"], base["wall_time"])
+            )
+
+    return regressions
+
+
+def format_report(results, baseline):
+    lines = ["{:<50} {:>12} {:>12} {:>12} {:>8}".format("case/solver", "wall [s]", "compile [s]", "max dev", "speed")]
+
+    for key, res in results.items():
+        if "error" in res:
+            lines.append("{:<50} failed ({})".format(key, res["error"][:60]))
+            continue
+
+        if key in baseline and baseline[key].get("wall_time", 0) > 0:
+            ratio = "{:.2f}".format(res["wall_time"] / baseline[key]["wall_time"])
+        else:
+            ratio = "-"
+
+        lines.append(
+            "{:<50} {:>12.3e} {:>12.3e} {:>12.3e} {:>8}".format(
+                key, res["wall_time"], res["compile_time"], res["max_deviation"], ratio
+            )
+        )
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Performance and accuracy regression of SuperflexPy")
+    parser.add_argument("--repeat", type=int, default=10, help="number of timed runs per case")
+    parser.add_argument("--tile", type=int, default=50, help="repetitions of the inputs in the timed runs")
+    parser.add_argument("--report", default=None, help="path of the JSON report")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="path of the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as baseline")
+    parser.add_argument("--speed-tolerance", type=float, default=2.0, help="accepted ratio of wall times")
+    parser.add_argument("--min-time", type=float, default=1e-3, help="ignored increase of wall time (s)")
+    parser.add_argument("--accuracy-tolerance", type=float, default=1e-8, help="accepted increase of deviation")
+    args = parser.parse_args(argv)
+
+    results = run_all(args.repeat, args.tile)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    except FileNotFoundError:
+        baseline = {}
+
+    regressions = compare(results, baseline, args.speed_tolerance, args.min_time, args.accuracy_tolerance)
+
+    print(format_report(results, baseline))
+
+    report = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "repeat": args.repeat,
+        "tile": args.tile,
+        "results": results,
+        "regressions": regressions,
+    }
+
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, allow_nan=False)
+
+    if args.update_baseline:
+        report.pop("regressions")
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, allow_nan=False)
+        return 0
+
+    if regressions:
+        print("\nRegressions:")
+        for r in regressions:
+            print("\t" + r)
+        return 1
+
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -53,7 +53,7 @@ class TestStructureElements(unittest.TestCase):
     - 2 rounds to check that it re-sets the states to the initial value
     """
 
-    def _init_model(self, solver):
+    def _init_model(self, solver, parallel=False):
         if solver == "numba":
             solver = PegasusNumba()
             num_app = ImplicitEulerNumba(root_finder=solver)
@@ -90,7 +90,7 @@ class TestStructureElements(unittest.TestCase):
         h2 = Unit(layers=[[ur], [s], [fr, sr], [j]], id="H2")
 
         # Define the catchment
-        cat = Node(units=[h1, h2], weights=[0.4, 0.6], area=1.0, id="Cat")
+        cat = Node(units=[h1, h2], weights=[0.4, 0.6], area=1.0, id="Cat", parallel=parallel, max_workers=2)
 
         cat.set_timestep(1.0)
         self._model = cat
@@ -163,8 +163,8 @@ class TestStructureElements(unittest.TestCase):
     def test_start_stop_numba(self):
         self._test_start_stop(solver="numba")
 
-    def _test_2_rounds(self, solver):
-        self._init_model(solver=solver)
+    def _test_2_rounds(self, solver, parallel=False):
+        self._init_model(solver=solver, parallel=parallel)
         self._read_outputs()
         self._read_inputs()
 
@@ -217,6 +217,35 @@ class TestStructureElements(unittest.TestCase):
     def test_2_rounds_numba(self):
         self._test_2_rounds(solver="numba")
 
+    def test_2_rounds_parallel_python(self):
+        self._test_2_rounds(solver="python", parallel=True)
+        self._model.close()
+
+    def test_2_rounds_parallel_numba(self):
+        self._test_2_rounds(solver="numba", parallel=True)
+        self._model.close()
+
+    def test_parallel_deterministic(self):
+        self._read_inputs()
+        self._init_model(solver="numba")
+        sequential = self._model
+        self._init_model(solver="numba", parallel=True)
+
+        for model in [sequential, self._model]:
+            model.set_input([self._precipitation, self._pet])
+
+        for _ in range(3):
+            for model in [sequential, self._model]:
+                model.reset_states()
+            self.assertTrue(np.array_equal(sequential.get_output()[0], self._model.get_output()[0]))
+
+        # The pool is reused
+        pool = self._model._pool
+        self._model.get_output()
+        self.assertIs(pool, self._model._pool)
+        self._model.close()
+        self.assertIsNone(self._model._pool)
+
 
 if __name__ == "__main__":
     unittest.main()
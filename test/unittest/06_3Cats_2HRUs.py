@@ -54,7 +54,7 @@ class TestStructureElements(unittest.TestCase):
     - 2 rounds to check that it re-sets the states to the initial value
     """
 
-    def _init_model(self, solver):
+    def _init_model(self, solver, incremental=False):
         if solver == "numba":
             solver = PegasusNumba()
             num_app = ImplicitEulerNumba(root_finder=solver)
@@ -103,6 +103,7 @@ class TestStructureElements(unittest.TestCase):
                 "Cat2": "Cat3",
                 "Cat3": None,
             },
+            incremental=incremental,
         )
         net.set_timestep(1.0)
         self._cat1 = cat1
@@ -393,6 +394,137 @@ class TestStructureElements(unittest.TestCase):
     def test_2_rounds_numba(self):
         self._test_2_rounds(solver="numba")
 
+    def _test_outlets(self, solver):
+        self._init_model(solver=solver)
+        self._read_outputs()
+        self._read_inputs()
+
+        self._cat1.set_input([self._precipitation_c1[:], self._pet_c1[:]])
+        self._cat2.set_input([self._precipitation_c2[:], self._pet_c2[:]])
+        self._cat3.set_input([self._precipitation_c3[:], self._pet_c3[:]])
+
+        # Only Cat1 is solved
+        out = self._model.get_output(outlets=["Cat1"])
+
+        self.assertEqual(list(out.keys()), ["Cat1"])
+        self.assertTrue(np.allclose(out["Cat1"], self._superflex_output.iloc[:, 0]))
+        self.assertEqual(self._model.get_states(["Cat2_H1_FR_S0"])["Cat2_H1_FR_S0"], 0.0)
+        self.assertEqual(self._model.get_states(["Cat3_H1_FR_S0"])["Cat3_H1_FR_S0"], 0.0)
+
+        # The outlet needs all the upstream nodes
+        self._model.reset_states()
+        out = self._model.get_output(outlets="Cat3")
+
+        self.assertEqual(list(out.keys()), ["Cat3"])
+        self.assertTrue(np.allclose(out["Cat3"], self._superflex_output.iloc[:, 2]))
+
+        with self.assertRaises(KeyError):
+            self._model.get_output(outlets=["Cat4"])
+
+    def test_outlets_python(self):
+        self._test_outlets(solver="python")
+
+    def test_outlets_numba(self):
+        self._test_outlets(solver="numba")
+
+    def _test_incremental(self, solver):
+        self._read_inputs()
+
+        self._init_model(solver=solver)
+        reference = self._model
+        ref_cats = [self._cat1, self._cat2, self._cat3]
+
+        self._init_model(solver=solver, incremental=True)
+        incremental = self._model
+        inc_cats = [self._cat1, self._cat2, self._cat3]
+
+        # Count the nodes that are solved
+        solved = []
+
+        def count_calls(node):
+            get_output = node.get_output
+
+            def wrapper(solve=True):
+                solved.append(node.id)
+                return get_output(solve)
+
+            node.get_output = wrapper
+
+        for cat in inc_cats:
+            count_calls(cat)
+
+        inputs = [
+            [self._precipitation_c1[:], self._pet_c1[:]],
+            [self._precipitation_c2[:], self._pet_c2[:]],
+            [self._precipitation_c3[:], self._pet_c3[:]],
+        ]
+
+        for cats in [ref_cats, inc_cats]:
+            for cat, inp in zip(cats, inputs):
+                cat.set_input(inp)
+
+        def check(expected_solved, reset=True):
+            del solved[:]
+            if reset:
+                reference.reset_states()
+                incremental.reset_states()
+            out_ref = reference.get_output()
+            out_inc = incremental.get_output()
+            self.assertEqual(sorted(solved), expected_solved)
+            for cat in out_ref:
+                self.assertTrue(np.allclose(out_ref[cat], out_inc[cat]))
+            ref_states = reference.get_states()
+            inc_states = incremental.get_states()
+            for k in ref_states:
+                if ref_states[k] is None:
+                    self.assertIsNone(inc_states[k])
+                else:
+                    self.assertTrue(np.allclose(ref_states[k], inc_states[k]))
+            for id in element_ids:
+                self.assertTrue(
+                    np.allclose(
+                        reference.get_internal(id, "state_array"),
+                        incremental.get_internal(id, "state_array"),
+                    )
+                )
+
+        element_ids = ["Cat{}_{}".format(c, e) for c in [1, 2, 3] for e in ["H1_FR", "H2_UR", "H2_FR", "H2_SR"]]
+
+        check(["Cat1", "Cat2", "Cat3"])
+
+        # Nothing changed
+        check([])
+
+        # The time series of the elements are restored from the cache
+        incremental.get_internal("Cat1_H1_FR", "state_array")[:] = 0.0
+        check([])
+
+        # Input of one node
+        for cats in [ref_cats, inc_cats]:
+            cats[1].set_input([self._precipitation_c2[:] * 1.5, self._pet_c2[:]])
+        check(["Cat2"])
+
+        # States of one node
+        reference.reset_states()
+        incremental.reset_states()
+        reference.set_states({"Cat3_H2_UR_S0": 5.0})
+        incremental.set_states({"Cat3_H2_UR_S0": 5.0})
+        check(["Cat3"], reset=False)
+
+        # Shared parameters
+        reference.set_parameters({"H1_FR_k": 0.02})
+        incremental.set_parameters({"H1_FR_k": 0.02})
+        check(["Cat1", "Cat2", "Cat3"])
+
+        # The states move forward without reset
+        check(["Cat1", "Cat2", "Cat3"], reset=False)
+
+    def test_incremental_python(self):
+        self._test_incremental(solver="python")
+
+    def test_incremental_numba(self):
+        self._test_incremental(solver="numba")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,202 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import (
+    FluxAggregator,
+    InterceptionFilter,
+    ProductionStore,
+    RoutingStore,
+    UnitHydrograph1,
+    UnitHydrograph2,
+)
+from superflexpy.implementation.elements.structure_elements import (
+    Junction,
+    Splitter,
+    Transparent,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba, PegasusPython
+from superflexpy.utils.memoization import MemoizationCache
+
+
+class TestMemoization(unittest.TestCase):
+    """
+    This class tests the memoization of the solution of the elements. A GR4J
+    model with memoization must give the same results of one without it,
+    solving again only the elements affected by a change.
+    """
+
+    def _init_model(self, solver):
+        if solver == "numba":
+            solver = PegasusNumba()
+            num_app = ImplicitEulerNumba(root_finder=solver)
+        elif solver == "python":
+            solver = PegasusPython()
+            num_app = ImplicitEulerPython(root_finder=solver)
+
+        x1, x2, x3, x4 = (50.0, 0.1, 20.0, 3.5)
+
+        interception_filter = InterceptionFilter(id="ir")
+
+        production_store = ProductionStore(
+            parameters={"x1": x1, "alpha": 2.0, "beta": 5.0, "ni": 4 / 9},
+            states={"S0": 10.0},
+            approximation=num_app,
+            id="ps",
+        )
+
+        splitter = Splitter(weight=[[0.9], [0.1]], direction=[[0], [0]], id="spl")
+
+        unit_hydrograph_1 = UnitHydrograph1(parameters={"lag-time": x4}, states={"lag": None}, id="uh1")
+
+        unit_hydrograph_2 = UnitHydrograph2(parameters={"lag-time": 2 * x4}, states={"lag": None}, id="uh2")
+
+        routing_store = RoutingStore(
+            parameters={"x2": x2, "x3": x3, "gamma": 5.0, "omega": 3.5},
+            states={"S0": 10.0},
+            approximation=num_app,
+            id="rs",
+        )
+
+        transparent = Transparent(id="tr")
+
+        junction = Junction(direction=[[0, None], [1, None], [None, 0]], id="jun")
+
+        flux_aggregator = FluxAggregator(id="fa")
+
+        model = Unit(
+            layers=[
+                [interception_filter],
+                [production_store],
+                [splitter],
+                [unit_hydrograph_1, unit_hydrograph_2],
+                [routing_store, transparent],
+                [junction],
+                [flux_aggregator],
+            ],
+            id="model",
+        )
+
+        model.set_timestep(1.0)
+
+        return model
+
+    def _read_inputs(self):
+        rng = np.random.RandomState(42)
+        self._precipitation = rng.gamma(0.5, 10.0, size=200)
+        self._pet = 2.0 + np.sin(np.arange(200) / 10.0)
+
+    def _test_memoization(self, solver):
+        self._read_inputs()
+
+        reference = self._init_model(solver)
+        model = self._init_model(solver)
+
+        cache = MemoizationCache()
+        model.set_memoization(cache)
+
+        reference.set_input([self._pet, self._precipitation])
+        model.set_input([self._pet, self._precipitation])
+
+        def check(expected_hits, expected_misses):
+            before = cache.get_statistics()
+            reference.reset_states()
+            model.reset_states()
+            out_ref = reference.get_output()
+            out_memo = model.get_output()
+            after = cache.get_statistics()
+
+            self.assertTrue(np.array_equal(out_ref[0], out_memo[0]))
+            ref_states = reference.get_states()
+            memo_states = model.get_states()
+            for k in ref_states:
+                self.assertTrue(np.array_equal(ref_states[k], memo_states[k]))
+            self.assertTrue(
+                np.array_equal(
+                    reference.get_internal("rs", "state_array"),
+                    model.get_internal("rs", "state_array"),
+                )
+            )
+            self.assertEqual(after["hits"] - before["hits"], expected_hits)
+            self.assertEqual(after["misses"] - before["misses"], expected_misses)
+
+        # ps, uh1, uh2, and rs are solved
+        check(expected_hits=0, expected_misses=4)
+
+        # Nothing changed
+        check(expected_hits=4, expected_misses=0)
+
+        # Only uh2 changes: its output does not go to the routing store
+        for m in [reference, model]:
+            m.set_parameters({"model_uh2_lag-time": 9.0})
+        check(expected_hits=3, expected_misses=1)
+
+        for m in [reference, model]:
+            m.set_parameters({"model_rs_x3": 30.0})
+        check(expected_hits=3, expected_misses=1)
+
+        # Eviction
+        small_cache = MemoizationCache(max_memory=1)
+        model.set_memoization(small_cache)
+        model.reset_states()
+        model.get_output()
+        self.assertEqual(small_cache.get_statistics()["entries"], 0)
+
+    def test_memoization_python(self):
+        self._test_memoization(solver="python")
+
+    def test_memoization_numba(self):
+        self._test_memoization(solver="numba")
+
+    def test_lru(self):
+        cache = MemoizationCache(max_memory=2 * 8 * 10)
+
+        cache.put("a", np.zeros(10))
+        cache.put("b", np.zeros(10))
+        cache.get("a")  # b is now the least recently used
+        cache.put("c", np.zeros(10))
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.get_statistics()["evictions"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
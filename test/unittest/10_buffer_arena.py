@@ -0,0 +1,177 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import (
+    FluxAggregator,
+    InterceptionFilter,
+    ProductionStore,
+    RoutingStore,
+    UnitHydrograph1,
+    UnitHydrograph2,
+)
+from superflexpy.implementation.elements.structure_elements import (
+    Junction,
+    Splitter,
+    Transparent,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+
+
+class TestBufferArena(unittest.TestCase):
+    """
+    This class tests the buffer arena of the Unit. A GR4J model writing the
+    outputs of splitter and junction in preallocated buffers must give the
+    same results of one allocating new arrays at every run.
+    """
+
+    def _init_model(self):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+
+        x1, x2, x3, x4 = (50.0, 0.1, 20.0, 3.5)
+
+        interception_filter = InterceptionFilter(id="ir")
+
+        production_store = ProductionStore(
+            parameters={"x1": x1, "alpha": 2.0, "beta": 5.0, "ni": 4 / 9},
+            states={"S0": 10.0},
+            approximation=num_app,
+            id="ps",
+        )
+
+        splitter = Splitter(weight=[[0.9], [0.1]], direction=[[0], [0]], id="spl")
+
+        unit_hydrograph_1 = UnitHydrograph1(parameters={"lag-time": x4}, states={"lag": None}, id="uh1")
+
+        unit_hydrograph_2 = UnitHydrograph2(parameters={"lag-time": 2 * x4}, states={"lag": None}, id="uh2")
+
+        routing_store = RoutingStore(
+            parameters={"x2": x2, "x3": x3, "gamma": 5.0, "omega": 3.5},
+            states={"S0": 10.0},
+            approximation=num_app,
+            id="rs",
+        )
+
+        transparent = Transparent(id="tr")
+
+        junction = Junction(direction=[[0, None], [1, None], [None, 0]], id="jun")
+
+        flux_aggregator = FluxAggregator(id="fa")
+
+        model = Unit(
+            layers=[
+                [interception_filter],
+                [production_store],
+                [splitter],
+                [unit_hydrograph_1, unit_hydrograph_2],
+                [routing_store, transparent],
+                [junction],
+                [flux_aggregator],
+            ],
+            id="model",
+        )
+
+        model.set_timestep(1.0)
+
+        return model
+
+    def _read_inputs(self, length):
+        rng = np.random.RandomState(42)
+        self._precipitation = rng.gamma(0.5, 10.0, size=length)
+        self._pet = 2.0 + np.sin(np.arange(length) / 10.0)
+
+    def _test_arena(self, recycle, num_buffers):
+        reference = self._init_model()
+        model = self._init_model()
+        model.enable_buffer_arena(recycle=recycle)
+
+        self.assertEqual(model._arena.num_buffers, num_buffers)
+
+        first_buffers = None
+
+        for length in [200, 200, 150]:
+            self._read_inputs(length)
+
+            for m in [reference, model]:
+                m.set_input([self._pet, self._precipitation])
+                m.reset_states()
+
+            out_ref = reference.get_output()
+            out_arena = model.get_output()
+
+            self.assertTrue(np.array_equal(out_ref[0], out_arena[0]))
+            self.assertEqual(model._arena.nbytes, num_buffers * length * 8)
+
+            if length == 200:
+                buffers = [model._arena.get(i) for i in range(num_buffers)]
+                if first_buffers is not None:
+                    # No reallocation when the length does not change
+                    self.assertTrue(all(b1 is b2 for b1, b2 in zip(buffers, first_buffers)))
+                first_buffers = buffers
+
+        # The outputs are allocated again when the arena is disabled
+        model.disable_buffer_arena()
+        model.reset_states()
+        out_arena = model.get_output()
+        self.assertTrue(np.array_equal(out_ref[0], out_arena[0]))
+        self.assertFalse(any(np.shares_memory(out_arena[0], b) for b in buffers))
+
+    def test_arena_recycle(self):
+        # Splitter outputs are free when the junction writes
+        self._test_arena(recycle=True, num_buffers=3)
+
+    def test_arena_no_recycle(self):
+        self._test_arena(recycle=False, num_buffers=5)
+
+    def test_insert_layer(self):
+        model = self._init_model()
+        model.enable_buffer_arena(recycle=True)
+        model.insert_layer([Transparent(id="tr2")], position=6)
+
+        self.assertEqual(model._arena.num_buffers, 3)
+
+        self._read_inputs(100)
+        model.set_input([self._pet, self._precipitation])
+        reference = self._init_model()
+        reference.set_input([self._pet, self._precipitation])
+
+        self.assertTrue(np.array_equal(reference.get_output()[0], model.get_output()[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
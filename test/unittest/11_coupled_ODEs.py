@@ -0,0 +1,148 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numba as nb
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.hymod import (
+    LinearReservoir,
+    LinearReservoirCascade,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler_coupled import (
+    ImplicitEulerCoupledNumba,
+    ImplicitEulerCoupledPython,
+)
+from superflexpy.implementation.root_finders.newton_system import (
+    NewtonSystemNumba,
+    NewtonSystemPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba, PegasusPython
+
+
+class TestCoupled(unittest.TestCase):
+    """
+    This class tests the solution of coupled ODEs. A cascade of three linear
+    reservoirs solved as a coupled system must give the same results of three
+    linear reservoirs solved one after the other.
+    """
+
+    def _init_model(self, solver):
+        if solver == "numba":
+            num_app = ImplicitEulerNumba(root_finder=PegasusNumba())
+            num_app_coupled = ImplicitEulerCoupledNumba(root_finder=NewtonSystemNumba())
+        elif solver == "python":
+            num_app = ImplicitEulerPython(root_finder=PegasusPython())
+            num_app_coupled = ImplicitEulerCoupledPython(root_finder=NewtonSystemPython())
+
+        layers = []
+        for i, s in enumerate([1.0, 2.0, 3.0]):
+            layers.append(
+                [LinearReservoir(parameters={"k": 0.3}, states={"S0": s}, approximation=num_app, id="lr{}".format(i))]
+            )
+
+        self._chain = Unit(layers=layers, id="chain")
+
+        self._cascade = LinearReservoirCascade(
+            parameters={"k": 0.3},
+            states={"S1": 1.0, "S2": 2.0, "S3": 3.0},
+            approximation=num_app_coupled,
+            id="cascade",
+        )
+
+        self._chain.set_timestep(1.0)
+        self._cascade.set_timestep(1.0)
+
+    def _test_cascade(self, solver):
+        self._init_model(solver)
+
+        rng = np.random.RandomState(42)
+        precipitation = rng.gamma(0.5, 10.0, size=500)
+
+        self._chain.set_input([precipitation])
+        self._cascade.set_input([precipitation])
+
+        out_chain = self._chain.get_output()
+        out_cascade = self._cascade.get_output()
+
+        self.assertTrue(np.allclose(out_chain[0], out_cascade[0], atol=1e-10))
+
+        states = self._cascade.get_states()
+        for i, s in enumerate(["S1", "S2", "S3"]):
+            self.assertAlmostEqual(
+                self._chain.get_internal("lr{}".format(i), "state_array")[-1, 0], states["cascade_" + s]
+            )
+
+        # Post-run evaluation of the fluxes
+        self.assertTrue(np.array_equal(out_cascade[0], self._cascade.get_output(solve=False)[0]))
+
+    def test_cascade_python(self):
+        self._test_cascade(solver="python")
+
+    def test_cascade_numba(self):
+        self._test_cascade(solver="numba")
+
+    def test_newton_system(self):
+        # Nonlinear system with the initial guess outside of the bounds. The
+        # positive root is found
+        def diff_eq(fluxes, S, S0, dt, ind, args):
+            return (
+                S**2 - np.array([4.0, 9.0]) + 0.1 * S[::-1],
+                np.zeros(2),
+                np.full(2, 10.0),
+                np.diag(2 * S) + 0.1 * np.array([[0.0, 1.0], [1.0, 0.0]]),
+            )
+
+        S0 = np.array([0.5, 12.0])
+        expected = NewtonSystemPython().solve(diff_eq=diff_eq, fluxes=None, S0=S0, dt=None, ind=0, args=())
+        self.assertTrue(np.all(expected > 0))
+        self.assertTrue(np.allclose(diff_eq(None, expected, None, None, None, None)[0], 0.0, atol=1e-8))
+
+        root = NewtonSystemNumba().solve(
+            nb.njit(diff_eq), None, S0, None, 0, (), tol_F=1e-8, tol_x=1e-8, iter_max=20, max_damping=10
+        )
+        self.assertTrue(np.allclose(root, expected))
+
+    def test_single_function(self):
+        num_app = ImplicitEulerCoupledPython(root_finder=NewtonSystemPython())
+
+        with self.assertRaises(ValueError):
+            num_app.solve(fun=[None, None], S0=[0.0, 0.0], dt=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from copy import copy
+from os.path import abspath, dirname, join
+
+import numba as nb
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.implementation.elements.structure_elements import (
+    Junction,
+    JunctionNumba,
+    Linker,
+    LinkerNumba,
+    Splitter,
+    SplitterNumba,
+    Transparent,
+    TransparentNumba,
+    route_fluxes,
+)
+from superflexpy.utils.buffer_arena import BufferArena
+
+
+class TestStructureNumba(unittest.TestCase):
+    """
+    This class tests the compiled structure elements. They must give the same
+    outputs of the python ones and their routing arrays must be usable inside
+    numba kernels.
+    """
+
+    def _read_inputs(self):
+        rng = np.random.RandomState(42)
+        self._fluxes = [rng.rand(100) for _ in range(3)]
+
+    def test_splitter(self):
+        self._read_inputs()
+        weight = [[0.3, 0.5, 1.0], [0.7, 0.5, 0.0]]
+        direction = [[0, 1, 2], [0, None, 1]]
+
+        python = Splitter(weight=weight, direction=direction, id="spl")
+        numba = SplitterNumba(weight=weight, direction=direction, id="spl")
+
+        for el in [python, numba, copy(numba)]:
+            el.set_input(self._fluxes)
+
+        for out_python, out_numba in zip(python.get_output(), numba.get_output()):
+            self.assertEqual(len(out_python), len(out_numba))
+            for f_python, f_numba in zip(out_python, out_numba):
+                self.assertTrue(np.allclose(f_python, f_numba))
+
+        # The routing is updated with the weight
+        numba.set_weight([[0.1, 0.5, 1.0], [0.9, 0.5, 0.0]])
+        self.assertTrue(np.allclose(numba.get_output()[1][0], 0.9 * self._fluxes[0]))
+
+    def test_junction(self):
+        self._read_inputs()
+        direction = [[0, None], [1, 0], [None, None]]
+
+        python = Junction(direction=direction, id="jun")
+        numba = JunctionNumba(direction=direction, id="jun")
+
+        for el in [python, numba]:
+            el.set_input([self._fluxes[:2], self._fluxes[2:]])
+
+        out_python = python.get_output()
+        out_numba = numba.get_output()
+
+        self.assertTrue(np.allclose(out_python[0], out_numba[0]))
+        self.assertTrue(np.allclose(out_python[1], out_numba[1]))
+        self.assertTrue(np.array_equal(out_numba[2], np.zeros(100)))
+
+    def test_buffers(self):
+        self._read_inputs()
+        arena = BufferArena(num_buffers=8)
+        arena.allocate(100)
+
+        splitter = SplitterNumba(
+            weight=[[0.3, 0.5, 1.0], [0.7, 0.5, 0.0]], direction=[[0, 1, 2], [0, None, 1]], id="spl"
+        )
+        reference = copy(splitter)
+        splitter.set_output_buffers([[arena.get(0), arena.get(2), arena.get(4)], [arena.get(6), arena.get(1)]])
+        junction = JunctionNumba(direction=[[0, None], [1, 0], [None, None]], id="jun")
+        junction.set_output_buffers([arena.get(3), arena.get(5), arena.get(7)])
+
+        for _ in range(2):
+            arena.get(7)[:] = np.nan  # Outputs without contributions are set to zero
+            splitter.set_input(self._fluxes)
+            reference.set_input(self._fluxes)
+            junction.set_input([self._fluxes[:2], self._fluxes[2:]])
+
+            out_spl = splitter.get_output()
+            out_jun = junction.get_output()
+            input_block = splitter._input_block
+
+            # The outputs are written in the buffers
+            self.assertIs(out_spl[1][0], arena.get(6))
+            self.assertIs(out_jun[0], arena.get(3))
+            for out, out_ref in zip(out_spl, reference.get_output()):
+                for f, f_ref in zip(out, out_ref):
+                    self.assertTrue(np.allclose(f, f_ref))
+            self.assertTrue(np.allclose(out_jun[1], self._fluxes[1] + self._fluxes[2]))
+            self.assertTrue(np.array_equal(out_jun[2], np.zeros(100)))
+
+        # The inputs are copied in the same array at every run
+        splitter.get_output()
+        self.assertIs(splitter._input_block, input_block)
+
+        # Buffers that do not belong to the same array are not used
+        splitter.set_output_buffers([[np.empty(100), np.empty(100), np.empty(100)], [np.empty(100), np.empty(100)]])
+        self.assertIsNone(splitter._output_block)
+        self.assertTrue(np.allclose(splitter.get_output()[1][0], 0.7 * self._fluxes[0]))
+
+    def test_linker_transparent(self):
+        self._read_inputs()
+
+        linker = LinkerNumba(direction=[1, 0], id="lin")
+        linker.set_input([self._fluxes[:1], self._fluxes[1:]])
+        reference = Linker(direction=[1, 0], id="lin")
+        reference.set_input([self._fluxes[:1], self._fluxes[1:]])
+
+        self.assertEqual(linker.get_output(), reference.get_output())
+
+        fluxes = np.array(self._fluxes)
+        routed = route_fluxes(fluxes, *linker.get_routing([1, 2]))
+        self.assertTrue(np.array_equal(routed, fluxes[[1, 2, 0]]))
+
+        transparent = TransparentNumba(id="tr")
+        self.assertTrue(np.array_equal(route_fluxes(fluxes, *transparent.get_routing(3)), fluxes))
+        self.assertIsInstance(transparent, Transparent)
+
+    def test_nopython(self):
+        self._read_inputs()
+
+        splitter = SplitterNumba(weight=[[0.9], [0.1]], direction=[[0], [0]], id="spl")
+        junction = JunctionNumba(direction=[[0, 0]], id="jun")
+
+        @nb.jit(nopython=True)
+        def split_and_join(fluxes, routing_spl, routing_jun):
+            split = route_fluxes(fluxes, *routing_spl)
+            return route_fluxes(split, *routing_jun)
+
+        output = split_and_join(
+            np.array(self._fluxes[:1]),
+            splitter.get_routing(),
+            junction.get_routing([1, 1]),
+        )
+
+        self.assertTrue(np.allclose(output[0], self._fluxes[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
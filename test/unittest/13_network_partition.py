@@ -0,0 +1,174 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+from unittest import mock
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.framework.network_partition import (
+    NetworkExecutor,
+    estimate_costs,
+    partition_network,
+)
+from superflexpy.framework.node import Node
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.elements.structure_elements import Junction, Splitter
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba
+
+
+class TestNetworkPartition(unittest.TestCase):
+    """
+    This class tests the solution of a network using multiple processes. The
+    results must be the same of Network.get_output.
+    """
+
+    def _init_model(self):
+        num_app = ImplicitEulerNumba(root_finder=PegasusNumba())
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+        h1 = Unit(layers=[[fr]], id="H1")
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+        sr = PowerReservoir(parameters={"k": 1e-4, "alpha": 1.0}, states={"S0": 0.0}, approximation=num_app, id="SR")
+        ur = UnsaturatedReservoir(
+            parameters={"Smax": 50.0, "Ce": 1.5, "m": 0.01, "beta": 1.5},
+            states={"S0": 0.2 * 50.0, "PET": None},
+            approximation=num_app,
+            id="UR",
+        )
+        s = Splitter(weight=[[0.3], [0.7]], direction=[[0], [0]], id="S")
+        j = Junction(direction=[[0, 0]], id="J")
+        h2 = Unit(layers=[[ur], [s], [fr, sr], [j]], id="H2")
+
+        rng = np.random.RandomState(42)
+        nodes = []
+        for i, (w, area) in enumerate([(0.25, 10.0), (0.4, 20.0), (0.8, 30.0), (0.5, 5.0)]):
+            node = Node(units=[h1, h2], weights=[w, 1 - w], area=area, id="Cat{}".format(i + 1))
+            node.set_input([rng.gamma(0.5, 10.0, size=100), np.full(100, 2.0)])
+            nodes.append(node)
+
+        net = Network(
+            nodes=nodes,
+            topology={"Cat1": "Cat3", "Cat2": "Cat3", "Cat3": "Cat4", "Cat4": None},
+        )
+        net.set_timestep(1.0)
+
+        return net
+
+    def _assert_equal_outputs(self, reference, output):
+        for cat in output:
+            for o_ref, o in zip(reference[cat], output[cat]):
+                self.assertTrue(np.allclose(o_ref, o, rtol=1e-12, atol=0.0))
+
+    def test_partition(self):
+        net = self._init_model()
+
+        costs = {"Cat1": 1.0, "Cat2": 1.0, "Cat3": 1.0, "Cat4": 1.0}
+        partitions, trunk = partition_network(net, num_workers=2, costs=costs)
+        self.assertEqual(sorted(partitions), [["Cat1"], ["Cat2"]])
+        self.assertEqual(trunk, ["Cat3", "Cat4"])
+
+        # Cat1 dominates the cost: it is given alone to one worker
+        costs["Cat1"] = 10.0
+        partitions, trunk = partition_network(net, num_workers=2, costs=costs)
+        self.assertEqual(partitions, [["Cat1"], ["Cat2"]])
+
+        # One worker takes the whole network
+        partitions, trunk = partition_network(net, num_workers=1)
+        self.assertEqual(partitions, [["Cat4"]])
+        self.assertEqual(trunk, [])
+
+        estimated = estimate_costs(net)
+        self.assertTrue(all(v > 0 for v in estimated.values()))
+
+    def test_executor(self):
+        reference = self._init_model()
+        net = self._init_model()
+
+        with NetworkExecutor(net, num_workers=2) as executor:
+            partitions, trunk = executor.get_partitions()
+            self.assertEqual(trunk, ["Cat3", "Cat4"])
+
+            out_ref = reference.get_output()
+            output = executor.get_output()
+            self.assertEqual(sorted(output), ["Cat1", "Cat2", "Cat3", "Cat4"])
+            self._assert_equal_outputs(out_ref, output)
+
+            # Start from the final states
+            self._assert_equal_outputs(reference.get_output(), executor.get_output())
+
+            # Shared parameters are changed in all the workers
+            parameters = {"H1_FR_k": 0.02, "H2_SR_k": 1e-3}
+            for m in [reference, executor]:
+                m.set_parameters(parameters)
+                m.reset_states()
+            self._assert_equal_outputs(reference.get_output(), executor.get_output())
+
+            states_ref = reference.get_states()
+            states = executor.get_states()
+            self.assertEqual(sorted(states_ref), sorted(states))
+
+            # Inputs
+            inputs = {"Cat1": [np.ones(50), np.ones(50)]}
+            for cat in ["Cat2", "Cat3", "Cat4"]:
+                inputs[cat] = [np.zeros(50), np.ones(50)]
+
+            for cat in inputs:
+                reference.call_internal(cat, "set_input", input=inputs[cat])
+            executor.set_input(inputs)
+
+            self._assert_equal_outputs(reference.get_output(), executor.get_output())
+
+    def test_executor_trunk_error(self):
+        reference = self._init_model()
+        net = self._init_model()
+        trunk_node = net._content[net._content_pointer["Cat3"]]
+
+        with NetworkExecutor(net, num_workers=2) as executor:
+            with mock.patch.object(trunk_node, "get_output", side_effect=ValueError("trunk")):
+                with self.assertRaises(ValueError):
+                    executor.get_output()
+
+            # The replies of the workers have been read: the following
+            # requests receive the right results
+            executor.reset_states()
+            self.assertEqual(sorted(executor.get_states()), sorted(reference.get_states()))
+            self._assert_equal_outputs(reference.get_output(), executor.get_output())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.implementation.elements.hymod import LinearReservoir
+from superflexpy.implementation.numerical_approximators.explicit_euler import (
+    ExplicitEulerNumba,
+    ExplicitEulerPython,
+)
+from superflexpy.implementation.numerical_approximators.runge_kutta_4 import (
+    RungeKutta4Numba,
+    RungeKutta4Python,
+)
+from superflexpy.implementation.root_finders.explicit import (
+    ExplicitNumba,
+    ExplicitPython,
+)
+from superflexpy.utils.memoization import MemoizationCache
+
+
+class TestExplicitKernels(unittest.TestCase):
+    """
+    This class tests the explicit approximators used without root finder. The
+    solution must be the same obtained using the explicit root finder and,
+    for Euler, the one calculated by hand.
+    """
+
+    def _get_reservoir(self, approximation, k=0.3, dt=1.0):
+        lr = LinearReservoir(parameters={"k": k}, states={"S0": 5.0}, approximation=approximation, id="lr")
+        lr.set_timestep(dt)
+
+        rng = np.random.RandomState(42)
+        lr.set_input([rng.gamma(0.5, 10.0, size=300)])
+
+        return lr
+
+    def _test_root_finder(self, approximator, root_finder):
+        for dt in [1.0, 0.5]:
+            direct = self._get_reservoir(approximator(), dt=dt)
+            indirect = self._get_reservoir(approximator(root_finder=root_finder()), dt=dt)
+
+            self.assertTrue(np.allclose(direct.get_output()[0], indirect.get_output()[0], rtol=1e-12))
+            self.assertTrue(np.allclose(direct.state_array, indirect.state_array, rtol=1e-12))
+
+    def test_rk4_python(self):
+        self._test_root_finder(RungeKutta4Python, ExplicitPython)
+
+    def test_rk4_numba(self):
+        self._test_root_finder(RungeKutta4Numba, ExplicitNumba)
+
+    def test_euler_python(self):
+        self._test_root_finder(ExplicitEulerPython, ExplicitPython)
+
+    def test_euler_numba(self):
+        self._test_root_finder(ExplicitEulerNumba, ExplicitNumba)
+
+    def _test_euler_by_hand(self, approximator):
+        lr = self._get_reservoir(approximator(), dt=0.5)
+        lr.get_output()
+
+        S = 5.0
+        expected = []
+        for p in lr.input["P"]:
+            S = S + 0.5 * (p - 0.3 * S)
+            expected.append(S)
+
+        self.assertTrue(np.allclose(lr.state_array[:, 0], expected, rtol=1e-12))
+
+    def test_euler_by_hand_python(self):
+        self._test_euler_by_hand(ExplicitEulerPython)
+
+    def test_euler_by_hand_numba(self):
+        self._test_euler_by_hand(ExplicitEulerNumba)
+
+    def _test_clip_bounds(self, approximator):
+        # With k * dt > 1 explicit Euler overshoots below zero
+        unclipped = self._get_reservoir(approximator(), k=3.0)
+        clipped = self._get_reservoir(approximator(clip_bounds=True), k=3.0)
+        unclipped.get_output()
+        clipped.get_output()
+
+        self.assertTrue(np.any(unclipped.state_array < 0.0))
+        self.assertTrue(np.all(clipped.state_array >= 0.0))
+
+    def test_clip_bounds_python(self):
+        self._test_clip_bounds(ExplicitEulerPython)
+
+    def test_clip_bounds_numba(self):
+        self._test_clip_bounds(ExplicitEulerNumba)
+
+    def test_memoization(self):
+        cache = MemoizationCache()
+        lr = self._get_reservoir(RungeKutta4Numba())
+        lr.set_memoization(cache)
+
+        out = lr.get_output()[0]
+        lr.reset_states()
+        self.assertTrue(np.array_equal(out, lr.get_output()[0]))
+        self.assertEqual(cache.get_statistics()["hits"], 1)
+
+    def test_architecture(self):
+        with self.assertRaises(ValueError):
+            RungeKutta4Numba(root_finder=ExplicitPython())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+from unittest import mock
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework import element as element_module
+from superflexpy.framework.element import LagElement
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1, UnitHydrograph2
+from superflexpy.implementation.elements.thur_model_hess import HalfTriangularLag
+from superflexpy.utils.memoization import MemoizationCache
+
+
+class TriangularLag(LagElement):
+    # Custom lag element that opts in the cache of the weights
+    _weight_cache = MemoizationCache(max_memory=1e6)
+
+    def _build_weight(self, lag_time):
+        weight = []
+
+        for t in lag_time:
+            w = np.zeros(int(np.ceil(t)))
+            w[:] = 1.0 / len(w)
+            weight.append(w)
+
+        return weight
+
+
+def _area_uh1(bin, len):
+    return 0 if bin <= 0 else ((bin / len) ** 2.5 if bin < len else 1)
+
+
+def _area_uh2(bin, len):
+    half_len = len / 2
+    if bin <= 0:
+        return 0
+    elif bin < half_len:
+        return 0.5 * (bin / half_len) ** 2.5
+    elif bin < len:
+        return 1 - 0.5 * (2 - bin / half_len) ** 2.5
+    else:
+        return 1
+
+
+def _area_half_triangular(bin, len):
+    return 0 if bin <= 0 else ((bin / len) ** 2 if bin < len else 1)
+
+
+class TestLagWeights(unittest.TestCase):
+    """
+    This class tests the construction of the weights of the lag elements. The
+    vectorized weights must be equal to the ones calculated bin by bin and the
+    cached weights must be shared by the instances of the same class.
+    """
+
+    def _test_weights(self, element_class, area):
+        element = element_class(parameters={"lag-time": 2.0}, states={"lag": None}, id="lag")
+
+        for t in [0.5, 1.0, 2.0, 2.3, 3.7, 10.0, 31.9]:
+            expected = np.array([area(i + 1, t) - area(i, t) for i in range(int(np.ceil(t)))])
+            weight = element._build_weight([t])[0]
+
+            self.assertEqual(weight.shape, expected.shape)
+            self.assertTrue(np.allclose(weight, expected, rtol=0.0, atol=1e-15))
+            self.assertAlmostEqual(weight.sum(), 1.0)
+
+    def test_uh1(self):
+        self._test_weights(UnitHydrograph1, _area_uh1)
+
+    def test_uh2(self):
+        self._test_weights(UnitHydrograph2, _area_uh2)
+
+    def test_half_triangular(self):
+        self._test_weights(HalfTriangularLag, _area_half_triangular)
+
+    def test_cache(self):
+        UnitHydrograph2._weight_cache.clear()
+        hits = UnitHydrograph2._weight_cache.get_statistics()["hits"]
+
+        rng = np.random.RandomState(42)
+        precipitation = rng.gamma(0.5, 10.0, size=100)
+
+        outputs = []
+        weights = []
+        for i in range(2):
+            element = UnitHydrograph2(parameters={"lag-time": 4.5}, states={"lag": None}, id="uh{}".format(i))
+            element.set_input([precipitation, 2 * precipitation])
+            outputs.append(element.get_output())
+            weights.append(element._weight)
+
+        # Two fluxes for each of the two elements: one miss and three hits
+        self.assertEqual(UnitHydrograph2._weight_cache.get_statistics()["hits"] - hits, 3)
+        self.assertIs(weights[0][0], weights[1][1])
+        self.assertFalse(weights[0][0].flags.writeable)
+
+        for o_0, o_1 in zip(outputs[0], outputs[1]):
+            self.assertTrue(np.array_equal(o_0, o_1))
+
+        # Same results without cache
+        element = UnitHydrograph2(parameters={"lag-time": 4.5}, states={"lag": None}, id="uh")
+        element._weight_cache = None
+        element.set_input([precipitation, 2 * precipitation])
+        for o_0, o_1 in zip(outputs[0], element.get_output()):
+            self.assertTrue(np.array_equal(o_0, o_1))
+
+    def test_custom_element(self):
+        element = TriangularLag(parameters={"lag-time": [3.0, 5.0]}, states={"lag": None}, id="lag")
+        element.set_input([np.ones(10), np.ones(10)])
+        element.get_output()
+        element.reset_states()  # The weights are taken again
+        element.get_output()
+
+        statistics = TriangularLag._weight_cache.get_statistics()
+        self.assertEqual(statistics["entries"], 2)
+        self.assertEqual(statistics["hits"], 2)
+
+    def test_state_length(self):
+        # Changing the lag time without resetting the states: the state is
+        # fitted to the new weights, with the same results for the compiled
+        # and the vectorized solution, and no water is lost
+        for lag_time in [4.0, 2.0]:
+            outputs = []
+            for numba_loaded in [True, False]:
+                element = TriangularLag(parameters={"lag-time": 3.0}, states={"lag": None}, id="uh")
+                element.set_input([np.arange(1.0, 6.0)])
+                first_output = element.get_output()[0].sum()
+                element.set_parameters({"uh_lag-time": lag_time})
+
+                with mock.patch.object(element_module, "is_numba_loaded", return_value=numba_loaded):
+                    outputs.append(element.get_output()[0])
+
+                final_state = element.get_states()["uh_lag"][0]
+                self.assertEqual(len(final_state), lag_time)
+                self.assertAlmostEqual(first_output + outputs[-1].sum() + final_state.sum(), 2 * 15.0)
+
+            self.assertTrue(np.allclose(outputs[0], outputs[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import json
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.framework.node import Node
+from superflexpy.framework.profiler import Profiler
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.implementation.elements.structure_elements import Junction, Splitter
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+
+
+class TestProfiler(unittest.TestCase):
+    """
+    This class tests the profiler. The times must be recorded for all the
+    components, keyed by prefixed id, and the components must work as before
+    once the profiler is detached.
+    """
+
+    def _init_model(self):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+        sr = PowerReservoir(parameters={"k": 1e-4, "alpha": 1.0}, states={"S0": 0.0}, approximation=num_app, id="SR")
+        lag = UnitHydrograph1(parameters={"lag-time": 2.3}, states={"lag": None}, id="L")
+        s = Splitter(weight=[[0.3], [0.7]], direction=[[0], [0]], id="S")
+        j = Junction(direction=[[0, 0]], id="J")
+
+        h1 = Unit(layers=[[fr]], id="H1")
+        h2 = Unit(layers=[[s], [fr, sr], [j], [lag]], id="H2")
+
+        cat1 = Node(units=[h1, h2], weights=[0.4, 0.6], area=1.0, id="Cat1")
+        cat2 = Node(units=[h1], weights=[1.0], area=2.0, id="Cat2")
+
+        self._model = Network(nodes=[cat1, cat2], topology={"Cat1": "Cat2", "Cat2": None})
+        self._model.set_timestep(1.0)
+
+        rng = np.random.RandomState(42)
+        for node in [cat1, cat2]:
+            node.set_input([rng.gamma(0.5, 10.0, size=50)])
+
+    def test_statistics(self):
+        self._init_model()
+        expected = self._model.get_output()
+
+        self._model.reset_states()
+        profiler = Profiler(self._model, compile_events=False)
+        out = self._model.get_output()
+        profiler.detach()
+
+        for k in expected:
+            self.assertTrue(np.array_equal(expected[k][0], out[k][0]))
+
+        statistics = profiler.get_statistics()
+
+        kinds = {
+            "network": "network",
+            "Cat1": "node",
+            "Cat1_H2": "unit",
+            "Cat1_H2_S": "element",
+            "Cat1_H2_FR:solve": "solve",
+            "Cat1_H2_FR:get_fluxes": "get_fluxes",
+            "Cat1_H2_L:solve": "solve",
+            "Cat2_H1_FR": "element",
+        }
+        for k, kind in kinds.items():
+            self.assertEqual(statistics[k]["kind"], kind)
+            self.assertEqual(statistics[k]["calls"], 1)
+
+        self.assertEqual(statistics["Cat1_H2_S"]["class"], "Splitter")
+        self.assertNotIn("compile", profiler.get_summary())
+
+        # Exclusive times sum to the total time
+        total = sum(v["exclusive"] for v in statistics.values())
+        self.assertAlmostEqual(total, statistics["network"]["inclusive"])
+
+        for v in statistics.values():
+            self.assertLessEqual(v["exclusive"], v["inclusive"] + 1e-12)
+
+        # The inclusive time of a unit contains the ones of its elements
+        elements = sum(statistics["Cat1_H2_" + e]["inclusive"] for e in ["S", "FR", "SR", "J", "L"])
+        self.assertLessEqual(elements, statistics["Cat1_H2"]["inclusive"])
+
+    def test_detach(self):
+        self._init_model()
+
+        profiler = Profiler(self._model)
+        self._model.get_output()
+        profiler.detach()
+
+        self.assertNotIn("get_output", self._model.__dict__)
+        node = self._model._content[0]
+        self.assertNotIn("get_output", node.__dict__)
+        element = node._content[1]._layers[1][0]
+        self.assertNotIn("_solve_differential_equation", element.__dict__)
+        self.assertNotIn("get_fluxes", element._num_app.__dict__)
+
+        # No more records
+        self._model.get_output()
+        self.assertEqual(profiler.get_statistics()["network"]["calls"], 1)
+
+        with self.assertRaises(RuntimeError):
+            profiler.attach(self._model)
+            profiler.attach(self._model)
+
+        profiler.detach()
+
+    def test_export(self):
+        self._init_model()
+
+        profiler = Profiler(self._model, compile_events=False)
+        self._model.get_output()
+        self._model.get_output(solve=False)
+        profiler.detach()
+
+        statistics = json.loads(profiler.to_json())
+        self.assertEqual(statistics["Cat1_H1"]["calls"], 2)
+        self.assertEqual(statistics["Cat1_H1_FR:solve"]["calls"], 1)
+
+        trace = profiler.to_chrome_trace()["traceEvents"]
+        self.assertEqual(len(trace), sum(v["calls"] for v in statistics.values()))
+        self.assertEqual({e["ph"] for e in trace}, {"X"})
+
+        # All the events are nested in one of the two runs of the network
+        networks = [e for e in trace if e["name"] == "network"]
+        self.assertEqual(len(networks), 2)
+        for e in trace:
+            self.assertTrue(
+                any(n["ts"] <= e["ts"] and e["ts"] + e["dur"] <= n["ts"] + n["dur"] + 1e-3 for n in networks)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.framework.node import Node
+from superflexpy.framework.profiler import Profiler
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+
+
+class TestMemoryReport(unittest.TestCase):
+    """
+    This class tests the memory report of the components. The memory of the
+    arrays retained by the elements must be reported once, for the first
+    component that retains them.
+    """
+
+    def _init_model(self, incremental=False):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+        lag = UnitHydrograph1(parameters={"lag-time": 3.5}, states={"lag": None}, id="L")
+
+        self._unit = Unit(layers=[[fr], [lag]], id="H1")
+        self._node = Node(units=[self._unit], weights=[1.0], area=1.0, id="Cat")
+        self._network = Network(nodes=[self._node], topology={"Cat": None}, incremental=incremental)
+        self._network.set_timestep(1.0)
+
+        self._num_ts = 100
+        self._node.set_input([np.ones(self._num_ts)])
+
+    def test_unit(self):
+        self._init_model()
+        unit = self._node._content[0]
+        unit.set_input([np.ones(self._num_ts)])
+        unit.get_output()
+
+        report = unit.memory_report()
+
+        # The input of the unit is the one of the reservoir
+        self.assertEqual(report["H1"]["inputs"], self._num_ts * 8)
+        self.assertEqual(report["H1_FR"]["inputs"], 0)
+        self.assertEqual(report["H1_FR"]["state_array"], self._num_ts * 8)
+
+        # Output of the reservoir, history, weights, and final state of the
+        # lag
+        self.assertEqual(report["H1_L"]["inputs"], self._num_ts * 8)
+        self.assertEqual(report["H1_L"]["state_array"], self._num_ts * 4 * 8)
+        self.assertEqual(report["H1_L"]["weights"], 4 * 8)
+        self.assertEqual(report["H1_L"]["states"], 4 * 8)
+
+        self.assertEqual(report["H1"]["inclusive"], sum(report[k]["total"] for k in ["H1", "H1_FR", "H1_L"]))
+
+    def test_network(self):
+        self._init_model(incremental=True)
+        self._network.get_output()
+
+        report = self._network.memory_report()
+
+        self.assertEqual(list(report.keys()), ["network", "Cat", "Cat_H1", "Cat_H1_FR", "Cat_H1_L"])
+
+        # The node copies its inputs to the units
+        self.assertEqual(report["Cat"]["inputs"], self._num_ts * 8)
+        self.assertEqual(report["Cat_H1"]["inputs"], self._num_ts * 8)
+
+        # Outputs and states cached by the incremental network
+        self.assertGreaterEqual(report["network"]["cache"], 2 * self._num_ts * 8)
+
+        self.assertEqual(report["network"]["inclusive"], sum(v["total"] for v in report.values()))
+
+    def test_peak(self):
+        self._init_model()
+
+        profiler = Profiler(self._network, compile_events=False, memory=True)
+        self._network.get_output()
+        profiler.detach()
+
+        report = self._network.memory_report(profiler=profiler)
+
+        for k in ["network", "Cat", "Cat_H1", "Cat_H1_FR", "Cat_H1_L"]:
+            self.assertIn("peak", report[k])
+
+        # The peak of the lag contains its history
+        self.assertGreaterEqual(report["Cat_H1_L"]["peak"], self._num_ts * 4 * 8)
+        self.assertGreaterEqual(report["network"]["peak"], report["Cat_H1_L"]["peak"])
+
+        self.assertNotIn("peak", self._network.memory_report()["network"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import json
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.framework.node import Node
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.elements.structure_elements import Junction, Splitter
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+)
+from superflexpy.implementation.numerical_approximators.runge_kutta_4 import (
+    RungeKutta4Python,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba
+
+
+class TestModelSpec(unittest.TestCase):
+    """
+    This class tests the specifications of the components. Rebuilding a model
+    from its specification must give a model with the same parameters,
+    states, structure, and outputs, sharing approximators and compiled
+    kernels.
+    """
+
+    def _init_model(self, shared_parameters=True):
+        num_app = ImplicitEulerNumba(root_finder=PegasusNumba(tol_F=1e-10))
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+        h1 = Unit(layers=[[fr]], id="H1")
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+        sr = PowerReservoir(
+            parameters={"k": 1e-4, "alpha": 1.0},
+            states={"S0": 0.0},
+            approximation=RungeKutta4Python(clip_bounds=True),
+            id="SR",
+        )
+        ur = UnsaturatedReservoir(
+            parameters={"Smax": 50.0, "Ce": 1.5, "m": 0.01, "beta": 1.5},
+            states={"S0": 10.0, "PET": None},
+            approximation=num_app,
+            id="UR",
+        )
+        s = Splitter(weight=[[0.3], [0.7]], direction=[[0], [0]], id="S")
+        j = Junction(direction=[[0, 0]], id="J")
+        lag = UnitHydrograph1(parameters={"lag-time": 2.3}, states={"lag": None}, id="L")
+
+        h2 = Unit(layers=[[ur], [s], [fr, sr], [j], [lag]], id="H2", parameters={"area": 1.0})
+
+        cat1 = Node(units=[h1, h2], weights=[0.25, 0.75], area=10.0, id="Cat1", shared_parameters=shared_parameters)
+        cat2 = Node(units=[h1, h2], weights=[0.4, 0.6], area=20.0, id="Cat2", shared_parameters=shared_parameters)
+
+        net = Network(nodes=[cat1, cat2], topology={"Cat1": "Cat2", "Cat2": None})
+        net.set_timestep(1.0)
+
+        return net
+
+    def _set_input(self, net):
+        rng = np.random.default_rng(1)
+        for cat in ["Cat1", "Cat2"]:
+            net.call_internal(cat, "set_input", input=[rng.uniform(0, 10, 50), rng.uniform(0, 3, 50)])
+
+    def _check_same(self, net, new_net):
+        self.assertEqual(net.get_parameters(), new_net.get_parameters())
+        self.assertEqual(net.get_states(), new_net.get_states())
+
+        self._set_input(net)
+        self._set_input(new_net)
+        out = net.get_output()
+        new_out = new_net.get_output()
+
+        for cat in out:
+            for o, n in zip(out[cat], new_out[cat]):
+                np.testing.assert_array_equal(o, n)
+
+    def test_network(self):
+        for shared_parameters in [True, False]:
+            net = self._init_model(shared_parameters)
+            spec = net.to_spec()
+
+            # Identical units and approximators are stored once
+            self.assertEqual(len(spec["units"]), 2)
+            self.assertEqual(len(spec["approximators"]), 2)
+
+            # The specification is JSON serializable
+            spec = json.loads(json.dumps(spec))
+            new_net = Network.from_spec(spec)
+            self._check_same(net, new_net)
+
+            # The specification is not modified by the rebuild
+            self.assertEqual(spec, json.loads(json.dumps(net.to_spec())))
+
+    def test_shared_parameters(self):
+        net = Network.from_spec(self._init_model(shared_parameters=True).to_spec())
+        net.set_parameters({"H2_FR_k": 0.02})
+        self.assertEqual(net.get_internal("Cat1_H2_FR", "_parameters")["H2_FR_k"], 0.02)
+        self.assertEqual(net.get_internal("Cat2_H2_FR", "_parameters")["H2_FR_k"], 0.02)
+
+        net = Network.from_spec(self._init_model(shared_parameters=False).to_spec())
+        net.set_parameters({"Cat1_H2_FR_k": 0.02})
+        self.assertEqual(net.get_internal("Cat1_H2_FR", "_parameters")["Cat1_H2_FR_k"], 0.02)
+        self.assertEqual(net.get_internal("Cat2_H2_FR", "_parameters")["Cat2_H2_FR_k"], 0.01)
+
+    def test_shared_kernels(self):
+        net = self._init_model()
+        self._set_input(net)
+        net.get_output()
+
+        fluxes = net.get_internal("Cat1_H2_UR", "_fluxes")[0]
+        num_signatures = len(fluxes.signatures)
+
+        new_net = Network.from_spec(net.to_spec())
+        self._set_input(new_net)
+        new_net.get_output()
+
+        # The approximator is shared among the elements
+        self.assertIs(
+            new_net.get_internal("Cat1_H2_UR", "_num_app"),
+            new_net.get_internal("Cat2_H1_FR", "_num_app"),
+        )
+        self.assertIsNot(new_net.get_internal("Cat1_H2_UR", "_num_app"), net.get_internal("Cat1_H2_UR", "_num_app"))
+
+        # No new compilation
+        self.assertIs(new_net.get_internal("Cat1_H2_UR", "_fluxes")[0], fluxes)
+        self.assertEqual(len(fluxes.signatures), num_signatures)
+
+    def test_components(self):
+        net = self._init_model()
+
+        node = net._content[0]
+        new_node = Node.from_spec(node.to_spec())
+        self.assertEqual(node.get_parameters(), new_node.get_parameters())
+        self.assertEqual(new_node.area, 10.0)
+
+        h2 = node._content[1]
+        new_h2 = Unit.from_spec(h2.to_spec())
+        self.assertEqual(h2.get_parameters(), new_h2.get_parameters())
+        self.assertEqual(new_h2.get_internal("S", "_weight"), [[0.3], [0.7]])
+
+        with self.assertRaises(TypeError):
+            Unit.from_spec(node.to_spec())
+
+        spec = node.to_spec()
+        spec["version"] = 0
+        with self.assertRaises(ValueError):
+            Node.from_spec(spec)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import pickle
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.framework.node import Node
+from superflexpy.framework.profiler import Profiler
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.elements.structure_elements import (
+    Junction,
+    SplitterNumba,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba
+from superflexpy.utils.memoization import MemoizationCache
+
+
+class _CustomReservoir(PowerReservoir):
+    def __init__(self, k, states, approximation, id):
+        super().__init__(parameters={"k": k, "alpha": 1.0}, states=states, approximation=approximation, id=id)
+
+
+class TestPickle(unittest.TestCase):
+    """
+    This class tests the pickling of the components. The compiled kernels,
+    caches, results of the last run, and profiler wrappers are not pickled;
+    the unpickled model uses the kernels of the classes and, continuing the
+    simulation, gives the same results of the original one.
+    """
+
+    def _init_model(self, parallel=False, incremental=False):
+        num_app = ImplicitEulerNumba(root_finder=PegasusNumba())
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+        sr = PowerReservoir(parameters={"k": 1e-4, "alpha": 1.0}, states={"S0": 0.0}, approximation=num_app, id="SR")
+        ur = UnsaturatedReservoir(
+            parameters={"Smax": 50.0, "Ce": 1.5, "m": 0.01, "beta": 1.5},
+            states={"S0": 10.0, "PET": None},
+            approximation=num_app,
+            id="UR",
+        )
+        s = SplitterNumba(weight=[[0.3], [0.7]], direction=[[0], [0]], id="S")
+        j = Junction(direction=[[0, 0]], id="J")
+        lag = UnitHydrograph1(parameters={"lag-time": 2.3}, states={"lag": None}, id="L")
+
+        h1 = Unit(layers=[[ur], [s], [fr, sr], [j], [lag]], id="H1")
+        h2 = Unit(layers=[[fr]], id="H2")
+
+        cat1 = Node(units=[h1, h2], weights=[0.25, 0.75], area=10.0, id="Cat1", parallel=parallel)
+        cat2 = Node(units=[h1, h2], weights=[0.4, 0.6], area=20.0, id="Cat2", parallel=parallel)
+
+        net = Network(nodes=[cat1, cat2], topology={"Cat1": "Cat2", "Cat2": None}, incremental=incremental)
+        net.set_timestep(1.0)
+        cat1._content[0].enable_buffer_arena()
+
+        rng = np.random.default_rng(1)
+        for cat in [cat1, cat2]:
+            cat.set_input([rng.uniform(0, 10, 50), rng.uniform(0, 3, 50)])
+
+        return net
+
+    def _check_continue(self, net, new_net):
+        self.assertEqual(net.get_parameters(), new_net.get_parameters())
+
+        out = net.get_output()
+        new_out = new_net.get_output()
+
+        for cat in out:
+            for o, n in zip(out[cat], new_out[cat]):
+                np.testing.assert_array_equal(o, n)
+
+    def test_network(self):
+        net = self._init_model()
+        net.get_output()
+
+        new_net = pickle.loads(pickle.dumps(net))
+
+        # Kernels of the classes and approximator shared among the elements
+        ur = new_net.get_internal("Cat1_H1_UR", "__dict__")
+        self.assertIs(ur["_fluxes"][0], UnsaturatedReservoir._fluxes_function_numba)
+        self.assertIs(ur["_num_app"], new_net.get_internal("Cat2_H2_FR", "_num_app"))
+        self.assertNotIn("_solve", ur["_num_app"].__dict__)
+
+        # Shared parameters are still shared
+        self.assertIs(
+            new_net.get_internal("Cat1_H1_FR", "_parameters"), new_net.get_internal("Cat2_H1_FR", "_parameters")
+        )
+
+        # Results of the last run are not pickled
+        self.assertNotIn("state_array", ur)
+
+        self._check_continue(net, new_net)
+
+    def test_custom_element(self):
+        # Elements whose initializer has a different signature
+        num_app = ImplicitEulerNumba(root_finder=PegasusNumba())
+        fr = _CustomReservoir(k=0.01, states={"S0": 5.0}, approximation=num_app, id="FR")
+        fr.set_timestep(1.0)
+        fr.set_input([np.linspace(0.0, 10.0, 20)])
+        fr.get_output()
+
+        new_fr = pickle.loads(pickle.dumps(fr))
+
+        self.assertIsInstance(new_fr, _CustomReservoir)
+        self.assertIs(new_fr._fluxes[0], PowerReservoir._fluxes_function_numba)
+
+        out = fr.get_output()[0]
+        new_out = new_fr.get_output()[0]
+        np.testing.assert_array_equal(out, new_out)
+
+    def test_runtime_objects(self):
+        net = self._init_model(parallel=True, incremental=True)
+        net.set_memoization(MemoizationCache())
+        profiler = Profiler(net, compile_events=False)
+        net.get_output()
+
+        data = pickle.dumps(net)
+        profiler.detach()
+        new_net = pickle.loads(data)
+
+        self.assertNotIn("get_output", new_net.__dict__)
+        self.assertNotIn("get_output", new_net.get_internal("Cat1_H1_UR", "__dict__"))
+        self.assertIsNone(new_net.get_internal("Cat1_H1_UR", "_memo"))
+        self.assertIsNone(new_net._content[0]._pool)
+        self.assertEqual(new_net._cache, {})
+        self.assertEqual(new_net._content[0]._content[0]._arena.nbytes, 0)
+
+        self._check_continue(net, new_net)
+        for node in net._content + new_net._content:
+            node.close()
+
+    def test_size(self):
+        net = self._init_model()
+        size = len(pickle.dumps(net))
+        net.get_output()
+
+        # The time series of the states and the buffers are not pickled
+        report = net.memory_report()
+        state_array = sum(v.get("state_array", 0) for v in report.values())
+        retained = sum(v["total"] - v.get("state_array", 0) - v.get("buffers", 0) for v in report.values())
+        self.assertLess(len(pickle.dumps(net)) - size, retained + state_array // 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
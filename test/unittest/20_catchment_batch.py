@@ -0,0 +1,277 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from copy import deepcopy
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.catchment_batch import CatchmentBatch
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import (
+    FluxAggregator,
+    InterceptionFilter,
+    ProductionStore,
+    RoutingStore,
+    UnitHydrograph1,
+    UnitHydrograph2,
+)
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.elements.hymod import LinearReservoirCascade
+from superflexpy.implementation.elements.structure_elements import (
+    Junction,
+    JunctionNumba,
+    Splitter,
+    SplitterNumba,
+    Transparent,
+)
+from superflexpy.implementation.numerical_approximators.explicit_euler import (
+    ExplicitEulerNumba,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler_coupled import (
+    ImplicitEulerCoupledPython,
+)
+from superflexpy.implementation.numerical_approximators.runge_kutta_4 import (
+    RungeKutta4Numba,
+)
+from superflexpy.implementation.root_finders.newton_system import NewtonSystemPython
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba, PegasusPython
+
+
+class TestCatchmentBatch(unittest.TestCase):
+    """
+    This class tests the solution of many catchments at once. Outputs and
+    final states must be the ones obtained solving the unit for each
+    catchment, for python and numba structures, with and without root finder,
+    and splitting the catchments in batches.
+    """
+
+    def _init_model(self, architecture):
+        if architecture == "python":
+            num_app = ImplicitEulerPython(root_finder=PegasusPython())
+            splitter = Splitter(weight=[[0.9], [0.1]], direction=[[0], [0]], id="spl")
+            junction = Junction(direction=[[0, None], [1, None], [None, 0]], id="jun")
+        else:
+            num_app = ImplicitEulerNumba(root_finder=PegasusNumba())
+            splitter = SplitterNumba(weight=[[0.9], [0.1]], direction=[[0], [0]], id="spl")
+            junction = JunctionNumba(direction=[[0, None], [1, None], [None, 0]], id="jun")
+
+        self._model = Unit(
+            layers=[
+                [InterceptionFilter(id="ir")],
+                [
+                    ProductionStore(
+                        parameters={"x1": 50.0, "alpha": 2.0, "beta": 5.0, "ni": 4 / 9},
+                        states={"S0": 10.0},
+                        approximation=num_app,
+                        id="ps",
+                    )
+                ],
+                [splitter],
+                [
+                    UnitHydrograph1(parameters={"lag-time": 3.5}, states={"lag": None}, id="uh1"),
+                    UnitHydrograph2(parameters={"lag-time": 7.0}, states={"lag": None}, id="uh2"),
+                ],
+                [
+                    RoutingStore(
+                        parameters={"x2": 0.1, "x3": 20.0, "gamma": 5.0, "omega": 3.5},
+                        states={"S0": 10.0},
+                        approximation=num_app,
+                        id="rs",
+                    ),
+                    Transparent(id="tr"),
+                ],
+                [junction],
+                [FluxAggregator(id="fa")],
+            ],
+            id="model",
+        )
+        self._model.set_timestep(1.0)
+
+    def _read_inputs(self, num_catchments=7, num_ts=150):
+        rng = np.random.RandomState(42)
+        self._P = rng.gamma(0.5, 6.0, size=(num_catchments, num_ts))
+        self._E = rng.uniform(0.0, 4.0, size=(num_catchments, num_ts))
+
+        x4 = rng.uniform(1.2, 4.0, size=num_catchments)
+        self._parameters = {
+            "model_ps_x1": rng.uniform(50.0, 500.0, size=num_catchments),
+            "model_uh1_lag-time": x4,
+            "model_uh2_lag-time": 2 * x4,
+            "model_rs_x3": rng.uniform(10.0, 100.0, size=num_catchments),
+        }
+        self._states = {"model_ps_S0": rng.uniform(0.0, 40.0, size=num_catchments)}
+
+    def _run_reference(self, model, inputs, parameters, states):
+        model = deepcopy(model)
+        outputs = []
+        final_states = []
+
+        for c in range(len(inputs[0])):
+            model.reset_states()
+            model.set_parameters({k: float(v[c]) for k, v in parameters.items()})
+            model.set_states({k: float(v[c]) for k, v in states.items()})
+            model.set_input([i[c] for i in inputs])
+            outputs.append(model.get_output())
+            final_states.append(model.get_states())
+
+        return outputs, final_states
+
+    def _check(self, outputs, states, reference_outputs, reference_states):
+        for c, (loc_out, loc_states) in enumerate(zip(reference_outputs, reference_states)):
+            for o, ro in zip(outputs, loc_out):
+                self.assertTrue(np.allclose(o[c], ro))
+
+            for k, v in loc_states.items():
+                if isinstance(v, float):
+                    self.assertAlmostEqual(states[k][c], v)
+                elif isinstance(v, list):
+                    # The lags of the batch are as long as the longest one
+                    for s, rs in zip(states[k], v):
+                        self.assertTrue(np.allclose(s[c, : len(rs)], rs))
+                        self.assertTrue(np.all(s[c, len(rs) :] == 0))
+
+    def _test_gr4j(self, architecture, batch_size):
+        self._init_model(architecture)
+        self._read_inputs()
+
+        runner = CatchmentBatch(self._model, batch_size=batch_size)
+        outputs, states = runner.run(inputs=[self._P, self._E], parameters=self._parameters, states=self._states)
+
+        self.assertEqual(len(outputs), 1)
+        self.assertEqual(outputs[0].shape, self._P.shape)
+
+        reference = self._run_reference(self._model, [self._P, self._E], self._parameters, self._states)
+        self._check(outputs, states, *reference)
+
+        # The runner works on a copy
+        self.assertEqual(self._model.get_parameters(["model_ps_x1"])["model_ps_x1"], 50.0)
+
+    def test_gr4j_python(self):
+        self._test_gr4j("python", batch_size=None)
+
+    def test_gr4j_numba(self):
+        self._test_gr4j("numba", batch_size=3)
+
+    def test_restart(self):
+        # Solving in two parts, restarting from the final states, is the
+        # same as solving in one go
+        self._init_model("numba")
+        self._read_inputs()
+        runner = CatchmentBatch(self._model)
+
+        outputs, states = runner.run(inputs=[self._P, self._E], parameters=self._parameters)
+
+        first, loc_states = runner.run(inputs=[self._P[:, :70], self._E[:, :70]], parameters=self._parameters)
+        loc_states = {k: v for k, v in loc_states.items() if v is not None}
+        second, restart_states = runner.run(
+            inputs=[self._P[:, 70:], self._E[:, 70:]], parameters=self._parameters, states=loc_states
+        )
+
+        self.assertTrue(np.allclose(outputs[0][:, :70], first[0]))
+        self.assertTrue(np.allclose(outputs[0][:, 70:], second[0]))
+        self.assertTrue(np.allclose(states["model_rs_S0"], restart_states["model_rs_S0"]))
+
+    def test_direct_solution(self):
+        # Explicit approximators without root finder and inputs shared among
+        # the catchments
+        self._test_direct_solution(RungeKutta4Numba(root_finder=None, clip_bounds=True))
+        self._test_direct_solution(ExplicitEulerNumba(root_finder=None, clip_bounds=True))
+
+    def _test_direct_solution(self, num_app):
+        model = Unit(
+            layers=[
+                [
+                    UnsaturatedReservoir(
+                        parameters={"Smax": 50.0, "Ce": 1.0, "m": 0.01, "beta": 2.0},
+                        states={"S0": 25.0},
+                        approximation=num_app,
+                        id="UR",
+                    )
+                ],
+                [
+                    PowerReservoir(
+                        parameters={"k": 0.1, "alpha": 1.0}, states={"S0": 10.0}, approximation=num_app, id="FR"
+                    )
+                ],
+            ],
+            id="M4",
+        )
+        model.set_timestep(1.0)
+        self._read_inputs()
+
+        parameters = {"M4_UR_Smax": np.array([40.0, 80.0, 120.0]), "M4_FR_k": 0.2}
+        runner = CatchmentBatch(model, batch_size=2)
+        outputs, states = runner.run(inputs=[self._P[0], self._E[0]], parameters=parameters)
+
+        reference = self._run_reference(
+            model,
+            [np.tile(self._P[0], (3, 1)), np.tile(self._E[0], (3, 1))],
+            {k: np.broadcast_to(v, (3,)) for k, v in parameters.items()},
+            {},
+        )
+        self._check(outputs, states, *reference)
+
+    def test_lag_state(self):
+        # A lag state longer than the weights keeps all its water
+        lag = UnitHydrograph1(parameters={"lag-time": np.array([2.0, 3.0])}, states={"lag": None}, id="uh1")
+        lag.set_input([np.ones((5, 2))])
+        lag.set_states({"uh1_lag": [np.ones((6, 2))]})
+
+        output = lag.get_output()[0]
+        final_state = lag.get_states()["uh1_lag"][0]
+
+        self.assertTrue(np.allclose(output.sum(axis=0) + final_state.sum(axis=0), 5.0 + 6.0))
+
+    def test_errors(self):
+        self._init_model("python")
+        self._read_inputs()
+        runner = CatchmentBatch(self._model)
+
+        with self.assertRaises(ValueError):
+            runner.run(inputs=[self._P, self._E], parameters={"model_ps_x1": np.ones(3)})
+
+        cascade = LinearReservoirCascade(
+            parameters={"k": 0.1},
+            states={"S1": 0.0, "S2": 0.0, "S3": 0.0},
+            approximation=ImplicitEulerCoupledPython(root_finder=NewtonSystemPython()),
+            id="cr",
+        )
+        with self.assertRaises(ValueError):
+            CatchmentBatch(Unit(layers=[[cascade]], id="model"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.sensitivity import (
+    MorrisEstimator,
+    SensitivityAnalysis,
+    SobolEstimator,
+    morris_design,
+    sobol_design,
+)
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+
+
+def _ishigami(X):
+    X = -np.pi + 2 * np.pi * X
+    return np.sin(X[:, 0]) + 7 * np.sin(X[:, 1]) ** 2 + 0.1 * X[:, 2] ** 4 * np.sin(X[:, 0])
+
+
+def _mean_flow(outputs):
+    return outputs[0].mean(axis=1)
+
+
+class TestSensitivity(unittest.TestCase):
+    """
+    This class tests the sensitivity analysis. The estimators must find the
+    analytical Sobol indices of the Ishigami function, the designs must not
+    depend on the size of the blocks, and the analysis of a unit must give
+    the same results in the calling process and in worker processes.
+    """
+
+    def _init_model(self):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+
+        ur = UnsaturatedReservoir(
+            parameters={"Smax": 50.0, "Ce": 1.0, "m": 0.01, "beta": 2.0},
+            states={"S0": 25.0},
+            approximation=num_app,
+            id="UR",
+        )
+        fr = PowerReservoir(parameters={"k": 0.1, "alpha": 1.0}, states={"S0": 10.0}, approximation=num_app, id="FR")
+
+        self._model = Unit(layers=[[ur], [fr]], id="M4")
+        self._model.set_timestep(1.0)
+
+        rng = np.random.RandomState(42)
+        self._inputs = [rng.gamma(0.5, 6.0, size=100), rng.uniform(0.0, 4.0, size=100)]
+        self._bounds = {"M4_UR_Smax": (50.0, 300.0), "M4_FR_k": (0.01, 0.5), "M4_UR_beta": (1.0, 4.0)}
+
+    def test_sobol_ishigami(self):
+        estimator = SobolEstimator(3)
+        for block in sobol_design(3, 20000, block_size=1000, seed=1):
+            estimator.update(_ishigami(block))
+
+        indices = estimator.get_indices()
+
+        self.assertTrue(np.allclose(indices["S1"], [0.314, 0.442, 0.0], atol=0.03))
+        self.assertTrue(np.allclose(indices["ST"], [0.558, 0.442, 0.244], atol=0.03))
+
+    def test_morris_design(self):
+        blocks = list(morris_design(3, 50, num_levels=4, block_size=7, seed=2))
+        design = np.concatenate(blocks)
+
+        self.assertEqual(len(blocks), 8)
+        self.assertEqual(design.shape, (50 * 4, 3))
+        self.assertTrue(np.all((design >= 0) & (design <= 1)))
+        self.assertTrue(np.array_equal(design, next(morris_design(3, 50, num_levels=4, block_size=50, seed=2))))
+
+        for num_levels in [0, 1, 3]:
+            with self.assertRaises(ValueError):
+                morris_design(3, 50, num_levels=num_levels)
+
+        # One parameter changes at each step, by 2/3
+        step = np.abs(np.diff(design.reshape((50, 4, 3)), axis=1))
+        self.assertTrue(np.all(np.sum(step > 0, axis=2) == 1))
+        self.assertTrue(np.allclose(step.max(axis=2), 2 / 3))
+
+        # Linear function: all the effects are equal to the coefficients
+        estimator = MorrisEstimator(3)
+        estimator.update(design, design @ np.array([1.0, -2.0, 0.0]))
+        indices = estimator.get_indices()
+
+        self.assertTrue(np.allclose(indices["mu"], [1.0, -2.0, 0.0]))
+        self.assertTrue(np.allclose(indices["mu_star"], [1.0, 2.0, 0.0]))
+        self.assertTrue(np.allclose(indices["sigma"], 0.0))
+
+    def test_sobol_design(self):
+        design = np.concatenate(list(sobol_design(2, 10, block_size=10, seed=3)))
+        blocks = list(sobol_design(2, 10, block_size=3, seed=3))
+
+        A, B, AB_0, AB_1 = design.reshape((4, 10, 2))
+        self.assertTrue(np.array_equal(AB_0[:, 0], B[:, 0]) and np.array_equal(AB_0[:, 1], A[:, 1]))
+        self.assertTrue(np.array_equal(AB_1[:, 0], A[:, 0]) and np.array_equal(AB_1[:, 1], B[:, 1]))
+
+        self.assertEqual([len(b) for b in blocks], [12, 12, 12, 4])
+        self.assertTrue(np.array_equal(blocks[1].reshape((4, 3, 2))[0], A[3:6]))
+
+    def test_unit(self):
+        self._init_model()
+
+        serial = SensitivityAnalysis(self._model, self._inputs, _mean_flow, self._bounds, block_size=40)
+        parallel = SensitivityAnalysis(
+            self._model, self._inputs, _mean_flow, self._bounds, block_size=15, num_workers=2
+        )
+
+        sobol = serial.sobol(16, seed=0)
+        morris = serial.morris(8, seed=0)
+
+        for indices, reference in [(parallel.sobol(16, seed=0), sobol), (parallel.morris(8, seed=0), morris)]:
+            for k in reference:
+                for p in self._bounds:
+                    self.assertAlmostEqual(indices[k][p], reference[k][p])
+
+        # Smax controls the evapotranspiration and, therefore, the mean flow
+        self.assertGreater(morris["mu_star"]["M4_UR_Smax"], morris["mu_star"]["M4_FR_k"])
+        self.assertLess(morris["mu"]["M4_UR_Smax"], 0.0)
+
+    def test_errors(self):
+        self._init_model()
+
+        with self.assertRaises(KeyError):
+            SensitivityAnalysis(self._model, self._inputs, _mean_flow, {"M4_UR_k": (0.0, 1.0)})
+
+
+if __name__ == "__main__":
+    unittest.main()
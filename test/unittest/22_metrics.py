@@ -0,0 +1,137 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+from unittest import mock
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.catchment_batch import CatchmentBatch
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+from superflexpy.utils import metrics as metrics_module
+from superflexpy.utils.metrics import StreamingMetrics
+
+
+def _reference(sim, obs):
+    valid = ~np.isnan(obs)
+    sim = sim[valid]
+    obs = obs[valid]
+
+    r = np.corrcoef(sim, obs)[0, 1]
+    alpha = np.std(sim) / np.std(obs)
+    beta = np.mean(sim) / np.mean(obs)
+
+    return {
+        "NSE": 1 - np.sum((sim - obs) ** 2) / np.sum((obs - np.mean(obs)) ** 2),
+        "KGE": 1 - np.sqrt((r - 1) ** 2 + (alpha - 1) ** 2 + (beta - 1) ** 2),
+        "RMSE": np.sqrt(np.mean((sim - obs) ** 2)),
+    }
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    This class tests the streaming metrics. Passing the series in one go or
+    in chunks must give the metrics calculated on the full series, also when
+    evaluating a batch of catchments in chunks of time steps.
+    """
+
+    def _read_inputs(self):
+        rng = np.random.RandomState(42)
+        self._obs = 100.0 + rng.gamma(2.0, 3.0, size=500)  # Large mean, to check the cancellation
+        self._sim = np.array([self._obs + rng.normal(0.0, s, size=500) for s in [0.5, 2.0, 5.0]])
+        self._obs[[3, 200, 201]] = np.nan
+
+    def _test_single_pass(self):
+        self._read_inputs()
+
+        one_go = StreamingMetrics(num_members=3)
+        one_go.update(self._sim, self._obs)
+
+        chunks = StreamingMetrics(num_members=3)
+        for start in range(0, 500, 77):
+            chunks.update(self._sim[:, start : start + 77], self._obs[start : start + 77])
+
+        for m in range(3):
+            reference = _reference(self._sim[m], self._obs)
+            for k, v in reference.items():
+                self.assertAlmostEqual(one_go.get_scores()[k][m], v)
+                self.assertAlmostEqual(chunks.get_scores()[k][m], v)
+
+        # Members without observations have no metrics
+        chunks.reset()
+        chunks.update(self._sim[:, 200:202], self._obs[200:202])
+        self.assertTrue(np.all(np.isnan(chunks.get_scores()["RMSE"])))
+
+    def test_single_pass_numba(self):
+        with mock.patch.object(metrics_module, "is_numba_loaded", return_value=True):
+            self._test_single_pass()
+
+    def test_single_pass_numpy(self):
+        # Used when numba is not in use
+        with mock.patch.object(metrics_module, "is_numba_loaded", return_value=False):
+            self._test_single_pass()
+
+    def test_catchment_batch(self):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+        ur = UnsaturatedReservoir(
+            parameters={"Smax": 50.0, "Ce": 1.0, "m": 0.01, "beta": 2.0},
+            states={"S0": 25.0},
+            approximation=num_app,
+            id="UR",
+        )
+        fr = PowerReservoir(parameters={"k": 0.1, "alpha": 1.0}, states={"S0": 10.0}, approximation=num_app, id="FR")
+        model = Unit(layers=[[ur], [fr]], id="M4")
+        model.set_timestep(1.0)
+
+        rng = np.random.RandomState(42)
+        inputs = [rng.gamma(0.5, 6.0, size=(4, 300)), rng.uniform(0.0, 4.0, size=300)]
+        observed = rng.gamma(1.0, 2.0, size=300)
+        parameters = {"M4_FR_k": np.array([0.05, 0.1, 0.2, 0.4])}
+
+        runner = CatchmentBatch(model)
+        outputs, states = runner.run(inputs, parameters=parameters)
+        scores, chunk_states = runner.evaluate(inputs, observed, parameters=parameters, chunk_size=70, warmup=30)
+
+        self.assertTrue(np.allclose(states["M4_FR_S0"], chunk_states["M4_FR_S0"]))
+
+        for c in range(4):
+            reference = _reference(outputs[0][c, 30:], observed[30:])
+            for k, v in reference.items():
+                self.assertAlmostEqual(scores[k][c], v)
+
+
+if __name__ == "__main__":
+    unittest.main()
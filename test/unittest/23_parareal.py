@@ -0,0 +1,127 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from copy import deepcopy
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.parareal import Parareal
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.numerical_approximators.explicit_euler import (
+    ExplicitEulerNumba,
+    ExplicitEulerPython,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+
+
+class TestParareal(unittest.TestCase):
+    """
+    This class tests the Parareal solution of a unit. The solution must
+    converge to the serial one, be equal to it after as many iterations as
+    slices, and be the same in the calling process and in worker processes.
+    """
+
+    def _init_model(self):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+
+        ur = UnsaturatedReservoir(
+            parameters={"Smax": 50.0, "Ce": 1.0, "m": 0.01, "beta": 2.0},
+            states={"S0": 25.0},
+            approximation=num_app,
+            id="UR",
+        )
+        fr = PowerReservoir(parameters={"k": 0.02, "alpha": 1.5}, states={"S0": 10.0}, approximation=num_app, id="FR")
+
+        self._model = Unit(layers=[[ur], [fr]], id="M4")
+        self._model.set_timestep(1.0)
+        self._coarse = ExplicitEulerPython(root_finder=None, clip_bounds=True)
+
+        rng = np.random.RandomState(42)
+        self._inputs = [rng.gamma(0.5, 6.0, size=600), rng.uniform(0.0, 4.0, size=600)]
+
+        serial = deepcopy(self._model)
+        serial.set_input(self._inputs)
+        self._reference = serial.get_output()
+        self._reference_states = serial.get_states()
+
+    def test_convergence(self):
+        self._init_model()
+
+        for num_workers in [1, 2]:
+            parareal = Parareal(
+                self._model, num_slices=6, coarse_approximation=self._coarse, coarse_factor=4, num_workers=num_workers
+            )
+            outputs, report = parareal.run(self._inputs, tol=1e-9, compare=True)
+
+            self.assertTrue(report["converged"])
+            self.assertLessEqual(report["iterations"], 6)
+            self.assertEqual(len(report["defects"]), report["iterations"])
+            self.assertLess(report["max_error"], 1e-6)
+            self.assertTrue(np.allclose(outputs[0], self._reference[0]))
+            self.assertAlmostEqual(parareal.get_states()["M4_FR_S0"], self._reference_states["M4_FR_S0"])
+
+    def test_exact(self):
+        # After as many iterations as slices the solution is the serial one
+        self._init_model()
+        parareal = Parareal(self._model, num_slices=4, coarse_approximation=self._coarse, coarse_factor=7)
+        outputs, report = parareal.run(self._inputs, tol=0.0)
+
+        self.assertEqual(report["iterations"], 4)
+        self.assertTrue(np.allclose(outputs[0], self._reference[0], rtol=1e-12, atol=1e-12))
+
+        # The next run continues from the final states
+        serial = deepcopy(self._model)
+        serial.set_states(self._reference_states)
+        serial.set_input(self._inputs)
+        reference = serial.get_output()
+
+        outputs, _ = parareal.run(self._inputs, tol=0.0)
+        self.assertTrue(np.allclose(outputs[0], reference[0], rtol=1e-12, atol=1e-12))
+
+    def test_errors(self):
+        self._init_model()
+
+        with self.assertRaises(ValueError):
+            Parareal(self._model, num_slices=4, coarse_approximation=ExplicitEulerNumba(root_finder=None))
+
+        lag = UnitHydrograph1(parameters={"lag-time": 2.0}, states={"lag": None}, id="uh")
+        with self.assertRaises(ValueError):
+            Parareal(Unit(layers=[[lag]], id="lag"), num_slices=4, coarse_approximation=self._coarse)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.chunked_evaluation import ChunkedEvaluation
+from superflexpy.framework.network import Network
+from superflexpy.framework.node import Node
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+from superflexpy.utils.metrics import StreamingMetrics
+
+
+class TestChunkedEvaluation(unittest.TestCase):
+    """
+    This class tests the evaluation of models in chunks of time steps. The
+    complete runs must give the metrics of the full simulation and, in a
+    calibration, stopping the runs that cannot improve on the best one must
+    not change the best parameter set.
+    """
+
+    def _init_model(self):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 0.0}, approximation=num_app, id="FR")
+        lag = UnitHydrograph1(parameters={"lag-time": 2.3}, states={"lag": None}, id="L")
+
+        self._unit = Unit(layers=[[fr], [lag]], id="H1")
+        self._unit.set_timestep(1.0)
+
+        rng = np.random.RandomState(42)
+        self._inputs = [rng.gamma(0.5, 10.0, size=400)]
+
+        self._unit.set_input(self._inputs)
+        self._observed = self._unit.get_output()[0] + rng.normal(0.0, 0.05, size=400)
+        self._unit.reset_states()
+
+    def test_complete(self):
+        self._init_model()
+        self._unit.set_parameters({"H1_FR_k": 0.02})
+
+        self._unit.set_input(self._inputs)
+        reference = StreamingMetrics()
+        reference.update(self._unit.get_output()[0][50:], self._observed[50:])
+        self._unit.reset_states()
+
+        evaluation = ChunkedEvaluation(self._unit, self._observed, chunk_size=33, warmup=50)
+        scores, report = evaluation.run(self._inputs)
+
+        self.assertTrue(report["complete"])
+        self.assertEqual(report["time_steps"], 400)
+        for k, v in reference.get_scores().items():
+            self.assertAlmostEqual(scores[k], v[0])
+        self.assertAlmostEqual(evaluation.get_best(), scores["SSE"])
+
+    def test_calibration(self):
+        self._init_model()
+        rng = np.random.RandomState(0)
+        candidates = rng.uniform(0.001, 0.05, size=30)
+
+        evaluation = ChunkedEvaluation(self._unit, self._observed, chunk_size=20)
+        best = {}
+        solved = 0
+
+        for early_abort in [False, True]:
+            evaluation.reset()
+            solved = 0
+
+            for k in candidates:
+                self._unit.set_parameters({"H1_FR_k": k})
+                self._unit.reset_states()
+                scores, report = evaluation.run(self._inputs, threshold=None if early_abort else np.inf)
+                solved += report["time_steps"]
+
+                if report["complete"] and (early_abort not in best or scores["SSE"] < best[early_abort][1]):
+                    best[early_abort] = (k, scores["SSE"])
+                elif not report["complete"]:
+                    self.assertGreater(report["bound"], best[early_abort][1])
+
+        self.assertEqual(best[True], best[False])
+        self.assertLess(solved, 0.75 * 30 * 400)
+
+    def test_network(self):
+        self._init_model()
+
+        cat1 = Node(units=[self._unit], weights=[1.0], area=1.0, id="Cat1")
+        cat2 = Node(units=[self._unit], weights=[1.0], area=2.0, id="Cat2")
+        net = Network(nodes=[cat1, cat2], topology={"Cat1": "Cat2", "Cat2": None})
+        inputs = {"Cat1": self._inputs, "Cat2": [0.5 * self._inputs[0]]}
+
+        for node, loc_in in zip([cat1, cat2], inputs.values()):
+            node.set_input(loc_in)
+        reference = StreamingMetrics()
+        reference.update(net.get_output()["Cat2"][0], self._observed)
+        net.reset_states()
+
+        evaluation = ChunkedEvaluation(net, self._observed, chunk_size=64, outlet="Cat2")
+        scores, report = evaluation.run(inputs)
+        self.assertTrue(report["complete"])
+        self.assertAlmostEqual(scores["SSE"], reference.get_scores()["SSE"][0])
+
+        # Stopped run
+        net.reset_states()
+        scores, report = evaluation.run(inputs, threshold=0.0)
+        self.assertFalse(report["complete"])
+        self.assertEqual(report["time_steps"], 64)
+
+    def test_errors(self):
+        self._init_model()
+
+        with self.assertRaises(TypeError):
+            ChunkedEvaluation(self._unit._layers[0][0], self._observed, chunk_size=10)
+
+        net = Network(nodes=[Node(units=[self._unit], weights=[1.0], area=1.0, id="Cat1")], topology={"Cat1": None})
+        with self.assertRaises(ValueError):
+            ChunkedEvaluation(net, self._observed, chunk_size=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.catchment_batch import CatchmentBatch
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.fallback import (
+    FallbackNumba,
+    FallbackPython,
+    count_status,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+
+
+def _no_root(fluxes, S, S0, dt, args, ind):
+    S = 0.5 if S is None else S
+    return S**2 + 1.0, 0.0, 1.0, 2 * S
+
+
+def _linear(fluxes, S, S0, dt, args, ind):
+    S = 0.5 if S is None else S
+    return S - 0.3, 0.0, 1.0, 1.0
+
+
+def _wrong_derivative(fluxes, S, S0, dt, args, ind):
+    # The Newton steps are tiny and go in the wrong direction
+    S = 0.5 if S is None else S
+    return S - 0.3, 0.0, 1.0, -1e12
+
+
+class TestFallback(unittest.TestCase):
+    """
+    This class tests the fallback root finders. They must give the solution
+    of the other root finders, never raise when the methods do not converge,
+    and report the method that produced each root.
+    """
+
+    def _init_model(self, approximation):
+        ur = UnsaturatedReservoir(
+            parameters={"Smax": 50.0, "Ce": 1.0, "m": 0.01, "beta": 2.0},
+            states={"S0": 25.0},
+            approximation=approximation,
+            id="UR",
+        )
+        fr = PowerReservoir(
+            parameters={"k": 0.02, "alpha": 3.5}, states={"S0": 10.0}, approximation=approximation, id="FR"
+        )
+
+        model = Unit(layers=[[ur], [fr]], id="M4")
+        model.set_timestep(1.0)
+        model.set_input(self._inputs)
+
+        return model
+
+    def _read_inputs(self):
+        rng = np.random.RandomState(1)
+        self._inputs = [rng.gamma(0.5, 20.0, size=300), rng.uniform(0.0, 4.0, size=300)]
+
+        reference = self._init_model(ImplicitEulerPython(root_finder=PegasusPython(iter_max=100)))
+        self._reference = reference.get_output()[0]
+
+    def test_solution(self):
+        self._read_inputs()
+
+        for approximation in [ImplicitEulerPython(FallbackPython()), ImplicitEulerNumba(FallbackNumba())]:
+            model = self._init_model(approximation)
+            self.assertTrue(np.allclose(model.get_output()[0], self._reference, atol=1e-6))
+
+            status = model.get_internal("FR", "solver_status")
+            self.assertEqual(status.shape, (300, 1))
+            self.assertEqual(count_status(status)["newton"], 300)
+
+    def test_fallback(self):
+        self._read_inputs()
+
+        with self.assertRaises(RuntimeError):
+            self._init_model(ImplicitEulerPython(PegasusPython(iter_max=2))).get_output()
+
+        for approximation in [
+            ImplicitEulerPython(FallbackPython(iter_max=2)),
+            ImplicitEulerNumba(FallbackNumba(chain=("newton", "bisection"), iter_max=1)),
+        ]:
+            model = self._init_model(approximation)
+            self.assertTrue(np.allclose(model.get_output()[0], self._reference, atol=1e-6))
+
+            counts = count_status(model.get_internal("FR", "solver_status"))
+            self.assertGreater(counts["bisection"], 0)
+            self.assertEqual(counts["bisection"] + counts["pegasus"] + counts["newton"], 300)
+
+    def test_last_resort(self):
+        # Not converged: midpoint of the bracket
+        root, status = FallbackPython(chain=("bisection",), bisection_iter_max=2).solve(
+            _linear, None, 0.0, None, 0, None
+        )
+        self.assertEqual(status, 3)
+        self.assertEqual(root, 0.375)
+
+        # No bracket: bound with the smallest residual or NaN
+        root, status = FallbackPython().solve(_no_root, None, 0.0, None, 0, None)
+        self.assertEqual((root, status), (0.0, 4))
+
+        root, status = FallbackPython(accept_midpoint=False).solve(_no_root, None, 0.0, None, 0, None)
+        self.assertTrue(np.isnan(root))
+
+        # Root on a bound of the interval
+        root, status = FallbackPython(tol_F=0.5).solve(_linear, None, 0.0, None, 0, None)
+        self.assertEqual((root, status), (0.0, 5))
+
+        # Newton does not stop outside the bracket, even if the step is small
+        root, status = FallbackPython(chain=("newton",), tol_F=0.0).solve(_wrong_derivative, None, 0.0, None, 0, None)
+        self.assertEqual(status, 3)
+        self.assertAlmostEqual(root, 0.3, places=2)
+
+        with self.assertRaises(ValueError):
+            FallbackPython(chain=("newton", "secant"))
+
+    def test_batch(self):
+        self._read_inputs()
+        model = self._init_model(ImplicitEulerNumba(FallbackNumba(iter_max=3)))
+
+        batch = CatchmentBatch(model)
+        outputs, _ = batch.run(self._inputs, parameters={"M4_FR_k": np.array([0.01, 0.02, 0.05])})
+        self.assertTrue(np.allclose(outputs[0][1], self._reference, atol=1e-6))
+
+        status = batch._unit.get_internal("FR", "solver_status")
+        self.assertEqual(status.shape, (300, 1, 3))
+        self.assertEqual(sum(count_status(status).values()), 900)
+        self.assertEqual(count_status(status)["failed"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from copy import deepcopy
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.framework.node import Node
+from superflexpy.framework.service import ForecastClient, ForecastServer
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+
+
+class TestService(unittest.TestCase):
+    """
+    This class tests the forecast service. The outputs must be the ones of
+    the model solved directly, consecutive requests must continue from the
+    warm states, and errors must be returned to the client.
+    """
+
+    def _init_model(self):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+
+        fr = PowerReservoir(parameters={"k": 0.01, "alpha": 2.5}, states={"S0": 5.0}, approximation=num_app, id="FR")
+        lag = UnitHydrograph1(parameters={"lag-time": 2.3}, states={"lag": None}, id="L")
+
+        self._unit = Unit(layers=[[fr], [lag]], id="H1")
+        self._unit.set_timestep(1.0)
+
+        cat1 = Node(units=[self._unit], weights=[1.0], area=1.0, id="Cat1")
+        cat2 = Node(units=[self._unit], weights=[1.0], area=2.0, id="Cat2")
+        self._network = Network(nodes=[cat1, cat2], topology={"Cat1": "Cat2", "Cat2": None})
+
+        rng = np.random.RandomState(42)
+        self._inputs = [rng.gamma(0.5, 10.0, size=200)]
+
+        self._folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self._folder.cleanup)
+        self._address = os.path.join(self._folder.name, "service.sock")
+
+    def _get_reference(self, model, inputs):
+        model = deepcopy(model)
+        model.set_input(inputs)
+        return model.get_output()
+
+    def test_run(self):
+        self._init_model()
+        reference = self._get_reference(self._unit, self._inputs)
+
+        with ForecastServer({"h1": self._unit.to_spec()}, self._address, num_workers=2) as server:
+            with ForecastClient(server.get_address()) as client:
+                self.assertEqual(client.list_models(), ["h1"])
+
+                # Two consecutive requests continue from the warm states
+                out_1, _ = client.run("h1", [self._inputs[0][:120]])
+                out_2, states = client.run("h1", [self._inputs[0][120:]])
+                self.assertTrue(np.allclose(np.concatenate([out_1[0], out_2[0]]), reference[0]))
+                self.assertAlmostEqual(client.get_states("h1")["H1_FR_S0"], states["H1_FR_S0"])
+
+                # Requests that do not update the warm states
+                client.reset_states("h1")
+                for _ in range(2):
+                    out, _ = client.run("h1", self._inputs, update_states=False)
+                    self.assertTrue(np.allclose(out[0], reference[0]))
+
+                # Initial states given with the request
+                client.set_states("h1", {"H1_FR_S0": 50.0})
+                out, _ = client.run("h1", self._inputs, states={"H1_FR_S0": 5.0})
+                self.assertTrue(np.allclose(out[0], reference[0]))
+
+                with self.assertRaises(RuntimeError):
+                    client.run("h2", self._inputs)
+
+                # The connection is still usable after an error
+                self.assertEqual(client.list_models(), ["h1"])
+
+    def test_network(self):
+        self._init_model()
+        inputs = {"Cat1": self._inputs, "Cat2": [0.5 * self._inputs[0]]}
+
+        network = Network.from_spec(self._network.to_spec())
+        for cat, loc_in in inputs.items():
+            network.call_internal(cat, "set_input", input=loc_in)
+        reference = network.get_output()
+
+        with ForecastServer({"net": self._network}, 0, warmup_inputs={"net": inputs}) as server:
+            with ForecastClient(server.get_address()) as client:
+                out, _ = client.run("net", inputs)
+
+        for cat in reference:
+            self.assertTrue(np.allclose(out[cat][0], reference[cat][0]))
+
+    def test_concurrent(self):
+        self._init_model()
+        reference = self._get_reference(self._unit, self._inputs)
+        errors = []
+
+        def forecast(address):
+            with ForecastClient(address) as client:
+                for _ in range(5):
+                    out, _ = client.run("h1", self._inputs, update_states=False)
+                    errors.append(np.max(np.abs(out[0] - reference[0])))
+
+        with ForecastServer({"h1": self._unit}, self._address, num_workers=2) as server:
+            threads = [threading.Thread(target=forecast, args=(server.get_address(),)) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(len(errors), 20)
+        self.assertLess(max(errors), 1e-12)
+        self.assertFalse(os.path.exists(self._address))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import gc
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.network import Network
+from superflexpy.framework.node import Node
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir, UnsaturatedReservoir
+from superflexpy.implementation.numerical_approximators.explicit_euler import (
+    ExplicitEulerNumba,
+)
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerNumba,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusNumba
+from superflexpy.utils import numerical_approximator
+
+
+class TestUpdate(unittest.TestCase):
+    """
+    This class tests the step-wise solution of the components. Advancing a
+    component a few time steps at a time, starting from the states of the
+    previous call, must give the same outputs and final states of a single
+    run over the whole period.
+    """
+
+    def _init_model(self, num_app):
+        ur = UnsaturatedReservoir(
+            parameters={"Smax": 50.0, "Ce": 1.0, "m": 0.01, "beta": 2.0},
+            states={"S0": 25.0},
+            approximation=num_app,
+            id="UR",
+        )
+        fr = PowerReservoir(parameters={"k": 0.1, "alpha": 1.5}, states={"S0": 10.0}, approximation=num_app, id="FR")
+        lag = UnitHydrograph1(parameters={"lag-time": 3.4}, states={"lag": None}, id="L")
+
+        self._unit = Unit(layers=[[ur], [fr], [lag]], id="U")
+        self._unit.set_timestep(1.0)
+
+        rng = np.random.RandomState(42)
+        self._inputs = [rng.gamma(0.5, 10.0, size=100), rng.uniform(0.0, 3.0, size=100)]
+
+    def _run_steps(self, component, forcing, steps):
+        outputs = []
+        start = 0
+
+        for n in steps:
+            outputs.append(component.update(n, [f[start:] for f in forcing]))
+            start += n
+
+        return outputs
+
+    def _check_unit(self, num_app):
+        self._init_model(num_app)
+
+        self._unit.set_input(self._inputs)
+        reference = self._unit.get_output()[0]
+        final_states = self._unit.get_states()
+
+        for steps in [[1] * 100, [7] * 14 + [2]]:
+            self._unit.reset_states()
+            outputs = self._run_steps(self._unit, self._inputs, steps)
+
+            self.assertTrue(np.array_equal(np.concatenate([o[0] for o in outputs]), reference))
+            self.assertEqual(self._unit.get_states()["U_FR_S0"], final_states["U_FR_S0"])
+            for s, f in zip(self._unit.get_states()["U_L_lag"], final_states["U_L_lag"]):
+                self.assertTrue(np.array_equal(s, f))
+
+    def test_unit(self):
+        self._check_unit(ImplicitEulerNumba(root_finder=PegasusNumba()))
+        self._check_unit(ExplicitEulerNumba(root_finder=None))
+
+    def test_network(self):
+        self._init_model(ImplicitEulerNumba(root_finder=PegasusNumba()))
+
+        cat1 = Node(units=[self._unit], weights=[1.0], area=1.0, id="Cat1")
+        cat2 = Node(units=[self._unit], weights=[1.0], area=2.0, id="Cat2")
+        net = Network(nodes=[cat1, cat2], topology={"Cat1": "Cat2", "Cat2": None})
+        forcing = {"Cat1": self._inputs, "Cat2": [0.5 * self._inputs[0], 1.0]}
+
+        cat1.set_input(self._inputs)
+        cat2.set_input([0.5 * self._inputs[0], np.ones(100)])
+        reference = net.get_output()
+        net.reset_states()
+
+        outputs = []
+        for t in range(100):
+            outputs.append(net.update(1, {k: [f if np.ndim(f) == 0 else f[t:] for f in v] for k, v in forcing.items()}))
+
+        for cat in ["Cat1", "Cat2"]:
+            self.assertTrue(np.array_equal(np.concatenate([o[cat][0] for o in outputs]), reference[cat][0]))
+
+        with self.assertRaises(KeyError):
+            net.update(1, {"Cat1": self._inputs})
+
+    def test_forcing(self):
+        self._init_model(ImplicitEulerNumba(root_finder=PegasusNumba()))
+
+        self._unit.set_input([np.full(5, 2.0), np.full(5, 1.0)])
+        reference = self._unit.get_output()[0]
+        self._unit.reset_states()
+
+        self.assertTrue(np.array_equal(self._unit.update(5, [2.0, np.ones(8)])[0], reference))
+
+        with self.assertRaises(ValueError):
+            self._unit.update(5, [2.0, np.ones(3)])
+
+    def test_lag_buffers(self):
+        # The ring buffers of the lag persist between the calls and the
+        # state is written back only when read
+        self._init_model(ExplicitEulerNumba(root_finder=None))
+        lag = self._unit._layers[2][0]
+        forcing = [self._inputs[0][:1], self._inputs[1][:1]]
+
+        self._unit.update(1, forcing)
+        buffers = lag._lag_buffers
+        state_array = lag.state_array
+        self._unit.update(1, forcing)
+
+        self.assertIs(lag._lag_buffers, buffers)
+        self.assertIs(lag.state_array, state_array)
+        self.assertIsNotNone(self._unit.get_states()["U_L_lag"])
+        self.assertIsNone(lag._lag_buffers)
+
+    def test_caches(self):
+        # The names of the arguments are forgotten with the function
+        def fluxes(S, S0, ind, P, k, dt):
+            return None
+
+        names = numerical_approximator._get_arguments_name(fluxes)
+        self.assertEqual(names, ("P", "k", "dt"))
+        self.assertIn(fluxes, numerical_approximator._ARGUMENTS_NAME)
+        num_entries = len(numerical_approximator._ARGUMENTS_NAME)
+        del fluxes
+        gc.collect()
+        self.assertEqual(len(numerical_approximator._ARGUMENTS_NAME), num_entries - 1)
+
+        # The specialized loops are bounded and built again after eviction
+        def make_kernel(fun):
+            return [fun]
+
+        max_kernels = numerical_approximator._MAX_KERNELS
+        numerical_approximator._MAX_KERNELS = 2
+        try:
+            first = numerical_approximator._get_numba_kernel(make_kernel, min)
+            self.assertIs(numerical_approximator._get_numba_kernel(make_kernel, min), first)
+            numerical_approximator._get_numba_kernel(make_kernel, max)
+            numerical_approximator._get_numba_kernel(make_kernel, abs)
+            self.assertEqual(len(numerical_approximator._KERNELS), 2)
+            self.assertIsNot(numerical_approximator._get_numba_kernel(make_kernel, min), first)
+        finally:
+            numerical_approximator._MAX_KERNELS = max_kernels
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.assimilation import EnsembleKalmanFilter
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import (
+    ImplicitEulerPython,
+)
+from superflexpy.implementation.root_finders.pegasus import PegasusPython
+
+
+class TestEnsembleKalmanFilter(unittest.TestCase):
+    """
+    This class tests the ensemble Kalman filter. The analysis must give the
+    Kalman update of the ensemble statistics, the forecast must continue the
+    simulation of the unit from the states of the ensemble, and assimilating
+    observations must improve the simulation of a unit with wrong initial
+    states.
+    """
+
+    def _init_model(self):
+        num_app = ImplicitEulerPython(root_finder=PegasusPython())
+
+        fr = PowerReservoir(parameters={"k": 0.05, "alpha": 1.5}, states={"S0": 10.0}, approximation=num_app, id="FR")
+        lag = UnitHydrograph1(parameters={"lag-time": 2.3}, states={"lag": None}, id="L")
+
+        self._unit = Unit(layers=[[fr], [lag]], id="U")
+        self._unit.set_timestep(1.0)
+
+        rng = np.random.RandomState(42)
+        self._inputs = [rng.gamma(0.5, 10.0, size=100)]
+
+    def test_analysis(self):
+        self._init_model()
+        rng = np.random.RandomState(1)
+        prior = rng.normal(10.0, 2.0, size=2000)
+
+        for method in ["sqrt", "stochastic"]:
+            enkf = EnsembleKalmanFilter(
+                self._unit, 2000, states={"U_FR_S0": prior, "U_L_lag": [np.zeros(3)]}, method=method, seed=0
+            )
+            self.assertEqual(enkf.get_layout(), [("U_FR_S0", None, 0, 1), ("U_L_lag", 0, 1, 4)])
+
+            enkf.analysis(12.0, prior.reshape((-1, 1)), 4.0)
+            posterior = enkf.get_ensemble()[:, 0]
+
+            var = np.var(prior, ddof=1)
+            gain = var / (var + 4.0)
+            exp_mean = prior.mean() + gain * (12.0 - prior.mean())
+            exp_var = (1 - gain) * var
+
+            if method == "sqrt":
+                self.assertAlmostEqual(posterior.mean(), exp_mean, places=10)
+                self.assertAlmostEqual(np.var(posterior, ddof=1), exp_var, places=10)
+            else:
+                self.assertAlmostEqual(posterior.mean(), exp_mean, delta=0.1)
+                self.assertAlmostEqual(np.var(posterior, ddof=1), exp_var, delta=0.2)
+
+            # Missing observations do not change the ensemble
+            enkf.analysis(np.nan, prior.reshape((-1, 1)), 4.0)
+            self.assertTrue(np.array_equal(enkf.get_ensemble()[:, 0], posterior))
+
+    def test_forecast(self):
+        self._init_model()
+
+        self._unit.set_input(self._inputs)
+        reference = self._unit.get_output()[0]
+        final_states = self._unit.get_states()
+        self._unit.reset_states()
+
+        enkf = EnsembleKalmanFilter(self._unit, 3)
+        self.assertIsNone(enkf.get_ensemble())  # Lag states not initialized
+
+        outputs = [enkf.forecast([self._inputs[0][:40]])[0], enkf.forecast([self._inputs[0][40:]])[0]]
+        outputs = np.concatenate(outputs, axis=1)
+
+        self.assertEqual(enkf.get_ensemble().shape, (3, 4))
+        for o in outputs:
+            self.assertTrue(np.allclose(o, reference))
+        self.assertTrue(np.allclose(enkf.get_states()["U_FR_S0"], final_states["U_FR_S0"]))
+        self.assertTrue(np.allclose(enkf.get_states()["U_L_lag"][0], final_states["U_L_lag"][0]))
+
+    def test_assimilate(self):
+        self._init_model()
+
+        self._unit.set_input(self._inputs)
+        truth = self._unit.get_output()[0]
+        self._unit.set_states({"U_FR_S0": 50.0})  # Wrong initial state
+        self._unit.set_input(self._inputs)
+        open_loop = self._unit.get_output()[0]
+        self._unit.set_states({"U_FR_S0": 50.0})
+
+        rng = np.random.RandomState(3)
+        observed = truth + rng.normal(0.0, 0.1, size=100)
+        initial = {"U_FR_S0": rng.uniform(5.0, 60.0, size=30)}
+        noise = rng.lognormal(0.0, 0.2, size=(30, 100))  # Keeps the spread of the ensemble
+
+        for method in ["stochastic", "sqrt"]:
+            enkf = EnsembleKalmanFilter(
+                self._unit,
+                30,
+                states=initial,
+                method=method,
+                bounds={"U_FR_S0": (0.0, None), "U_L_lag": (0.0, None)},
+                seed=0,
+            )
+
+            simulated = []
+            for t in range(100):
+                outputs = enkf.assimilate([self._inputs[0][t : t + 1] * noise[:, t : t + 1]], observed[t], 0.04)
+                simulated.append(outputs[0][:, -1].mean())
+
+            error = np.abs(np.array(simulated) - truth)
+            self.assertLess(error.mean(), 0.5 * np.abs(open_loop - truth).mean())
+            self.assertTrue(np.all(enkf.get_ensemble()[:, 0] >= 0.0))
+
+    def test_errors(self):
+        self._init_model()
+
+        with self.assertRaises(ValueError):
+            EnsembleKalmanFilter(self._unit, 3, method="particle")
+
+        with self.assertRaises(RuntimeError):
+            EnsembleKalmanFilter(self._unit, 3).analysis(1.0, np.ones((3, 1)), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Copyright 2020 Marco Dal Molin et al.
+
+This file is part of SuperflexPy.
+
+SuperflexPy is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+SuperflexPy is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with SuperflexPy. If not, see <https://www.gnu.org/licenses/>.
+
+This file is part of the SuperflexPy modelling framework. For details about it,
+visit the page https://superflexpy.readthedocs.io
+
+CODED BY: Marco Dal Molin
+DESIGNED BY: Marco Dal Molin, Fabrizio Fenicia, Dmitri Kavetski
+"""
+
+import subprocess
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+
+# Package path is 2 levels above this file
+package_path = join(abspath(dirname(__file__)), "..", "..")
+sys.path.insert(0, package_path)
+
+from superflexpy.framework.element import _solve_lag_ring, _solve_lag_vectorized
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.utils.lazy_numba import LazyDispatcher, jit, nb
+
+CHECK_IMPORT = """
+import sys
+import numpy as np
+from superflexpy.framework.profiler import Profiler
+from superflexpy.framework.unit import Unit
+from superflexpy.implementation.elements.gr4j import UnitHydrograph1
+from superflexpy.implementation.elements.hbv import PowerReservoir
+from superflexpy.implementation.numerical_approximators.implicit_euler import ImplicitEuler{arch}
+from superflexpy.implementation.root_finders.pegasus import Pegasus{arch}
+from superflexpy.utils.metrics import StreamingMetrics
+
+app = ImplicitEuler{arch}(root_finder=Pegasus{arch}())
+fr = PowerReservoir(parameters={{"k": 0.1, "alpha": 1.5}}, states={{"S0": 10.0}}, approximation=app, id="FR")
+lag = UnitHydrograph1(parameters={{"lag-time": 2.3}}, states={{"lag": None}}, id="L")
+unit = Unit(layers=[[fr], [lag]], id="U")
+unit.set_timestep(1.0)
+unit.set_input([np.ones(10)])
+profiler = Profiler(unit)  # Records the compilations only if numba is used
+output = unit.get_output()[0]
+StreamingMetrics().update(output, np.linspace(0.0, 1.0, 10))
+print(output[-1], "numba" in sys.modules)
+"""
+
+
+@jit(nopython=True)
+def _double(x):
+    return 2.0 * x
+
+
+@jit(nopython=True, parallel=True)
+def _double_all(x):
+    output = np.zeros(len(x))
+    for i in nb.prange(len(x)):
+        output[i] = _double(x[i])  # Lazy function used as global
+    return output
+
+
+@jit(nopython=True)
+def _call(fun, x):
+    return fun(x)
+
+
+class TestLazyNumba(unittest.TestCase):
+    """
+    This class tests the lazy use of numba: models with the python
+    architecture must not import it, not even when profiled or evaluated with
+    StreamingMetrics, the functions decorated with jit must behave as the ones
+    decorated with numba.jit, and the python lag must give the results of the
+    compiled one.
+    """
+
+    def _run(self, arch):
+        output = subprocess.run(
+            [sys.executable, "-c", CHECK_IMPORT.format(arch=arch)],
+            cwd=package_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        value, numba_imported = output.stdout.split()
+        return float(value), numba_imported == "True"
+
+    def test_import(self):
+        python_out, python_numba = self._run("Python")
+        numba_out, numba_numba = self._run("Numba")
+
+        self.assertFalse(python_numba)
+        self.assertTrue(numba_numba)
+        self.assertAlmostEqual(python_out, numba_out, places=10)
+
+    def test_jit(self):
+        self.assertIsInstance(_double, LazyDispatcher)
+        self.assertEqual(_double(2.0), 4.0)
+        self.assertTrue(np.array_equal(_double_all(np.arange(3.0)), [0.0, 2.0, 4.0]))
+        self.assertEqual(_call(_double, 3.0), 6.0)
+
+        # As class attribute it returns the compiled function
+        fluxes = PowerReservoir._fluxes_function_numba
+        self.assertIs(fluxes, PowerReservoir._fluxes_function_numba)
+        self.assertTrue(hasattr(fluxes, "signatures"))
+
+    def test_lag(self):
+        rng = np.random.RandomState(0)
+
+        for length, num_ts in [(5, 200), (20, 3), (1, 50), (7, 7)]:
+            weight = rng.uniform(size=length)
+            lag_state = rng.uniform(size=length)
+            inputs = rng.gamma(0.5, 10.0, size=num_ts)
+
+            head = rng.randint(length)
+
+            # Ring buffer whose first position is at head
+            compiled_state = np.roll(lag_state, head)
+            vectorized_state = compiled_state.copy()
+
+            compiled = np.zeros((num_ts, length))
+            vectorized = np.zeros((num_ts, length))
+            compiled_head = _solve_lag_ring(weight, compiled_state, head, inputs, compiled)
+            vectorized_head = _solve_lag_vectorized(weight, vectorized_state, head, inputs, vectorized)
+
+            self.assertTrue(np.array_equal(compiled, vectorized))
+            self.assertTrue(
+                np.array_equal(np.roll(compiled_state, -compiled_head), np.roll(vectorized_state, -vectorized_head))
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()